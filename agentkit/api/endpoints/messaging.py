@@ -1,8 +1,30 @@
+import asyncio
+import hashlib
+import os
+import json
+import uuid
 import httpx # Import httpx for async HTTP calls
-from fastapi import APIRouter, HTTPException, status, Body, Path, BackgroundTasks # Add BackgroundTasks
-from pydantic import HttpUrl # For endpoint validation
-from agentkit.core.models import MessagePayload, ApiResponse, AgentInfo
-from agentkit.registration.storage import agent_storage # To get agent details
+from typing import Annotated, Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from fastapi import APIRouter, HTTPException, status, Body, Header, Path, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import ValidationError
+from agentkit.core.compression import compression
+from agentkit.core.http_pool import http_pool # Shared keep-alive client for outbound calls
+from agentkit.core.models import MessagePayload, ApiResponse, AgentInfo, BatchDeliveryConfig, BulkMessageRecord, DeadLetterReplayPayload
+from agentkit.messaging.blobs import claim_checks
+from agentkit.messaging.broadcast import broadcast, concurrency_from_env
+from agentkit.messaging.circuit_breaker import circuit_breakers
+from agentkit.messaging.dead_letters import dead_letter_store
+from agentkit.messaging.dispatcher import AgentUnavailable, Delivery, Dispatcher, DispatchBatch, DispatchJob, DispatchQueueFull
+from agentkit.messaging.idempotency import IdempotencyConflict, idempotency_cache
+from agentkit.messaging.ingest import RecordError, iter_json_records
+from agentkit.messaging.push import push_channels
+from agentkit.messaging.rate_limit import RateLimited, rate_limiter
+from agentkit.messaging.replies import ReplyFailed, ReplyWaitersFull, reply_waiters
+from agentkit.messaging.routes import accepted_encodings, dispatch_routes
+from agentkit.messaging.retry import DeliveryError, KIND_CONNECT, KIND_DISCONNECT, KIND_STATUS, KIND_TIMEOUT
+from agentkit.messaging.tasks import task_store
+from agentkit.registration.storage import MAX_PAGE_SIZE, agent_storage # To get agent details
 from agentkit.tools.registry import tool_registry
 from agentkit.tools.interface import ToolInterface
 import logging # Add logging
@@ -11,38 +33,103 @@ import logging # Add logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Placeholder for more sophisticated dispatch logic later
-# from agentkit.messaging.dispatcher import dispatch_message
-
 router = APIRouter()
 
 # Define a timeout for external calls
 EXTERNAL_CALL_TIMEOUT = 15.0 # seconds
 
+MAX_DEAD_LETTER_PAGE = 1000 # Most dead letters returned by one GET /dead-letters
+MAX_TASK_PAGE = 1000 # Most tasks returned by one GET /tasks
+MAX_BULK_RECORD_BYTES = int(os.getenv("AGENTKIT_MAX_BULK_RECORD_BYTES", str(1024 * 1024))) # Largest record accepted by /agents/run:batch
+BROADCAST_CONCURRENCY = concurrency_from_env() # Deliveries of one capability broadcast in flight at once
+DEFAULT_REPLY_TIMEOUT = 30.0 # Seconds /run?wait=true waits for the agent's reply by default
+MAX_REPLY_TIMEOUT = 300.0 # Longest wait a caller may ask for
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
 @router.post(
     "/agents/{agent_id}/run",
     response_model=ApiResponse, # Response model remains ApiResponse for structure
     status_code=status.HTTP_202_ACCEPTED, # Change status code to 202 Accepted
     summary="Accept a task for an agent",
-    description="Accepts a task payload for the specified agent. If the agent has a contact endpoint, the task is dispatched asynchronously in the background. Tool invocations are handled synchronously before responding.",
+    description="Accepts a task payload for the specified agent. If the agent has a contact endpoint, the task is queued for asynchronous dispatch. Returns 429 with a Retry-After header when the sender or the agent is over its rate limit or the dispatch queue is full, or 503 when the agent's circuit breaker is open and set to fail fast. Tool invocations are handled synchronously before responding. "
+                "Requests with an Idempotency-Key header (or idempotencyKey field) that the same sender already sent successfully get the stored response, marked with an Idempotent-Replayed header, without dispatching again; reusing a key for a different agent or message is rejected with 422. "
+                "With wait=true, the request is held until the agent posts its reply to /tasks/{taskId}/reply (200 with the reply), the message cannot be delivered (502), or the timeout passes (202 with the taskId).",
     tags=["Messaging"]
 )
 async def run_agent(
-    background_tasks: BackgroundTasks, # Dependency Injection (no default) - MUST COME FIRST
     agent_id: str = Path(..., description="The unique ID of the target agent"), # Default from Path
-    payload: MessagePayload = Body(...) # Default from Body
+    payload: MessagePayload = Body(...), # Default from Body
+    # Annotated, so that direct calls get plain defaults rather than Query markers
+    wait: Annotated[bool, Query(description="Wait for the agent's reply instead of answering 202 right away")] = False,
+    timeout: Annotated[float, Query(gt=0, le=MAX_REPLY_TIMEOUT, description="Seconds to wait for the reply (with wait=true)")] = DEFAULT_REPLY_TIMEOUT,
+    idempotency_key: Annotated[Optional[str], Header(alias="Idempotency-Key", max_length=MAX_IDEMPOTENCY_KEY_LENGTH, description="Retries with the same key get the first response instead of running again")] = None,
+    response: Response = None # Injected by FastAPI; lets a reply be answered with 200
 ) -> ApiResponse:
+    """
+    Accepts a message for an agent, at most once per idempotency key.
+
+    With an Idempotency-Key header (or the payload's idempotencyKey), the
+    key is looked up per sender: a retry of a request that succeeded gets
+    the stored response (with an Idempotent-Replayed header) and nothing is
+    dispatched or executed again; a retry that arrives while the first
+    request is still running waits for its outcome.
+    """
+    _check_sender_fields(payload)
+    key = idempotency_key or payload.idempotencyKey
+    if key is None:
+        return await _run_agent(agent_id, payload, wait, timeout, response)
+
+    async def execute():
+        body = await _run_agent(agent_id, payload, wait, timeout, response)
+        return (response.status_code if response is not None and response.status_code else status.HTTP_202_ACCEPTED), body
+    try:
+        status_code, body, replayed = await idempotency_cache.run((payload.senderId, key), _request_fingerprint(agent_id, payload, wait), execute)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"{e} Use a new key for each distinct message.")
+    if replayed and response is not None:
+        logger.info(f"Replaying stored response for idempotency key '{key}' from sender {payload.senderId}.")
+        response.status_code = status_code
+        response.headers["Idempotent-Replayed"] = "true"
+    return body
+
+
+def _check_sender_fields(payload: MessagePayload) -> None:
+    """
+    Rejects messages that set fields only AgentKit may set.
+
+    replyTo names a reply waiter created for a wait=true request; a sender
+    choosing it could answer into another caller's request.
+
+    Raises:
+        HTTPException: 422 if replyTo is set.
+    """
+    if payload.replyTo is not None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="replyTo is assigned by AgentKit; send with wait=true to get a reply instead of setting it."
+        )
+
+
+def _request_fingerprint(agent_id: str, payload: MessagePayload, wait: bool) -> Tuple[str, bool, str]:
+    """Identifies a /run request for idempotency: the target, wait mode and a hash of the message (without its key or timestamp, which a retry may regenerate)."""
+    message = payload.model_dump_json(exclude={"idempotencyKey", "timestamp"})
+    return agent_id, wait, hashlib.sha256(message.encode()).hexdigest()
+
+
+async def _run_agent(agent_id: str, payload: MessagePayload, wait: bool, timeout: float, response: Optional[Response]) -> ApiResponse:
     """
     Accepts incoming tasks/messages for a specific agent.
 
-    1. Checks if the target agent is registered.
+    1. Checks if the target agent is registered, and that neither the sender
+       nor the agent is over its rate limit (429 otherwise).
     2. If messageType is 'tool_invocation':
         - Attempts to execute the tool synchronously (external HTTP or local class).
         - Returns the tool execution result with 200 OK (overrides 202).
     3. If messageType is anything else:
         - Retrieves the target agent's contact_endpoint.
-        - If an endpoint exists, schedules asynchronous dispatch via background task.
-        - Returns 202 Accepted immediately.
+        - If an endpoint exists, queues the message on the dispatcher.
+        - Returns 202 Accepted immediately, or 429 if the dispatch queue is full.
+        - With wait=true, waits for the agent's reply first (see _run_and_wait).
 
     1. Checks if the target agent is registered.
     2. If messageType is 'tool_invocation':
@@ -61,6 +148,7 @@ async def run_agent(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Agent with ID '{agent_id}' not found."
         )
+    _admit(agent_id, payload)
 
     # 2. Handle tool invocation
     if payload.messageType == "tool_invocation":
@@ -78,51 +166,50 @@ async def run_agent(
         external_endpoint = tool_registry.get_tool_endpoint(tool_name)
         if external_endpoint:
             logger.info(f"Attempting to invoke external tool '{tool_name}' at {external_endpoint}")
-            async with httpx.AsyncClient(timeout=EXTERNAL_CALL_TIMEOUT) as client:
-                try:
-                    response = await client.post(external_endpoint, json={"arguments": arguments})
-                    response.raise_for_status() # Raise HTTPStatusError for 4xx/5xx responses
-                    tool_result = response.json()
-
-                    # Format external tool response
-                    if isinstance(tool_result, dict) and tool_result.get("status") == "error":
-                         logger.error(f"External tool '{tool_name}' reported execution error: {tool_result.get('error_message')}")
-                         # Tool errors should still return 200 OK with error status in payload
-                         # Overriding the default 202 for synchronous tool calls
-                         return ApiResponse(
-                             status="error",
-                             message=f"External tool '{tool_name}' execution failed: {tool_result.get('error_message', 'Unknown tool error')}",
-                             data=tool_result,
-                             error_code="EXTERNAL_TOOL_EXECUTION_FAILED"
-                         )
-                    else:
-                         logger.info(f"External tool '{tool_name}' executed successfully.")
-                         # Tool success should return 200 OK
-                         # Overriding the default 202 for synchronous tool calls
-                         return ApiResponse(
-                             status="success",
-                             message=f"External tool '{tool_name}' executed successfully.",
-                             data=tool_result
-                         )
-
-                except httpx.TimeoutException:
-                     logger.error(f"Request to external tool '{tool_name}' timed out.")
-                     raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=f"Request to external tool '{tool_name}' timed out.")
-                except httpx.ConnectError:
-                     logger.error(f"Could not connect to external tool '{tool_name}' at {external_endpoint}.")
-                     raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Could not connect to external tool '{tool_name}' at {external_endpoint}.")
-                except httpx.HTTPStatusError as e:
-                     error_detail = f"External tool '{tool_name}' returned error: Status {e.response.status_code}"
-                     try:
-                         error_data = e.response.json()
-                         error_detail += f" - Response: {error_data}"
-                     except Exception: # Use broad exception for JSON decode issues
-                         error_detail += f" - Response: {e.response.text}"
-                     logger.error(error_detail)
-                     raise HTTPException(status_code=e.response.status_code, detail=error_detail)
-                except Exception as e:
-                     logger.exception(f"An unexpected error occurred while calling external tool '{tool_name}'.") # Log stack trace
-                     raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred while calling external tool '{tool_name}': {str(e)}")
+            try:
+                tool_response = await http_pool.post(external_endpoint, json={"arguments": arguments}, timeout=EXTERNAL_CALL_TIMEOUT)
+                tool_response.raise_for_status() # Raise HTTPStatusError for 4xx/5xx responses
+                tool_result = tool_response.json()
+
+                # Format external tool response
+                if isinstance(tool_result, dict) and tool_result.get("status") == "error":
+                     logger.error(f"External tool '{tool_name}' reported execution error: {tool_result.get('error_message')}")
+                     # Tool errors should still return 200 OK with error status in payload
+                     # Overriding the default 202 for synchronous tool calls
+                     return ApiResponse(
+                         status="error",
+                         message=f"External tool '{tool_name}' execution failed: {tool_result.get('error_message', 'Unknown tool error')}",
+                         data=tool_result,
+                         error_code="EXTERNAL_TOOL_EXECUTION_FAILED"
+                     )
+                else:
+                     logger.info(f"External tool '{tool_name}' executed successfully.")
+                     # Tool success should return 200 OK
+                     # Overriding the default 202 for synchronous tool calls
+                     return ApiResponse(
+                         status="success",
+                         message=f"External tool '{tool_name}' executed successfully.",
+                         data=tool_result
+                     )
+
+            except httpx.TimeoutException:
+                 logger.error(f"Request to external tool '{tool_name}' timed out.")
+                 raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=f"Request to external tool '{tool_name}' timed out.")
+            except httpx.ConnectError:
+                 logger.error(f"Could not connect to external tool '{tool_name}' at {external_endpoint}.")
+                 raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Could not connect to external tool '{tool_name}' at {external_endpoint}.")
+            except httpx.HTTPStatusError as e:
+                 error_detail = f"External tool '{tool_name}' returned error: Status {e.response.status_code}"
+                 try:
+                     error_data = e.response.json()
+                     error_detail += f" - Response: {error_data}"
+                 except Exception: # Use broad exception for JSON decode issues
+                     error_detail += f" - Response: {e.response.text}"
+                 logger.error(error_detail)
+                 raise HTTPException(status_code=e.response.status_code, detail=error_detail)
+            except Exception as e:
+                 logger.exception(f"An unexpected error occurred while calling external tool '{tool_name}'.") # Log stack trace
+                 raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred while calling external tool '{tool_name}': {str(e)}")
 
         else:
             # Fallback to local tool class execution
@@ -168,79 +255,718 @@ async def run_agent(
                  )
 
     # 3. Handle other message types by dispatching to agent's contact_endpoint
+    elif wait:
+        return await _run_and_wait(agent_id, target_agent, payload, timeout, response)
     else:
-        logger.info(f"Attempting to dispatch message type '{payload.messageType}' to agent {agent_id}")
-        contact_endpoint_str = target_agent.contactEndpoint
+        try:
+            job = await _submit_message(agent_id, target_agent, payload)
+        except HTTPException:
+            _refund(agent_id, payload)
+            raise
 
-        if not contact_endpoint_str:
-            logger.error(f"Agent {agent_id} has no registered contactEndpoint. Cannot dispatch message.")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Agent '{agent_id}' has no registered contact endpoint. Cannot dispatch message type '{payload.messageType}'."
-            )
+        # Return 202 Accepted immediately
+        return ApiResponse(
+            status="success",
+            message=f"Task accepted for agent {agent_id}. Dispatch scheduled.",
+            data={"agentId": agent_id, "dispatch_status": "scheduled", "taskId": job.task_id}
+        )
 
-        # Validate the endpoint URL
-        try:
-            # Pydantic's HttpUrl can validate - we just need the string form after validation
-            HttpUrl(contact_endpoint_str) # This raises ValueError if invalid
-            logger.info(f"Validated contact endpoint for agent {agent_id}: {contact_endpoint_str}")
-        except ValueError as e: # Catches Pydantic's validation error
-            logger.error(f"Agent {agent_id} has an invalid contactEndpoint URL: {contact_endpoint_str}. Error: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, # Internal config error
-                detail=f"Agent '{agent_id}' has an invalid registered contact endpoint URL."
-            )
 
-        # Schedule the dispatch to the agent's endpoint as a background task
-        logger.info(f"Scheduling background dispatch to agent {agent_id} at {contact_endpoint_str}")
-        background_tasks.add_task(
-            dispatch_to_agent_endpoint,
-            agent_id=agent_id,
-            contact_endpoint=contact_endpoint_str, # Pass validated string URL
-            payload=payload
+async def _run_and_wait(agent_id: str, target_agent: AgentInfo, payload: MessagePayload, timeout: float, response: Optional[Response]) -> ApiResponse:
+    """
+    Queues a message and holds the request until the agent replies.
+
+    The task ID is chosen up front and carried to the agent as `replyTo`,
+    and the waiter is registered before the message is queued, so even an
+    immediate reply finds it.
+
+    Raises:
+        HTTPException: As _submit_message, 429 if too many requests are
+                       already waiting, 502 if the message was dead-lettered.
+    """
+    task_id = str(uuid.uuid4())
+    try:
+        reply = reply_waiters.expect(task_id)
+    except ReplyWaitersFull as e:
+        logger.warning(f"Rejecting message for agent {agent_id}: {e}")
+        _refund(agent_id, payload)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"{e} Retry later or send without wait=true.",
+            headers={"Retry-After": "1"}
         )
+    try:
+        await _submit_message(agent_id, target_agent, payload.model_copy(update={"replyTo": task_id}), task_id=task_id)
+    except HTTPException:
+        reply_waiters.discard(task_id)
+        _refund(agent_id, payload)
+        raise
 
-        # Return 202 Accepted immediately
+    try:
+        answer = await reply_waiters.wait(task_id, reply, timeout)
+    except ReplyFailed as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Message for agent '{agent_id}' could not be delivered (task {task_id}): {e}"
+        )
+    if answer is None:
         return ApiResponse(
             status="success",
-            message=f"Task accepted for agent {agent_id}. Dispatch scheduled.",
-            data={"agentId": agent_id, "dispatch_status": "scheduled"}
+            message=f"Task accepted for agent {agent_id}, but it did not reply within {timeout}s. The reply will be available at /tasks/{task_id}.",
+            data={"agentId": agent_id, "dispatch_status": "scheduled", "taskId": task_id, "replyStatus": "timeout"}
         )
+    if response is not None:
+        response.status_code = status.HTTP_200_OK
+    return ApiResponse(
+        status="success",
+        message=f"Agent {agent_id} replied.",
+        data={"agentId": agent_id, "taskId": task_id, "replyStatus": "replied", "reply": answer}
+    )
 
 
-async def dispatch_to_agent_endpoint(agent_id: str, contact_endpoint: str, payload: MessagePayload):
+def _admit(agent_id: str, payload: MessagePayload) -> None:
+    """
+    Applies the per-sender and per-agent rate limits to a message.
+
+    Raises:
+        HTTPException: 429 with Retry-After if the sender or the agent is over its rate.
+    """
+    try:
+        rate_limiter.acquire(payload.senderId, agent_id)
+    except RateLimited as e:
+        logger.warning(f"Rejecting message for agent {agent_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"{e} Retry later.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
+def _refund(agent_id: str, payload: MessagePayload) -> None:
+    """Gives back the rate-limit tokens _admit took for a message that was then not queued, so a full queue does not also spend the sender's allowance."""
+    rate_limiter.refund(payload.senderId, agent_id)
+
+
+async def _submit_message(agent_id: str, target_agent: AgentInfo, payload: MessagePayload, task_id: Optional[str] = None) -> DispatchJob:
+    """
+    Queues a non-tool message for dispatch to the agent's contact endpoint.
+
+    Raises:
+        HTTPException: 400/500 if the agent has no usable contact endpoint,
+                       429 if the dispatch queue is full, 503 if the agent's
+                       circuit breaker rejects messages.
+    """
+    logger.info(f"Attempting to dispatch message type '{payload.messageType}' to agent {agent_id}")
+    contact_endpoint_str = target_agent.contactEndpoint
+
+    if not contact_endpoint_str:
+        logger.error(f"Agent {agent_id} has no registered contactEndpoint. Cannot dispatch message.")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Agent '{agent_id}' has no registered contact endpoint. Cannot dispatch message type '{payload.messageType}'."
+        )
+
+    # Validate the endpoint URL (parsed once at registration; the cached route is reused)
+    try:
+        route = dispatch_routes.route(agent_id, str(contact_endpoint_str), accepted_encodings(target_agent)) # This raises ValueError if invalid
+    except ValueError as e: # Catches Pydantic's validation error
+        logger.error(f"Agent {agent_id} has an invalid contactEndpoint URL: {contact_endpoint_str}. Error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, # Internal config error
+            detail=f"Agent '{agent_id}' has an invalid registered contact endpoint URL."
+        )
+
+    # Large payloads stay on disk; the queue, retries and dispatch carry a reference
+    payload = await claim_checks.offload(payload)
+
+    # Queue the dispatch to the agent's endpoint; the worker pool delivers it
+    logger.info(f"Queueing dispatch to agent {agent_id} at {contact_endpoint_str}")
+    try:
+        return dispatcher.submit(
+            agent_id=agent_id,
+            contact_endpoint=route.endpoint, # Pass validated string URL
+            payload=payload,
+            task_id=task_id,
+            batch=_batch_config(target_agent)
+        )
+    except DispatchQueueFull as e:
+        logger.warning(f"Rejecting message for agent {agent_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"{e} Retry later.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except AgentUnavailable as e:
+        logger.warning(f"Rejecting message for agent {agent_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"{e} Retry later.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
+class _DuplexStreamingResponse(StreamingResponse):
     """
-    Background task to dispatch a message payload to the agent's contact endpoint.
-    Handles HTTP calls and logging.
+    Streams a response that is produced while the request body is still being read.
+
+    StreamingResponse normally listens for a client disconnect on `receive`
+    while it streams, which would swallow the body chunks the generator is
+    reading. Here a single listener reads `receive` for both: it hands body
+    chunks to `ingest` through a one-slot queue, so a slow ingest still
+    holds back the upload, and once the client disconnects it cancels the
+    response, stopping the ingest wherever it is.
     """
-    dispatch_payload = payload.model_dump(mode='json')
-    logger.info(f"[Background Task] Dispatching message type '{payload.messageType}' to {contact_endpoint} for agent {agent_id}")
 
-    async with httpx.AsyncClient(timeout=EXTERNAL_CALL_TIMEOUT) as client:
+    def __init__(self, ingest: Callable[[AsyncIterator[bytes]], AsyncIterator[bytes]], media_type: Optional[str] = None):
+        super().__init__((), media_type=media_type) # The body iterator is built per call, around the request body
+        self.ingest = ingest
+
+    async def __call__(self, scope, receive, send) -> None:
+        chunks: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=1)
+        self.body_iterator = self.ingest(self._body(chunks))
+        streaming = asyncio.ensure_future(self.stream_response(send))
+        listening = asyncio.ensure_future(self._listen(receive, chunks))
+        try:
+            await asyncio.wait((streaming, listening), return_when=asyncio.FIRST_COMPLETED)
+            if not streaming.done() and listening.done() and listening.result():
+                logger.info("Client disconnected during bulk ingestion; stopping.")
+                streaming.cancel()
+            await asyncio.wait((streaming,))
+        finally:
+            streaming.cancel()
+            listening.cancel()
+        if not streaming.cancelled():
+            streaming.result()
+
+    @staticmethod
+    async def _listen(receive, chunks: "asyncio.Queue[Any]") -> bool:
+        """Feeds the request body to `chunks` (None at its end), then waits for the client to go away. Returns whether it did."""
         try:
-            response = await client.post(contact_endpoint, json=dispatch_payload)
-            response.raise_for_status() # Raise HTTPStatusError for 4xx/5xx responses
-
-            # Log success, but don't process response body in background task
-            logger.info(f"[Background Task] Successfully dispatched message to agent {agent_id} at {contact_endpoint}. Status: {response.status_code}")
-            # Optionally log response snippet if needed for debugging:
-            # response_text_snippet = response.text[:100] + "..." if len(response.text) > 100 else response.text
-            # logger.debug(f"[Background Task] Agent {agent_id} response snippet: {response_text_snippet}")
-
-        except (httpx.TimeoutException, httpx.RemoteProtocolError) as timeout_err:
-             error_message = f"[Background Task] Dispatch request to agent '{agent_id}' at {contact_endpoint} timed out or connection failed unexpectedly: {timeout_err}"
-             logger.error(error_message)
-        except httpx.ConnectError:
-             logger.error(f"[Background Task] Could not connect to agent '{agent_id}' at {contact_endpoint}.")
-        except httpx.HTTPStatusError as e:
-             error_detail = f"[Background Task] Agent '{agent_id}' endpoint ({contact_endpoint}) returned error: Status {e.response.status_code}"
-             try:
-                 error_data = e.response.json()
-                 error_detail += f" - Response: {error_data}"
-             except Exception:
-                 error_detail += f" - Response: {e.response.text}"
-             logger.error(error_detail)
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return True
+                more_body = message.get("more_body", False)
+                await chunks.put(message.get("body", b""))
         except Exception as e:
-             logger.exception(f"[Background Task] An unexpected error occurred while dispatching message to agent '{agent_id}' at {contact_endpoint}.")
+            await chunks.put(e) # Raised to the ingest when it reaches it, e.g. a corrupt compressed body
+            return False
+        await chunks.put(None)
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        return True
+
+    @staticmethod
+    async def _body(chunks: "asyncio.Queue[Any]") -> AsyncIterator[bytes]:
+        while (chunk := await chunks.get()) is not None:
+            if isinstance(chunk, Exception):
+                raise chunk
+            if chunk:
+                yield chunk
+
+
+@router.post(
+    "/agents/run:batch",
+    status_code=status.HTTP_200_OK,
+    response_class=_DuplexStreamingResponse,
+    summary="Queue many messages",
+    description="Accepts a JSON array or an NDJSON stream (application/x-ndjson) of {agentId, message} records and queues each message "
+                "for dispatch as POST /agents/{agentId}/run would. The body is parsed incrementally, and one NDJSON result line per "
+                "record - its taskId, or the error that prevented queueing it - is streamed back as records are processed. "
+                "Tool invocations are not accepted in bulk.",
+    tags=["Messaging"]
+)
+async def run_agents_batch() -> _DuplexStreamingResponse:
+    """
+    Bulk counterpart of run_agent for high-volume producers.
+
+    Records are validated and queued one at a time, so a bad record or a
+    full queue only fails that record (reported with the status code /run
+    would have returned, plus retryAfter when applicable). A malformed
+    JSON array cannot be resynchronized, so its error line ends the stream.
+    If the client disconnects, records not yet queued are dropped.
+    """
+    return _DuplexStreamingResponse(_queue_records, media_type="application/x-ndjson")
+
+
+def _body_error(exc: BaseException) -> Optional[HTTPException]:
+    """The HTTPException raised while reading the request body, unwrapped from the task groups that receive may run in."""
+    while len(getattr(exc, "exceptions", ())) == 1:
+        exc = exc.exceptions[0]
+    return exc if isinstance(exc, HTTPException) else None
+
+
+async def _queue_records(body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    agents: Dict[str, Optional[AgentInfo]] = {} # Records tend to repeat agents; look each up once per request
+    queued = failed = 0
+    index = 0
+    try:
+        async for record in iter_json_records(body, MAX_BULK_RECORD_BYTES):
+            result = await _queue_record(index, record, agents)
+            if "taskId" in result:
+                queued += 1
+            else:
+                failed += 1
+            yield (json.dumps(result) + "\n").encode()
+            index += 1
+            if isinstance(record, RecordError) and record.fatal:
+                break
+    except Exception as e:
+        # The compressed body could not be decoded (see CompressionMiddleware); the 200 is already sent, so end the stream with the error
+        error = _body_error(e)
+        if error is None:
+            raise
+        failed += 1
+        yield (json.dumps({"index": index, "status": "error", "statusCode": error.status_code, "error": error.detail}) + "\n").encode()
+    logger.info(f"Bulk ingestion queued {queued} messages ({failed} rejected).")
+
+
+async def _queue_record(index: int, record: Any, agents: Dict[str, Optional[AgentInfo]]) -> Dict[str, Any]:
+    if isinstance(record, RecordError):
+        return {"index": index, "status": "error", "statusCode": status.HTTP_400_BAD_REQUEST, "error": record.message}
+    try:
+        item = BulkMessageRecord.model_validate(record)
+    except ValidationError as e:
+        return {"index": index, "status": "error", "statusCode": status.HTTP_422_UNPROCESSABLE_ENTITY, "error": e.errors(include_url=False, include_context=False, include_input=False)}
+
+    result: Dict[str, Any] = {"index": index, "agentId": item.agentId}
+    if item.message.messageType == "tool_invocation":
+        return {**result, "status": "error", "statusCode": status.HTTP_400_BAD_REQUEST, "error": "Tool invocations are not accepted in bulk; use POST /agents/{agentId}/run."}
+    try:
+        _check_sender_fields(item.message)
+    except HTTPException as e:
+        return {**result, "status": "error", "statusCode": e.status_code, "error": e.detail}
+    if item.agentId not in agents:
+        agents[item.agentId] = agent_storage.get_agent(item.agentId)
+    target_agent = agents[item.agentId]
+    if target_agent is None:
+        return {**result, "status": "error", "statusCode": status.HTTP_404_NOT_FOUND, "error": f"Agent with ID '{item.agentId}' not found."}
+    try:
+        _admit(item.agentId, item.message)
+        try:
+            job = await _submit_message(item.agentId, target_agent, item.message)
+        except HTTPException:
+            _refund(item.agentId, item.message)
+            raise
+    except HTTPException as e:
+        result.update(status="error", statusCode=e.status_code, error=e.detail)
+        if e.headers and "Retry-After" in e.headers:
+            result["retryAfter"] = int(e.headers["Retry-After"])
+        return result
+    return {**result, "status": "queued", "taskId": job.task_id}
+
+
+@router.post(
+    "/capabilities/{capability}/broadcast",
+    response_model=ApiResponse,
+    summary="Broadcast a message to every agent with a capability",
+    description="Delivers the message to the contact endpoint of every registered agent advertising the capability and returns "
+                "an aggregated delivery report. The message is serialized once and sent with bounded concurrency over the shared "
+                "HTTP client. Each agent gets a single attempt; agents whose circuit breaker is open are skipped. "
+                "Tool invocations cannot be broadcast.",
+    tags=["Messaging"]
+)
+async def broadcast_to_capability(
+    capability: str = Path(..., description="Capability the recipients advertise"),
+    payload: MessagePayload = Body(...)
+) -> ApiResponse:
+    """
+    Fans a message out to all agents with a capability, replacing one /run request per agent.
+
+    Recipients are read from the registry's capability index a page at a
+    time while the deliveries are in progress, and every request shares the
+    same serialized body, so memory use does not grow with the number of
+    recipients. Agents that receive messages in batches get a one-element
+    JSON array, as the dispatcher would send them.
+    """
+    if payload.messageType == "tool_invocation":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Tool invocations cannot be broadcast; use POST /agents/{agentId}/run."
+        )
+    _check_sender_fields(payload)
+    body = payload.model_dump_json().encode()
+    batch_body = b"[" + body + b"]"
+
+    async def send(agent: AgentInfo) -> None:
+        await _send_to_agent(agent.agentId, str(agent.contactEndpoint), batch_body if _batch_config(agent) is not None else body)
+
+    report = await broadcast(_agents_with_capability(capability), send, concurrency=BROADCAST_CONCURRENCY, breakers=circuit_breakers)
+    logger.info(f"Broadcast '{payload.messageType}' to capability '{capability}': {report.delivered}/{report.recipients} delivered "
+                f"({report.failed} failed, {report.skipped} skipped).")
+    return ApiResponse(
+        status="success",
+        message=f"Broadcast delivered to {report.delivered} of {report.recipients} agents.",
+        data={"capability": capability, **report.to_dict()}
+    )
+
+
+def _agents_with_capability(capability: str) -> Iterator[AgentInfo]:
+    """Yields the agents advertising a capability, fetching them from the registry one page at a time."""
+    cursor = None
+    while True:
+        agents, cursor = agent_storage.query_agents(capability=capability, cursor=cursor, limit=MAX_PAGE_SIZE)
+        yield from agents
+        if cursor is None:
+            return
+
+
+async def dispatch_to_agent_endpoint(agent_id: str, contact_endpoint: str, payload: MessagePayload):
+    """
+    Delivers a message payload to the agent's push channel, or else its contact
+    endpoint (run by a dispatcher worker). Handles HTTP calls and logging.
+
+    Raises:
+        DeliveryError: If the message was not delivered. The error's kind and
+                       status code let the dispatcher's retry policy decide
+                       whether resending is safe.
+    """
+    logger.info(f"[Dispatch] Dispatching message type '{payload.messageType}' to {contact_endpoint} for agent {agent_id}")
+    await _send_to_agent(agent_id, contact_endpoint, payload.model_dump_json().encode())
+
+
+async def dispatch_batch_to_agent_endpoint(agent_id: str, contact_endpoint: str, payloads: List[MessagePayload]):
+    """
+    Delivers several messages to a batch-receiving agent in one request
+    whose body is a JSON array of message payloads (run by a dispatcher worker).
+
+    Raises:
+        DeliveryError: If the batch was not delivered (it is retried as a whole).
+    """
+    logger.info(f"[Dispatch] Dispatching a batch of {len(payloads)} messages to {contact_endpoint} for agent {agent_id}")
+    await _send_to_agent(agent_id, contact_endpoint, b"[" + b",".join(payload.model_dump_json().encode() for payload in payloads) + b"]")
+
+
+async def _send_to_agent(agent_id: str, contact_endpoint: str, body: bytes) -> None:
+    """
+    Delivers an already serialized JSON body to an agent, over its push channel if it has one open.
+
+    Falls back to POSTing to the contact endpoint when the agent is not
+    connected, or when the frame could not be written to its socket.
+    """
+    connection = push_channels.get(agent_id)
+    if connection is not None:
+        try:
+            await connection.deliver(body)
+            logger.info(f"[Dispatch] Successfully pushed message to agent {agent_id} over its WebSocket.")
+            return
+        except DeliveryError as e:
+            if e.kind != KIND_CONNECT:
+                raise
+            logger.warning(f"[Dispatch] {e} Falling back to {contact_endpoint}.")
+    await _post_to_agent(agent_id, contact_endpoint, body)
+
+
+async def _post_to_agent(agent_id: str, contact_endpoint: str, body: bytes) -> None:
+    """POSTs an already serialized JSON body to an agent, translating failures into DeliveryErrors."""
+    try:
+        route = dispatch_routes.route(agent_id, contact_endpoint)
+        body, headers = route.encode(body) # Compressed if the agent declared it accepts a supported coding
+        response = await http_pool.post(route.url, content=body, headers=headers, pool_key=route.pool_key, timeout=EXTERNAL_CALL_TIMEOUT)
+        response.raise_for_status() # Raise HTTPStatusError for 4xx/5xx responses
+
+        # Log success, but don't process the response body
+        logger.info(f"[Dispatch] Successfully dispatched message to agent {agent_id} at {contact_endpoint}. Status: {response.status_code}")
+        # Optionally log response snippet if needed for debugging:
+        # response_text_snippet = response.text[:100] + "..." if len(response.text) > 100 else response.text
+        # logger.debug(f"[Dispatch] Agent {agent_id} response snippet: {response_text_snippet}")
+
+    except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+         # The request never reached the agent, so it is always safe to resend
+         logger.error(f"[Dispatch] Could not connect to agent '{agent_id}' at {contact_endpoint}.")
+         raise DeliveryError(f"Could not connect to {contact_endpoint}: {e!r}", kind=KIND_CONNECT)
+    except httpx.TimeoutException as timeout_err:
+         error_message = f"[Dispatch] Dispatch request to agent '{agent_id}' at {contact_endpoint} timed out: {timeout_err}"
+         logger.error(error_message)
+         raise DeliveryError(f"Request timed out: {timeout_err!r}", kind=KIND_TIMEOUT)
+    except httpx.RemoteProtocolError as e:
+         # The agent closed the connection before answering in full; it may already have processed the message
+         logger.error(f"[Dispatch] Agent '{agent_id}' at {contact_endpoint} dropped the connection mid-response: {e}")
+         raise DeliveryError(f"Connection dropped before the response completed: {e!r}", kind=KIND_DISCONNECT)
+    except httpx.HTTPStatusError as e:
+         error_detail = f"[Dispatch] Agent '{agent_id}' endpoint ({contact_endpoint}) returned error: Status {e.response.status_code}"
+         try:
+             error_data = e.response.json()
+             error_detail += f" - Response: {error_data}"
+         except Exception:
+             error_detail += f" - Response: {e.response.text}"
+         logger.error(error_detail)
+         raise DeliveryError(
+             f"Agent returned status {e.response.status_code}",
+             kind=KIND_STATUS,
+             status_code=e.response.status_code,
+             retry_after=_retry_after_seconds(e.response)
+         )
+    except Exception as e:
+         logger.exception(f"[Dispatch] An unexpected error occurred while dispatching message to agent '{agent_id}' at {contact_endpoint}.")
+         raise DeliveryError(f"Unexpected error: {e!r}")
+
+
+def _batch_config(agent: AgentInfo) -> Optional[BatchDeliveryConfig]:
+    """The agent's batch delivery settings, if it opted in at registration."""
+    return agent.metadata.batchDelivery if agent.metadata is not None else None
+
+
+def _retry_after_seconds(response: httpx.Response) -> float | None:
+    """Parses a delay-seconds Retry-After header (HTTP-dates are ignored)."""
+    try:
+        return max(0.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        return None
+
+
+async def _deliver(delivery: Delivery) -> None:
+    """Dispatcher delivery callback (looks the functions up at call time so they can be patched)."""
+    if isinstance(delivery, DispatchBatch):
+        await dispatch_batch_to_agent_endpoint(agent_id=delivery.agent_id, contact_endpoint=delivery.contact_endpoint, payloads=delivery.payloads)
+    else:
+        await dispatch_to_agent_endpoint(agent_id=delivery.agent_id, contact_endpoint=delivery.contact_endpoint, payload=delivery.payload)
+
+
+# Singleton dispatcher for non-tool messages (started and drained by the app lifespan)
+dispatcher = Dispatcher.from_env(deliver=_deliver, dead_letters=dead_letter_store, tasks=task_store, breakers=circuit_breakers, replies=reply_waiters)
+
+
+@router.websocket("/agents/{agent_id}/connect")
+async def agent_push_channel(websocket: WebSocket, agent_id: str):
+    """
+    Persistent delivery channel for a registered agent.
+
+    While the socket is open, the dispatcher pushes the agent's messages as
+    `deliver` frames instead of POSTing them to its contact endpoint, so
+    agents that cannot accept inbound connections still receive messages.
+    The agent acknowledges each frame (see PushConnection). The connection
+    must carry the agent's push token from registration as
+    `Authorization: Bearer <token>`. Connections for unknown agents are
+    closed with code 4404, without a valid token with 4401, and for an
+    agent whose channel is already open with 4409 (the open channel is
+    kept). When the agent leaves the registry, its channel is closed with 4410.
+    """
+    await websocket.accept() # Accept first so the client sees the close code rather than a bare 403
+    if agent_storage.get_agent(agent_id) is None:
+        logger.warning(f"Rejecting push channel for unknown agent '{agent_id}'.")
+        await websocket.close(code=4404, reason=f"Agent with ID '{agent_id}' not found.")
+        return
+    scheme, _, token = websocket.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not push_channels.verify(agent_id, token):
+        logger.warning(f"Rejecting push channel for agent '{agent_id}': missing or invalid push token.")
+        await websocket.close(code=4401, reason=f"A valid push token for agent '{agent_id}' is required.")
+        return
+
+    loop = asyncio.get_running_loop()
+
+    async def close() -> None:
+        try:
+            await websocket.close(code=4410, reason=f"Agent '{agent_id}' is no longer registered.")
+        except RuntimeError:
+            pass # The client closed the socket meanwhile
+
+    def close_socket() -> None:
+        # Called when the agent leaves the registry, possibly from another thread's event loop
+        loop.call_soon_threadsafe(asyncio.ensure_future, close())
+
+    connection = push_channels.connect(agent_id, websocket.send_text, close_socket)
+    if connection is None:
+        logger.warning(f"Rejecting push channel for agent '{agent_id}': it already has an open one.")
+        await websocket.close(code=4409, reason=f"Agent '{agent_id}' already has an open push channel.")
+        return
+    logger.info(f"Agent {agent_id} opened a push channel.")
+    try:
+        while True:
+            connection.receive(await websocket.receive_text())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        push_channels.disconnect(connection)
+        logger.info(f"Agent {agent_id} closed its push channel.")
+
+@router.get(
+    "/dispatch/stats",
+    response_model=ApiResponse,
+    summary="Dispatch queue statistics",
+    description="Returns the dispatch queue depth, in-flight deliveries, accept/reject counters, recent queue wait times, circuit breaker states, the number of agents connected over push channels and requests waiting for replies.",
+    tags=["Messaging"]
+)
+async def get_dispatch_stats() -> ApiResponse:
+    return ApiResponse(
+        status="success",
+        message="Dispatch statistics retrieved successfully.",
+        data={**dispatcher.stats(), "pushChannels": push_channels.stats(), "replyWaiters": reply_waiters.stats(), "dnsCache": http_pool.dns_cache.stats(), "rateLimits": rate_limiter.stats(), "idempotency": idempotency_cache.stats(), "claimCheck": claim_checks.stats(), "compression": compression.stats()}
+    )
+
+
+@router.get(
+    "/dead-letters",
+    response_model=ApiResponse,
+    summary="List undeliverable messages",
+    description="Returns messages whose delivery failed permanently or exhausted its retries, oldest first.",
+    tags=["Messaging"]
+)
+async def list_dead_letters(
+    agentId: Optional[str] = Query(None, description="Only return dead letters addressed to this agent"),
+    limit: int = Query(100, ge=1, le=MAX_DEAD_LETTER_PAGE, description="Maximum number of dead letters to return")
+) -> ApiResponse:
+    letters = dead_letter_store.list(agent_id=agentId)
+    return ApiResponse(
+        status="success",
+        message=f"Found {len(letters)} dead letters.",
+        data={
+            "total": len(letters),
+            "evicted": dead_letter_store.evicted,
+            "deadLetters": [letter.to_dict() for letter in letters[:limit]]
+        }
+    )
+
+
+@router.post(
+    "/dead-letters",
+    response_model=ApiResponse,
+    summary="Replay undeliverable messages",
+    description="Queues the selected dead letters for delivery again, to the agent's currently registered contact endpoint. Replayed messages leave the dead-letter store; if they fail again they return to it.",
+    tags=["Messaging"]
+)
+async def replay_dead_letters(request: DeadLetterReplayPayload = Body(...)) -> ApiResponse:
+    """
+    Replays dead letters through the dispatcher.
+
+    Dead letters whose agent is no longer registered are kept. If the
+    dispatch queue fills up part-way, the rest are reported as deferred
+    (as are letters for agents whose circuit breaker rejects messages);
+    if the queue is full before anything was queued the request fails with 429.
+    """
+    not_found: List[str] = []
+    if request.ids is not None:
+        letters = []
+        for letter_id in request.ids:
+            letter = dead_letter_store.get(letter_id)
+            if letter is None or (request.agentId is not None and letter.agent_id != request.agentId):
+                not_found.append(letter_id)
+            else:
+                letters.append(letter)
+    else:
+        letters = dead_letter_store.list(agent_id=request.agentId)
+
+    replayed: List[str] = []
+    unknown_agent: List[str] = []
+    deferred: List[str] = []
+    for index, letter in enumerate(letters):
+        agent = agent_storage.get_agent(letter.agent_id)
+        if agent is None:
+            unknown_agent.append(letter.id)
+            continue
+        try:
+            dispatcher.submit(agent_id=letter.agent_id, contact_endpoint=str(agent.contactEndpoint), payload=letter.payload, task_id=letter.task_id, batch=_batch_config(agent))
+        except DispatchQueueFull as e:
+            if not replayed:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail=f"{e} Retry later.",
+                    headers={"Retry-After": str(e.retry_after)}
+                )
+            deferred.extend(remaining.id for remaining in letters[index:])
+            break
+        except AgentUnavailable:
+            deferred.append(letter.id) # The agent's circuit breaker is open; keep it for a later replay
+            continue
+        dead_letter_store.pop(letter.id)
+        replayed.append(letter.id)
+
+    logger.info(f"Replayed {len(replayed)} dead letters ({len(deferred)} deferred, {len(unknown_agent)} for unknown agents).")
+    return ApiResponse(
+        status="success",
+        message=f"Replayed {len(replayed)} dead letters.",
+        data={"replayed": replayed, "notFound": not_found, "unknownAgent": unknown_agent, "deferred": deferred}
+    )
+
+
+@router.get(
+    "/tasks",
+    response_model=ApiResponse,
+    summary="Find tasks by Ops-Core correlation IDs",
+    description="Returns the retained tasks whose message carried the given opscore_task_id and/or opscore_session_id, oldest first.",
+    tags=["Messaging"]
+)
+async def find_tasks(
+    opscore_task_id: Optional[str] = Query(None, description="Ops-Core task ID from the message"),
+    opscore_session_id: Optional[str] = Query(None, description="Ops-Core session ID from the message"),
+    limit: int = Query(100, ge=1, le=MAX_TASK_PAGE, description="Maximum number of tasks to return")
+) -> ApiResponse:
+    try:
+        tasks = task_store.find(opscore_task_id=opscore_task_id, opscore_session_id=opscore_session_id, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return ApiResponse(
+        status="success",
+        message=f"Found {len(tasks)} tasks.",
+        data={"tasks": [task.to_dict() for task in tasks]}
+    )
+
+
+@router.get(
+    "/blobs/{blob_id}",
+    response_class=FileResponse,
+    summary="Download an offloaded message payload",
+    description="Streams the payload of a message that was delivered with a claim check (`payload.claimCheck.href`).",
+    tags=["Messaging"]
+)
+async def get_blob(blob_id: str = Path(..., description="The claim check's blobId")) -> FileResponse:
+    path = await asyncio.to_thread(claim_checks.store.path, blob_id) if claim_checks.enabled else None
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Blob '{blob_id}' not found (unknown or expired)."
+        )
+    return FileResponse(path, media_type="application/json")
+
+
+@router.get(
+    "/tasks/{task_id}",
+    response_model=ApiResponse,
+    summary="Get the status of a dispatched task",
+    description="Returns the lifecycle of a message accepted by /run: its status (queued, dispatched, retrying, delivered or failed), attempt count and timestamps. Only the most recent tasks are retained.",
+    tags=["Messaging"]
+)
+async def get_task(task_id: str = Path(..., description="Task ID returned by /run")) -> ApiResponse:
+    task = task_store.get(task_id)
+    if task is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Task with ID '{task_id}' not found (unknown or no longer retained)."
+        )
+    return ApiResponse(
+        status="success",
+        message="Task retrieved successfully.",
+        data=task.to_dict()
+    )
+
+
+@router.post(
+    "/tasks/{task_id}/reply",
+    response_model=ApiResponse,
+    summary="Reply to a task",
+    description="Posts the agent's reply to a message it received with `replyTo` set. A caller still waiting on /run?wait=true receives it "
+                "immediately; otherwise it is kept on the task (GET /tasks/{taskId}) while the task is retained.",
+    tags=["Messaging"]
+)
+async def reply_to_task(
+    task_id: str = Path(..., description="The `replyTo` value of the received message"),
+    reply: MessagePayload = Body(...)
+) -> ApiResponse:
+    task = task_store.get(task_id)
+    body = reply.model_dump(mode='json')
+    waiting = reply_waiters.resolve(task_id, body)
+    if task is not None:
+        task.replied(task_store.now(), body)
+    elif not waiting:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Task with ID '{task_id}' not found (unknown or no longer retained)."
+        )
+    return ApiResponse(
+        status="success",
+        message="Reply delivered to the waiting caller." if waiting else "Reply stored on the task.",
+        data={"taskId": task_id, "callerWaiting": waiting}
+    )
 
 # Add other messaging-related endpoints if needed
\ No newline at end of file
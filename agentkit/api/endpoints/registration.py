@@ -5,9 +5,15 @@ import hmac
 import hashlib
 import logging
 import httpx
-from fastapi import APIRouter, HTTPException, status, Body, BackgroundTasks
-from agentkit.core.models import AgentRegistrationPayload, AgentInfo, ApiResponse
-from agentkit.registration.storage import agent_storage
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, HTTPException, status, Body, BackgroundTasks, Path, Query
+from agentkit.core.http_pool import http_pool
+from agentkit.core.models import AgentRegistrationPayload, AgentBatchRegistrationPayload, AgentHeartbeatPayload, AgentInfo, ApiResponse
+from agentkit.messaging.circuit_breaker import circuit_breakers
+from agentkit.messaging.routes import accepted_encodings, dispatch_routes
+from agentkit.messaging.push import push_channels
+from agentkit.registration.changes import ChangeLogExpired
+from agentkit.registration.storage import agent_storage, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -15,12 +21,34 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+
+def _release_agent_state(agent_info: AgentInfo) -> None:
+    """Drops the dispatch state kept for an agent that left the registry (deregistered or lease expired), and closes its push channel."""
+    circuit_breakers.forget(agent_info.agentId)
+    dispatch_routes.forget(agent_info.agentId)
+    push_channels.revoke(agent_info.agentId)
+
+
+agent_storage.on_remove(_release_agent_state)
+
 # --- Webhook Notification Logic ---
 
-async def notify_opscore_webhook(agent_info: AgentInfo):
+def _opscore_agent_details(agent_info: AgentInfo) -> Dict[str, Any]:
+    """Builds the agent_details structure expected by Ops-Core."""
+    return {
+        "agentId": agent_info.agentId,
+        "agentName": agent_info.agentName,
+        "version": agent_info.version,
+        "capabilities": agent_info.capabilities,
+        "contactEndpoint": str(agent_info.contactEndpoint), # Ensure URL is string
+        "metadata": agent_info.metadata.model_dump(mode='json') if agent_info.metadata else {} # Ensure metadata is at least an empty dict
+    }
+
+
+async def _send_opscore_webhook(payload: Dict[str, Any], description: str) -> None:
     """
-    Sends a webhook notification to Ops-Core upon agent registration.
-    Uses HMAC-SHA256 signature for authentication.
+    Signs and POSTs a webhook payload to Ops-Core.
+    Uses HMAC-SHA256 signature for authentication. Failures are logged, not raised.
     """
     webhook_url = os.getenv("OPSCORE_WEBHOOK_URL")
     webhook_secret = os.getenv("OPSCORE_WEBHOOK_SECRET")
@@ -30,20 +58,6 @@ async def notify_opscore_webhook(agent_info: AgentInfo):
         return
 
     try:
-        # Ensure agent_details matches the expected Ops-Core structure
-        # Assuming AgentInfo fields map directly for now, adjust if needed based on Ops-Core spec
-        agent_details = {
-            "agentId": agent_info.agentId,
-            "agentName": agent_info.agentName,
-            "version": agent_info.version,
-            "capabilities": agent_info.capabilities,
-            "contactEndpoint": str(agent_info.contactEndpoint), # Ensure URL is string
-            "metadata": agent_info.metadata or {} # Ensure metadata is at least an empty dict
-        }
-        payload = {
-            "event_type": "REGISTER",
-            "agent_details": agent_details
-        }
         payload_bytes = json.dumps(payload, separators=(',', ':')).encode('utf-8')
 
         timestamp = str(int(time.time()))
@@ -57,17 +71,50 @@ async def notify_opscore_webhook(agent_info: AgentInfo):
             "X-AgentKit-Signature": signature
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(webhook_url, content=payload_bytes, headers=headers, timeout=10.0) # Add timeout
-            response.raise_for_status() # Raise exception for 4xx/5xx responses
-            logger.info(f"Successfully sent webhook notification for agent {agent_info.agentId} to {webhook_url}. Status: {response.status_code}")
+        response = await http_pool.post(webhook_url, content=payload_bytes, headers=headers, timeout=10.0) # Add timeout
+        response.raise_for_status() # Raise exception for 4xx/5xx responses
+        logger.info(f"Successfully sent webhook notification for {description} to {webhook_url}. Status: {response.status_code}")
 
     except httpx.RequestError as exc:
-        logger.error(f"Error sending Ops-Core webhook for agent {agent_info.agentId}: Request failed {exc.request.url!r} - {exc}")
+        logger.error(f"Error sending Ops-Core webhook for {description}: Request failed {exc.request.url!r} - {exc}")
     except httpx.HTTPStatusError as exc:
-        logger.error(f"Error sending Ops-Core webhook for agent {agent_info.agentId}: Status error {exc.response.status_code} while requesting {exc.request.url!r}. Response: {exc.response.text}")
+        logger.error(f"Error sending Ops-Core webhook for {description}: Status error {exc.response.status_code} while requesting {exc.request.url!r}. Response: {exc.response.text}")
     except Exception as e:
-        logger.error(f"An unexpected error occurred during Ops-Core webhook notification for agent {agent_info.agentId}: {e}", exc_info=True)
+        logger.error(f"An unexpected error occurred during Ops-Core webhook notification for {description}: {e}", exc_info=True)
+
+
+async def notify_opscore_webhook(agent_info: AgentInfo):
+    """
+    Sends a webhook notification to Ops-Core upon agent registration.
+    """
+    payload = {
+        "event_type": "REGISTER",
+        "agent_details": _opscore_agent_details(agent_info)
+    }
+    await _send_opscore_webhook(payload, f"agent {agent_info.agentId}")
+
+
+async def notify_opscore_webhook_deregister(agent_info: AgentInfo):
+    """
+    Sends a webhook notification to Ops-Core when an agent deregisters.
+    """
+    payload = {
+        "event_type": "DEREGISTER",
+        "agent_details": _opscore_agent_details(agent_info)
+    }
+    await _send_opscore_webhook(payload, f"agent {agent_info.agentId}")
+
+
+async def notify_opscore_webhook_batch(agent_infos: List[AgentInfo]):
+    """
+    Sends a single webhook notification to Ops-Core for a batch registration,
+    carrying the details of every agent that was registered.
+    """
+    payload = {
+        "event_type": "REGISTER_BATCH",
+        "agents": [_opscore_agent_details(agent_info) for agent_info in agent_infos]
+    }
+    await _send_opscore_webhook(payload, f"batch of {len(agent_infos)} agents")
 
 
 # --- API Endpoint ---
@@ -77,7 +124,8 @@ async def notify_opscore_webhook(agent_info: AgentInfo):
     response_model=ApiResponse,
     status_code=status.HTTP_201_CREATED,
     summary="Register a new agent",
-    description="Registers a new agent with the system, assigning a unique ID.",
+    description="Registers a new agent with the system, assigning a unique ID. The response also carries the agent's pushToken, "
+                "which it presents to open its WebSocket push channel.",
     tags=["Registration"] # Add tag for grouping in Swagger UI
 )
 async def register_agent(
@@ -102,17 +150,22 @@ async def register_agent(
             # agentId and registration_time are set by default factory
         )
 
-        # Attempt to add the agent to storage
-        agent_storage.add_agent(agent_info)
+        # Attempt to add the agent to storage (leased if requested or configured)
+        lease_ttl = agent_storage.add_agent(agent_info, lease_ttl=payload.leaseTtl)
+        dispatch_routes.update(agent_info.agentId, str(agent_info.contactEndpoint), accepted_encodings(agent_info)) # Parsed once here, not per message
 
         # Trigger webhook notification in the background
         background_tasks.add_task(notify_opscore_webhook, agent_info)
 
+        data = {"agentId": agent_info.agentId, "pushToken": push_channels.token_for(agent_info.agentId)}
+        if lease_ttl is not None:
+            data["leaseTtl"] = lease_ttl
+
         # Return success response immediately
         return ApiResponse(
             status="success",
             message=f"Agent '{agent_info.agentName}' registered successfully.",
-            data={"agentId": agent_info.agentId}
+            data=data
         )
 
     except ValueError as e:
@@ -129,5 +182,268 @@ async def register_agent(
             detail=f"An unexpected error occurred during agent registration: {e}"
         )
 
-# Add other registration-related endpoints here later if needed
-# (e.g., GET /agents/{agentId}, GET /agents, DELETE /agents/{agentId})
\ No newline at end of file
+MAX_REGISTRATION_BATCH = int(os.getenv("AGENTKIT_MAX_REGISTRATION_BATCH", "1000"))
+
+@router.post(
+    "/agents/register:batch",
+    response_model=ApiResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Register several agents",
+    description="Registers up to AGENTKIT_MAX_REGISTRATION_BATCH agents in one request. "
+                "Agents are validated together; conflicting agents are reported per item "
+                "and do not prevent the others from being registered. Each registered agent's result carries its pushToken.",
+    tags=["Registration"]
+)
+async def register_agents_batch(
+    background_tasks: BackgroundTasks,
+    payload: AgentBatchRegistrationPayload = Body(...)
+) -> ApiResponse:
+    """
+    Handles batch registration and triggers one Ops-Core webhook for all
+    agents that were registered.
+
+    The response lists one result per submitted agent, in order, with either
+    the assigned agentId or the conflict that prevented registration.
+    """
+    if len(payload.agents) > MAX_REGISTRATION_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch contains {len(payload.agents)} agents; the maximum is {MAX_REGISTRATION_BATCH}."
+        )
+
+    agent_infos = [
+        AgentInfo(
+            agentName=item.agentName,
+            capabilities=item.capabilities,
+            version=item.version,
+            contactEndpoint=item.contactEndpoint,
+            metadata=item.metadata
+        )
+        for item in payload.agents
+    ]
+    try:
+        errors = agent_storage.add_agents(agent_infos, lease_ttls=[item.leaseTtl for item in payload.agents])
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An unexpected error occurred during batch registration: {e}"
+        )
+
+    results = []
+    registered = []
+    for index, (agent_info, error) in enumerate(zip(agent_infos, errors)):
+        if error is None:
+            registered.append(agent_info)
+            dispatch_routes.update(agent_info.agentId, str(agent_info.contactEndpoint), accepted_encodings(agent_info))
+            results.append({"index": index, "status": "registered", "agentName": agent_info.agentName, "agentId": agent_info.agentId,
+                            "pushToken": push_channels.token_for(agent_info.agentId)})
+        else:
+            results.append({"index": index, "status": "conflict", "agentName": agent_info.agentName, "error": error})
+
+    if registered:
+        background_tasks.add_task(notify_opscore_webhook_batch, registered)
+
+    conflicts = len(agent_infos) - len(registered)
+    return ApiResponse(
+        status="success" if registered else "error",
+        message=f"Registered {len(registered)} of {len(agent_infos)} agents ({conflicts} conflicts).",
+        data={"registered": len(registered), "conflicts": conflicts, "results": results},
+        error_code=None if registered else "BATCH_ALL_CONFLICTS"
+    )
+
+# --- Lease Endpoints ---
+
+@router.post(
+    "/agents/heartbeat",
+    response_model=ApiResponse,
+    summary="Renew agent leases",
+    description="Renews the leases of one or more agents in a single call. "
+                "Agents reported as unknown are no longer registered (e.g. their lease expired) and must re-register. "
+                "Agents reported as unleased are registered but hold no lease in the process that answered, so nothing was renewed.",
+    tags=["Registration"]
+)
+async def heartbeat(payload: AgentHeartbeatPayload = Body(...)) -> ApiResponse:
+    """Extends the leases of the given agents by leaseTtl (or the configured default) seconds."""
+    renewed, unleased, unknown = agent_storage.renew_leases(payload.agentIds, lease_ttl=payload.leaseTtl)
+    return ApiResponse(
+        status="success",
+        message=f"Renewed {len(renewed)} of {len(payload.agentIds)} agents.",
+        data={"renewed": renewed, "unleased": unleased, "unknown": unknown}
+    )
+
+
+@router.delete(
+    "/agents/{agent_id}",
+    response_model=ApiResponse,
+    summary="Deregister an agent",
+    description="Removes an agent from the registry and notifies Ops-Core.",
+    tags=["Registration"]
+)
+async def deregister_agent(
+    background_tasks: BackgroundTasks,
+    agent_id: str = Path(..., description="The unique ID of the agent")
+) -> ApiResponse:
+    """Removes an agent (and its lease) from the registry."""
+    agent_info = agent_storage.remove_agent(agent_id)
+    if agent_info is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Agent with ID '{agent_id}' not found."
+        )
+    background_tasks.add_task(notify_opscore_webhook_deregister, agent_info)
+    return ApiResponse(
+        status="success",
+        message=f"Agent '{agent_info.agentName}' deregistered successfully.",
+        data={"agentId": agent_id}
+    )
+
+# --- Discovery Endpoints ---
+
+def _parse_fields(fields: Optional[str]) -> Optional[set[str]]:
+    """
+    Parses a comma-separated field projection (e.g. "agentId,agentName").
+
+    Returns None when no projection was requested.
+
+    Raises:
+        HTTPException: 400 if an unknown field is requested.
+    """
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(AgentInfo.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown field(s) requested: {', '.join(sorted(unknown))}. "
+                   f"Valid fields: {', '.join(AgentInfo.model_fields)}."
+        )
+    return requested
+
+
+def _serialize_agent(agent_info: AgentInfo, include: Optional[set[str]]) -> Dict[str, Any]:
+    """Serializes an agent for discovery responses, applying the optional projection."""
+    return agent_info.model_dump(mode='json', include=include)
+
+
+@router.get(
+    "/agents",
+    response_model=ApiResponse,
+    summary="List and search registered agents",
+    description="Returns one page of registered agents, optionally filtered by capability and version. "
+                "Use the returned `nextCursor` to fetch the next page and `fields` to limit the returned attributes.",
+    tags=["Registration"]
+)
+async def list_agents(
+    capability: Optional[str] = Query(None, description="Only return agents advertising this capability"),
+    version: Optional[str] = Query(None, description="Only return agents with this exact version"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor returned by a previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of agents per page"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of agent fields to return (e.g. 'agentId,contactEndpoint')")
+) -> ApiResponse:
+    """
+    Discovers agents through the registry's capability/version indexes.
+
+    Results are ordered by agentId, so a cursor stays valid while agents are
+    registered or removed concurrently.
+    """
+    include = _parse_fields(fields)
+    try:
+        agents, next_cursor = agent_storage.query_agents(
+            capability=capability, version=version, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return ApiResponse(
+        status="success",
+        data={
+            "agents": [_serialize_agent(agent, include) for agent in agents],
+            "nextCursor": next_cursor
+        }
+    )
+
+
+CHANGES_DEFAULT_LIMIT = 1000
+CHANGES_MAX_LIMIT = 10000
+CHANGES_MAX_WAIT = 60.0
+
+@router.get(
+    "/agents/changes",
+    response_model=ApiResponse,
+    summary="Follow registry changes",
+    description="Returns registry changes after the `since` sequence number, waiting up to `timeout` seconds "
+                "for one if there are none yet. Without a usable cursor (first call, cursor too old, or issued "
+                "before a restart) the response is a full snapshot with `reset: true` and the cursor it reflects.",
+    tags=["Registration"]
+)
+async def list_agent_changes(
+    since: Optional[int] = Query(None, ge=0, description="Sequence number returned by the previous call"),
+    epoch: Optional[str] = Query(None, description="Epoch returned together with the cursor"),
+    limit: int = Query(CHANGES_DEFAULT_LIMIT, ge=1, le=CHANGES_MAX_LIMIT, description="Maximum number of changes to return"),
+    timeout: float = Query(25.0, ge=0, le=CHANGES_MAX_WAIT, description="Seconds to wait for a change (long-poll)")
+) -> ApiResponse:
+    """
+    Serves the registry change feed.
+
+    Each change is {"seq", "op" (register/update/remove), "agentId", "agent"}.
+    Clients apply the changes in order and pass the returned `seq` and
+    `epoch` to the next call.
+    """
+    if since is not None:
+        try:
+            changes, cursor = agent_storage.changes_since(since, limit, epoch=epoch)
+            if not changes and await agent_storage.wait_for_changes(since, timeout):
+                changes, cursor = agent_storage.changes_since(since, limit, epoch=epoch)
+            return ApiResponse(
+                status="success",
+                data={
+                    "reset": False,
+                    "epoch": agent_storage.changes.epoch,
+                    "seq": cursor,
+                    "changes": changes,
+                    "hasMore": cursor < agent_storage.changes.seq
+                }
+            )
+        except ChangeLogExpired as e:
+            logger.info(f"Change feed cursor cannot be resumed, sending snapshot: {e}")
+
+    agents, cursor = agent_storage.snapshot()
+    return ApiResponse(
+        status="success",
+        data={
+            "reset": True,
+            "epoch": agent_storage.changes.epoch,
+            "seq": cursor,
+            "agents": [_serialize_agent(agent, None) for agent in agents],
+            "hasMore": False
+        }
+    )
+
+
+@router.get(
+    "/agents/{agent_id}",
+    response_model=ApiResponse,
+    summary="Get a registered agent",
+    description="Returns the registration record of a single agent. Without a field projection, the response also includes the state of the agent's dispatch circuit breaker and push channel.",
+    tags=["Registration"]
+)
+async def get_agent(
+    agent_id: str = Path(..., description="The unique ID of the agent"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of agent fields to return")
+) -> ApiResponse:
+    """Looks up a single agent by ID."""
+    include = _parse_fields(fields)
+    agent_info = agent_storage.get_agent(agent_id)
+    if agent_info is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Agent with ID '{agent_id}' not found."
+        )
+    data = _serialize_agent(agent_info, include)
+    if include is None:
+        data["circuitBreaker"] = circuit_breakers.state_of(agent_id)
+        data["pushChannel"] = push_channels.state_of(agent_id)
+    return ApiResponse(status="success", data=data)
+
+# Add other registration-related endpoints here later if needed
\ No newline at end of file
@@ -1,7 +1,12 @@
 import time
 import logging
-from fastapi import Request, Response
+from typing import Optional
+from fastapi import HTTPException, Request, Response, status
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from agentkit.core.compression import Compression, DecompressedTooLarge, DecompressionError, UnsupportedEncoding, compression
 
 # Configure basic logging
 # In a real app, use a more robust logging setup (e.g., structlog, loguru)
@@ -52,4 +57,142 @@ class LoggingMiddleware(BaseHTTPMiddleware):
 
         return response
 
+
+class CompressionMiddleware:
+    """
+    Content-Encoding support for request and response bodies.
+
+    A request body sent with `Content-Encoding: gzip` (or `zstd`) is decoded
+    as the endpoint reads it, so streamed uploads such as the bulk endpoint
+    stay streamed. Unsupported codings are answered with `415` and an
+    `Accept-Encoding` header listing the supported ones; corrupt bodies with
+    `400`, and bodies that decode to more than the configured limit with `413`.
+    Decoding errors are raised as HTTPException from `receive`; an endpoint
+    that streams its response while still reading the body (the bulk
+    endpoint) reports them in the stream, since its status line is already sent.
+
+    Responses are compressed with the best coding the client's
+    Accept-Encoding allows, unless their Content-Length is below the
+    compression threshold, they are already encoded, or they are partial
+    (206, or carrying Content-Range), since a byte range must index the
+    uncompressed representation. Streamed responses
+    (no Content-Length) are compressed chunk by chunk and flushed after each
+    one, so NDJSON results still arrive as they are produced. Every response
+    to a request with Accept-Encoding carries `Vary: Accept-Encoding`,
+    compressed or not, so caches keep the variants apart.
+    """
+
+    def __init__(self, app: ASGIApp, codecs: Optional[Compression] = None):
+        self.app = app
+        self.codecs = codecs or compression
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        try:
+            encoding = self.codecs.check(headers.get("content-encoding", ""))
+        except UnsupportedEncoding as e:
+            response = JSONResponse({"detail": str(e)}, status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                                    headers={"Accept-Encoding": ", ".join(self.codecs.supported)})
+            await response(scope, receive, send)
+            return
+        if encoding is not None:
+            scope = dict(scope, headers=[(k, v) for k, v in scope["headers"] if k not in (b"content-encoding", b"content-length")])
+            receive = self._decoding(receive, encoding)
+        if "accept-encoding" in headers:
+            send = _EncodingSender(send, self.codecs, self.codecs.negotiate(headers["accept-encoding"]))
+        await self.app(scope, receive, send)
+
+    def _decoding(self, receive: Receive, encoding: str) -> Receive:
+        decoder = self.codecs.decoder(encoding)
+
+        async def receive_decoded() -> Message:
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            more_body = message.get("more_body", False)
+            try:
+                body = decoder.feed(message.get("body", b""))
+                if not more_body:
+                    decoder.finish()
+            except DecompressedTooLarge as e:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+            except DecompressionError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            return {"type": "http.request", "body": body, "more_body": more_body}
+
+        return receive_decoded
+
+
+class _EncodingSender:
+    """ASGI send wrapper that compresses the response body (see CompressionMiddleware)."""
+
+    def __init__(self, send: Send, codecs: Compression, encoding: Optional[str]):
+        self.send = send
+        self.codecs = codecs
+        self.encoding = encoding
+        self.start: Optional[Message] = None   # Held until the first body chunk shows whether to compress
+        self.encoder = None
+        self.flush = False   # Flush after every chunk (streamed responses of unknown length)
+        self.passthrough = False
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            if self.encoding is None: # Nothing the client accepts; the response still varies by Accept-Encoding
+                MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+                self.passthrough = True
+                await self.send(message)
+                return
+            self.start = message
+            return
+        if self.passthrough or (self.start is None and self.encoder is None):
+            await self.send(message)
+            return
+        if message["type"] != "http.response.body":
+            await self._begin(compress=False)
+            await self.send(message)
+            return
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start is not None:
+            headers = Headers(raw=self.start["headers"])
+            length = headers.get("content-length")
+            size = int(length) if length is not None else None if more_body else len(body)
+            small = size is not None and size < self.codecs.min_size
+            # A 206 or Content-Range body is a byte range of the uncompressed representation; encoding it would break the range
+            if small or "content-encoding" in headers or "content-range" in headers or self.start["status"] in (204, 206, 304):
+                await self._begin(compress=False)
+                await self.send(message)
+                return
+            if not more_body:
+                # The whole body is here: compress it in one go and keep an exact Content-Length
+                body = self.codecs.compress(body, self.encoding)
+                await self._begin(compress=True, length=len(body))
+                await self.send({"type": "http.response.body", "body": body, "more_body": False})
+                return
+            self.encoder = self.codecs.encoder(self.encoding)
+            self.flush = length is None
+            await self._begin(compress=True)
+        body = self.encoder.compress(body, flush=more_body and self.flush)
+        if not more_body:
+            body += self.encoder.finish()
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    async def _begin(self, compress: bool, length: Optional[int] = None) -> None:
+        start, self.start = self.start, None
+        headers = MutableHeaders(scope=start)
+        headers.add_vary_header("Accept-Encoding")
+        if not compress:
+            self.passthrough = True
+        else:
+            headers["Content-Encoding"] = self.encoding
+            if length is None:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(length)
+        await self.send(start)
+
+
 # You can add more middleware here as needed (e.g., authentication, CORS)
\ No newline at end of file
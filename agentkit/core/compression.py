@@ -0,0 +1,260 @@
+import importlib
+import importlib.util
+import os
+import zlib
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Compression configuration (see Compression.from_env)
+MIN_SIZE_ENV = "AGENTKIT_COMPRESSION_MIN_SIZE"                 # Bodies smaller than this many bytes are sent uncompressed
+GZIP_LEVEL_ENV = "AGENTKIT_GZIP_LEVEL"
+ZSTD_LEVEL_ENV = "AGENTKIT_ZSTD_LEVEL"
+MAX_DECOMPRESSED_ENV = "AGENTKIT_MAX_DECOMPRESSED_SIZE"        # Largest request body accepted after decoding
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_GZIP_LEVEL = 1
+DEFAULT_ZSTD_LEVEL = 3
+DEFAULT_MAX_DECOMPRESSED_SIZE = 64 * 2**20
+
+GZIP = "gzip"
+ZSTD = "zstd"
+IDENTITY = "identity"
+
+# zstd needs the optional 'zstandard' package; without it only gzip is offered
+_zstd = importlib.import_module("zstandard") if importlib.util.find_spec("zstandard") is not None else None
+_CODEC_ERRORS: Tuple[type, ...] = (zlib.error,) + ((_zstd.ZstdError,) if _zstd is not None else ())
+
+# Compressed input is decoded this many bytes at a time, so the size limit is
+# checked before a small, highly compressed chunk can expand without bound
+_DECODE_SLICE = 1024
+
+
+class UnsupportedEncoding(ValueError):
+    """Raised for a Content-Encoding this service cannot decode."""
+
+
+class DecompressionError(ValueError):
+    """Raised when a compressed body is corrupt or truncated."""
+
+
+class DecompressedTooLarge(DecompressionError):
+    """Raised when a compressed body decodes to more than the allowed size."""
+
+
+class Encoder:
+    """Incremental compressor for a streamed body."""
+
+    def __init__(self, codecs: "Compression", encoding: str):
+        self._codecs = codecs
+        if encoding == GZIP:
+            self._obj = zlib.compressobj(codecs.gzip_level, zlib.DEFLATED, 31)
+            self._flush_mode, self._finish_mode = zlib.Z_SYNC_FLUSH, zlib.Z_FINISH
+        else:
+            self._obj = _zstd.ZstdCompressor(level=codecs.zstd_level).compressobj()
+            self._flush_mode, self._finish_mode = _zstd.COMPRESSOBJ_FLUSH_BLOCK, _zstd.COMPRESSOBJ_FLUSH_FINISH
+        self._size_in = 0
+        self._size_out = 0
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        """Compresses the next chunk; with `flush`, everything so far is emitted so the receiver can decode it now."""
+        out = self._obj.compress(data)
+        if flush:
+            out += self._obj.flush(self._flush_mode)
+        self._size_in += len(data)
+        self._size_out += len(out)
+        return out
+
+    def finish(self) -> bytes:
+        out = self._obj.flush(self._finish_mode)
+        self._codecs._count_encoded(self._size_in, self._size_out + len(out))
+        return out
+
+
+class Decoder:
+    """
+    Incremental decompressor for a streamed request body.
+
+    Raises DecompressedTooLarge as soon as the decoded size passes
+    `max_size`, so a small compressed upload cannot expand into an
+    unbounded amount of memory.
+    """
+
+    def __init__(self, codecs: "Compression", encoding: str):
+        self._codecs = codecs
+        self._obj = zlib.decompressobj(31) if encoding == GZIP else _zstd.ZstdDecompressor().decompressobj()
+        self.max_size = codecs.max_decompressed_size
+        self._size_in = 0
+        self._size_out = 0
+
+    def feed(self, data: bytes) -> bytes:
+        """
+        Decodes the next chunk of the body.
+
+        Raises:
+            DecompressionError: If the data is not valid for the encoding.
+            DecompressedTooLarge: If the body decodes to more than `max_size` bytes.
+        """
+        out = []
+        for start in range(0, len(data), _DECODE_SLICE):
+            try:
+                chunk = self._obj.decompress(data[start:start + _DECODE_SLICE])
+            except _CODEC_ERRORS as e:
+                raise DecompressionError(f"Request body could not be decompressed: {e}") from e
+            self._size_out += len(chunk)
+            if self._size_out > self.max_size:
+                raise DecompressedTooLarge(f"Request body decompresses to more than {self.max_size} bytes.")
+            out.append(chunk)
+        self._size_in += len(data)
+        return b"".join(out)
+
+    def finish(self) -> None:
+        """
+        Checks that the body is exactly one complete compressed stream.
+
+        Raises:
+            DecompressionError: If the body was truncated, or has data after
+                                the end of the stream (padding or a second,
+                                concatenated stream), which would be dropped.
+        """
+        if not getattr(self._obj, "eof", True):
+            raise DecompressionError("Request body ended in the middle of the compressed stream.")
+        if getattr(self._obj, "unused_data", b""):
+            raise DecompressionError("Request body has data after the end of the compressed stream.")
+        self._codecs._count_decoded(self._size_in, self._size_out)
+
+
+class Compression:
+    """
+    Content codings for request, response and dispatch bodies.
+
+    gzip is always available; zstd is offered when the optional `zstandard`
+    package is installed, and preferred when a peer accepts both. Bodies
+    under `min_size` bytes are not compressed, since on small JSON the CPU
+    spent outweighs the few bytes saved. gzip defaults to level 1: on message
+    JSON it removes about 80% of the bytes at a quarter of the CPU time of
+    level 6, which matters because bodies are compressed on the event loop
+    (see benchmarks/bench_compression.py).
+    """
+
+    def __init__(
+        self,
+        min_size: int = DEFAULT_MIN_SIZE,
+        gzip_level: int = DEFAULT_GZIP_LEVEL,
+        zstd_level: int = DEFAULT_ZSTD_LEVEL,
+        max_decompressed_size: int = DEFAULT_MAX_DECOMPRESSED_SIZE,
+    ):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+        self.max_decompressed_size = max_decompressed_size
+        self.supported: Tuple[str, ...] = (ZSTD, GZIP) if _zstd is not None else (GZIP,)   # In order of preference
+        self.encoded = self.encoded_in = self.encoded_out = 0
+        self.decoded = self.decoded_in = self.decoded_out = 0
+
+    @classmethod
+    def from_env(cls) -> "Compression":
+        return cls(
+            min_size=int(os.getenv(MIN_SIZE_ENV, DEFAULT_MIN_SIZE)),
+            gzip_level=int(os.getenv(GZIP_LEVEL_ENV, DEFAULT_GZIP_LEVEL)),
+            zstd_level=int(os.getenv(ZSTD_LEVEL_ENV, DEFAULT_ZSTD_LEVEL)),
+            max_decompressed_size=int(os.getenv(MAX_DECOMPRESSED_ENV, DEFAULT_MAX_DECOMPRESSED_SIZE)),
+        )
+
+    def negotiate(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """
+        The coding to use for a response, given the request's Accept-Encoding header.
+
+        Returns the supported coding with the highest q-value (ties go to
+        the server's preference), or None to send the body as is.
+        """
+        if not accept_encoding:
+            return None
+        weights: Dict[str, float] = {}
+        for part in accept_encoding.split(","):
+            coding, _, params = part.strip().partition(";")
+            coding = coding.strip().lower()
+            q = 1.0
+            for param in params.split(";"):
+                name, _, value = param.strip().partition("=")
+                if name.strip().lower() == "q":
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            if coding:
+                weights[coding] = q
+        best, best_q = None, 0.0
+        for coding in self.supported:
+            q = weights.get(coding, weights.get("*", 0.0))
+            if q > best_q:
+                best, best_q = coding, q
+        return best
+
+    def choose(self, accepted: Optional[Iterable[str]]) -> Optional[str]:
+        """The first of a peer's accepted codings (most preferred first) that is supported, or None."""
+        for coding in accepted or ():
+            if coding.lower() in self.supported:
+                return coding.lower()
+        return None
+
+    def check(self, content_encoding: str) -> Optional[str]:
+        """
+        Normalizes a request's Content-Encoding header.
+
+        Returns:
+            The coding to decode, or None for an unencoded body.
+
+        Raises:
+            UnsupportedEncoding: If the coding is unknown, unavailable, or stacked.
+        """
+        coding = content_encoding.strip().lower()
+        if coding in ("", IDENTITY):
+            return None
+        if coding not in self.supported:
+            raise UnsupportedEncoding(f"Content-Encoding '{content_encoding}' is not supported; use one of: {', '.join(self.supported)}.")
+        return coding
+
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        if encoding == GZIP:
+            out = zlib.compress(data, self.gzip_level, wbits=31)
+        else:
+            out = _zstd.ZstdCompressor(level=self.zstd_level).compress(data)
+        self._count_encoded(len(data), len(out))
+        return out
+
+    def decompress(self, data: bytes, encoding: str) -> bytes:
+        """
+        Raises:
+            DecompressionError: If the data is corrupt, truncated or too large.
+        """
+        decoder = self.decoder(encoding)
+        out = decoder.feed(data)
+        decoder.finish()
+        return out
+
+    def encoder(self, encoding: str) -> Encoder:
+        return Encoder(self, encoding)
+
+    def decoder(self, encoding: str) -> Decoder:
+        return Decoder(self, encoding)
+
+    def _count_encoded(self, size_in: int, size_out: int) -> None:
+        self.encoded += 1
+        self.encoded_in += size_in
+        self.encoded_out += size_out
+
+    def _count_decoded(self, size_in: int, size_out: int) -> None:
+        self.decoded += 1
+        self.decoded_in += size_in
+        self.decoded_out += size_out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "supported": list(self.supported),
+            "minSize": self.min_size,
+            "encoded": {"bodies": self.encoded, "bytesIn": self.encoded_in, "bytesOut": self.encoded_out},
+            "decoded": {"bodies": self.decoded, "bytesIn": self.decoded_in, "bytesOut": self.decoded_out},
+        }
+
+
+# Singleton instance
+compression = Compression.from_env()
@@ -0,0 +1,190 @@
+import asyncio
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import httpcore
+
+logger = logging.getLogger(__name__)
+
+# DNS cache configuration (see DnsCache.from_env)
+DNS_TTL_ENV = "AGENTKIT_DNS_TTL"                     # Seconds a successful lookup is reused; 0 disables the cache
+DNS_NEGATIVE_TTL_ENV = "AGENTKIT_DNS_NEGATIVE_TTL"   # Seconds a failed lookup is remembered
+DNS_MAX_ENTRIES_ENV = "AGENTKIT_DNS_MAX_ENTRIES"
+
+DEFAULT_DNS_TTL = 60.0
+DEFAULT_DNS_NEGATIVE_TTL = 5.0
+DEFAULT_DNS_MAX_ENTRIES = 10_000
+
+Resolver = Callable[[str, int], Any]   # async (host, port) -> list of IP address strings
+
+
+class DnsCache:
+    """
+    Asynchronous DNS cache with a TTL and negative caching.
+
+    The operating system resolver is not cached for the process, so every
+    new connection to an agent repeats the lookup. This cache keeps each
+    host's addresses for `ttl` seconds and a failed lookup for
+    `negative_ttl` seconds, so a host that does not resolve is not asked
+    for again on every retry. Concurrent lookups of the same host share one
+    resolver call. IP literals are returned without a lookup.
+
+    At most `max_entries` hosts are kept; the least recently used are dropped.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_DNS_TTL,
+        negative_ttl: float = DEFAULT_DNS_NEGATIVE_TTL,
+        max_entries: int = DEFAULT_DNS_MAX_ENTRIES,
+        resolver: Optional[Resolver] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._resolver = resolver or _getaddrinfo
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[float, Any]]" = OrderedDict()   # -> (expires_at, addresses or error)
+        self._lookups: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "DnsCache":
+        return cls(
+            ttl=float(os.getenv(DNS_TTL_ENV, DEFAULT_DNS_TTL)),
+            negative_ttl=float(os.getenv(DNS_NEGATIVE_TTL_ENV, DEFAULT_DNS_NEGATIVE_TTL)),
+            max_entries=int(os.getenv(DNS_MAX_ENTRIES_ENV, DEFAULT_DNS_MAX_ENTRIES)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    async def resolve(self, host: str, port: int) -> List[str]:
+        """
+        Returns the IP addresses of `host`, from the cache when fresh.
+
+        Raises:
+            OSError: If the lookup failed (now, or within the negative TTL).
+        """
+        if _is_ip(host):
+            return [host]
+        key = (host, port)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                result = entry[1]
+                if isinstance(result, OSError):
+                    raise type(result)(*result.args) # A fresh exception, so tracebacks don't pile up on the cached one
+                return result
+            self.misses += 1
+        lookup = self._lookups.get(key)
+        if lookup is None:
+            lookup = self._lookups[key] = asyncio.ensure_future(self._lookup(key))
+        return await asyncio.shield(lookup)
+
+    async def _lookup(self, key: Tuple[str, int]) -> List[str]:
+        try:
+            addresses = list(await self._resolver(*key))
+            if not addresses:
+                raise socket.gaierror(socket.EAI_NONAME, f"No addresses found for {key[0]}")
+        except OSError as e:
+            self._store(key, e, self.negative_ttl)
+            raise
+        finally:
+            self._lookups.pop(key, None)
+        self._store(key, addresses, self.ttl)
+        return addresses
+
+    def _store(self, key: Tuple[str, int], result: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, host: str, port: int) -> None:
+        """Forgets a host, e.g. after none of its cached addresses accepted a connection."""
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+class CachingNetworkBackend(httpcore.AsyncNetworkBackend):
+    """
+    httpcore network backend that resolves hosts through a DnsCache.
+
+    Connections are opened to the cached IP addresses, tried in order. The
+    connect timeout is one deadline for the whole attempt (lookup included),
+    so a host with several unreachable addresses does not wait the timeout
+    once per address. TLS still verifies the certificate against the
+    original host name, which httpcore passes separately when it starts TLS.
+    """
+
+    def __init__(self, dns_cache: DnsCache, backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        self.dns_cache = dns_cache
+        self._backend = backend or httpcore.AnyIOBackend()
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options: Optional[Iterable[Any]] = None,
+    ) -> httpcore.AsyncNetworkStream:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            addresses = await self.dns_cache.resolve(host, port)
+        except OSError as e:
+            raise httpcore.ConnectError(f"Could not resolve {host}: {e}") from e
+        error: Optional[Exception] = None
+        for tried, address in enumerate(addresses):
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                raise httpcore.ConnectTimeout(f"Timed out connecting to {host} after trying {tried} of its {len(addresses)} addresses")
+            try:
+                return await self._backend.connect_tcp(address, port, timeout=remaining, local_address=local_address, socket_options=socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        self.dns_cache.invalidate(host, port) # The host may have moved; look it up again next time
+        raise error
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None, socket_options: Optional[Iterable[Any]] = None) -> httpcore.AsyncNetworkStream:
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+async def _getaddrinfo(host: str, port: int) -> List[str]:
+    infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return list(dict.fromkeys(info[4][0] for info in infos)) # Keep the resolver's order, without duplicates
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,233 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import weakref
+from typing import Any, AsyncIterator, Dict, Optional, Tuple, Type, Union
+import httpcore
+import httpx
+from agentkit.core.dns_cache import CachingNetworkBackend, DnsCache
+
+logger = logging.getLogger(__name__)
+
+# Outbound HTTP pool configuration (see HttpClientPool.from_env)
+MAX_CONNECTIONS_ENV = "AGENTKIT_HTTP_MAX_CONNECTIONS"
+MAX_KEEPALIVE_ENV = "AGENTKIT_HTTP_MAX_KEEPALIVE"
+KEEPALIVE_EXPIRY_ENV = "AGENTKIT_HTTP_KEEPALIVE_EXPIRY"
+MAX_PER_HOST_ENV = "AGENTKIT_HTTP_MAX_PER_HOST"
+HTTP2_ENV = "AGENTKIT_HTTP2"
+
+DEFAULT_MAX_CONNECTIONS = 200
+DEFAULT_MAX_KEEPALIVE = 100
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_MAX_PER_HOST = 50
+
+# httpcore errors and the httpx errors they surface as, most specific first
+_HTTPCORE_ERRORS: Tuple[Tuple[Type[Exception], Type[Exception]], ...] = (
+    (httpcore.PoolTimeout, httpx.PoolTimeout),
+    (httpcore.ConnectTimeout, httpx.ConnectTimeout),
+    (httpcore.ReadTimeout, httpx.ReadTimeout),
+    (httpcore.WriteTimeout, httpx.WriteTimeout),
+    (httpcore.TimeoutException, httpx.TimeoutException),
+    (httpcore.ConnectError, httpx.ConnectError),
+    (httpcore.ReadError, httpx.ReadError),
+    (httpcore.WriteError, httpx.WriteError),
+    (httpcore.NetworkError, httpx.NetworkError),
+    (httpcore.ProxyError, httpx.ProxyError),
+    (httpcore.UnsupportedProtocol, httpx.UnsupportedProtocol),
+    (httpcore.LocalProtocolError, httpx.LocalProtocolError),
+    (httpcore.RemoteProtocolError, httpx.RemoteProtocolError),
+    (httpcore.ProtocolError, httpx.ProtocolError),
+)
+_CORE_ERROR_TYPES = tuple(core_type for core_type, _ in _HTTPCORE_ERRORS)
+
+
+def _httpx_error(error: Exception, request: httpx.Request) -> Exception:
+    for core_type, httpx_type in _HTTPCORE_ERRORS:
+        if isinstance(error, core_type):
+            return httpx_type(str(error), request=request)
+    return error # Not reached: callers only pass _CORE_ERROR_TYPES
+
+
+class _ResponseStream(httpx.AsyncByteStream):
+    def __init__(self, stream: Any, request: httpx.Request):
+        self._stream = stream
+        self._request = request
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        except _CORE_ERROR_TYPES as e:
+            raise _httpx_error(e, self._request) from e
+
+    async def aclose(self) -> None:
+        await self._stream.aclose()
+
+
+class ConnectionPoolTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport over an httpcore connection pool built by the caller.
+
+    httpx.AsyncHTTPTransport creates its pool itself and takes no network
+    backend, so HttpClientPool builds the pool (with the DNS-caching
+    backend) and sends requests through it with this transport.
+    """
+
+    def __init__(self, pool: httpcore.AsyncConnectionPool):
+        self.pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(scheme=request.url.raw_scheme, host=request.url.raw_host, port=request.url.port, target=request.url.raw_path),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        try:
+            core_response = await self.pool.handle_async_request(core_request)
+        except _CORE_ERROR_TYPES as e:
+            raise _httpx_error(e, request) from e
+        return httpx.Response(
+            status_code=core_response.status,
+            headers=core_response.headers,
+            stream=_ResponseStream(core_response.stream, request),
+            extensions=core_response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self.pool.aclose()
+
+
+class HttpClientPool:
+    """
+    Shared outbound HTTP client for agent dispatch, external tools and webhooks.
+
+    Creating an httpx.AsyncClient per request throws away its connection pool,
+    so every call pays a new TCP (and TLS) handshake. This pool keeps one
+    long-lived client whose connections are reused across requests.
+
+    httpx clients are bound to the event loop they first run on, so one
+    client is kept per running loop (in production that is a single client
+    per worker process). The FastAPI lifespan closes them on shutdown.
+
+    httpx only limits connections globally; `max_per_host` additionally
+    caps concurrent requests to any one host, so a single slow agent cannot
+    occupy the whole pool. A host's limit is kept only while it has
+    requests in flight, so hosts that are no longer called (such as
+    deregistered agents) leave nothing behind.
+
+    Host names are resolved through `dns_cache` (when enabled), so opening
+    a new connection to a known agent does not wait on the system resolver.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive: int = DEFAULT_MAX_KEEPALIVE,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+        max_per_host: int = DEFAULT_MAX_PER_HOST,
+        http2: bool = False,
+        dns_cache: Optional[DnsCache] = None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.max_per_host = max_per_host
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed (pip install 'httpx[http2]'). Using HTTP/1.1.")
+            http2 = False
+        self.http2 = http2
+        self.dns_cache = dns_cache or DnsCache(ttl=0)
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self._host_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, _HostLimit]]" = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_env(cls) -> "HttpClientPool":
+        return cls(
+            max_connections=int(os.getenv(MAX_CONNECTIONS_ENV, DEFAULT_MAX_CONNECTIONS)),
+            max_keepalive=int(os.getenv(MAX_KEEPALIVE_ENV, DEFAULT_MAX_KEEPALIVE)),
+            keepalive_expiry=float(os.getenv(KEEPALIVE_EXPIRY_ENV, DEFAULT_KEEPALIVE_EXPIRY)),
+            max_per_host=int(os.getenv(MAX_PER_HOST_ENV, DEFAULT_MAX_PER_HOST)),
+            http2=os.getenv(HTTP2_ENV, "0").lower() in ("1", "true", "yes"),
+            dns_cache=DnsCache.from_env(),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared client for the running event loop (created on first use)."""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(transport=self._transport())
+            self._clients[loop] = client
+        return client
+
+    def _transport(self) -> httpx.AsyncBaseTransport:
+        if not self.dns_cache.enabled:
+            return httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+        # httpx has no hook for name resolution, so build the httpcore pool with the caching backend
+        return ConnectionPoolTransport(httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=self.limits.max_connections,
+            max_keepalive_connections=self.limits.max_keepalive_connections,
+            keepalive_expiry=self.limits.keepalive_expiry,
+            http2=self.http2,
+            network_backend=CachingNetworkBackend(self.dns_cache),
+        ))
+
+    async def request(self, method: str, url: Union[str, httpx.URL], pool_key: Optional[str] = None, **kwargs: Any) -> httpx.Response:
+        """
+        Sends a request through the shared client, honouring the per-host limit.
+
+        Args:
+            pool_key: The `pool_key` of `url`, if the caller has it precomputed (saves parsing the URL).
+        """
+        client = self.client
+        if self.max_per_host <= 0:
+            return await client.request(method, url, **kwargs)
+        key = pool_key or host_pool_key(httpx.URL(url))
+        limits = self._host_limits.setdefault(asyncio.get_running_loop(), {})
+        limit = limits.get(key)
+        if limit is None:
+            limit = limits[key] = _HostLimit(self.max_per_host)
+        limit.users += 1
+        try:
+            async with limit.semaphore:
+                return await client.request(method, url, **kwargs)
+        finally:
+            limit.users -= 1
+            if limit.users == 0:
+                del limits[key] # Idle: nobody holds or waits on the semaphore
+
+    async def post(self, url: Union[str, httpx.URL], **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self) -> None:
+        """Closes the client of the running loop (call from the app lifespan on shutdown)."""
+        loop = asyncio.get_running_loop()
+        client = self._clients.pop(loop, None)
+        self._host_limits.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+
+class _HostLimit:
+    """A host's request semaphore and the number of requests holding or waiting on it."""
+
+    def __init__(self, max_per_host: int):
+        self.semaphore = asyncio.Semaphore(max_per_host)
+        self.users = 0
+
+
+def host_pool_key(url: httpx.URL) -> str:
+    """Key of the per-host limit `url` counts against."""
+    port = url.port or (443 if url.scheme == "https" else 80)
+    return f"{url.scheme}://{url.host}:{port}"
+
+
+# Singleton instance
+http_pool = HttpClientPool.from_env()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, HttpUrl
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Literal, Optional, Union
 from datetime import datetime, timezone # Import timezone
 import uuid
 
@@ -14,10 +14,21 @@ class ApiResponse(BaseModel):
 
 # --- Agent Registration Models ---
 
+MAX_LEASE_TTL = 7 * 24 * 3600 # Longest lease an agent may request, in seconds
+MAX_BATCH_SIZE = 1000 # Most messages coalesced into one batch delivery
+MAX_BATCH_LINGER_MS = 10_000 # Longest an agent may ask a batch to wait for more messages
+
+class BatchDeliveryConfig(BaseModel):
+    """Opt-in coalescing of an agent's messages into one POST carrying a JSON array of MessagePayloads."""
+    maxBatchSize: int = Field(20, ge=1, le=MAX_BATCH_SIZE, description="Most messages delivered in one request")
+    lingerMs: float = Field(10.0, ge=0, le=MAX_BATCH_LINGER_MS, description="How long the first queued message waits for others before the batch is sent, in milliseconds")
+
 class AgentMetadata(BaseModel):
     """Custom metadata for an agent."""
     description: Optional[str] = Field(None, description="Optional description of the agent")
     config: Optional[Dict[str, Any]] = Field(None, description="Optional agent-specific configuration")
+    batchDelivery: Optional[BatchDeliveryConfig] = Field(None, description="Opt in to receiving messages in batches (the contact endpoint then receives a JSON array of messages)")
+    acceptEncoding: Optional[List[str]] = Field(None, max_length=8, description="Content codings the contact endpoint can decode (gzip, zstd), most preferred first; larger messages are then sent compressed")
     # Add other relevant metadata fields as needed
 
 class AgentRegistrationPayload(BaseModel):
@@ -27,6 +38,16 @@ class AgentRegistrationPayload(BaseModel):
     version: str = Field(..., description="Version string for the agent")
     contactEndpoint: HttpUrl = Field(..., description="URL endpoint where the agent can be reached")
     metadata: Optional[AgentMetadata] = Field(None, description="Optional structured metadata about the agent")
+    leaseTtl: Optional[float] = Field(None, gt=0, le=MAX_LEASE_TTL, description="Optional lease in seconds; the agent is evicted unless it heartbeats within this time")
+
+class AgentBatchRegistrationPayload(BaseModel):
+    """Payload for registering several agents in one request."""
+    agents: List[AgentRegistrationPayload] = Field(..., min_length=1, description="Agents to register, processed in order")
+
+class AgentHeartbeatPayload(BaseModel):
+    """Payload for renewing the leases of one or more agents."""
+    agentIds: List[str] = Field(..., min_length=1, description="Agents whose leases to renew")
+    leaseTtl: Optional[float] = Field(None, gt=0, le=MAX_LEASE_TTL, description="New lease in seconds (defaults to each agent's current lease length)")
 
 class AgentInfo(BaseModel):
     """Information stored about a registered agent."""
@@ -58,6 +79,20 @@ class MessagePayload(BaseModel):
     task_name: Optional[str] = Field(None, description="Specific task name provided by the caller (e.g., Ops-Core)")
     opscore_session_id: Optional[str] = Field(None, description="Correlation ID for the Ops-Core session, if provided")
     opscore_task_id: Optional[str] = Field(None, description="Correlation ID for the specific Ops-Core task, if provided")
+    priority: Literal["high", "normal", "low"] = Field("normal", description="Dispatch priority class; higher classes are delivered first, and senders share each class fairly")
+    idempotencyKey: Optional[str] = Field(None, max_length=255, description="Client-chosen key; a retried /run with the same key (per sender) returns the first response instead of dispatching again. The Idempotency-Key header takes precedence")
+    # --- Request/Reply ---
+    replyTo: Optional[str] = Field(None, description="Set by AgentKit when the sender waits for a reply: the task ID the agent answers at POST /v1/tasks/{replyTo}/reply. Messages sent with it set are rejected with 422")
+
+class BulkMessageRecord(BaseModel):
+    """One record of a bulk submission to POST /v1/agents/run:batch."""
+    agentId: str = Field(..., description="The unique ID of the target agent")
+    message: MessagePayload = Field(..., description="The message to queue for the agent")
+
+class DeadLetterReplayPayload(BaseModel):
+    """Selects dead letters to redeliver. Without `ids`, every dead letter (for `agentId`, if given) is replayed."""
+    ids: Optional[List[str]] = Field(None, min_length=1, description="Dead-letter IDs to replay")
+    agentId: Optional[str] = Field(None, description="Only replay dead letters addressed to this agent")
 
 # --- Tool Integration Models ---
 
@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+from pydantic_core import to_json
+from agentkit.core.models import MessagePayload
+
+logger = logging.getLogger(__name__)
+
+# Claim-check configuration (see ClaimCheck.from_env)
+CLAIM_CHECK_THRESHOLD_ENV = "AGENTKIT_CLAIM_CHECK_THRESHOLD"   # Payload bytes above which the payload is offloaded; 0 disables
+BLOB_DIR_ENV = "AGENTKIT_BLOB_DIR"
+BLOB_TTL_ENV = "AGENTKIT_BLOB_TTL"                             # Seconds an unused blob is kept
+
+DEFAULT_THRESHOLD = 0
+DEFAULT_BLOB_DIR = os.path.join(tempfile.gettempdir(), "agentkit-blobs")
+DEFAULT_BLOB_TTL = 7 * 24 * 3600.0
+
+CLAIM_CHECK_KEY = "claimCheck"   # The only key of an offloaded message's payload
+BLOB_ID_PATTERN = r"^[0-9a-f]{64}$"
+_BLOB_ID = re.compile(BLOB_ID_PATTERN)
+
+
+class BlobStore:
+    """
+    Content-addressed blob files in a local directory.
+
+    A blob is named by the SHA-256 of its content, so storing the same
+    payload twice keeps one file. Files are written to a temporary name and
+    renamed into place, so a reader never sees a partial blob. Blobs not
+    stored again for `ttl` seconds are deleted by `sweep`, which `put` runs
+    every so often.
+    """
+
+    def __init__(self, directory: str, ttl: float = DEFAULT_BLOB_TTL, clock: Callable[[], float] = time.time):
+        self.directory = directory
+        self.ttl = ttl
+        self._clock = clock
+        self._sweep_every = max(60.0, ttl / 10)
+        self._next_sweep = clock() + self._sweep_every
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+        self.swept = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, data: bytes) -> str:
+        """Stores `data` and returns its blob ID."""
+        blob_id = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.directory, blob_id)
+        if os.path.exists(path):
+            os.utime(path) # Referenced again; keep it past the sweep
+            self.deduplicated += 1
+        else:
+            temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(data)
+            os.replace(temporary, path)
+            self.stored += 1
+        if self._clock() >= self._next_sweep:
+            self.sweep()
+        return blob_id
+
+    def path(self, blob_id: str) -> Optional[str]:
+        """Path of a stored blob, or None if the ID is malformed or unknown."""
+        if not _BLOB_ID.match(blob_id):
+            return None
+        path = os.path.join(self.directory, blob_id)
+        return path if os.path.isfile(path) else None
+
+    def sweep(self) -> int:
+        """Deletes blobs (and abandoned temporary files) older than the TTL. Returns how many were deleted."""
+        with self._lock:
+            now = self._clock()
+            self._next_sweep = now + self._sweep_every
+            deleted = 0
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file() and entry.stat().st_mtime < now - self.ttl:
+                            os.unlink(entry.path)
+                            deleted += 1
+                    except FileNotFoundError:
+                        pass
+            self.swept += deleted
+        if deleted:
+            logger.info(f"Deleted {deleted} expired blobs from {self.directory}.")
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        return {"stored": self.stored, "deduplicated": self.deduplicated, "swept": self.swept}
+
+
+class ClaimCheck:
+    """
+    Offloads large message payloads to a BlobStore.
+
+    A message whose payload serializes to more than `threshold` bytes is
+    queued with a small reference instead:
+
+        {"claimCheck": {"blobId": ..., "size": ..., "contentType": "application/json", "href": "/v1/blobs/<blobId>"}}
+
+    and the agent downloads the payload from `href`. The queued job, its
+    retries, dead letter and every dispatch then carry the reference rather
+    than the document.
+    """
+
+    def __init__(self, store: Optional[BlobStore], threshold: int = DEFAULT_THRESHOLD):
+        self.store = store
+        self.threshold = threshold
+        self.offloaded = 0
+
+    @classmethod
+    def from_env(cls) -> "ClaimCheck":
+        threshold = int(os.getenv(CLAIM_CHECK_THRESHOLD_ENV, DEFAULT_THRESHOLD))
+        if threshold <= 0:
+            return cls(None, 0)
+        store = BlobStore(os.getenv(BLOB_DIR_ENV, DEFAULT_BLOB_DIR), ttl=float(os.getenv(BLOB_TTL_ENV, DEFAULT_BLOB_TTL)))
+        return cls(store, threshold)
+
+    @property
+    def enabled(self) -> bool:
+        return self.store is not None and self.threshold > 0
+
+    async def offload(self, payload: MessagePayload) -> MessagePayload:
+        """
+        Returns the message with its payload replaced by a claim check if the payload is above the threshold.
+
+        The blob is written on a worker thread, so the event loop keeps serving requests meanwhile.
+        """
+        if not self.enabled:
+            return payload
+        data = to_json(payload.payload)
+        if len(data) <= self.threshold:
+            return payload
+        blob_id = await asyncio.to_thread(self.store.put, data)
+        self.offloaded += 1
+        reference = {"blobId": blob_id, "size": len(data), "contentType": "application/json", "href": f"/v1/blobs/{blob_id}"}
+        return payload.model_copy(update={"payload": {CLAIM_CHECK_KEY: reference}})
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"enabled": False}
+        return {"enabled": True, "threshold": self.threshold, "offloaded": self.offloaded, **self.store.stats()}
+
+
+# Singleton instance
+claim_checks = ClaimCheck.from_env()
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from agentkit.core.models import AgentInfo
+from agentkit.messaging.circuit_breaker import CircuitBreakerRegistry, is_breaker_failure
+from agentkit.messaging.retry import DeliveryError
+
+logger = logging.getLogger(__name__)
+
+# Broadcast configuration
+CONCURRENCY_ENV = "AGENTKIT_BROADCAST_CONCURRENCY"   # Deliveries of one broadcast in flight at once
+
+DEFAULT_CONCURRENCY = 100
+MAX_REPORTED_FAILURES = 1000  # Failed/skipped recipients listed in a report (all are counted)
+
+SendFn = Callable[[AgentInfo], Awaitable[Any]]
+
+
+class BroadcastReport:
+    """Aggregated outcome of one broadcast."""
+
+    def __init__(self, max_reported: int = MAX_REPORTED_FAILURES):
+        self.recipients = 0
+        self.delivered = 0
+        self.failed = 0
+        self.skipped = 0                          # Agents whose circuit breaker is open
+        self.failures: List[Dict[str, Any]] = []  # The first `max_reported` failed or skipped agents
+        self.max_reported = max_reported
+        self.duration = 0.0
+
+    def _report(self, agent_id: str, error: str, status_code: Optional[int] = None) -> None:
+        if len(self.failures) < self.max_reported:
+            self.failures.append({"agentId": agent_id, "error": error, "statusCode": status_code})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "recipients": self.recipients,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "failuresTruncated": self.failed + self.skipped > len(self.failures),
+            "durationMs": round(self.duration * 1000, 3),
+        }
+
+
+async def broadcast(
+    targets: Iterable[AgentInfo],
+    send: SendFn,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    breakers: Optional[CircuitBreakerRegistry] = None,
+    clock: Callable[[], float] = time.monotonic,
+) -> BroadcastReport:
+    """
+    Sends one message to every agent in `targets` and reports the outcome.
+
+    A fixed set of `concurrency` workers pulls recipients from `targets` as
+    they go, so a lazily paged iterable is never materialized and at most
+    `concurrency` requests are in flight. `send` is expected to post a body
+    that was serialized once for all recipients.
+
+    Each recipient gets a single attempt: broadcasts are not retried or
+    dead-lettered. Agents whose circuit breaker in `breakers` is open are
+    skipped, and every delivery feeds the agent's breaker.
+
+    Raises:
+        ValueError: If concurrency is less than one.
+    """
+    if concurrency < 1:
+        raise ValueError("Broadcast needs a concurrency of at least one.")
+    report = BroadcastReport()
+    recipients = iter(targets)
+    started = clock()
+
+    async def work() -> None:
+        # next() runs to completion between awaits, so the workers can share the iterator
+        for agent in recipients:
+            report.recipients += 1
+            breaker = breakers.get(agent.agentId) if breakers is not None else None
+            if breaker is not None and not breaker.allow(breakers.clock()):
+                report.skipped += 1
+                report._report(agent.agentId, f"Circuit breaker for agent '{agent.agentId}' is open.")
+                continue
+            sent = clock()
+            error: Optional[DeliveryError] = None
+            try:
+                await send(agent)
+            except DeliveryError as e:
+                error = e
+            except Exception as e:
+                logger.exception(f"Unexpected error while broadcasting to agent '{agent.agentId}'.")
+                error = DeliveryError(f"Unexpected error: {e}")
+            if breaker is not None:
+                breaker.record(is_breaker_failure(error), clock() - sent, breakers.clock())
+            if error is None:
+                report.delivered += 1
+            else:
+                report.failed += 1
+                report._report(agent.agentId, str(error), error.status_code)
+
+    await asyncio.gather(*(work() for _ in range(concurrency)))
+    report.duration = clock() - started
+    return report
+
+
+def concurrency_from_env() -> int:
+    return int(os.getenv(CONCURRENCY_ENV, DEFAULT_CONCURRENCY))
@@ -0,0 +1,240 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+from agentkit.messaging.retry import DeliveryError, KIND_CONNECT, KIND_DISCONNECT, KIND_STATUS, KIND_TIMEOUT
+
+# Circuit breaker configuration (see CircuitBreakerRegistry.from_env)
+BREAKER_WINDOW_ENV = "AGENTKIT_BREAKER_WINDOW"               # Recent deliveries considered; 0 disables breakers
+BREAKER_MIN_CALLS_ENV = "AGENTKIT_BREAKER_MIN_CALLS"         # Deliveries needed before the breaker may open
+BREAKER_FAILURE_RATE_ENV = "AGENTKIT_BREAKER_FAILURE_RATE"   # Failure share (0-1) that opens the breaker
+BREAKER_SLOW_CALL_ENV = "AGENTKIT_BREAKER_SLOW_CALL"         # Seconds after which a delivery counts as failed
+BREAKER_OPEN_SECONDS_ENV = "AGENTKIT_BREAKER_OPEN_SECONDS"   # How long the breaker stays open before a probe
+BREAKER_OPEN_ACTION_ENV = "AGENTKIT_BREAKER_OPEN_ACTION"     # "park" or "fail"
+
+DEFAULT_WINDOW = 20
+DEFAULT_MIN_CALLS = 10
+DEFAULT_FAILURE_RATE = 0.5
+DEFAULT_SLOW_CALL = 5.0
+DEFAULT_OPEN_SECONDS = 30.0
+MAX_TRACKED = 100_000
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+ACTION_PARK = "park"   # Keep messages queued until the breaker lets a delivery through
+ACTION_FAIL = "fail"   # Reject new messages with 503 and dead-letter queued ones
+
+
+def is_breaker_failure(error: Optional[DeliveryError]) -> bool:
+    """Whether a delivery outcome says the agent is unhealthy (as opposed to rejecting one message)."""
+    if error is None:
+        return False
+    if error.kind in (KIND_CONNECT, KIND_TIMEOUT, KIND_DISCONNECT):
+        return True
+    return error.kind == KIND_STATUS and error.status_code is not None and (error.status_code >= 500 or error.status_code == 429)
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker for one agent endpoint.
+
+    While closed, the outcomes of the last `window` deliveries are kept;
+    once at least `min_calls` are known and the share of failures (errors
+    or deliveries slower than `slow_call`) reaches `failure_rate`, the
+    breaker opens. After `open_seconds` it turns half-open and lets a
+    single probe delivery through: success closes it, failure reopens it.
+    A probe that never reports back is replaced after another
+    `open_seconds`.
+    """
+    __slots__ = ("window", "min_calls", "failure_rate", "slow_call", "open_seconds",
+                 "state", "trips", "_outcomes", "_failures", "_opened_at", "_probe_at")
+
+    def __init__(self, window: int, min_calls: int, failure_rate: float, slow_call: float, open_seconds: float):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.state = STATE_CLOSED
+        self.trips = 0                                     # Times the breaker has opened
+        self._outcomes: Deque[bool] = deque(maxlen=window)  # True = failure
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_at: Optional[float] = None
+
+    def is_open(self, now: float) -> bool:
+        """True while the breaker rejects deliveries outright (open and not yet due for a probe)."""
+        return self.state == STATE_OPEN and now < self._opened_at + self.open_seconds
+
+    def allow(self, now: float) -> bool:
+        """Returns whether a delivery may start now (claiming the probe slot when half-open)."""
+        if self.state == STATE_CLOSED:
+            return True
+        if self.state == STATE_OPEN:
+            if now < self._opened_at + self.open_seconds:
+                return False
+            self.state = STATE_HALF_OPEN
+            self._probe_at = None
+        if self._probe_at is None or now - self._probe_at >= self.open_seconds:
+            self._probe_at = now
+            return True
+        return False
+
+    def retry_in(self, now: float) -> float:
+        """Seconds until a delivery may be allowed again."""
+        if self.state == STATE_OPEN:
+            return max(0.0, self._opened_at + self.open_seconds - now)
+        if self.state == STATE_HALF_OPEN and self._probe_at is not None:
+            return max(0.0, self._probe_at + self.open_seconds - now)
+        return 0.0
+
+    def record(self, failed: bool, latency: float, now: float) -> None:
+        """Records the outcome of a delivery that `allow` let through."""
+        failed = failed or (self.slow_call > 0 and latency >= self.slow_call)
+        if self.state == STATE_HALF_OPEN:
+            if failed:
+                self._open(now)
+            else:
+                self.state = STATE_CLOSED
+                self._probe_at = None
+                self._outcomes.clear()
+                self._failures = 0
+            return
+        if self.state == STATE_OPEN:
+            return # A delivery that started before the breaker opened
+        if len(self._outcomes) == self._outcomes.maxlen:
+            self._failures -= self._outcomes[0]
+        self._outcomes.append(failed)
+        self._failures += failed
+        calls = len(self._outcomes)
+        if calls >= self.min_calls and self._failures >= self.failure_rate * calls:
+            self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = STATE_OPEN
+        self.trips += 1
+        self._opened_at = now
+        self._probe_at = None
+        self._outcomes.clear()
+        self._failures = 0
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        calls = len(self._outcomes)
+        return {
+            "state": self.state,
+            "failureRate": round(self._failures / calls, 3) if calls else 0.0,
+            "recentCalls": calls,
+            "trips": self.trips,
+            "retryInSeconds": round(self.retry_in(now), 3),
+        }
+
+
+class CircuitBreakerRegistry:
+    """
+    Per-agent circuit breakers, created on an agent's first delivery.
+
+    When more than `max_tracked` breakers exist, closed ones are dropped
+    (they carry no state worth keeping beyond recent outcomes).
+    """
+
+    def __init__(
+        self,
+        window: int = DEFAULT_WINDOW,
+        min_calls: int = DEFAULT_MIN_CALLS,
+        failure_rate: float = DEFAULT_FAILURE_RATE,
+        slow_call: float = DEFAULT_SLOW_CALL,
+        open_seconds: float = DEFAULT_OPEN_SECONDS,
+        open_action: str = ACTION_PARK,
+        max_tracked: int = MAX_TRACKED,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if open_action not in (ACTION_PARK, ACTION_FAIL):
+            raise ValueError(f"Unknown circuit breaker open action '{open_action}' (expected '{ACTION_PARK}' or '{ACTION_FAIL}').")
+        self.window = window
+        self.min_calls = min(max(min_calls, 1), window) if window > 0 else 0
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.open_action = open_action
+        self.max_tracked = max_tracked
+        self.clock = clock
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreakerRegistry":
+        return cls(
+            window=int(os.getenv(BREAKER_WINDOW_ENV, DEFAULT_WINDOW)),
+            min_calls=int(os.getenv(BREAKER_MIN_CALLS_ENV, DEFAULT_MIN_CALLS)),
+            failure_rate=float(os.getenv(BREAKER_FAILURE_RATE_ENV, DEFAULT_FAILURE_RATE)),
+            slow_call=float(os.getenv(BREAKER_SLOW_CALL_ENV, DEFAULT_SLOW_CALL)),
+            open_seconds=float(os.getenv(BREAKER_OPEN_SECONDS_ENV, DEFAULT_OPEN_SECONDS)),
+            open_action=os.getenv(BREAKER_OPEN_ACTION_ENV, ACTION_PARK).lower(),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def get(self, agent_id: str) -> Optional[CircuitBreaker]:
+        """Returns the agent's breaker (creating it), or None if breakers are disabled."""
+        if not self.enabled:
+            return None
+        breaker = self._breakers.get(agent_id)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(agent_id)
+                if breaker is None:
+                    if len(self._breakers) >= self.max_tracked:
+                        self._prune()
+                    breaker = self._breakers[agent_id] = CircuitBreaker(
+                        self.window, self.min_calls, self.failure_rate, self.slow_call, self.open_seconds
+                    )
+        return breaker
+
+    def _prune(self) -> None:
+        for agent_id in [agent_id for agent_id, breaker in self._breakers.items() if breaker.state == STATE_CLOSED]:
+            del self._breakers[agent_id]
+
+    def state_of(self, agent_id: str) -> Dict[str, Any]:
+        """Breaker state for an agent's info (a fresh closed breaker if it was never used)."""
+        breaker = self._breakers.get(agent_id)
+        if breaker is None:
+            return {"state": STATE_CLOSED if self.enabled else "disabled", "failureRate": 0.0, "recentCalls": 0, "trips": 0, "retryInSeconds": 0.0}
+        return breaker.to_dict(self.clock())
+
+    def forget(self, agent_id: str) -> None:
+        self._breakers.pop(agent_id, None)
+
+    def stats(self, max_listed: int = 100) -> Dict[str, Any]:
+        now = self.clock()
+        tripped: List[Dict[str, Any]] = []
+        open_count = half_open = 0
+        for agent_id, breaker in list(self._breakers.items()):
+            if breaker.state == STATE_CLOSED:
+                continue
+            if breaker.state == STATE_OPEN:
+                open_count += 1
+            else:
+                half_open += 1
+            if len(tripped) < max_listed:
+                tripped.append({"agentId": agent_id, **breaker.to_dict(now)})
+        return {
+            "enabled": self.enabled,
+            "openAction": self.open_action,
+            "tracked": len(self._breakers),
+            "open": open_count,
+            "halfOpen": half_open,
+            "agents": tripped,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._breakers.clear()
+
+
+# Singleton instance
+circuit_breakers = CircuitBreakerRegistry.from_env()
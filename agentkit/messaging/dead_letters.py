@@ -0,0 +1,92 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from agentkit.core.models import MessagePayload
+
+# Dead-letter store configuration
+DEAD_LETTER_SIZE_ENV = "AGENTKIT_DEAD_LETTER_SIZE"
+DEFAULT_DEAD_LETTER_SIZE = 10_000
+
+
+class DeadLetter:
+    """A message that could not be delivered."""
+    __slots__ = ("id", "agent_id", "contact_endpoint", "payload", "attempts", "error", "status_code", "failed_at", "task_id")
+
+    def __init__(self, agent_id: str, contact_endpoint: str, payload: MessagePayload, attempts: int, error: str, status_code: Optional[int] = None, task_id: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.task_id = task_id
+        self.agent_id = agent_id
+        self.contact_endpoint = contact_endpoint
+        self.payload = payload
+        self.attempts = attempts
+        self.error = error
+        self.status_code = status_code
+        self.failed_at = datetime.now(timezone.utc)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "taskId": self.task_id,
+            "agentId": self.agent_id,
+            "contactEndpoint": self.contact_endpoint,
+            "attempts": self.attempts,
+            "error": self.error,
+            "statusCode": self.status_code,
+            "failedAt": self.failed_at.isoformat(),
+            "payload": self.payload.model_dump(mode='json'),
+        }
+
+
+class DeadLetterStore:
+    """
+    Bounded in-memory store of undeliverable messages, oldest first.
+
+    When full, the oldest dead letter is dropped to make room; `evicted`
+    counts how many were lost that way.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_DEAD_LETTER_SIZE):
+        self.max_size = max_size
+        self.evicted = 0
+        self._letters: "OrderedDict[str, DeadLetter]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._letters)
+
+    def add(self, letter: DeadLetter) -> DeadLetter:
+        with self._lock:
+            self._letters[letter.id] = letter
+            while len(self._letters) > self.max_size:
+                self._letters.popitem(last=False)
+                self.evicted += 1
+        return letter
+
+    def get(self, letter_id: str) -> Optional[DeadLetter]:
+        return self._letters.get(letter_id)
+
+    def list(self, agent_id: Optional[str] = None, limit: Optional[int] = None) -> List[DeadLetter]:
+        """Returns dead letters (optionally only those for `agent_id`), oldest first."""
+        with self._lock:
+            letters = [letter for letter in self._letters.values() if agent_id is None or letter.agent_id == agent_id]
+        return letters if limit is None else letters[:limit]
+
+    def pop(self, letter_id: str) -> Optional[DeadLetter]:
+        with self._lock:
+            return self._letters.pop(letter_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._letters.clear()
+            self.evicted = 0
+
+
+def dead_letter_size_from_env() -> int:
+    return int(os.getenv(DEAD_LETTER_SIZE_ENV, DEFAULT_DEAD_LETTER_SIZE))
+
+
+# Singleton instance
+dead_letter_store = DeadLetterStore(dead_letter_size_from_env())
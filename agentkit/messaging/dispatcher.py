@@ -0,0 +1,652 @@
+import asyncio
+import logging
+import math
+import os
+import time
+import weakref
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple, Union
+from agentkit.core.models import BatchDeliveryConfig, MessagePayload
+from agentkit.messaging.circuit_breaker import ACTION_FAIL, STATE_OPEN, CircuitBreaker, CircuitBreakerRegistry, is_breaker_failure
+from agentkit.messaging.dead_letters import DeadLetter, DeadLetterStore
+from agentkit.messaging.replies import ReplyWaiters
+from agentkit.messaging.retry import DeliveryError, RetryPolicy
+from agentkit.messaging.scheduler import AGING_ENV, DEFAULT_AGING, DEFAULT_QUANTUM, PRIORITIES, QUANTUM_ENV, SENDER_WEIGHTS_ENV, DispatchScheduler, parse_weights
+from agentkit.messaging.tasks import TaskRecord, TaskStore
+
+logger = logging.getLogger(__name__)
+
+# Dispatch configuration (see Dispatcher.from_env)
+QUEUE_SIZE_ENV = "AGENTKIT_DISPATCH_QUEUE_SIZE"               # Messages waiting across all agents
+WORKERS_ENV = "AGENTKIT_DISPATCH_WORKERS"                     # Concurrent deliveries
+PER_AGENT_LIMIT_ENV = "AGENTKIT_DISPATCH_PER_AGENT_LIMIT"     # Concurrent deliveries to one agent
+PER_AGENT_QUEUE_ENV = "AGENTKIT_DISPATCH_PER_AGENT_QUEUE"     # Messages waiting for one agent
+SESSION_ORDER_ENV = "AGENTKIT_DISPATCH_SESSION_ORDER"         # Deliver each session's messages one at a time, in order
+DRAIN_TIMEOUT_ENV = "AGENTKIT_DISPATCH_DRAIN_TIMEOUT"         # Seconds to finish queued work on shutdown
+
+DEFAULT_QUEUE_SIZE = 10_000
+DEFAULT_WORKERS = 64
+DEFAULT_PER_AGENT_LIMIT = 16
+DEFAULT_PER_AGENT_QUEUE = 1_000
+DEFAULT_DRAIN_TIMEOUT = 10.0
+
+MAX_RETRY_AFTER = 60          # Upper bound for the Retry-After hint, in seconds
+WAIT_SAMPLES = 1024           # Recent queue wait times kept for the stats percentiles
+
+
+class DispatchQueueFull(Exception):
+    """Raised by Dispatcher.submit when a message cannot be queued."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AgentUnavailable(Exception):
+    """Raised by Dispatcher.submit when the agent's circuit breaker is open and set to fail fast."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DispatchJob:
+    """A message accepted for delivery to an agent's contact endpoint."""
+    __slots__ = ("agent_id", "contact_endpoint", "payload", "task", "enqueued_at", "attempts", "session_id")
+
+    def __init__(self, agent_id: str, contact_endpoint: str, payload: MessagePayload, task: TaskRecord, enqueued_at: float):
+        self.agent_id = agent_id
+        self.contact_endpoint = contact_endpoint
+        self.payload = payload
+        self.task = task                 # Lifecycle record reported by GET /v1/tasks/{id}
+        self.enqueued_at = enqueued_at   # When the job (re-)entered the queue
+        self.attempts = 0                # Deliveries attempted so far
+        self.session_id = payload.sessionContext.sessionId if payload.sessionContext is not None else None
+
+    @property
+    def task_id(self) -> str:
+        return self.task.task_id
+
+    @property
+    def jobs(self) -> Sequence["DispatchJob"]:
+        return (self,)
+
+
+class DispatchBatch:
+    """Messages for one batch-receiving agent, delivered (and retried) together in a single request."""
+    __slots__ = ("agent_id", "contact_endpoint", "jobs", "enqueued_at")
+
+    def __init__(self, first: DispatchJob):
+        self.agent_id = first.agent_id
+        self.contact_endpoint = first.contact_endpoint
+        self.jobs: List[DispatchJob] = [first]
+        self.enqueued_at = first.enqueued_at   # The oldest message's wait includes the linger time
+
+    @property
+    def payloads(self) -> List[MessagePayload]:
+        return [job.payload for job in self.jobs]
+
+    @property
+    def attempts(self) -> int:
+        return self.jobs[0].attempts
+
+
+# A unit of delivery: one message, or a batch for an agent that opted in
+Delivery = Union[DispatchJob, DispatchBatch]
+DeliverFn = Callable[[Delivery], Awaitable[Any]]
+
+
+def classify(delivery: Delivery) -> Tuple[str, str, int]:
+    """Scheduling lane of a delivery: (priority, sender, cost in messages). A batch takes its most urgent message's priority."""
+    jobs = delivery.jobs
+    first = jobs[0].payload
+    if len(jobs) == 1:
+        return first.priority, first.senderId, 1
+    return min((job.payload.priority for job in jobs), key=PRIORITIES.index), first.senderId, len(jobs)
+
+
+class _LoopState:
+    """Queue, workers and counters of the dispatcher on one event loop."""
+
+    def __init__(self, queue: DispatchScheduler) -> None:
+        self.queue = queue                                # Deliveries ready for a worker, by priority and sender
+        self.workers: List[asyncio.Task] = []
+        self.parked: Dict[str, Deque[Delivery]] = {}      # agentId -> deliveries waiting for a free per-agent slot
+        self.pending: Dict[str, int] = {}                 # agentId -> messages accepted but not finished
+        self.retrying: Dict[Delivery, asyncio.TimerHandle] = {}   # Deliveries waiting out a retry delay
+        self.held: Dict[str, List[Delivery]] = {}         # agentId -> deliveries held while its circuit breaker is open
+        self.hold_timers: Dict[str, asyncio.TimerHandle] = {}
+        self.batching: Dict[str, DispatchBatch] = {}      # agentId -> batch still collecting messages
+        self.linger_timers: Dict[str, asyncio.TimerHandle] = {}
+        self.batch_lanes: Dict[str, Deque[DispatchBatch]] = {}   # agentId -> closed batches, while one is being delivered
+        self.batch_waiting = 0                            # Messages in those batches
+        self.in_flight: Dict[str, int] = {}               # agentId -> deliveries in progress
+        self.sessions: Dict[Tuple[str, str], Deque[DispatchJob]] = {}   # (agentId, sessionId) -> later messages, while one is being delivered
+        self.session_waiting = 0
+        self.total_pending = 0
+        self.total_parked = 0
+        self.messages_in_flight = 0
+        self.idle = asyncio.Event()                       # Set while no job is pending
+        self.idle.set()
+        self.accepted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.delivered = 0
+        self.batches = 0                                  # Batch requests delivered
+        self.retried = 0
+        self.dead_lettered = 0
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.service_time = 0.0                           # Moving average of delivery duration
+
+
+class Dispatcher:
+    """
+    Bounded queue and worker pool for delivering messages to agents.
+
+    Accepted messages wait in a queue of at most `max_queue` entries and are
+    delivered by a fixed pool of `workers`, so the number of concurrent
+    outbound requests and the memory held by waiting messages are both
+    capped. When the queue (or one agent's share of it) is full, `submit`
+    raises DispatchQueueFull with a Retry-After hint estimated from the
+    current backlog and the recent delivery time.
+
+    At most `per_agent_limit` deliveries to the same agent run at once. A
+    worker that picks up a message for an agent at its limit parks it with
+    that agent and moves on; the parked message is delivered as soon as one
+    of the agent's deliveries finishes, so a slow agent never blocks workers
+    that could serve others.
+
+    asyncio queues and tasks belong to one event loop, so the state is kept
+    per running loop (in production that is a single loop per worker
+    process). Workers start on the first submit, or from the application
+    lifespan.
+
+    A delivery that fails with a retryable DeliveryError is put back on the
+    queue after the delay chosen by `retry_policy`. The delay is a timer on
+    the event loop, not a sleeping worker, so waiting retries cost no
+    worker capacity (they do keep their place in the queue bound). Messages
+    that exhaust their attempts, fail permanently, or are still undelivered
+    when the dispatcher stops go to `dead_letters`.
+
+    Deliveries feed the agent's circuit breaker in `breakers`. While a
+    breaker is open, the agent's messages are either held (without a
+    worker) until the breaker lets a probe through and released as soon as
+    it closes, or - with the fail-fast action - rejected at submit and
+    dead-lettered if already queued.
+
+    Every accepted message gets a task in `tasks`, whose status and
+    timestamps follow the job through queueing, delivery attempts and its
+    final outcome.
+
+    Messages submitted with a BatchDeliveryConfig are coalesced per agent:
+    the first one opens a batch that collects later messages for up to
+    `lingerMs`, or until `maxBatchSize` is reached, and the whole batch
+    then enters the queue as a single DispatchBatch. It takes one worker,
+    one per-agent slot and one circuit breaker outcome, and is retried or
+    dead-lettered as a unit; each message keeps its own task and queue
+    capacity. An agent's batches form a serial lane like a session's
+    messages: the next batch enters the queue only when the previous one is
+    delivered or given up on, so batches arrive in submission order even
+    with `per_agent_limit` above 1 or when one is retried.
+
+    Senders waiting for an agent's reply are registered in `replies`; when
+    their message is dead-lettered, the wait ends with ReplyFailed.
+
+    The queue is a DispatchScheduler: messages are served by their
+    `priority` class first, and within a class senders take turns (deficit
+    round robin with `quantum` and `sender_weights`), so a sender flooding
+    the dispatcher cannot delay urgent or other senders' messages. A lower
+    class unserved for `aging` seconds is served regardless.
+
+    With `session_order`, messages that share an agent and a
+    `sessionContext.sessionId` form a serial lane: only the oldest is queued
+    or being delivered (including its retries), and the next one enters the
+    queue when it is delivered or given up on. Other sessions, and messages
+    without a session, are unaffected, so conversations keep their order
+    without serializing the agent. A lane takes memory only while it has a
+    message in progress. Batched agents receive each batch in submission
+    order and are not split into lanes.
+    """
+
+    def __init__(
+        self,
+        deliver: DeliverFn,
+        max_queue: int = DEFAULT_QUEUE_SIZE,
+        workers: int = DEFAULT_WORKERS,
+        per_agent_limit: int = DEFAULT_PER_AGENT_LIMIT,
+        per_agent_queue: int = DEFAULT_PER_AGENT_QUEUE,
+        retry_policy: Optional[RetryPolicy] = None,
+        dead_letters: Optional[DeadLetterStore] = None,
+        tasks: Optional[TaskStore] = None,
+        breakers: Optional[CircuitBreakerRegistry] = None,
+        replies: Optional[ReplyWaiters] = None,
+        quantum: int = DEFAULT_QUANTUM,
+        sender_weights: Optional[Dict[str, int]] = None,
+        aging: float = DEFAULT_AGING,
+        session_order: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if workers < 1:
+            raise ValueError("Dispatcher needs at least one worker.")
+        self.deliver = deliver
+        self.max_queue = max_queue
+        self.workers = workers
+        self.per_agent_limit = per_agent_limit
+        self.per_agent_queue = per_agent_queue
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=1)
+        self.dead_letters = dead_letters if dead_letters is not None else DeadLetterStore()
+        self.tasks = tasks if tasks is not None else TaskStore()
+        self.breakers = breakers if breakers is not None else CircuitBreakerRegistry(window=0)
+        self.replies = replies
+        self.quantum = quantum
+        self.sender_weights = sender_weights or {}
+        self.aging = aging
+        self.session_order = session_order
+        self._clock = clock
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_env(
+        cls,
+        deliver: DeliverFn,
+        dead_letters: Optional[DeadLetterStore] = None,
+        tasks: Optional[TaskStore] = None,
+        breakers: Optional[CircuitBreakerRegistry] = None,
+        replies: Optional[ReplyWaiters] = None,
+    ) -> "Dispatcher":
+        return cls(
+            deliver,
+            max_queue=int(os.getenv(QUEUE_SIZE_ENV, DEFAULT_QUEUE_SIZE)),
+            workers=int(os.getenv(WORKERS_ENV, DEFAULT_WORKERS)),
+            per_agent_limit=int(os.getenv(PER_AGENT_LIMIT_ENV, DEFAULT_PER_AGENT_LIMIT)),
+            per_agent_queue=int(os.getenv(PER_AGENT_QUEUE_ENV, DEFAULT_PER_AGENT_QUEUE)),
+            retry_policy=RetryPolicy.from_env(),
+            dead_letters=dead_letters,
+            tasks=tasks,
+            breakers=breakers,
+            replies=replies,
+            quantum=int(os.getenv(QUANTUM_ENV, DEFAULT_QUANTUM)),
+            sender_weights=parse_weights(os.getenv(SENDER_WEIGHTS_ENV, "")),
+            aging=float(os.getenv(AGING_ENV, DEFAULT_AGING)),
+            session_order=os.getenv(SESSION_ORDER_ENV, "1").lower() in ("1", "true", "yes"),
+        )
+
+    def _new_state(self) -> _LoopState:
+        return _LoopState(DispatchScheduler(classify, self.quantum, self.sender_weights, self.aging, self._clock))
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = self._new_state()
+        if not state.workers:
+            state.workers = [loop.create_task(self._work(state)) for _ in range(self.workers)]
+        return state
+
+    def start(self) -> None:
+        """Starts the worker pool on the running loop (idempotent)."""
+        self._state()
+
+    def submit(
+        self,
+        agent_id: str,
+        contact_endpoint: str,
+        payload: MessagePayload,
+        task_id: Optional[str] = None,
+        batch: Optional[BatchDeliveryConfig] = None,
+    ) -> DispatchJob:
+        """
+        Queues a message for delivery.
+
+        Args:
+            task_id: Existing task to restart (dead-letter replays); a new task is created otherwise.
+            batch: The agent's batch delivery settings, if it receives messages in batches.
+
+        Returns:
+            DispatchJob: The queued job.
+
+        Raises:
+            DispatchQueueFull: If the queue, or the agent's share of it, is full.
+            AgentUnavailable: If the agent's circuit breaker is open and set to fail fast.
+        """
+        state = self._state()
+        if self.breakers.open_action == ACTION_FAIL:
+            breaker = self.breakers.get(agent_id)
+            now = self.breakers.clock()
+            if breaker is not None and breaker.is_open(now):
+                state.rejected += 1
+                raise AgentUnavailable(
+                    f"Agent '{agent_id}' is failing; its circuit breaker is open.",
+                    max(1, math.ceil(breaker.retry_in(now))),
+                )
+        if self.max_queue > 0 and state.total_pending >= self.max_queue:
+            state.rejected += 1
+            raise DispatchQueueFull(
+                f"Dispatch queue is full ({state.total_pending} messages waiting).",
+                self._retry_after(state, state.total_pending, self.workers),
+            )
+        agent_pending = state.pending.get(agent_id, 0)
+        if self.per_agent_queue > 0 and agent_pending >= self.per_agent_queue:
+            state.rejected += 1
+            raise DispatchQueueFull(
+                f"Too many messages waiting for agent '{agent_id}' ({agent_pending}).",
+                self._retry_after(state, agent_pending, self.per_agent_limit or self.workers),
+            )
+        job = DispatchJob(agent_id, contact_endpoint, payload, self.tasks.add(agent_id, payload, task_id), self._clock())
+        state.pending[agent_id] = agent_pending + 1
+        state.total_pending += 1
+        state.idle.clear()
+        state.accepted += 1
+        if batch is not None:
+            self._add_to_batch(state, job, batch)
+        elif not self._wait_for_session(state, job):
+            state.queue.put_nowait(job)
+        return job
+
+    def _wait_for_session(self, state: _LoopState, job: DispatchJob) -> bool:
+        """Queues the job behind its session's message in progress, if there is one; otherwise opens the session's lane."""
+        if not self.session_order or job.session_id is None:
+            return False
+        key = (job.agent_id, job.session_id)
+        lane = state.sessions.get(key)
+        if lane is None:
+            state.sessions[key] = deque()
+            return False
+        lane.append(job)
+        state.session_waiting += 1
+        return True
+
+    def _next_in_session(self, state: _LoopState, job: DispatchJob) -> None:
+        """Queues the session's next message, or closes the lane if there is none."""
+        key = (job.agent_id, job.session_id)
+        lane = state.sessions.get(key)
+        if lane:
+            state.session_waiting -= 1
+            state.queue.put_nowait(lane.popleft())
+        elif lane is not None:
+            del state.sessions[key]
+
+    def _add_to_batch(self, state: _LoopState, job: DispatchJob, config: BatchDeliveryConfig) -> None:
+        batch = state.batching.get(job.agent_id)
+        if batch is not None and batch.contact_endpoint != job.contact_endpoint:
+            self._flush(state, job.agent_id) # The agent moved; don't send new messages to the old endpoint
+            batch = None
+        if batch is None:
+            batch = state.batching[job.agent_id] = DispatchBatch(job)
+            if config.maxBatchSize > 1:
+                state.linger_timers[job.agent_id] = asyncio.get_running_loop().call_later(
+                    config.lingerMs / 1000, self._flush, state, job.agent_id
+                )
+        else:
+            batch.jobs.append(job)
+        if len(batch.jobs) >= config.maxBatchSize:
+            self._flush(state, job.agent_id)
+
+    def _flush(self, state: _LoopState, agent_id: str) -> None:
+        """Closes the agent's open batch and queues it for delivery."""
+        timer = state.linger_timers.pop(agent_id, None)
+        if timer is not None:
+            timer.cancel()
+        batch = state.batching.pop(agent_id, None)
+        if batch is None:
+            return
+        lane = state.batch_lanes.get(agent_id)
+        if lane is None:
+            state.batch_lanes[agent_id] = deque()
+            state.queue.put_nowait(batch)
+        else:
+            lane.append(batch) # Behind the agent's batch in progress
+            state.batch_waiting += len(batch.jobs)
+
+    def _next_batch(self, state: _LoopState, agent_id: str) -> None:
+        """Queues the agent's next closed batch, or closes its lane if there is none."""
+        lane = state.batch_lanes.get(agent_id)
+        if lane:
+            batch = lane.popleft()
+            state.batch_waiting -= len(batch.jobs)
+            state.queue.put_nowait(batch)
+        elif lane is not None:
+            del state.batch_lanes[agent_id]
+
+    def _retry_after(self, state: _LoopState, backlog: int, concurrency: int) -> int:
+        """Estimates how long `backlog` messages take to drain at `concurrency` deliveries at a time."""
+        estimate = backlog * state.service_time / max(concurrency, 1)
+        return max(1, min(MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    async def _work(self, state: _LoopState) -> None:
+        while True:
+            job = await state.queue.get()
+            agent_id = job.agent_id
+            if self.per_agent_limit > 0 and state.in_flight.get(agent_id, 0) >= self.per_agent_limit:
+                state.parked.setdefault(agent_id, deque()).append(job)
+                state.total_parked += 1
+                continue
+            state.in_flight[agent_id] = state.in_flight.get(agent_id, 0) + 1
+            try:
+                # Keep serving this agent's parked jobs with the slot we already hold
+                while job is not None:
+                    await self._run(state, job)
+                    job = self._unpark(state, agent_id)
+            finally:
+                remaining = state.in_flight[agent_id] - 1
+                if remaining:
+                    state.in_flight[agent_id] = remaining
+                else:
+                    del state.in_flight[agent_id]
+
+    def _unpark(self, state: _LoopState, agent_id: str) -> Optional[Delivery]:
+        parked = state.parked.get(agent_id)
+        if not parked:
+            return None
+        job = parked.popleft()
+        state.total_parked -= 1
+        if not parked:
+            del state.parked[agent_id]
+        return job
+
+    async def _run(self, state: _LoopState, delivery: Delivery) -> None:
+        breaker = self.breakers.get(delivery.agent_id)
+        if breaker is not None and not breaker.allow(self.breakers.clock()):
+            self._circuit_open(state, delivery, breaker)
+            return
+        started = self._clock()
+        state.waits.append(started - delivery.enqueued_at)
+        now = self.tasks.now()
+        for job in delivery.jobs:
+            job.attempts += 1
+            job.task.dispatched(now)
+        state.messages_in_flight += len(delivery.jobs)
+        error: Optional[DeliveryError] = None
+        try:
+            await self.deliver(delivery)
+        except asyncio.CancelledError:
+            self._dead_letter(state, delivery, "Dispatcher stopped during delivery.")
+            self._finish(state, delivery)
+            raise
+        except DeliveryError as e:
+            error = e
+        except Exception as e:
+            logger.exception(f"Unexpected error while delivering a message to agent '{delivery.agent_id}'.")
+            error = DeliveryError(f"Unexpected error: {e}")
+        finally:
+            state.messages_in_flight -= len(delivery.jobs)
+            elapsed = self._clock() - started
+            state.service_time = elapsed if not state.service_time else 0.9 * state.service_time + 0.1 * elapsed
+
+        if breaker is not None:
+            breaker.record(is_breaker_failure(error), elapsed, self.breakers.clock())
+            if breaker.state != STATE_OPEN and delivery.agent_id in state.held:
+                self._release_held(state, delivery.agent_id) # The breaker let a delivery through; resume the agent
+        if error is None:
+            state.delivered += len(delivery.jobs)
+            if isinstance(delivery, DispatchBatch):
+                state.batches += 1
+            now = self.tasks.now()
+            for job in delivery.jobs:
+                job.task.delivered(now)
+        else:
+            delay = self.retry_policy.next_delay(delivery.attempts, error)
+            if delay is not None:
+                logger.info(f"Retrying delivery to agent '{delivery.agent_id}' in {delay:.2f}s (attempt {delivery.attempts} failed: {error}).")
+                state.retried += 1
+                for job in delivery.jobs:
+                    job.task.retrying(str(error))
+                state.retrying[delivery] = asyncio.get_running_loop().call_later(delay, self._requeue, state, delivery)
+                return
+            self._dead_letter(state, delivery, str(error), error.status_code)
+        self._finish(state, delivery)
+
+    def _circuit_open(self, state: _LoopState, delivery: Delivery, breaker: CircuitBreaker) -> None:
+        """Holds (or fails) a delivery whose agent's circuit breaker does not allow it now."""
+        message = f"Circuit breaker for agent '{delivery.agent_id}' is open."
+        if self.breakers.open_action == ACTION_FAIL:
+            self._dead_letter(state, delivery, message)
+            self._finish(state, delivery)
+            return
+        for job in delivery.jobs:
+            job.task.retrying(message)
+        state.held.setdefault(delivery.agent_id, []).append(delivery)
+        if delivery.agent_id not in state.hold_timers:
+            delay = max(breaker.retry_in(self.breakers.clock()), 0.05)
+            state.hold_timers[delivery.agent_id] = asyncio.get_running_loop().call_later(delay, self._release_held, state, delivery.agent_id)
+
+    def _release_held(self, state: _LoopState, agent_id: str) -> None:
+        timer = state.hold_timers.pop(agent_id, None)
+        if timer is not None:
+            timer.cancel()
+        now = self._clock()
+        for delivery in state.held.pop(agent_id, ()):
+            delivery.enqueued_at = now
+            state.queue.put_nowait(delivery)
+
+    def _requeue(self, state: _LoopState, delivery: Delivery) -> None:
+        if state.retrying.pop(delivery, None) is not None:
+            delivery.enqueued_at = self._clock()
+            state.queue.put_nowait(delivery)
+
+    def _dead_letter(self, state: _LoopState, delivery: Delivery, error: str, status_code: Optional[int] = None) -> None:
+        jobs = delivery.jobs
+        count = f"{len(jobs)} messages" if len(jobs) > 1 else "message"
+        logger.error(f"Giving up on {count} for agent '{delivery.agent_id}' after {delivery.attempts} attempt(s): {error}")
+        now = self.tasks.now()
+        for job in jobs:
+            self.dead_letters.add(DeadLetter(job.agent_id, job.contact_endpoint, job.payload, job.attempts, error, status_code, task_id=job.task_id))
+            job.task.failed(now, error)
+            if self.replies is not None:
+                self.replies.fail(job.task_id, error)
+        state.dead_lettered += len(jobs)
+
+    def _finish(self, state: _LoopState, delivery: Delivery) -> None:
+        """Releases the queue capacity held by messages that are delivered or given up on."""
+        count = len(delivery.jobs)
+        state.completed += count
+        remaining = state.pending[delivery.agent_id] - count
+        if remaining:
+            state.pending[delivery.agent_id] = remaining
+        else:
+            del state.pending[delivery.agent_id]
+        state.total_pending -= count
+        if not state.total_pending:
+            state.idle.set()
+        if isinstance(delivery, DispatchBatch):
+            self._next_batch(state, delivery.agent_id)
+        elif delivery.session_id is not None:
+            self._next_in_session(state, delivery)
+
+    async def stop(self, timeout: float = DEFAULT_DRAIN_TIMEOUT) -> None:
+        """
+        Stops the workers of the running loop.
+
+        Open batches are sent without waiting out their linger time. Messages
+        that are still queued, parked or waiting for a retry after `timeout`
+        are moved to the dead-letter store.
+
+        Args:
+            timeout: Seconds to wait for queued messages to be delivered first.
+        """
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is None:
+            return
+        for agent_id in list(state.batching):
+            self._flush(state, agent_id)
+        try:
+            await asyncio.wait_for(state.idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for worker in state.workers:
+            worker.cancel()
+        await asyncio.gather(*state.workers, return_exceptions=True)
+
+        leftovers: List[Delivery] = []
+        for delivery, handle in state.retrying.items():
+            handle.cancel()
+            leftovers.append(delivery)
+        state.retrying.clear()
+        for timer in state.hold_timers.values():
+            timer.cancel()
+        for held in state.held.values():
+            leftovers.extend(held)
+        state.held.clear()
+        while not state.queue.empty():
+            leftovers.append(state.queue.get_nowait())
+        for parked in state.parked.values():
+            leftovers.extend(parked)
+        state.parked.clear()
+        for lane in state.sessions.values():
+            leftovers.extend(lane)
+        state.sessions.clear()
+        for batches in state.batch_lanes.values():
+            leftovers.extend(batches)
+        state.batch_lanes.clear()
+        if leftovers:
+            count = sum(len(delivery.jobs) for delivery in leftovers)
+            logger.warning(f"Dispatcher stopped with {count} undelivered messages; moving them to the dead-letter store.")
+        for delivery in leftovers:
+            self._dead_letter(state, delivery, "Dispatcher stopped before delivery.")
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns queue depth, concurrency and wait-time statistics for the running loop."""
+        state = self._states.get(asyncio.get_running_loop()) or self._new_state()
+        waits = sorted(state.waits)
+        held = sum(len(delivery.jobs) for held in state.held.values() for delivery in held)
+        retrying = sum(len(delivery.jobs) for delivery in state.retrying)
+        batching = sum(len(batch.jobs) for batch in state.batching.values())
+
+        def percentile(fraction: float) -> float:
+            return round(waits[min(len(waits) - 1, int(fraction * len(waits)))] * 1000, 3) if waits else 0.0
+
+        return {
+            "workers": self.workers,
+            "queueCapacity": self.max_queue,
+            "queueDepth": state.total_pending - state.messages_in_flight - retrying - held - batching - state.session_waiting - state.batch_waiting,
+            "parked": state.total_parked,
+            "inFlight": sum(state.in_flight.values()),
+            "busyAgents": len(state.in_flight),
+            "perAgentLimit": self.per_agent_limit,
+            "accepted": state.accepted,
+            "rejected": state.rejected,
+            "completed": state.completed,
+            "delivered": state.delivered,
+            "retried": state.retried,
+            "batchesDelivered": state.batches,
+            "batching": batching,
+            "waitingForBatch": state.batch_waiting,
+            "retryWaiting": retrying,
+            "heldByCircuitBreaker": held,
+            "sessionLanes": len(state.sessions),
+            "waitingForSession": state.session_waiting,
+            "deadLettered": state.dead_lettered,
+            "waitTimeMs": {
+                "avg": round(sum(waits) / len(waits) * 1000, 3) if waits else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": round(waits[-1] * 1000, 3) if waits else 0.0,
+            },
+            "serviceTimeMs": round(state.service_time * 1000, 3),
+            "priorityLanes": state.queue.stats(),
+            "circuitBreakers": self.breakers.stats(),
+        }
+
+
+def drain_timeout_from_env() -> float:
+    return float(os.getenv(DRAIN_TIMEOUT_ENV, DEFAULT_DRAIN_TIMEOUT))
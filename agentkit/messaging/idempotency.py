@@ -0,0 +1,157 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# Idempotency configuration (see IdempotencyCache.from_env)
+TTL_ENV = "AGENTKIT_IDEMPOTENCY_TTL"             # Seconds a key's stored response is replayed
+MAX_KEYS_ENV = "AGENTKIT_IDEMPOTENCY_MAX_KEYS"   # Stored responses kept; least recently used go first
+
+DEFAULT_TTL = 24 * 3600.0
+DEFAULT_MAX_KEYS = 100_000
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an idempotency key is reused for a different request."""
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "future", "expires_at")
+
+    def __init__(self, fingerprint: Hashable, future: asyncio.Future):
+        self.fingerprint = fingerprint
+        self.future = future                    # Resolves to (status_code, body) when the first execution finishes
+        self.expires_at: Optional[float] = None # Set once the response is stored
+
+
+class IdempotencyCache:
+    """
+    Recent idempotency keys and the responses they produced.
+
+    The first request with a key executes; its successful response is kept
+    for `ttl` seconds and returned to every later request with the same key
+    without executing again. Requests that arrive while the first one is
+    still executing wait for its outcome instead of starting their own. A
+    failed execution is not stored (waiting duplicates get the same error),
+    so the caller can retry with the same key. At most `max_keys` responses
+    are kept, least recently used first out; keys still executing are never
+    evicted.
+
+    Each key carries a fingerprint of the request; reusing a key for a
+    different request raises IdempotencyConflict rather than replaying an
+    unrelated response.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_keys: int = DEFAULT_MAX_KEYS, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.replayed = 0
+        self.joined = 0   # Duplicates that waited for an in-flight execution
+
+    @classmethod
+    def from_env(cls) -> "IdempotencyCache":
+        return cls(
+            ttl=float(os.getenv(TTL_ENV, DEFAULT_TTL)),
+            max_keys=int(os.getenv(MAX_KEYS_ENV, DEFAULT_MAX_KEYS)),
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def run(self, key: Hashable, fingerprint: Hashable, execute: Callable[[], Awaitable[Tuple[int, Any]]]) -> Tuple[int, Any, bool]:
+        """
+        Executes a request once per key.
+
+        Args:
+            key: The idempotency key (scoped by the caller as needed).
+            fingerprint: Identifies the request the key was first used for.
+            execute: Runs the request and returns (status_code, body).
+
+        Returns:
+            (status_code, body, replayed): replayed is True if the response
+            came from an earlier or concurrent execution.
+
+        Raises:
+            IdempotencyConflict: If the key was used for a different request.
+            Any exception raised by `execute` (for this or the awaited execution).
+        """
+        while True:
+            now = self._clock()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.expires_at is not None and entry.expires_at <= now:
+                    del self._entries[key]
+                    entry = None
+                if entry is None:
+                    entry = self._entries[key] = _Entry(fingerprint, asyncio.get_running_loop().create_future())
+                    self._entries.move_to_end(key)
+                    owner = True
+                else:
+                    self._entries.move_to_end(key)
+                    owner = False
+            if entry.fingerprint != fingerprint:
+                raise IdempotencyConflict("Idempotency key was already used for a different request.")
+            if owner:
+                return (*await self._execute(key, entry, execute), False)
+            if not entry.future.done():
+                self.joined += 1
+            try:
+                status_code, body = await asyncio.shield(entry.future)
+            except asyncio.CancelledError:
+                if entry.future.cancelled():
+                    continue # The first request went away before finishing; execute this one instead
+                raise
+            self.replayed += 1
+            return status_code, body, True
+
+    async def _execute(self, key: Hashable, entry: _Entry, execute: Callable[[], Awaitable[Tuple[int, Any]]]) -> Tuple[int, Any]:
+        self.executed += 1
+        try:
+            result = await execute()
+        except BaseException as e:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            if isinstance(e, asyncio.CancelledError):
+                entry.future.cancel()
+            else:
+                entry.future.set_exception(e)
+                entry.future.exception() # Retrieved here, so an unwatched failure is not logged as never retrieved
+            raise
+        with self._lock:
+            entry.expires_at = self._clock() + self.ttl
+            self._evict()
+        entry.future.set_result(result)
+        return result
+
+    def _evict(self) -> None:
+        """Drops the least recently used stored responses over `max_keys`; executions still in flight are kept, so their duplicates still join them."""
+        excess = len(self._entries) - self.max_keys
+        if excess <= 0:
+            return
+        stored = []
+        for key, entry in self._entries.items():
+            if entry.expires_at is not None:
+                stored.append(key)
+                if len(stored) == excess:
+                    break
+        for key in stored:
+            del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"keys": len(self._entries), "executed": self.executed, "replayed": self.replayed, "joined": self.joined}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.executed = self.replayed = self.joined = 0
+
+
+# Singleton instance
+idempotency_cache = IdempotencyCache.from_env()
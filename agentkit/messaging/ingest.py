@@ -0,0 +1,155 @@
+import codecs
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Union
+
+DEFAULT_MAX_RECORD_BYTES = 1024 * 1024
+
+_WHITESPACE = " \t\r\n"
+
+
+class RecordError:
+    """A record that could not be parsed. `fatal` errors end the stream (the framing is lost)."""
+    __slots__ = ("message", "fatal")
+
+    def __init__(self, message: str, fatal: bool = False):
+        self.message = message
+        self.fatal = fatal
+
+
+async def iter_json_records(chunks: AsyncIterable[bytes], max_record_bytes: int = DEFAULT_MAX_RECORD_BYTES) -> AsyncIterator[Union[Any, RecordError]]:
+    """
+    Parses a request body incrementally into JSON records.
+
+    The body is either NDJSON (one JSON value per line) or a single JSON
+    array, told apart by its first non-blank character. Only the record
+    being parsed is buffered, so arbitrarily long bodies can be consumed in
+    constant memory.
+
+    A malformed NDJSON line yields a RecordError and parsing continues with
+    the next line. In an array, a malformed element yields a fatal
+    RecordError and ends the stream, since the element boundaries are lost.
+    Records larger than `max_record_bytes` are rejected the same way.
+
+    Yields:
+        The decoded value of each record, or a RecordError, in body order.
+    """
+    iterator = chunks.__aiter__()
+    first = b""
+    async for chunk in iterator:
+        first = chunk.lstrip()
+        if first:
+            break
+    if not first:
+        return
+    if first.startswith(b"["):
+        parser = _iter_array(first, iterator, max_record_bytes)
+    else:
+        parser = _iter_lines(first, iterator, max_record_bytes)
+    async for record in parser:
+        yield record
+
+
+def _parse_line(line: bytes) -> Union[Any, RecordError, None]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return RecordError(f"Invalid JSON: {e}")
+
+
+async def _iter_lines(first: bytes, rest: AsyncIterator[bytes], max_record_bytes: int) -> AsyncIterator[Union[Any, RecordError]]:
+    buffer = bytearray(first)
+    skipping = False # Discarding the remainder of an oversized line
+    while True:
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            if skipping:
+                skipping = False
+            elif end - start > max_record_bytes: # A whole oversized line can arrive in one chunk
+                yield RecordError(f"Record exceeds {max_record_bytes} bytes.")
+            else:
+                record = _parse_line(buffer[start:end])
+                if record is not None:
+                    yield record
+            start = end + 1
+        del buffer[:start]
+        if len(buffer) > max_record_bytes:
+            if not skipping:
+                yield RecordError(f"Record exceeds {max_record_bytes} bytes.")
+            skipping = True
+            buffer.clear()
+        try:
+            chunk = await rest.__anext__()
+        except StopAsyncIteration:
+            break
+        buffer += chunk
+    if len(buffer) > max_record_bytes and not skipping:
+        yield RecordError(f"Record exceeds {max_record_bytes} bytes.")
+    elif buffer and not skipping:
+        record = _parse_line(buffer)
+        if record is not None:
+            yield record
+
+
+async def _iter_array(first: bytes, rest: AsyncIterator[bytes], max_record_bytes: int) -> AsyncIterator[Union[Any, RecordError]]:
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    text = utf8.decode(first)
+    pos = 1                      # Past the opening bracket
+    expect_value = True          # False once an element was read: a comma or the closing bracket must follow
+    seen_value = False
+    eof = False
+    while True:
+        while True:
+            while pos < len(text) and text[pos] in _WHITESPACE:
+                pos += 1
+            if pos == len(text):
+                break
+            char = text[pos]
+            if char == "]" and (not expect_value or not seen_value):
+                pos += 1
+                if text[pos:].strip(_WHITESPACE):
+                    yield RecordError("Unexpected data after the closing bracket.", fatal=True)
+                return
+            if not expect_value:
+                if char != ",":
+                    yield RecordError(f"Expected ',' or ']' between records, found {char!r}.", fatal=True)
+                    return
+                pos += 1
+                expect_value = True
+                continue
+            if char != "{":
+                yield RecordError("Each record must be a JSON object.", fatal=True)
+                return
+            try:
+                value, end = decoder.raw_decode(text, pos)
+            except ValueError as e:
+                if eof or len(text) - pos > max_record_bytes:
+                    message = f"Record exceeds {max_record_bytes} bytes." if not eof else f"Invalid JSON: {e}"
+                    yield RecordError(message, fatal=True)
+                    return
+                break # Incomplete; wait for more data
+            if end - pos > max_record_bytes:
+                yield RecordError(f"Record exceeds {max_record_bytes} bytes.", fatal=True)
+                return
+            yield value
+            pos = end
+            expect_value = False
+            seen_value = True
+        if eof:
+            yield RecordError("Unexpected end of body; the array is not closed.", fatal=True)
+            return
+        text = text[pos:]
+        pos = 0
+        try:
+            chunk = await rest.__anext__()
+        except StopAsyncIteration:
+            eof = True
+            text += utf8.decode(b"", final=True)
+            continue
+        text += utf8.decode(chunk)
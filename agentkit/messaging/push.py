@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+from agentkit.messaging.retry import DeliveryError, KIND_CONNECT, KIND_STATUS, KIND_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Push channel configuration
+ACK_TIMEOUT_ENV = "AGENTKIT_PUSH_ACK_TIMEOUT"   # Seconds an agent has to acknowledge a pushed delivery
+TOKEN_SECRET_ENV = "AGENTKIT_PUSH_TOKEN_SECRET"   # Key of the push tokens; random per process if unset
+
+DEFAULT_ACK_TIMEOUT = 15.0
+
+# Frame types. AgentKit sends `deliver` frames; the agent answers each with `ack` or `nack`.
+FRAME_DELIVER = "deliver"
+FRAME_ACK = "ack"
+FRAME_NACK = "nack"
+
+SendTextFn = Callable[[str], Awaitable[None]]
+CloseFn = Callable[[], None]
+
+
+class PushConnection:
+    """
+    An agent's open WebSocket, used to deliver messages without an outbound HTTP request.
+
+    Each delivery is one `deliver` frame,
+    ``{"type": "deliver", "deliveryId": "...", "body": <message or array of messages>}``,
+    where `body` is exactly what would have been POSTed to the contact
+    endpoint. The agent answers with ``{"type": "ack", "deliveryId": "..."}``
+    or, if it could not process it, ``{"type": "nack", "deliveryId": "...",
+    "statusCode": 503, "error": "..."}``; the status code (default 500) is
+    judged by the retry policy and circuit breaker like an HTTP response.
+    Deliveries share the socket and are acknowledged independently.
+    """
+
+    def __init__(self, agent_id: str, send_text: SendTextFn, ack_timeout: float = DEFAULT_ACK_TIMEOUT, close_socket: Optional[CloseFn] = None):
+        self.agent_id = agent_id
+        self.ack_timeout = ack_timeout
+        self._send_text = send_text
+        self._close_socket = close_socket   # Ends the WebSocket when the channel is revoked
+        self._send_lock = asyncio.Lock()   # One frame at a time on the socket
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.closed = False
+        self.delivered = 0
+
+    async def deliver(self, body: bytes) -> None:
+        """
+        Pushes an already serialized JSON body and waits for the agent's acknowledgement.
+
+        Raises:
+            DeliveryError: KIND_CONNECT if the frame could not be sent (resending
+                           elsewhere is safe), KIND_TIMEOUT if no answer arrived
+                           in time or the socket closed first, KIND_STATUS on a nack.
+        """
+        if self.closed:
+            raise DeliveryError(f"Push channel of agent '{self.agent_id}' is closed.", kind=KIND_CONNECT)
+        delivery_id = uuid.uuid4().hex
+        frame = b'{"type":"deliver","deliveryId":"' + delivery_id.encode() + b'","body":' + body + b"}"
+        acknowledged = asyncio.get_running_loop().create_future()
+        self._pending[delivery_id] = acknowledged
+        try:
+            try:
+                async with self._send_lock:
+                    await self._send_text(frame.decode())
+            except Exception as e:
+                raise DeliveryError(f"Could not push to agent '{self.agent_id}': {e!r}", kind=KIND_CONNECT)
+            try:
+                await asyncio.wait_for(acknowledged, self.ack_timeout)
+            except asyncio.TimeoutError:
+                raise DeliveryError(f"Agent '{self.agent_id}' did not acknowledge the delivery within {self.ack_timeout}s.", kind=KIND_TIMEOUT)
+        finally:
+            self._pending.pop(delivery_id, None)
+        self.delivered += 1
+
+    def receive(self, text: str) -> None:
+        """Handles a frame sent by the agent (acks and nacks; anything else is ignored)."""
+        try:
+            frame = json.loads(text)
+            frame_type = frame.get("type")
+            acknowledged = self._pending.get(frame.get("deliveryId"))
+        except (ValueError, AttributeError, TypeError):
+            logger.warning(f"Ignoring malformed push channel frame from agent '{self.agent_id}'.")
+            return
+        if acknowledged is None or acknowledged.done():
+            return # Unknown delivery, or one that already timed out
+        if frame_type == FRAME_ACK:
+            acknowledged.set_result(None)
+        elif frame_type == FRAME_NACK:
+            status_code = frame.get("statusCode") if isinstance(frame.get("statusCode"), int) else 500
+            acknowledged.set_exception(DeliveryError(
+                f"Agent rejected the delivery with status {status_code}: {frame.get('error', 'no reason given')}",
+                kind=KIND_STATUS,
+                status_code=status_code,
+            ))
+
+    def close(self) -> None:
+        """Marks the socket closed and fails the deliveries still waiting for an answer."""
+        self.closed = True
+        for acknowledged in self._pending.values():
+            if not acknowledged.done():
+                acknowledged.set_exception(DeliveryError(f"Push channel of agent '{self.agent_id}' closed before the delivery was acknowledged.", kind=KIND_TIMEOUT))
+
+    def revoke(self) -> None:
+        """Closes the channel from AgentKit's side: fails the waiting deliveries and ends the socket."""
+        self.close()
+        if self._close_socket is not None:
+            self._close_socket()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"connected": not self.closed, "awaitingAck": len(self._pending), "delivered": self.delivered}
+
+
+class PushChannelRegistry:
+    """
+    Open push channels by agent ID.
+
+    Opening a channel takes the agent's push token, which registration
+    returns: an HMAC of the agent ID, so it needs no storage and holds in
+    every process sharing the secret. An agent has at most one channel:
+    while it is open, further connections for the same agent are refused,
+    and the agent can connect again once the open channel is closed.
+    Channels live in the API process the agent connected to, and are
+    revoked when the agent leaves the registry.
+    """
+
+    def __init__(self, ack_timeout: float = DEFAULT_ACK_TIMEOUT, token_secret: Optional[bytes] = None):
+        self.ack_timeout = ack_timeout
+        self._token_secret = token_secret or secrets.token_bytes(32)
+        self._connections: Dict[str, PushConnection] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "PushChannelRegistry":
+        secret = os.getenv(TOKEN_SECRET_ENV)
+        return cls(ack_timeout=float(os.getenv(ACK_TIMEOUT_ENV, DEFAULT_ACK_TIMEOUT)), token_secret=secret.encode() if secret else None)
+
+    def token_for(self, agent_id: str) -> str:
+        """The push token that proves ownership of `agent_id` when opening its channel."""
+        return hmac.new(self._token_secret, agent_id.encode(), hashlib.sha256).hexdigest()
+
+    def verify(self, agent_id: str, token: Optional[str]) -> bool:
+        return token is not None and hmac.compare_digest(token, self.token_for(agent_id))
+
+    def connect(self, agent_id: str, send_text: SendTextFn, close_socket: Optional[CloseFn] = None) -> Optional[PushConnection]:
+        """Opens the agent's channel, or returns None if it already has an open one."""
+        with self._lock:
+            current = self._connections.get(agent_id)
+            if current is not None and not current.closed:
+                return None
+            connection = self._connections[agent_id] = PushConnection(agent_id, send_text, self.ack_timeout, close_socket)
+        return connection
+
+    def disconnect(self, connection: PushConnection) -> None:
+        connection.close()
+        with self._lock:
+            if self._connections.get(connection.agent_id) is connection:
+                del self._connections[connection.agent_id]
+
+    def revoke(self, agent_id: str) -> None:
+        """Closes the agent's channel, if it has one, e.g. because the agent was deregistered."""
+        with self._lock:
+            connection = self._connections.pop(agent_id, None)
+        if connection is not None:
+            connection.revoke()
+
+    def get(self, agent_id: str) -> Optional[PushConnection]:
+        """Returns the agent's open channel, if it is connected to this process."""
+        return self._connections.get(agent_id)
+
+    def state_of(self, agent_id: str) -> Dict[str, Any]:
+        connection = self._connections.get(agent_id)
+        return connection.to_dict() if connection is not None else {"connected": False}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"connected": len(self._connections)}
+
+    def clear(self) -> None:
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            connection.close()
+
+
+# Singleton instance
+push_channels = PushChannelRegistry.from_env()
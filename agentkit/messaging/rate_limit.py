@@ -0,0 +1,199 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+# Rate limit configuration (see RateLimiter.from_env)
+SENDER_RATE_ENV = "AGENTKIT_RATE_LIMIT_SENDER"           # Messages per second per senderId; 0 disables
+SENDER_BURST_ENV = "AGENTKIT_RATE_LIMIT_SENDER_BURST"    # Messages a sender may send at once after being idle
+AGENT_RATE_ENV = "AGENTKIT_RATE_LIMIT_AGENT"             # Messages per second per target agent; 0 disables
+AGENT_BURST_ENV = "AGENTKIT_RATE_LIMIT_AGENT_BURST"
+MAX_KEYS_ENV = "AGENTKIT_RATE_LIMIT_MAX_KEYS"            # Buckets kept per scope
+
+DEFAULT_RATE = 0.0
+DEFAULT_MAX_KEYS = 100_000
+MAX_LISTED = 10   # Most-throttled keys reported by stats()
+
+SCOPE_SENDER = "sender"
+SCOPE_AGENT = "agent"
+
+
+class RateLimited(Exception):
+    """Raised by RateLimiter.acquire when a sender or target agent is over its rate."""
+
+    def __init__(self, message: str, scope: str, retry_after: int):
+        super().__init__(message)
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class TokenBuckets:
+    """
+    Token buckets keyed by an arbitrary string, e.g. a sender ID.
+
+    A bucket holds up to `burst` tokens and gains `rate` tokens per second.
+    Buckets are refilled lazily from the time of their last update when
+    they are used, so checking or taking a token is O(1) and there is no
+    timer per key. At most `max_keys` buckets are kept, least recently used
+    first out; a key that has been idle long enough has a full bucket, so
+    dropping it loses nothing (an evicted busy key merely starts afresh).
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = DEFAULT_MAX_KEYS, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()   # key -> [tokens, updated_at, throttled]
+        self.allowed = 0
+        self.throttled = 0
+        self.evicted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _bucket(self, key: str, now: float) -> List[float]:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now, 0]
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket
+
+    def wait_time(self, key: str, now: float) -> float:
+        """Seconds until `key` has a token (0 if it has one now). Refills the bucket."""
+        tokens = self._bucket(key, now)[0]
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def take(self, key: str) -> None:
+        """Takes a token from a bucket that `wait_time` just found non-empty."""
+        self._buckets[key][0] -= 1
+        self.allowed += 1
+
+    def give_back(self, key: str) -> None:
+        """Returns a token taken for a message that was not sent after all (a no-op if the bucket was evicted since)."""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] = min(self.burst, bucket[0] + 1)
+            self.allowed -= 1
+
+    def reject(self, key: str) -> None:
+        self._buckets[key][2] += 1
+        self.throttled += 1
+
+    def stats(self) -> Dict[str, Any]:
+        top = sorted(((bucket[2], key) for key, bucket in self._buckets.items() if bucket[2]), reverse=True)[:MAX_LISTED]
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "keys": len(self._buckets),
+            "allowed": self.allowed,
+            "throttled": self.throttled,
+            "evicted": self.evicted,
+            "topThrottled": [{"key": key, "throttled": int(count)} for count, key in top],
+        }
+
+    def clear(self) -> None:
+        self._buckets.clear()
+        self.allowed = self.throttled = self.evicted = 0
+
+
+class RateLimiter:
+    """
+    Admission control for /run: one token bucket per sender and one per target agent.
+
+    A message is admitted only if both of its buckets have a token, and then
+    takes one from each, so a message rejected for its target does not use
+    up its sender's allowance (and vice versa). Either scope is disabled by
+    setting its rate to 0.
+    """
+
+    def __init__(
+        self,
+        sender_rate: float = DEFAULT_RATE,
+        sender_burst: Optional[float] = None,
+        agent_rate: float = DEFAULT_RATE,
+        agent_burst: Optional[float] = None,
+        max_keys: int = DEFAULT_MAX_KEYS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        # Without an explicit burst, allow one second's worth of messages at once
+        self.senders = TokenBuckets(sender_rate, sender_burst if sender_burst is not None else sender_rate, max_keys, clock)
+        self.agents = TokenBuckets(agent_rate, agent_burst if agent_burst is not None else agent_rate, max_keys, clock)
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        def burst(name: str) -> Optional[float]:
+            value = os.getenv(name)
+            return float(value) if value else None
+        return cls(
+            sender_rate=float(os.getenv(SENDER_RATE_ENV, DEFAULT_RATE)),
+            sender_burst=burst(SENDER_BURST_ENV),
+            agent_rate=float(os.getenv(AGENT_RATE_ENV, DEFAULT_RATE)),
+            agent_burst=burst(AGENT_BURST_ENV),
+            max_keys=int(os.getenv(MAX_KEYS_ENV, DEFAULT_MAX_KEYS)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.senders.enabled or self.agents.enabled
+
+    def acquire(self, sender_id: str, agent_id: str) -> None:
+        """
+        Admits one message from `sender_id` to `agent_id`.
+
+        Raises:
+            RateLimited: If the sender or the agent is over its rate.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            now = self._clock()
+            for buckets, key, scope in ((self.senders, sender_id, SCOPE_SENDER), (self.agents, agent_id, SCOPE_AGENT)):
+                if not buckets.enabled:
+                    continue
+                wait = buckets.wait_time(key, now)
+                if wait > 0:
+                    buckets.reject(key)
+                    who = f"Sender '{sender_id}'" if scope == SCOPE_SENDER else f"Agent '{agent_id}'"
+                    raise RateLimited(f"{who} is over its rate limit of {buckets.rate:g} messages per second.", scope, max(1, math.ceil(wait)))
+            if self.senders.enabled:
+                self.senders.take(sender_id)
+            if self.agents.enabled:
+                self.agents.take(agent_id)
+
+    def refund(self, sender_id: str, agent_id: str) -> None:
+        """Gives back the tokens `acquire` took for a message that was then rejected downstream (e.g. a full dispatch queue)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.senders.enabled:
+                self.senders.give_back(sender_id)
+            if self.agents.enabled:
+                self.agents.give_back(agent_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {SCOPE_SENDER: self.senders.stats(), SCOPE_AGENT: self.agents.stats()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self.senders.clear()
+            self.agents.clear()
+
+
+# Singleton instance
+rate_limiter = RateLimiter.from_env()
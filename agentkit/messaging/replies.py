@@ -0,0 +1,124 @@
+import asyncio
+import os
+import threading
+from typing import Any, Dict, Optional
+
+# Request/reply configuration
+MAX_WAITERS_ENV = "AGENTKIT_REPLY_MAX_WAITERS"   # /run requests that may wait for a reply at once
+
+DEFAULT_MAX_WAITERS = 10_000
+
+
+class ReplyWaitersFull(Exception):
+    """Raised by ReplyWaiters.expect when too many requests are already waiting."""
+
+
+class ReplyFailed(Exception):
+    """Set on a waiter when its message could not be delivered, so no reply will come."""
+
+
+class ReplyWaiters:
+    """
+    Correlation map of /run requests waiting for the agent's reply, keyed by task ID.
+
+    A waiter is a bare future, so a waiting request costs one dict entry and
+    one deadline timer on the event loop; thousands can wait at once. At
+    most `max_waiters` may wait, which bounds the memory held by requests
+    that never get an answer. Replies and failures for tasks nobody waits
+    for (any more) are ignored here; the caller decides what to do with them.
+    """
+
+    def __init__(self, max_waiters: int = DEFAULT_MAX_WAITERS):
+        self.max_waiters = max_waiters
+        self._waiters: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.replied = 0
+        self.timed_out = 0
+
+    @classmethod
+    def from_env(cls) -> "ReplyWaiters":
+        return cls(max_waiters=int(os.getenv(MAX_WAITERS_ENV, DEFAULT_MAX_WAITERS)))
+
+    def __len__(self) -> int:
+        return len(self._waiters)
+
+    def expect(self, task_id: str) -> asyncio.Future:
+        """
+        Registers interest in the reply to `task_id` (before the message is dispatched, so no reply is missed).
+
+        Raises:
+            ReplyWaitersFull: If `max_waiters` requests are already waiting.
+        """
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            if self.max_waiters > 0 and len(self._waiters) >= self.max_waiters:
+                raise ReplyWaitersFull(f"Too many requests are waiting for replies ({len(self._waiters)}).")
+            self._waiters[task_id] = future
+        return future
+
+    async def wait(self, task_id: str, future: asyncio.Future, timeout: float) -> Optional[Any]:
+        """
+        Waits for the reply registered with `expect`.
+
+        Returns:
+            The reply, or None if none arrived within `timeout` seconds.
+
+        Raises:
+            ReplyFailed: If the message could not be delivered.
+        """
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            return None
+        finally:
+            self.discard(task_id)
+
+    def discard(self, task_id: str) -> None:
+        with self._lock:
+            self._waiters.pop(task_id, None)
+
+    def resolve(self, task_id: str, reply: Any) -> bool:
+        """Hands a reply to the waiting request. Returns False if nobody is waiting for it."""
+        if self._settle(task_id, lambda future: future.set_result(reply)):
+            self.replied += 1
+            return True
+        return False
+
+    def fail(self, task_id: str, error: str) -> bool:
+        """Wakes the waiting request with ReplyFailed (the message was dead-lettered)."""
+        return self._settle(task_id, lambda future: future.set_exception(ReplyFailed(error)))
+
+    def _settle(self, task_id: str, settle) -> bool:
+        with self._lock:
+            future = self._waiters.pop(task_id, None)
+        if future is None:
+            return False
+
+        def apply() -> None:
+            if not future.done():
+                settle(future)
+        loop = future.get_loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            apply()
+        else:
+            loop.call_soon_threadsafe(apply)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"waiting": len(self._waiters), "maxWaiters": self.max_waiters, "replied": self.replied, "timedOut": self.timed_out}
+
+    def clear(self) -> None:
+        with self._lock:
+            waiters = list(self._waiters.values())
+            self._waiters.clear()
+        for future in waiters:
+            future.cancel()
+
+
+# Singleton instance
+reply_waiters = ReplyWaiters.from_env()
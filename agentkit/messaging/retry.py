@@ -0,0 +1,100 @@
+import os
+import random
+from typing import Iterable, Optional
+
+# Retry configuration (see RetryPolicy.from_env)
+MAX_ATTEMPTS_ENV = "AGENTKIT_DISPATCH_MAX_ATTEMPTS"
+BASE_DELAY_ENV = "AGENTKIT_DISPATCH_RETRY_BASE_DELAY"
+MAX_DELAY_ENV = "AGENTKIT_DISPATCH_RETRY_MAX_DELAY"
+RETRY_STATUSES_ENV = "AGENTKIT_DISPATCH_RETRY_STATUSES"
+RETRY_TIMEOUTS_ENV = "AGENTKIT_DISPATCH_RETRY_TIMEOUTS"
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+# Statuses that mean the agent did not act on the request, so resending cannot duplicate work
+DEFAULT_RETRY_STATUSES = frozenset({408, 425, 429, 502, 503, 504})
+
+# Failure kinds reported by DeliveryError
+KIND_CONNECT = "connect"   # The request never reached the agent
+KIND_TIMEOUT = "timeout"   # The request may or may not have been processed
+KIND_DISCONNECT = "disconnect"   # The connection dropped mid-response; the request may or may not have been processed
+KIND_STATUS = "status"     # The agent answered with an error status
+KIND_ERROR = "error"       # Anything else (invalid URL, unexpected exception, ...)
+
+
+class DeliveryError(Exception):
+    """Raised by a delivery callback when a message could not be delivered."""
+
+    def __init__(self, message: str, kind: str = KIND_ERROR, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.kind = kind
+        self.status_code = status_code
+        self.retry_after = retry_after   # Delay requested by the agent (Retry-After header), if any
+
+
+class RetryPolicy:
+    """
+    Decides whether a failed delivery is retried, and after how long.
+
+    Only failures where resending cannot duplicate work are retried:
+    connection errors and the statuses in `retry_statuses`. Timeouts and
+    connections dropped mid-response may have been processed, so they are
+    retried only when `retry_timeouts` is on, for agents that tolerate
+    duplicates. Delays grow exponentially from
+    `base_delay` up to `max_delay` with full jitter, so agents recovering
+    from an outage are not hit by synchronized retry waves.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        retry_statuses: Iterable[int] = DEFAULT_RETRY_STATUSES,
+        retry_timeouts: bool = False,
+        rng: Optional[random.Random] = None,
+    ):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1.")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_timeouts = retry_timeouts
+        self._rng = rng or random.Random()
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        statuses = os.getenv(RETRY_STATUSES_ENV)
+        return cls(
+            max_attempts=int(os.getenv(MAX_ATTEMPTS_ENV, DEFAULT_MAX_ATTEMPTS)),
+            base_delay=float(os.getenv(BASE_DELAY_ENV, DEFAULT_BASE_DELAY)),
+            max_delay=float(os.getenv(MAX_DELAY_ENV, DEFAULT_MAX_DELAY)),
+            retry_statuses=DEFAULT_RETRY_STATUSES if statuses is None else {int(code) for code in statuses.split(",") if code.strip()},
+            retry_timeouts=os.getenv(RETRY_TIMEOUTS_ENV, "0").lower() in ("1", "true", "yes"),
+        )
+
+    def is_retryable(self, error: DeliveryError) -> bool:
+        if error.kind == KIND_CONNECT:
+            return True
+        if error.kind in (KIND_TIMEOUT, KIND_DISCONNECT):
+            return self.retry_timeouts
+        if error.kind == KIND_STATUS:
+            return error.status_code in self.retry_statuses
+        return False
+
+    def next_delay(self, attempts: int, error: Optional[DeliveryError] = None) -> Optional[float]:
+        """
+        Returns the delay before the next attempt, or None if the message should not be retried.
+
+        Args:
+            attempts: Number of deliveries attempted so far (1 after the first failure).
+            error: The failure of the last attempt.
+        """
+        if attempts >= self.max_attempts or (error is not None and not self.is_retryable(error)):
+            return None
+        delay = self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempts - 1)))
+        if error is not None and error.retry_after:
+            delay = max(delay, min(error.retry_after, self.max_delay))   # Honour the agent's Retry-After
+        return delay
@@ -0,0 +1,126 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence, Tuple
+import httpx
+from agentkit.core.compression import compression
+from agentkit.core.http_pool import host_pool_key
+from agentkit.core.models import AgentInfo
+
+MAX_ROUTES = 100_000
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+class DispatchRoute:
+    """
+    Everything a delivery needs to know about an agent's contact endpoint, parsed once.
+
+    `endpoint` is the URL as registered (used to tell whether the route is
+    still current); `url` is the parsed form handed to httpx, so the client
+    does not parse the string again for every message. `encoding` is the
+    content coding negotiated from the codings the agent declared it
+    accepts, or None to always send bodies uncompressed.
+    """
+    __slots__ = ("agent_id", "endpoint", "url", "host", "port", "pool_key", "headers", "accept_encoding", "encoding", "encoded_headers")
+
+    def __init__(self, agent_id: str, endpoint: str, accept_encoding: Sequence[str] = ()):
+        try:
+            url = httpx.URL(endpoint)
+        except httpx.InvalidURL as e:
+            raise ValueError(f"Invalid contact endpoint {endpoint!r}: {e}") from e
+        if url.scheme not in ("http", "https") or not url.host:
+            raise ValueError(f"Contact endpoint {endpoint!r} is not an absolute http(s) URL.")
+        self.agent_id = agent_id
+        self.endpoint = endpoint
+        self.url = url
+        self.host = url.host
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.pool_key = host_pool_key(url)
+        self.headers = JSON_HEADERS
+        self.accept_encoding = tuple(accept_encoding)
+        self.encoding = compression.choose(self.accept_encoding)
+        self.encoded_headers = {**JSON_HEADERS, "Content-Encoding": self.encoding} if self.encoding else JSON_HEADERS
+
+    def encode(self, body: bytes) -> Tuple[bytes, Dict[str, str]]:
+        """The request body and headers to send: compressed if the agent accepts it and the body is large enough."""
+        if self.encoding is None or len(body) < compression.min_size:
+            return body, self.headers
+        return compression.compress(body, self.encoding), self.encoded_headers
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"url": str(self.url), "host": self.host, "port": self.port, "poolKey": self.pool_key, "contentEncoding": self.encoding}
+
+
+def accepted_encodings(agent: AgentInfo) -> Tuple[str, ...]:
+    """The content codings an agent declared at registration (empty if none)."""
+    if agent.metadata is None or not agent.metadata.acceptEncoding:
+        return ()
+    return tuple(agent.metadata.acceptEncoding)
+
+
+class RouteCache:
+    """
+    Dispatch routes by agent ID.
+
+    Routes are built when an agent registers (or changes its contact
+    endpoint) and dropped when it deregisters. A lookup whose endpoint (or
+    declared content codings, when the caller knows them) no longer matches
+    the cached route rebuilds it, so an agent updated through another path
+    never gets a stale route. At most `max_routes` are kept; the least
+    recently used are dropped.
+    """
+
+    def __init__(self, max_routes: int = MAX_ROUTES):
+        self.max_routes = max_routes
+        self._routes: "OrderedDict[str, DispatchRoute]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def route(self, agent_id: str, endpoint: str, accept_encoding: Optional[Sequence[str]] = None) -> DispatchRoute:
+        """
+        Returns the route for an agent's contact endpoint.
+
+        `accept_encoding` is the agent's declared content codings; None
+        means the caller does not know them and keeps the cached route's.
+
+        Raises:
+            ValueError: If the endpoint is not a valid http(s) URL.
+        """
+        with self._lock:
+            route = self._routes.get(agent_id)
+            if route is not None and route.endpoint == endpoint and (accept_encoding is None or route.accept_encoding == tuple(accept_encoding)):
+                self._routes.move_to_end(agent_id)
+                return route
+        return self.update(agent_id, endpoint, accept_encoding or ())
+
+    def update(self, agent_id: str, endpoint: str, accept_encoding: Sequence[str] = ()) -> DispatchRoute:
+        """
+        (Re)builds an agent's route, e.g. on registration.
+
+        Raises:
+            ValueError: If the endpoint is not a valid http(s) URL.
+        """
+        route = DispatchRoute(agent_id, endpoint, accept_encoding)
+        with self._lock:
+            self._routes[agent_id] = route
+            self._routes.move_to_end(agent_id)
+            while len(self._routes) > self.max_routes:
+                self._routes.popitem(last=False)
+        return route
+
+    def get(self, agent_id: str) -> Optional[DispatchRoute]:
+        return self._routes.get(agent_id)
+
+    def forget(self, agent_id: str) -> None:
+        with self._lock:
+            self._routes.pop(agent_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+# Singleton instance
+dispatch_routes = RouteCache()
@@ -0,0 +1,208 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# Scheduler configuration (read by Dispatcher.from_env)
+QUANTUM_ENV = "AGENTKIT_DISPATCH_QUANTUM"                 # Messages a sender may send per round within a priority class
+SENDER_WEIGHTS_ENV = "AGENTKIT_DISPATCH_SENDER_WEIGHTS"   # "senderA=4,senderB=2": quantum multipliers
+AGING_ENV = "AGENTKIT_DISPATCH_AGING"                     # Seconds a lower class may go unserved before it is served anyway
+
+DEFAULT_QUANTUM = 1
+DEFAULT_AGING = 5.0
+
+PRIORITY_HIGH = "high"
+PRIORITY_NORMAL = "normal"
+PRIORITY_LOW = "low"
+PRIORITIES = (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)   # Strict order: earlier classes are served first
+
+Classifier = Callable[[Any], Tuple[str, str, int]]   # item -> (priority, sender, cost)
+
+
+class _Lane:
+    """One priority class: a FIFO per sender, served by deficit round robin."""
+    __slots__ = ("queues", "active", "deficits", "size", "enqueued", "served", "promoted", "last_served")
+
+    def __init__(self, now: float) -> None:
+        self.queues: Dict[str, Deque[Tuple[float, int, Any]]] = {}   # sender -> (enqueued_at, cost, item)
+        self.active: Deque[str] = deque()                            # Senders with queued items, in round-robin order
+        self.deficits: Dict[str, int] = {}
+        self.size = 0
+        self.enqueued = 0
+        self.served = 0
+        self.promoted = 0              # Served ahead of a higher class because it had waited too long
+        self.last_served = now         # Last time this lane was served, or became non-empty
+
+
+def parse_weights(spec: str) -> Dict[str, int]:
+    """
+    Parses "senderA=4,senderB=2" into sender weights.
+
+    Raises:
+        ValueError: If an entry is malformed or a weight is not a positive integer.
+    """
+    weights: Dict[str, int] = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        sender, sep, weight = entry.rpartition("=")
+        if not sep or not sender or not weight.isdigit() or int(weight) < 1:
+            raise ValueError(f"Invalid sender weight {entry!r}; expected sender=<positive integer>.")
+        weights[sender.strip()] = int(weight)
+    return weights
+
+
+class DispatchScheduler:
+    """
+    Queue in front of the dispatch workers with priority classes and per-sender fairness.
+
+    Items are sorted into strict priority classes (`PRIORITIES`): a worker
+    always takes from the highest class that has something waiting. Within
+    a class every sender has its own FIFO, and senders are served by
+    deficit round robin: each round a sender may send `quantum` messages
+    (times its weight in `weights`), so one sender flooding a class only
+    delays its own messages. A batch costs as many messages as it carries.
+
+    Strict priority alone would starve the lower classes under sustained
+    urgent traffic. With `aging` set, a non-empty class that has not been
+    served for `aging` seconds is served next regardless of its priority.
+
+    Has the subset of the asyncio.Queue interface the dispatcher uses; like
+    asyncio.Queue it must only be used from its event loop.
+    """
+
+    def __init__(
+        self,
+        classify: Classifier,
+        quantum: int = DEFAULT_QUANTUM,
+        weights: Optional[Dict[str, int]] = None,
+        aging: float = DEFAULT_AGING,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if quantum < 1:
+            raise ValueError("Scheduler quantum must be at least 1.")
+        self.classify = classify
+        self.quantum = quantum
+        self.weights = weights or {}
+        self.aging = aging
+        self._clock = clock
+        now = clock()
+        self._lanes: Dict[str, _Lane] = {priority: _Lane(now) for priority in PRIORITIES}
+        self._order: List[_Lane] = [self._lanes[priority] for priority in PRIORITIES]
+        self._size = 0
+        self._getters: Deque[asyncio.Future] = deque()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return not self._size
+
+    def put_nowait(self, item: Any) -> None:
+        priority, sender, cost = self.classify(item)
+        lane = self._lanes.get(priority) or self._lanes[PRIORITY_NORMAL]
+        queue = lane.queues.get(sender)
+        if queue is None:
+            queue = lane.queues[sender] = deque()
+            lane.active.append(sender)
+            lane.deficits[sender] = 0
+        now = self._clock()
+        if not lane.size:
+            lane.last_served = now # Aging counts from when the lane started waiting
+        queue.append((now, max(cost, 1), item))
+        lane.size += 1
+        lane.enqueued += 1
+        self._size += 1
+        self._wake_next()
+
+    def get_nowait(self) -> Any:
+        """
+        Removes and returns the next item.
+
+        Raises:
+            asyncio.QueueEmpty: If nothing is queued.
+        """
+        if not self._size:
+            raise asyncio.QueueEmpty
+        now = self._clock()
+        lane = self._aged_lane(now) or next(lane for lane in self._order if lane.size)
+        item = self._take(lane)
+        lane.last_served = now
+        self._size -= 1
+        return item
+
+    async def get(self) -> Any:
+        while not self._size:
+            getter = asyncio.get_running_loop().create_future()
+            self._getters.append(getter)
+            try:
+                await getter
+            except BaseException:
+                getter.cancel()
+                if self._size and not getter.cancelled():
+                    self._wake_next() # We were woken for an item we won't take; pass it on
+                raise
+        return self.get_nowait()
+
+    def _wake_next(self) -> None:
+        while self._getters:
+            getter = self._getters.popleft()
+            if not getter.done():
+                getter.set_result(None)
+                return
+
+    def _aged_lane(self, now: float) -> Optional[_Lane]:
+        """The lowest-priority waiting lane that has gone unserved for longer than `aging`, if any."""
+        if self.aging <= 0:
+            return None
+        first = True
+        aged = None
+        for lane in self._order:
+            if not lane.size:
+                continue
+            if first:
+                first = False # The highest waiting class is served anyway
+                continue
+            if now - lane.last_served >= self.aging:
+                aged = lane
+        if aged is not None:
+            aged.promoted += 1
+        return aged
+
+    def _take(self, lane: _Lane) -> Any:
+        # Deficit round robin: the sender at the head of the rotation sends while its deficit covers the cost
+        while True:
+            sender = lane.active[0]
+            queue = lane.queues[sender]
+            cost = queue[0][1]
+            if lane.deficits[sender] >= cost:
+                break
+            lane.deficits[sender] += self.quantum * self.weights.get(sender, 1)
+            if lane.deficits[sender] < cost:
+                lane.active.rotate(-1)
+        lane.deficits[sender] -= cost
+        _, _, item = queue.popleft()
+        lane.size -= 1
+        lane.served += 1
+        if not queue:
+            # An idle sender keeps no state (and no banked deficit)
+            del lane.queues[sender]
+            del lane.deficits[sender]
+            lane.active.popleft()
+        elif lane.deficits[sender] < queue[0][1]:
+            lane.active.rotate(-1)
+        return item
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-class queue metrics."""
+        now = self._clock()
+        lanes = {}
+        for priority, lane in self._lanes.items():
+            oldest = min((queue[0][0] for queue in lane.queues.values()), default=None)
+            lanes[priority] = {
+                "depth": lane.size,
+                "senders": len(lane.queues),
+                "enqueued": lane.enqueued,
+                "served": lane.served,
+                "promoted": lane.promoted,
+                "oldestWaitMs": 0.0 if oldest is None else round((now - oldest) * 1000, 3),
+            }
+        return {"quantum": self.quantum, "agingSeconds": self.aging, "lanes": lanes}
@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from agentkit.core.models import MessagePayload
+
+# Task store configuration
+TASK_STORE_SIZE_ENV = "AGENTKIT_TASK_STORE_SIZE"
+DEFAULT_TASK_STORE_SIZE = 100_000
+
+# Task lifecycle states
+STATUS_QUEUED = "queued"           # Accepted, waiting for a dispatch worker
+STATUS_DISPATCHED = "dispatched"   # A delivery attempt is in progress
+STATUS_RETRYING = "retrying"       # An attempt failed; waiting for the next one
+STATUS_DELIVERED = "delivered"     # The agent accepted the message
+STATUS_FAILED = "failed"           # Given up on; the message is in the dead-letter store
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return None if timestamp is None else datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+class TaskRecord:
+    """Lifecycle of one message accepted by /run. Timestamps are Unix epoch seconds."""
+    __slots__ = (
+        "task_id", "agent_id", "sender_id", "message_type", "opscore_task_id", "opscore_session_id",
+        "status", "attempts", "queued_at", "dispatched_at", "delivered_at", "failed_at", "error",
+        "replied_at", "reply",
+    )
+
+    def __init__(self, task_id: str, agent_id: str, payload: MessagePayload, now: float):
+        self.task_id = task_id
+        self.agent_id = agent_id
+        self.sender_id = payload.senderId
+        self.message_type = payload.messageType
+        self.opscore_task_id = payload.opscore_task_id
+        self.opscore_session_id = payload.opscore_session_id
+        self.attempts = 0
+        self.queue(now)
+
+    def queue(self, now: float) -> None:
+        """(Re)starts the lifecycle, e.g. when a dead letter is replayed."""
+        self.status = STATUS_QUEUED
+        self.queued_at = now
+        self.dispatched_at = self.delivered_at = self.failed_at = self.replied_at = None
+        self.error = None
+        self.reply = None
+
+    def dispatched(self, now: float) -> None:
+        self.status = STATUS_DISPATCHED
+        self.attempts += 1
+        self.dispatched_at = now
+
+    def retrying(self, error: str) -> None:
+        self.status = STATUS_RETRYING
+        self.error = error
+
+    def delivered(self, now: float) -> None:
+        self.status = STATUS_DELIVERED
+        self.delivered_at = now
+        self.error = None
+
+    def failed(self, now: float, error: str) -> None:
+        self.status = STATUS_FAILED
+        self.failed_at = now
+        self.error = error
+
+    def replied(self, now: float, reply: Dict[str, Any]) -> None:
+        """Keeps the agent's reply (posted to /tasks/{id}/reply) for callers that stopped waiting."""
+        self.replied_at = now
+        self.reply = reply
+
+    def to_dict(self) -> Dict[str, Any]:
+        finished_at = self.delivered_at if self.delivered_at is not None else self.failed_at
+        return {
+            "taskId": self.task_id,
+            "agentId": self.agent_id,
+            "senderId": self.sender_id,
+            "messageType": self.message_type,
+            "opscore_task_id": self.opscore_task_id,
+            "opscore_session_id": self.opscore_session_id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "queuedAt": _iso(self.queued_at),
+            "dispatchedAt": _iso(self.dispatched_at),
+            "deliveredAt": _iso(self.delivered_at),
+            "failedAt": _iso(self.failed_at),
+            "error": self.error,
+            "repliedAt": _iso(self.replied_at),
+            "reply": self.reply,
+            "queueSeconds": None if self.dispatched_at is None else round(self.dispatched_at - self.queued_at, 6),
+            "totalSeconds": None if finished_at is None else round(finished_at - self.queued_at, 6),
+        }
+
+
+class TaskStore:
+    """
+    Fixed-capacity ring buffer of task records.
+
+    The newest `capacity` tasks are retained; adding a task beyond that
+    overwrites the oldest slot and drops the evicted task from every index,
+    so memory stays bounded no matter how many messages pass through.
+    Besides the task ID, tasks can be looked up by the Ops-Core correlation
+    IDs carried in the message (several tasks may share them).
+    """
+
+    def __init__(self, capacity: int = DEFAULT_TASK_STORE_SIZE, clock=time.time):
+        if capacity < 1:
+            raise ValueError("Task store capacity must be at least 1.")
+        self.capacity = capacity
+        self.evicted = 0
+        self._clock = clock
+        self._ring: List[Optional[TaskRecord]] = [None] * capacity
+        self._next = 0                                              # Slot the next new task is written to
+        self._by_id: Dict[str, TaskRecord] = {}
+        self._by_opscore_task: Dict[str, Dict[str, None]] = {}      # opscore_task_id -> task IDs (ordered set)
+        self._by_opscore_session: Dict[str, Dict[str, None]] = {}   # opscore_session_id -> task IDs (ordered set)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def now(self) -> float:
+        return self._clock()
+
+    def add(self, agent_id: str, payload: MessagePayload, task_id: Optional[str] = None) -> TaskRecord:
+        """
+        Records a newly accepted message.
+
+        Args:
+            task_id: Reuse this ID (replays). If the task is still retained it
+                     is restarted in place instead of taking a new slot.
+        """
+        now = self._clock()
+        with self._lock:
+            if task_id is not None:
+                record = self._by_id.get(task_id)
+                if record is not None:
+                    record.queue(now)
+                    return record
+            record = TaskRecord(task_id or str(uuid.uuid4()), agent_id, payload, now)
+            old = self._ring[self._next]
+            if old is not None:
+                self._unindex(old)
+                self.evicted += 1
+            self._ring[self._next] = record
+            self._next = (self._next + 1) % self.capacity
+            self._by_id[record.task_id] = record
+            if record.opscore_task_id is not None:
+                self._by_opscore_task.setdefault(record.opscore_task_id, {})[record.task_id] = None
+            if record.opscore_session_id is not None:
+                self._by_opscore_session.setdefault(record.opscore_session_id, {})[record.task_id] = None
+            return record
+
+    def _unindex(self, record: TaskRecord) -> None:
+        del self._by_id[record.task_id]
+        for index, key in ((self._by_opscore_task, record.opscore_task_id), (self._by_opscore_session, record.opscore_session_id)):
+            if key is None:
+                continue
+            task_ids = index.get(key)
+            if task_ids is not None:
+                task_ids.pop(record.task_id, None)
+                if not task_ids:
+                    del index[key]
+
+    def get(self, task_id: str) -> Optional[TaskRecord]:
+        return self._by_id.get(task_id)
+
+    def find(self, opscore_task_id: Optional[str] = None, opscore_session_id: Optional[str] = None, limit: Optional[int] = None) -> List[TaskRecord]:
+        """
+        Returns the retained tasks matching the given Ops-Core correlation IDs, oldest first.
+
+        Raises:
+            ValueError: If neither ID is given.
+        """
+        if opscore_task_id is None and opscore_session_id is None:
+            raise ValueError("Provide opscore_task_id and/or opscore_session_id.")
+        with self._lock:
+            candidates = [
+                set(index.get(key, ())) for index, key in
+                ((self._by_opscore_task, opscore_task_id), (self._by_opscore_session, opscore_session_id))
+                if key is not None
+            ]
+            order = self._by_opscore_task.get(opscore_task_id) if opscore_task_id is not None else self._by_opscore_session.get(opscore_session_id)
+            matches = set.intersection(*candidates)
+            records = [self._by_id[task_id] for task_id in (order or ()) if task_id in matches]
+        return records if limit is None else records[:limit]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ring = [None] * self.capacity
+            self._next = 0
+            self._by_id.clear()
+            self._by_opscore_task.clear()
+            self._by_opscore_session.clear()
+            self.evicted = 0
+
+
+def task_store_size_from_env() -> int:
+    return int(os.getenv(TASK_STORE_SIZE_ENV, DEFAULT_TASK_STORE_SIZE))
+
+
+# Singleton instance
+task_store = TaskStore(task_store_size_from_env())
@@ -0,0 +1,611 @@
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+from agentkit.core.models import AgentInfo
+from agentkit.registration.records import AgentRecord
+
+logger = logging.getLogger(__name__)
+
+# Backend selection (see create_backend_from_env)
+STORAGE_BACKEND_ENV = "AGENTKIT_STORAGE_BACKEND"   # "memory" (default) or "sqlite"
+SQLITE_PATH_ENV = "AGENTKIT_SQLITE_PATH"
+DEFAULT_SQLITE_PATH = "agentkit_registry.db"
+DEFAULT_READ_CACHE_SIZE = 10_000
+
+
+class StorageBackend(ABC):
+    """
+    Interface implemented by every agent registry backend.
+
+    Backends enforce uniqueness of agentId and agentName themselves so that
+    the check and the insert are atomic, which matters once several
+    processes share one registry.
+
+    `persistent` backends keep the registry across restarts on their own,
+    so they must not be combined with a RegistryJournal.
+    """
+    persistent = False
+
+    @abstractmethod
+    def add(self, agent_info: AgentInfo) -> None:
+        """
+        Stores a new agent.
+
+        Raises:
+            ValueError: If an agent with the same agentId or agentName already exists.
+        """
+
+    def add_many(self, agent_infos: List[AgentInfo]) -> List[Optional[str]]:
+        """
+        Stores several new agents, skipping the ones that conflict.
+
+        Returns:
+            One entry per agent, in order: None if it was stored, otherwise
+            the conflict message `add` would have raised.
+        """
+        errors: List[Optional[str]] = []
+        for agent_info in agent_infos:
+            try:
+                self.add(agent_info)
+                errors.append(None)
+            except ValueError as e:
+                errors.append(str(e))
+        return errors
+
+    @abstractmethod
+    def update(self, agent_info: AgentInfo) -> AgentInfo:
+        """
+        Replaces the stored record of an existing agent, returning the previous record.
+
+        Raises:
+            KeyError: If no agent with that agentId is registered.
+            ValueError: If the new agentName is already used by another agent.
+        """
+
+    @abstractmethod
+    def remove(self, agent_id: str) -> Optional[AgentInfo]:
+        """Removes an agent, returning it if it was registered."""
+
+    @abstractmethod
+    def get(self, agent_id: str) -> Optional[AgentInfo]:
+        """Returns the agent with the given ID, or None."""
+
+    @abstractmethod
+    def get_by_name(self, agent_name: str) -> Optional[AgentInfo]:
+        """Returns the agent with the given name, or None."""
+
+    @abstractmethod
+    def query(
+        self,
+        capability: Optional[str] = None,
+        version: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[AgentInfo]:
+        """
+        Returns agents matching the filters in agentId order.
+
+        Args:
+            capability: Only return agents advertising this capability.
+            version: Only return agents with this exact version.
+            after: Only return agents whose agentId sorts strictly after this value.
+            limit: Maximum number of agents to return (None for no limit).
+        """
+
+    @abstractmethod
+    def list_all(self) -> List[AgentInfo]:
+        """Returns every registered agent."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Removes every agent."""
+
+    def get_record(self, agent_id: str) -> Optional[AgentRecord]:
+        """
+        Returns the stored AgentRecord of an agent if the backend keeps one in
+        memory (records are never mutated, so callers may share it), else None.
+        """
+        return None
+
+    def export_records(self) -> List[AgentRecord]:
+        """Returns compact records of every agent (used for persistence snapshots)."""
+        return [AgentRecord.from_agent_info(agent_info) for agent_info in self.list_all()]
+
+    def restore(self, records: Iterable[AgentRecord]) -> None:
+        """Loads previously persisted records into an empty backend."""
+        for record in records:
+            self.add(record.to_agent_info())
+
+    def close(self) -> None:
+        """Releases any resources held by the backend."""
+
+
+# --- In-Memory Backend ---
+
+class _IdIndex:
+    """
+    A set of agent IDs that can also be walked in sorted order.
+
+    Adds and removes are O(1): they are buffered and only merged into the
+    sorted list when a query needs it (one linear merge per batch of
+    changes), so registration storms and restores never pay for an O(n)
+    sorted insert. Resuming from a cursor is a binary search, which gives
+    stable pagination even while agents are being added or removed.
+    """
+    __slots__ = ("_members", "_sorted", "_pending_add", "_pending_remove")
+
+    def __init__(self) -> None:
+        self._members: Set[str] = set()
+        self._sorted: List[str] = []
+        self._pending_add: Set[str] = set()      # In _members but not yet in _sorted
+        self._pending_remove: Set[str] = set()   # Still in _sorted but no longer in _members
+
+    @classmethod
+    def from_ids(cls, agent_ids: Iterable[str]) -> "_IdIndex":
+        """Builds an index from many IDs at once (one sort instead of per-ID bookkeeping)."""
+        index = cls()
+        index._members = set(agent_ids)
+        index._sorted = sorted(index._members)
+        return index
+
+    def add(self, agent_id: str) -> None:
+        if agent_id in self._members:
+            return
+        self._members.add(agent_id)
+        if agent_id in self._pending_remove:
+            self._pending_remove.discard(agent_id)
+        else:
+            self._pending_add.add(agent_id)
+
+    def discard(self, agent_id: str) -> None:
+        if agent_id not in self._members:
+            return
+        self._members.discard(agent_id)
+        if agent_id in self._pending_add:
+            self._pending_add.discard(agent_id)
+        else:
+            self._pending_remove.add(agent_id)
+
+    def _flush(self) -> None:
+        """Merges buffered changes into the sorted list."""
+        if self._pending_remove:
+            removed = self._pending_remove
+            self._sorted = [agent_id for agent_id in self._sorted if agent_id not in removed]
+            self._pending_remove = set()
+        if self._pending_add:
+            self._sorted.extend(sorted(self._pending_add))
+            self._sorted.sort() # Two sorted runs: timsort merges them in linear time
+            self._pending_add = set()
+
+    def iter_after(self, cursor: Optional[str]) -> Iterable[str]:
+        """Yields IDs in sorted order, starting strictly after `cursor`."""
+        self._flush()
+        ids = self._sorted
+        start = bisect_right(ids, cursor) if cursor is not None else 0
+        for i in range(start, len(ids)):
+            yield ids[i]
+
+    def clear(self) -> None:
+        self._members.clear()
+        self._sorted.clear()
+        self._pending_add.clear()
+        self._pending_remove.clear()
+
+    def __contains__(self, agent_id: object) -> bool:
+        return agent_id in self._members
+
+    def __iter__(self):
+        return self.iter_after(None)
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+
+def _index_into(index: Dict[str, _IdIndex], key: str, agent_id: str) -> None:
+    """Adds agent_id to index[key], creating the bucket on first use."""
+    agent_ids = index.get(key)
+    if agent_ids is None:
+        agent_ids = index[key] = _IdIndex()
+    agent_ids.add(agent_id)
+
+
+def _discard_from(index: Dict[str, _IdIndex], key: str, agent_id: str) -> None:
+    """Removes agent_id from index[key], dropping the bucket once it is empty."""
+    agent_ids = index.get(key)
+    if agent_ids is not None:
+        agent_ids.discard(agent_id)
+        if not agent_ids:
+            del index[key]
+
+
+class InMemoryBackend(StorageBackend):
+    """
+    Process-local registry backed by dicts.
+
+    Agents are held as compact AgentRecord objects and only materialized
+    as AgentInfo when they are returned. Secondary indexes are kept
+    consistent with the primary dict on every add/remove/clear. They turn
+    name lookups and capability searches into dict hits instead of full scans.
+    """
+
+    def __init__(self) -> None:
+        self._agents: Dict[str, AgentRecord] = {}
+        self._name_index: Dict[str, str] = {}              # agentName -> agentId
+        self._id_index = _IdIndex()                        # all agentIds, sorted (pagination order)
+        self._capability_index: Dict[str, _IdIndex] = {}   # capability -> {agentId, ...}
+        self._version_index: Dict[str, _IdIndex] = {}      # version -> {agentId, ...}
+
+    def _insert(self, record: AgentRecord) -> None:
+        if record.agent_id in self._agents:
+            raise ValueError(f"Agent with ID {record.agent_id} already registered.")
+        if record.name in self._name_index:
+            raise ValueError(f"Agent with name '{record.name}' already registered.")
+
+        self._agents[record.agent_id] = record
+        self._name_index[record.name] = record.agent_id
+        self._id_index.add(record.agent_id)
+        for capability in record.capabilities:
+            _index_into(self._capability_index, capability, record.agent_id)
+        _index_into(self._version_index, record.version, record.agent_id)
+
+    def _delete(self, agent_id: str) -> Optional[AgentRecord]:
+        record = self._agents.pop(agent_id, None)
+        if record is None:
+            return None
+
+        if self._name_index.get(record.name) == agent_id:
+            del self._name_index[record.name]
+        self._id_index.discard(agent_id)
+        for capability in record.capabilities:
+            _discard_from(self._capability_index, capability, agent_id)
+        _discard_from(self._version_index, record.version, agent_id)
+        return record
+
+    def add(self, agent_info: AgentInfo) -> None:
+        self._insert(AgentRecord.from_agent_info(agent_info))
+
+    def update(self, agent_info: AgentInfo) -> AgentInfo:
+        previous = self._agents.get(agent_info.agentId)
+        if previous is None:
+            raise KeyError(agent_info.agentId)
+        owner = self._name_index.get(agent_info.agentName)
+        if owner is not None and owner != agent_info.agentId:
+            raise ValueError(f"Agent with name '{agent_info.agentName}' already registered.")
+        record = AgentRecord.from_agent_info(agent_info)
+        self._delete(agent_info.agentId)
+        self._insert(record)
+        return previous.to_agent_info()
+
+    def remove(self, agent_id: str) -> Optional[AgentInfo]:
+        record = self._delete(agent_id)
+        return record.to_agent_info() if record is not None else None
+
+    def get(self, agent_id: str) -> Optional[AgentInfo]:
+        record = self._agents.get(agent_id)
+        return record.to_agent_info() if record is not None else None
+
+    def get_by_name(self, agent_name: str) -> Optional[AgentInfo]:
+        agent_id = self._name_index.get(agent_name)
+        if agent_id is None:
+            return None
+        return self.get(agent_id)
+
+    def query(
+        self,
+        capability: Optional[str] = None,
+        version: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[AgentInfo]:
+        # The smallest matching index drives the scan; the others are checked
+        # by set membership, so the cost tracks the page size, not the registry size.
+        indexes: List[_IdIndex] = []
+        if capability is not None:
+            indexes.append(self._capability_index.get(capability) or _IdIndex())
+        if version is not None:
+            indexes.append(self._version_index.get(version) or _IdIndex())
+        if not indexes:
+            indexes.append(self._id_index)
+        indexes.sort(key=len)
+        driver, filters = indexes[0], indexes[1:]
+
+        results: List[AgentInfo] = []
+        for agent_id in driver.iter_after(after):
+            if limit is not None and len(results) >= limit:
+                break
+            if all(agent_id in index for index in filters):
+                results.append(self._agents[agent_id].to_agent_info())
+        return results
+
+    def list_all(self) -> List[AgentInfo]:
+        return [record.to_agent_info() for record in self._agents.values()]
+
+    def get_record(self, agent_id: str) -> Optional[AgentRecord]:
+        return self._agents.get(agent_id)
+
+    def export_records(self) -> List[AgentRecord]:
+        # Records are replaced rather than mutated, so a shallow copy is a consistent snapshot
+        return list(self._agents.values())
+
+    def restore(self, records: Iterable[AgentRecord]) -> None:
+        if self._agents:
+            for record in records:
+                self._insert(record)
+            return
+
+        # Bulk path for startup: group IDs per index key, then build each index once
+        capability_ids: Dict[str, List[str]] = {}
+        version_ids: Dict[str, List[str]] = {}
+        for record in records:
+            if record.agent_id in self._agents or record.name in self._name_index:
+                raise ValueError(f"Duplicate agent '{record.name}' (ID: {record.agent_id}) in restored records.")
+            self._agents[record.agent_id] = record
+            self._name_index[record.name] = record.agent_id
+            for capability in record.capabilities:
+                capability_ids.setdefault(capability, []).append(record.agent_id)
+            version_ids.setdefault(record.version, []).append(record.agent_id)
+
+        self._id_index = _IdIndex.from_ids(self._agents)
+        self._capability_index = {key: _IdIndex.from_ids(ids) for key, ids in capability_ids.items()}
+        self._version_index = {key: _IdIndex.from_ids(ids) for key, ids in version_ids.items()}
+
+    def clear(self) -> None:
+        self._agents.clear()
+        self._name_index.clear()
+        self._id_index.clear()
+        self._capability_index.clear()
+        self._version_index.clear()
+
+
+# --- SQLite Backend ---
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agents (
+    agent_id   TEXT PRIMARY KEY,
+    agent_name TEXT NOT NULL UNIQUE,
+    version    TEXT NOT NULL,
+    record     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_agents_version ON agents (version, agent_id);
+CREATE TABLE IF NOT EXISTS agent_capabilities (
+    capability TEXT NOT NULL,
+    agent_id   TEXT NOT NULL REFERENCES agents (agent_id) ON DELETE CASCADE,
+    PRIMARY KEY (capability, agent_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS registry_meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO registry_meta (key, value) VALUES ('change_counter', 0);
+"""
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Registry stored in a SQLite database in WAL mode.
+
+    Every worker process opens the same database file, so an agent
+    registered through one uvicorn worker is visible to all the others.
+    WAL lets readers proceed while a writer commits.
+
+    Reads are served from a bounded in-process cache. Every write bumps a
+    change counter in the same transaction; before using the cache, the
+    backend compares that counter with the value the cache was filled
+    under and drops the cache if any process has written since.
+    """
+    persistent = True
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH, cache_size: int = DEFAULT_READ_CACHE_SIZE) -> None:
+        self.path = path
+        self._cache_size = cache_size
+        self._lock = threading.RLock()
+        # isolation_level=None: transactions are managed explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        with self._lock:
+            self._conn.executescript(_SQLITE_SCHEMA)
+
+        self._cache: "OrderedDict[str, AgentInfo]" = OrderedDict()   # agentId -> AgentInfo
+        self._name_cache: Dict[str, str] = {}                         # agentName -> agentId
+        self._cache_counter = -1
+
+    # -- Helpers --
+
+    def _change_counter(self) -> int:
+        row = self._conn.execute("SELECT value FROM registry_meta WHERE key = 'change_counter'").fetchone()
+        return row[0]
+
+    def _sync_cache(self) -> None:
+        """Drops the read cache if the registry changed since it was filled."""
+        counter = self._change_counter()
+        if counter != self._cache_counter:
+            self._cache.clear()
+            self._name_cache.clear()
+            self._cache_counter = counter
+
+    def _cache_put(self, agent_info: AgentInfo) -> None:
+        self._cache[agent_info.agentId] = agent_info
+        self._name_cache[agent_info.agentName] = agent_info.agentId
+        if len(self._cache) > self._cache_size:
+            _, evicted = self._cache.popitem(last=False)
+            self._name_cache.pop(evicted.agentName, None)
+
+    @staticmethod
+    def _decode(record: str) -> AgentInfo:
+        return AgentInfo.model_validate_json(record)
+
+    def _write(self, statements) -> None:
+        """Runs `statements(conn)` in an immediate transaction and bumps the change counter."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                statements(self._conn)
+                self._conn.execute("UPDATE registry_meta SET value = value + 1 WHERE key = 'change_counter'")
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, agent_info: AgentInfo) -> None:
+        """Inserts one agent; raises ValueError before writing anything on a conflict."""
+        if conn.execute("SELECT 1 FROM agents WHERE agent_id = ?", (agent_info.agentId,)).fetchone():
+            raise ValueError(f"Agent with ID {agent_info.agentId} already registered.")
+        if conn.execute("SELECT 1 FROM agents WHERE agent_name = ?", (agent_info.agentName,)).fetchone():
+            raise ValueError(f"Agent with name '{agent_info.agentName}' already registered.")
+        conn.execute(
+            "INSERT INTO agents (agent_id, agent_name, version, record) VALUES (?, ?, ?, ?)",
+            (agent_info.agentId, agent_info.agentName, agent_info.version, agent_info.model_dump_json()),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO agent_capabilities (capability, agent_id) VALUES (?, ?)",
+            [(capability, agent_info.agentId) for capability in agent_info.capabilities],
+        )
+
+    # -- StorageBackend --
+
+    def add(self, agent_info: AgentInfo) -> None:
+        self._write(lambda conn: self._insert(conn, agent_info))
+
+    def add_many(self, agent_infos: List[AgentInfo]) -> List[Optional[str]]:
+        # One transaction (and one WAL commit) for the whole batch
+        errors: List[Optional[str]] = []
+
+        def insert_all(conn: sqlite3.Connection) -> None:
+            for agent_info in agent_infos:
+                try:
+                    self._insert(conn, agent_info)
+                    errors.append(None)
+                except ValueError as e:
+                    errors.append(str(e))
+        self._write(insert_all)
+        return errors
+
+    def update(self, agent_info: AgentInfo) -> AgentInfo:
+        previous: List[AgentInfo] = []
+
+        def replace(conn: sqlite3.Connection) -> None:
+            row = conn.execute("SELECT record FROM agents WHERE agent_id = ?", (agent_info.agentId,)).fetchone()
+            if row is None:
+                raise KeyError(agent_info.agentId)
+            owner = conn.execute("SELECT agent_id FROM agents WHERE agent_name = ?", (agent_info.agentName,)).fetchone()
+            if owner is not None and owner[0] != agent_info.agentId:
+                raise ValueError(f"Agent with name '{agent_info.agentName}' already registered.")
+            previous.append(self._decode(row[0]))
+            conn.execute(
+                "UPDATE agents SET agent_name = ?, version = ?, record = ? WHERE agent_id = ?",
+                (agent_info.agentName, agent_info.version, agent_info.model_dump_json(), agent_info.agentId),
+            )
+            conn.execute("DELETE FROM agent_capabilities WHERE agent_id = ?", (agent_info.agentId,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO agent_capabilities (capability, agent_id) VALUES (?, ?)",
+                [(capability, agent_info.agentId) for capability in agent_info.capabilities],
+            )
+        self._write(replace)
+        return previous[0]
+
+    def remove(self, agent_id: str) -> Optional[AgentInfo]:
+        removed: List[AgentInfo] = []
+
+        def delete(conn: sqlite3.Connection) -> None:
+            row = conn.execute("SELECT record FROM agents WHERE agent_id = ?", (agent_id,)).fetchone()
+            if row:
+                removed.append(self._decode(row[0]))
+                conn.execute("DELETE FROM agents WHERE agent_id = ?", (agent_id,))
+        self._write(delete)
+        return removed[0] if removed else None
+
+    def get(self, agent_id: str) -> Optional[AgentInfo]:
+        with self._lock:
+            self._sync_cache()
+            cached = self._cache.get(agent_id)
+            if cached is not None:
+                self._cache.move_to_end(agent_id)
+                return cached
+            row = self._conn.execute("SELECT record FROM agents WHERE agent_id = ?", (agent_id,)).fetchone()
+            if row is None:
+                return None
+            agent_info = self._decode(row[0])
+            self._cache_put(agent_info)
+            return agent_info
+
+    def get_by_name(self, agent_name: str) -> Optional[AgentInfo]:
+        with self._lock:
+            self._sync_cache()
+            agent_id = self._name_cache.get(agent_name)
+            if agent_id is not None and agent_id in self._cache:
+                return self._cache[agent_id]
+            row = self._conn.execute("SELECT record FROM agents WHERE agent_name = ?", (agent_name,)).fetchone()
+            if row is None:
+                return None
+            agent_info = self._decode(row[0])
+            self._cache_put(agent_info)
+            return agent_info
+
+    def query(
+        self,
+        capability: Optional[str] = None,
+        version: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[AgentInfo]:
+        if capability is not None:
+            sql = "SELECT a.record FROM agent_capabilities c JOIN agents a ON a.agent_id = c.agent_id WHERE c.capability = ?"
+            params: list = [capability]
+            id_column = "c.agent_id"
+        else:
+            sql = "SELECT a.record FROM agents a WHERE 1 = 1"
+            params = []
+            id_column = "a.agent_id"
+        if version is not None:
+            sql += " AND a.version = ?"
+            params.append(version)
+        if after is not None:
+            sql += f" AND {id_column} > ?"
+            params.append(after)
+        sql += f" ORDER BY {id_column}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._decode(row[0]) for row in rows]
+
+    def list_all(self) -> List[AgentInfo]:
+        with self._lock:
+            rows = self._conn.execute("SELECT record FROM agents").fetchall()
+        return [self._decode(row[0]) for row in rows]
+
+    def clear(self) -> None:
+        self._write(lambda conn: conn.execute("DELETE FROM agents"))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_backend_from_env() -> StorageBackend:
+    """
+    Builds the storage backend selected by AGENTKIT_STORAGE_BACKEND.
+
+    "memory" (the default) keeps the registry in the current process.
+    "sqlite" stores it in the database file named by AGENTKIT_SQLITE_PATH,
+    which lets several API worker processes share one registry.
+    """
+    backend_name = os.getenv(STORAGE_BACKEND_ENV, "memory").strip().lower()
+    if backend_name == "memory":
+        return InMemoryBackend()
+    if backend_name == "sqlite":
+        path = os.getenv(SQLITE_PATH_ENV, DEFAULT_SQLITE_PATH)
+        logger.info(f"Using SQLite agent registry at {path}")
+        return SQLiteBackend(path)
+    raise ValueError(f"Unknown {STORAGE_BACKEND_ENV} '{backend_name}'. Expected 'memory' or 'sqlite'.")
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import threading
+import uuid
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from agentkit.registration.records import AgentRecord
+
+# Change log configuration (see AgentStorage)
+CHANGE_LOG_SIZE_ENV = "AGENTKIT_CHANGE_LOG_SIZE"
+DEFAULT_CHANGE_LOG_SIZE = 100_000
+
+OP_REGISTER = "register"
+OP_UPDATE = "update"
+OP_REMOVE = "remove"
+
+
+class ChangeLogExpired(Exception):
+    """Raised when a cursor points before the oldest retained change (or into another epoch)."""
+
+
+class ChangeLog:
+    """
+    Bounded, sequence-numbered log of registry changes.
+
+    Every change gets the next sequence number. Only the newest `max_size`
+    changes are retained; a reader whose cursor has fallen behind that
+    window has to resynchronize from a snapshot. The log is identified by
+    a random epoch, so cursors from before a restart (or from another
+    registry) are recognized as stale rather than silently misapplied.
+
+    Writers may run on any thread; async readers can wait for the next
+    change with `wait`.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CHANGE_LOG_SIZE):
+        self.epoch = uuid.uuid4().hex
+        self._changes: Deque[Tuple[int, str, str, Optional[AgentRecord]]] = deque(maxlen=max_size)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the newest change (0 before the first one)."""
+        return self._seq
+
+    def append(self, op: str, agent_id: str, record: Optional[AgentRecord] = None) -> int:
+        with self._lock:
+            self._seq += 1
+            self._changes.append((self._seq, op, agent_id, record))
+            waiters, self._waiters = self._waiters, []
+        _wake(waiters)
+        return self._seq
+
+    def reset(self) -> None:
+        """Drops all retained changes; every existing cursor now requires a resync."""
+        with self._lock:
+            self._seq += 1
+            self._changes.clear()
+            waiters, self._waiters = self._waiters, []
+        _wake(waiters)
+
+    def since(self, seq: int, limit: int, epoch: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Returns up to `limit` changes newer than `seq`, oldest first.
+
+        Returns:
+            (changes, cursor): cursor is the seq to pass as `since` next time.
+
+        Raises:
+            ChangeLogExpired: If changes after `seq` are no longer retained,
+                              `seq` is ahead of the log, or `epoch` does not match.
+        """
+        with self._lock:
+            if (epoch is not None and epoch != self.epoch) or seq > self._seq:
+                raise ChangeLogExpired(f"Cursor {seq} does not belong to this change log.")
+            oldest = self._changes[0][0] if self._changes else self._seq + 1
+            if seq < oldest - 1:
+                raise ChangeLogExpired(f"Changes after {seq} are no longer retained (oldest is {oldest}).")
+            # Sequence numbers are contiguous within the deque, so the start position is computed directly
+            start = seq - oldest + 1
+            entries = list(islice(self._changes, start, start + limit))
+        changes = [
+            {
+                "seq": change_seq,
+                "op": op,
+                "agentId": agent_id,
+                "agent": record.to_agent_info().model_dump(mode='json') if record is not None else None,
+            }
+            for change_seq, op, agent_id, record in entries
+        ]
+        return changes, (entries[-1][0] if entries else seq)
+
+    async def wait(self, seq: int, timeout: float) -> bool:
+        """
+        Waits until a change newer than `seq` exists or `timeout` seconds pass.
+
+        Returns:
+            True if there are changes after `seq`.
+        """
+        if self._seq > seq or timeout <= 0:
+            return self._seq > seq
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._seq > seq:
+                return True
+            self._waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # Also on cancellation (the long-polling client disconnected), so abandoned waiters do not pile up
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+        return self._seq > seq
+
+
+def _wake(waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]) -> None:
+    for loop, future in waiters:
+        try:
+            loop.call_soon_threadsafe(_resolve, future)
+        except RuntimeError:
+            pass # The waiting loop has already been closed
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def change_log_size_from_env() -> int:
+    return int(os.getenv(CHANGE_LOG_SIZE_ENV, DEFAULT_CHANGE_LOG_SIZE))
@@ -0,0 +1,194 @@
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Lease configuration (see AgentStorage)
+LEASE_TTL_ENV = "AGENTKIT_LEASE_TTL"             # Default lease in seconds; 0 disables leases
+LEASE_TICK_ENV = "AGENTKIT_LEASE_TICK"           # Timer wheel resolution in seconds
+DEFAULT_LEASE_TICK = 1.0
+
+
+class TimerWheel:
+    """
+    Hierarchical timer wheel.
+
+    Level 0 has one slot per tick; every higher level has slots covering a
+    whole revolution of the level below it. A timer is placed on the lowest
+    level whose span covers its deadline. When a lower level completes a
+    revolution, the next slot of the level above is cascaded down, so each
+    timer moves at most once per level and advancing one tick only touches
+    the timers that are actually due (O(1) per tick, independent of the
+    number of timers).
+
+    Timers cannot be cancelled; callers keep the authoritative deadline
+    elsewhere and ignore or reschedule stale timers when they fire.
+    """
+
+    def __init__(self, tick: float = DEFAULT_LEASE_TICK, slots: int = 256, levels: int = 4, start: float = 0.0):
+        self.tick = tick
+        self._slots = slots
+        self._levels = levels
+        self._spans = [slots ** level for level in range(levels)]   # Ticks covered by one slot of each level
+        self._wheels: List[List[List[Tuple[Hashable, int]]]] = [[[] for _ in range(slots)] for _ in range(levels)]
+        self._current = int(start // tick)                           # Last tick processed
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """Schedules `key` to fire once the clock reaches `deadline` (seconds)."""
+        self._place(key, max(math.ceil(deadline / self.tick), self._current + 1))
+        self._count += 1
+
+    def _place(self, key: Hashable, when: int) -> None:
+        delta = when - self._current
+        level = 0
+        while level < self._levels - 1 and delta >= self._spans[level + 1]:
+            level += 1
+        slot = (when // self._spans[level]) % self._slots
+        self._wheels[level][slot].append((key, when))
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Advances the wheel to `now` and returns the keys whose deadline has passed."""
+        target = int(now // self.tick)
+        fired: List[Hashable] = []
+        while self._current < target:
+            self._current += 1
+            tick = self._current
+            # Cascade higher levels first: their timers may be due in this very tick
+            for level in range(1, self._levels):
+                if tick % self._spans[level]:
+                    break
+                slot = (tick // self._spans[level]) % self._slots
+                bucket, self._wheels[level][slot] = self._wheels[level][slot], []
+                for key, when in bucket:
+                    self._place(key, max(when, tick))
+            slot = tick % self._slots
+            bucket, self._wheels[0][slot] = self._wheels[0][slot], []
+            for key, when in bucket:
+                if when <= tick:
+                    fired.append(key)
+                    self._count -= 1
+                else:
+                    self._place(key, when)   # A wrapped top-level timer from a later revolution
+        return fired
+
+    def clear(self) -> None:
+        for wheel in self._wheels:
+            for slot in wheel:
+                slot.clear()
+        self._count = 0
+
+
+class LeaseTable:
+    """
+    Tracks lease expiry for registered agents.
+
+    The authoritative expiry of each lease lives in a dict, so renewing a
+    lease is a single assignment. The timer wheel only holds a wake-up for
+    the earliest deadline scheduled per agent; when it fires, the lease is
+    either expired or rescheduled for its renewed deadline.
+    """
+
+    def __init__(self, tick: float = DEFAULT_LEASE_TICK, clock: Callable[[], float] = time.monotonic):
+        self.tick = tick
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._expires: Dict[str, float] = {}     # agentId -> expiry time
+        self._ttls: Dict[str, float] = {}        # agentId -> lease length, reused by renewals that give none
+        self._scheduled: Dict[str, float] = {}   # agentId -> deadline of its pending wheel timer
+        self._wheel = TimerWheel(tick=tick, start=clock())
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def __contains__(self, agent_id: object) -> bool:
+        return agent_id in self._expires
+
+    def _set(self, agent_id: str, expires_at: float) -> None:
+        self._expires[agent_id] = expires_at
+        scheduled = self._scheduled.get(agent_id)
+        if scheduled is None or expires_at < scheduled:
+            self._wheel.schedule(agent_id, expires_at)
+            self._scheduled[agent_id] = expires_at
+
+    def grant(self, agent_ids: Iterable[str], ttl: float) -> float:
+        """Starts (or restarts) leases of `ttl` seconds; returns the expiry time."""
+        with self._lock:
+            expires_at = self._clock() + ttl
+            for agent_id in agent_ids:
+                self._set(agent_id, expires_at)
+                self._ttls[agent_id] = ttl
+            return expires_at
+
+    def renew(self, agent_ids: Iterable[str], ttl: Optional[float] = None) -> Tuple[List[str], List[str]]:
+        """
+        Extends the leases of `agent_ids` by `ttl` seconds from now (by default, each lease's current length).
+
+        Returns:
+            (renewed, unknown): agents without a lease are not granted one.
+        """
+        renewed, unknown = [], []
+        with self._lock:
+            now = self._clock()
+            for agent_id in agent_ids:
+                if agent_id in self._expires:
+                    if ttl is not None:
+                        self._ttls[agent_id] = ttl
+                    self._set(agent_id, now + self._ttls[agent_id])
+                    renewed.append(agent_id)
+                else:
+                    unknown.append(agent_id)
+        return renewed, unknown
+
+    def expires_in(self, agent_id: str) -> Optional[float]:
+        """Returns the seconds left on an agent's lease, or None if it has none."""
+        expires_at = self._expires.get(agent_id)
+        return None if expires_at is None else max(0.0, expires_at - self._clock())
+
+    def release(self, agent_id: str) -> None:
+        """Forgets an agent's lease (its pending timer is ignored when it fires)."""
+        with self._lock:
+            self._expires.pop(agent_id, None)
+            self._ttls.pop(agent_id, None)
+
+    def pop_expired(self) -> List[str]:
+        """Advances the wheel to now and returns (and forgets) the agents whose lease ran out."""
+        expired = []
+        with self._lock:
+            now = self._clock()
+            for agent_id in self._wheel.advance(now):
+                scheduled = self._scheduled.get(agent_id)
+                if scheduled is not None and scheduled > now:
+                    continue                              # Superseded timer; a later one is pending
+                self._scheduled.pop(agent_id, None)
+                expires_at = self._expires.get(agent_id)
+                if expires_at is None:
+                    continue                              # Released since the timer was set
+                if expires_at <= now:
+                    del self._expires[agent_id]
+                    self._ttls.pop(agent_id, None)
+                    expired.append(agent_id)
+                else:
+                    self._wheel.schedule(agent_id, expires_at)   # Renewed since the timer was set
+                    self._scheduled[agent_id] = expires_at
+        return expired
+
+    def clear(self) -> None:
+        with self._lock:
+            self._expires.clear()
+            self._ttls.clear()
+            self._scheduled.clear()
+            self._wheel.clear()
+
+
+def lease_ttl_from_env() -> float:
+    """Returns the default lease TTL from AGENTKIT_LEASE_TTL (0 means agents never expire)."""
+    return float(os.getenv(LEASE_TTL_ENV, "0"))
+
+
+def lease_tick_from_env() -> float:
+    return float(os.getenv(LEASE_TICK_ENV, DEFAULT_LEASE_TICK))
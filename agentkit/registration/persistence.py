@@ -0,0 +1,272 @@
+import json
+import logging
+import mmap
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from agentkit.core.models import AgentInfo
+from agentkit.registration.records import AgentRecord
+
+logger = logging.getLogger(__name__)
+
+# Persistence configuration (see create_journal_from_env)
+PERSISTENCE_DIR_ENV = "AGENTKIT_PERSISTENCE_DIR"
+SNAPSHOT_EVERY_ENV = "AGENTKIT_SNAPSHOT_EVERY"
+JOURNAL_FSYNC_ENV = "AGENTKIT_JOURNAL_FSYNC"
+DEFAULT_SNAPSHOT_EVERY = 50_000
+
+SNAPSHOT_FILE = "snapshot.json"
+SNAPSHOT_FORMAT = 2     # 1: list of rows; 2: columnar (still reads 1)
+JOURNAL_PREFIX = "journal-"
+JOURNAL_SUFFIX = ".log"
+
+OP_REGISTER = "register"
+OP_UPDATE = "update"
+OP_REMOVE = "remove"
+
+
+def _records_to_columns(records: List[AgentRecord]) -> Dict[str, list]:
+    """
+    Lays records out column by column for the snapshot.
+
+    Versions and capability sets repeat across the fleet, so they are stored
+    once in lookup tables and referenced by position. Flat columns of strings
+    parse several times faster than one small list per agent.
+    """
+    versions: Dict[str, int] = {}
+    capability_sets: Dict[tuple, int] = {}
+    return {
+        "agentId": [record.agent_id for record in records],
+        "agentName": [record.name for record in records],
+        "contactEndpoint": [record.endpoint for record in records],
+        "version": [versions.setdefault(record.version, len(versions)) for record in records],
+        "capabilities": [capability_sets.setdefault(record.capabilities, len(capability_sets)) for record in records],
+        "metadata": [record.metadata for record in records],
+        "registered_at": [record.registered_at for record in records],
+        "versionTable": list(versions),
+        "capabilityTable": [list(capabilities) for capabilities in capability_sets],
+    }
+
+
+def _columns_to_rows(columns: Dict[str, list]) -> List[list]:
+    """Turns a columnar snapshot body back into rows (see AgentRecord.to_row)."""
+    version_table = columns["versionTable"]
+    capability_table = columns["capabilityTable"]
+    return [
+        [agent_id, name, version_table[version], endpoint, capability_table[capabilities], metadata, registered_at]
+        for agent_id, name, endpoint, version, capabilities, metadata, registered_at in zip(
+            columns["agentId"], columns["agentName"], columns["contactEndpoint"], columns["version"],
+            columns["capabilities"], columns["metadata"], columns["registered_at"],
+        )
+    ]
+
+
+class RegistryJournal:
+    """
+    Append-only journal plus compacted snapshots for the agent registry.
+
+    Every register/update/remove is appended to the current journal segment
+    as one JSON line tagged with a sequence number. Once enough entries have
+    accumulated, the registry is compacted into snapshot.json (which records
+    the sequence number it covers) and older segments are deleted.
+
+    Restoring reads the snapshot through mmap and replays only the journal
+    entries newer than the snapshot, so startup cost tracks the number of
+    live agents rather than the full history of registrations. Agents are
+    persisted as positional AgentRecord rows, which restore straight into
+    compact records without a pydantic validation pass.
+    """
+
+    def __init__(self, directory: str, snapshot_every: int = DEFAULT_SNAPSHOT_EVERY, fsync: bool = False):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._seq = 0                   # Sequence number of the last journaled event
+        self._entries_since_snapshot = 0
+        self._segment = None            # Open file object of the current journal segment
+        self._compacting = False
+
+    # -- Paths --
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, SNAPSHOT_FILE)
+
+    def _segment_path(self, first_seq: int) -> str:
+        return os.path.join(self.directory, f"{JOURNAL_PREFIX}{first_seq:020d}{JOURNAL_SUFFIX}")
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        """Returns (first_seq, path) of every journal segment, oldest first."""
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(JOURNAL_PREFIX) and name.endswith(JOURNAL_SUFFIX):
+                first_seq = int(name[len(JOURNAL_PREFIX):-len(JOURNAL_SUFFIX)])
+                segments.append((first_seq, os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    # -- Restore --
+
+    def _read_snapshot(self) -> Tuple[int, List[list]]:
+        """Returns (seq, rows) from the snapshot, or (0, []) if there is none."""
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return 0, []
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    header = json.loads(mm.readline())
+                    body = json.loads(mm[mm.tell():])
+        except FileNotFoundError:
+            return 0, []
+
+        snapshot_format = header.get("format")
+        if snapshot_format == 1:
+            return header["seq"], body
+        if snapshot_format == 2:
+            return header["seq"], _columns_to_rows(body)
+        raise ValueError(f"Unsupported snapshot format {snapshot_format!r} in {self.snapshot_path}")
+
+    def _read_journal(self, after_seq: int) -> Iterator[Dict[str, Any]]:
+        """Yields journal entries with a sequence number greater than after_seq."""
+        for _, path in self._segments():
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final write after a crash; everything before it is intact
+                        logger.warning(f"Ignoring truncated journal entry in {path}")
+                        break
+                    if entry["seq"] > after_seq:
+                        yield entry
+
+    def load(self) -> List[AgentRecord]:
+        """
+        Restores the registry contents from the snapshot and journal tail.
+
+        Must be called once, before any new events are recorded.
+
+        Returns:
+            Records of the agents that were registered when the journal was last written.
+        """
+        snapshot_seq, rows = self._read_snapshot()
+        state: Dict[str, list] = {row[0]: row for row in rows}
+        last_seq = snapshot_seq
+        replayed = 0
+        for entry in self._read_journal(snapshot_seq):
+            if entry["op"] == OP_REMOVE:
+                state.pop(entry["agentId"], None)
+            else:
+                row = entry["agent"]
+                state[row[0]] = row
+            last_seq = entry["seq"]
+            replayed += 1
+
+        with self._lock:
+            self._seq = last_seq
+            self._entries_since_snapshot = replayed
+            self._open_segment()
+        return [AgentRecord.from_row(row) for row in state.values()]
+
+    # -- Recording --
+
+    def _open_segment(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+        self._segment = open(self._segment_path(self._seq + 1), "ab")
+
+    def _append(self, *entries: Dict[str, Any]) -> None:
+        """Appends entries with one write, flush (and fsync) for all of them."""
+        with self._lock:
+            if self._segment is None:
+                self._open_segment()
+            lines = []
+            for entry in entries:
+                self._seq += 1
+                entry["seq"] = self._seq
+                lines.append(json.dumps(entry, separators=(',', ':')).encode("utf-8") + b"\n")
+            self._segment.write(b"".join(lines))
+            self._segment.flush()
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+            self._entries_since_snapshot += len(entries)
+
+    def record_register(self, agent_info: AgentInfo) -> None:
+        self._append({"op": OP_REGISTER, "agent": AgentRecord.from_agent_info(agent_info).to_row()})
+
+    def record_register_many(self, agent_infos: List[AgentInfo]) -> None:
+        if agent_infos:
+            self._append(*({"op": OP_REGISTER, "agent": AgentRecord.from_agent_info(agent_info).to_row()} for agent_info in agent_infos))
+
+    def record_update(self, agent_info: AgentInfo) -> None:
+        self._append({"op": OP_UPDATE, "agent": AgentRecord.from_agent_info(agent_info).to_row()})
+
+    def record_remove(self, agent_id: str) -> None:
+        self._append({"op": OP_REMOVE, "agentId": agent_id})
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self._entries_since_snapshot >= self.snapshot_every and not self._compacting
+
+    # -- Compaction --
+
+    def begin_compaction(self) -> int:
+        """
+        Rotates to a new journal segment and returns the sequence number the
+        next snapshot will cover. The caller must capture the registry
+        contents while no other writes are in progress.
+        """
+        with self._lock:
+            self._compacting = True
+            self._entries_since_snapshot = 0
+            self._open_segment()
+            return self._seq
+
+    def write_snapshot(self, records: List[AgentRecord], seq: int) -> None:
+        """
+        Atomically writes a snapshot covering events up to `seq` and deletes
+        the journal segments it makes redundant.
+        """
+        try:
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(json.dumps({"format": SNAPSHOT_FORMAT, "seq": seq, "count": len(records)}).encode("utf-8") + b"\n")
+                f.write(json.dumps(_records_to_columns(records), separators=(',', ':')).encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            # Segments that start at or before `seq` only hold events the snapshot now covers
+            # (the segment opened by begin_compaction starts at seq + 1).
+            for first_seq, path in self._segments():
+                if first_seq <= seq:
+                    os.remove(path)
+            logger.info(f"Registry snapshot written: {len(records)} agents up to seq {seq}")
+        finally:
+            self._compacting = False
+
+    def compact(self, records: List[AgentRecord]) -> None:
+        """Synchronously snapshots `records` as the current registry state."""
+        self.write_snapshot(records, self.begin_compaction())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+
+
+def create_journal_from_env() -> Optional[RegistryJournal]:
+    """
+    Builds a RegistryJournal when AGENTKIT_PERSISTENCE_DIR is set.
+
+    Returns None (no persistence) otherwise.
+    """
+    directory = os.getenv(PERSISTENCE_DIR_ENV)
+    if not directory:
+        return None
+    snapshot_every = int(os.getenv(SNAPSHOT_EVERY_ENV, DEFAULT_SNAPSHOT_EVERY))
+    fsync = os.getenv(JOURNAL_FSYNC_ENV, "0").lower() in ("1", "true", "yes")
+    return RegistryJournal(directory, snapshot_every=snapshot_every, fsync=fsync)
@@ -0,0 +1,97 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from agentkit.core.models import AgentInfo
+
+# Identical capability lists are very common across a fleet, so every record
+# with the same capabilities shares one interned tuple. The table is an LRU
+# bounded to MAX_CAPABILITY_SETS entries, so fleets with per-agent capability
+# strings do not grow it forever under registration churn; an evicted tuple
+# stays alive in the records that use it, later records just get a new one.
+MAX_CAPABILITY_SETS = 10_000
+
+_capability_sets: "OrderedDict[Tuple[str, ...], Tuple[str, ...]]" = OrderedDict()
+_capability_lock = threading.Lock()
+
+
+def intern_capabilities(capabilities) -> Tuple[str, ...]:
+    """Returns a shared tuple of interned capability strings."""
+    key = tuple(capabilities)
+    with _capability_lock:
+        shared = _capability_sets.get(key)
+        if shared is not None:
+            _capability_sets.move_to_end(key)
+            return shared
+        shared = tuple(sys.intern(capability) for capability in key)
+        _capability_sets[shared] = shared
+        while len(_capability_sets) > MAX_CAPABILITY_SETS:
+            _capability_sets.popitem(last=False)
+    return shared
+
+
+class AgentRecord:
+    """
+    Compact in-memory representation of a registered agent.
+
+    A pydantic AgentInfo carries an HttpUrl object, a datetime, a metadata
+    model and a capability list per agent. The registry keeps this slotted
+    record instead: the URL as a plain string, the registration time as an
+    epoch float, and interned version/capability strings shared between
+    agents. AgentInfo objects are only built when a record leaves the store.
+    """
+    __slots__ = ("agent_id", "name", "version", "endpoint", "capabilities", "metadata", "registered_at")
+
+    def __init__(
+        self,
+        agent_id: str,
+        name: str,
+        version: str,
+        endpoint: Optional[str],
+        capabilities: Tuple[str, ...],
+        metadata: Optional[Dict[str, Any]],
+        registered_at: float,
+    ):
+        self.agent_id = agent_id
+        self.name = name
+        self.version = version
+        self.endpoint = endpoint
+        self.capabilities = capabilities
+        self.metadata = metadata
+        self.registered_at = registered_at
+
+    @classmethod
+    def from_agent_info(cls, agent_info: AgentInfo) -> "AgentRecord":
+        return cls(
+            agent_info.agentId,
+            agent_info.agentName,
+            sys.intern(agent_info.version),
+            str(agent_info.contactEndpoint) if agent_info.contactEndpoint is not None else None,
+            intern_capabilities(agent_info.capabilities),
+            agent_info.metadata.model_dump(mode='json', exclude_none=True) if agent_info.metadata is not None else None,
+            agent_info.registration_time.timestamp(),
+        )
+
+    def to_agent_info(self) -> AgentInfo:
+        """Materializes a fresh AgentInfo for the API boundary."""
+        return AgentInfo.model_validate({
+            "agentId": self.agent_id,
+            "agentName": self.name,
+            "capabilities": list(self.capabilities),
+            "version": self.version,
+            "contactEndpoint": self.endpoint,
+            "metadata": self.metadata,
+            "registration_time": self.registered_at,
+        })
+
+    @classmethod
+    def from_row(cls, row: list) -> "AgentRecord":
+        """Builds a record from a persisted row (see to_row)."""
+        agent_id, name, version, endpoint, capabilities, metadata, registered_at = row
+        return cls(agent_id, name, sys.intern(version), endpoint, intern_capabilities(capabilities), metadata, registered_at)
+
+    def to_row(self) -> list:
+        return [
+            self.agent_id, self.name, self.version, self.endpoint,
+            list(self.capabilities), self.metadata, self.registered_at,
+        ]
@@ -1,31 +1,316 @@
-from typing import Dict, Optional
+import asyncio
+import base64
+import binascii
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 from agentkit.core.models import AgentInfo
+from agentkit.registration.backends import StorageBackend, InMemoryBackend, create_backend_from_env
+from agentkit.registration.changes import OP_REGISTER, OP_REMOVE, OP_UPDATE, ChangeLog, change_log_size_from_env
+from agentkit.registration.records import AgentRecord
+from agentkit.registration.leases import LeaseTable, lease_tick_from_env, lease_ttl_from_env
+from agentkit.registration.persistence import RegistryJournal, create_journal_from_env
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(agent_id: str) -> str:
+    """Encodes the last agentId of a page as an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(agent_id.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> str:
+    """
+    Decodes a cursor produced by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        agent_id = base64.b64decode(cursor.encode("ascii"), altchars=b"-_", validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor '{cursor}'.") from e
+    if not agent_id:
+        raise ValueError(f"Invalid cursor '{cursor}'.")
+    return agent_id
 
-# Simple in-memory storage for registered agents
-# In a real application, this might be replaced by Redis, a database, etc.
-_agent_registry: Dict[str, AgentInfo] = {}
 
 class AgentStorage:
-    """Manages the storage and retrieval of registered agent information."""
+    """
+    Manages the storage and retrieval of registered agent information.
+
+    The actual records live in a pluggable StorageBackend: the in-memory
+    backend by default, or a shared SQLite database when several API
+    worker processes must see the same registry.
+
+    An optional RegistryJournal makes the in-memory registry survive
+    restarts: the registry is restored from it on construction and every
+    change is journaled afterwards. Backends that persist themselves (SQLite)
+    are refused a journal: replaying it into the database would re-add the
+    agents it already holds, and every worker would append to the same journal.
+
+    Every change is also appended to a bounded, sequence-numbered
+    ChangeLog, which lets clients mirror the registry by fetching deltas.
+
+    Agents may hold a lease: registered with a TTL, they must renew it via
+    heartbeats or be evicted once it runs out. With a default lease TTL
+    configured, every agent is leased; otherwise only agents that ask for
+    one are. Lease state is kept in memory only, so restored agents start
+    with a fresh lease. Expired agents are evicted by a task on the serving
+    event loop (see start_reaper), never from another thread: the in-memory
+    backend's indexes are not safe to read while a thread writes them.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[StorageBackend] = None,
+        journal: Optional[RegistryJournal] = None,
+        default_lease_ttl: float = 0.0,
+        leases: Optional[LeaseTable] = None,
+        changes: Optional[ChangeLog] = None,
+    ):
+        self.backend = backend if backend is not None else InMemoryBackend()
+        if journal is not None and self.backend.persistent:
+            raise ValueError(
+                f"{type(self.backend).__name__} already persists the registry; "
+                "unset AGENTKIT_PERSISTENCE_DIR (the journal is for the in-memory backend)."
+            )
+        self.journal = journal
+        self.changes = changes if changes is not None else ChangeLog()
+        self.default_lease_ttl = default_lease_ttl
+        self.leases = leases if leases is not None else LeaseTable()
+        self._write_lock = threading.RLock() # Keeps backend changes and journal order in step
+        self._reaper: Optional[asyncio.Task] = None
+        self._removal_listeners: List[Callable[[AgentInfo], None]] = []
+        if journal is not None:
+            self._restore()
 
-    def add_agent(self, agent_info: AgentInfo) -> None:
+    def _restore(self) -> None:
+        start = time.perf_counter()
+        records = self.journal.load()
+        self.backend.restore(records)
+        if self.default_lease_ttl > 0:
+            self._grant_leases([record.agent_id for record in records], None)
+        logger.info(f"Restored {len(records)} agents from {self.journal.directory} in {time.perf_counter() - start:.3f}s")
+
+    def _maybe_compact(self) -> None:
+        """Starts a background snapshot once the journal has grown past its threshold."""
+        if self.journal is None or not self.journal.needs_compaction:
+            return
+        # Rotate the journal and copy the registry under the write lock so the
+        # snapshot and the new journal segment line up exactly.
+        seq = self.journal.begin_compaction()
+        records = self.backend.export_records()
+        threading.Thread(
+            target=self.journal.write_snapshot, args=(records, seq), name="agentkit-registry-snapshot", daemon=True
+        ).start()
+
+    def _record_of(self, agent_info: AgentInfo) -> AgentRecord:
+        """Returns the stored record of a just-written agent, sharing the backend's copy when possible."""
+        return self.backend.get_record(agent_info.agentId) or AgentRecord.from_agent_info(agent_info)
+
+    def on_remove(self, listener: Callable[[AgentInfo], None]) -> None:
+        """
+        Registers a callback run for every agent that leaves the registry,
+        whether deregistered or evicted by lease expiry, so per-agent state
+        kept elsewhere (circuit breakers, dispatch routes) is released either way.
+        """
+        self._removal_listeners.append(listener)
+
+    def _notify_removed(self, agent_info: AgentInfo) -> None:
+        for listener in self._removal_listeners:
+            try:
+                listener(agent_info)
+            except Exception as e:
+                logger.error(f"Removal listener failed for agent {agent_info.agentId}: {e}", exc_info=True)
+
+    # -- Leases --
+
+    def _grant_leases(self, agent_ids: List[str], lease_ttl: Optional[float]) -> Optional[float]:
+        """Leases `agent_ids` for `lease_ttl` (or the default) seconds; returns the TTL used, if any."""
+        ttl = lease_ttl if lease_ttl is not None else self.default_lease_ttl
+        if ttl <= 0 or not agent_ids:
+            return None
+        self.leases.grant(agent_ids, ttl)
+        self._start_reaper()
+        return ttl
+
+    def _start_reaper(self) -> None:
+        """Starts the lease expiry task on the running event loop once leases are in use."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return # No loop yet (e.g. leases granted on restore); the app lifespan calls start_reaper
+        if self._reaper is None or self._reaper.done() or self._reaper.get_loop() is not loop:
+            self._reaper = loop.create_task(self._reap_forever(), name="agentkit-lease-reaper")
+
+    def start_reaper(self) -> None:
+        """Starts evicting expired agents on the running event loop (called by the app lifespan)."""
+        self._start_reaper()
+
+    async def stop_reaper(self) -> None:
+        reaper, self._reaper = self._reaper, None
+        if reaper is not None and not reaper.done() and reaper.get_loop() is asyncio.get_running_loop():
+            reaper.cancel()
+            try:
+                await reaper
+            except asyncio.CancelledError:
+                pass
+
+    async def _reap_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.leases.tick)
+            try:
+                self.expire_leases()
+            except Exception as e:
+                logger.error(f"Lease expiry sweep failed: {e}", exc_info=True)
+
+    def renew_leases(self, agent_ids: List[str], lease_ttl: Optional[float] = None) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Renews the leases of several agents (a batched heartbeat).
+
+        Args:
+            agent_ids: Agents whose leases to extend.
+            lease_ttl: New lease length in seconds; defaults to each agent's current lease length.
+
+        Returns:
+            (renewed, unleased, unknown): IDs whose lease was extended; IDs
+            that are registered but hold no lease in this process, so nothing
+            was renewed (agents registered without a lease, or, with a shared
+            SQLite registry, leased by another worker, which will still evict
+            them); and IDs that are not registered, e.g. because their lease
+            already expired.
+        """
+        renewed, missing = self.leases.renew(agent_ids, lease_ttl)
+        unleased, unknown = [], []
+        for agent_id in missing:
+            (unleased if self.backend.get(agent_id) is not None else unknown).append(agent_id)
+        return renewed, unleased, unknown
+
+    def expire_leases(self) -> List[str]:
+        """
+        Evicts every agent whose lease has run out.
+
+        Returns:
+            The IDs of the evicted agents.
+        """
+        evicted = []
+        for agent_id in self.leases.pop_expired():
+            if self.remove_agent(agent_id) is not None:
+                evicted.append(agent_id)
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} agents with expired leases")
+        return evicted
+
+    # -- Registry --
+
+    def add_agent(self, agent_info: AgentInfo, lease_ttl: Optional[float] = None) -> Optional[float]:
         """
         Adds a new agent to the registry.
 
         Args:
             agent_info: The AgentInfo object to store.
+            lease_ttl: Lease length in seconds; defaults to the configured TTL (if any).
+
+        Returns:
+            The lease TTL granted, or None if the agent is not leased.
 
         Raises:
             ValueError: If an agent with the same agentId or agentName already exists.
         """
-        if agent_info.agentId in _agent_registry:
-            raise ValueError(f"Agent with ID {agent_info.agentId} already registered.")
-        # Check for name collision as well, depending on requirements
-        if self.get_agent_by_name(agent_info.agentName):
-             raise ValueError(f"Agent with name '{agent_info.agentName}' already registered.")
+        with self._write_lock:
+            self.backend.add(agent_info)
+            self.changes.append(OP_REGISTER, agent_info.agentId, self._record_of(agent_info))
+            if self.journal is not None:
+                self.journal.record_register(agent_info)
+                self._maybe_compact()
+        logger.debug(f"Agent registered: {agent_info.agentName} (ID: {agent_info.agentId})")
+        return self._grant_leases([agent_info.agentId], lease_ttl)
+
+    def add_agents(self, agent_infos: List[AgentInfo], lease_ttls: Optional[List[Optional[float]]] = None) -> List[Optional[str]]:
+        """
+        Adds several agents in one pass; conflicting agents are skipped.
 
-        _agent_registry[agent_info.agentId] = agent_info
-        print(f"Agent registered: {agent_info.agentName} (ID: {agent_info.agentId})") # Basic logging
+        The backend is written (and the journal appended) once for the whole
+        batch rather than once per agent.
+
+        Args:
+            agent_infos: The AgentInfo objects to store.
+            lease_ttls: Optional per-agent lease lengths in seconds (None entries use the configured TTL).
+
+        Returns:
+            One entry per agent, in order: None if it was registered,
+            otherwise the conflict message (duplicate agentId or agentName,
+            including duplicates within the batch).
+        """
+        with self._write_lock:
+            errors = self.backend.add_many(agent_infos)
+            for agent_info, error in zip(agent_infos, errors):
+                if error is None:
+                    self.changes.append(OP_REGISTER, agent_info.agentId, self._record_of(agent_info))
+            if self.journal is not None:
+                self.journal.record_register_many(
+                    [agent_info for agent_info, error in zip(agent_infos, errors) if error is None]
+                )
+                self._maybe_compact()
+        logger.debug(f"Batch registered {errors.count(None)} of {len(agent_infos)} agents")
+        by_ttl: Dict[Optional[float], List[str]] = {}
+        for agent_info, error, ttl in zip(agent_infos, errors, lease_ttls or [None] * len(agent_infos)):
+            if error is None:
+                by_ttl.setdefault(ttl, []).append(agent_info.agentId)
+        for ttl, agent_ids in by_ttl.items():
+            self._grant_leases(agent_ids, ttl)
+        return errors
+
+    def update_agent(self, agent_info: AgentInfo) -> AgentInfo:
+        """
+        Replaces the stored record of an already registered agent.
+
+        Args:
+            agent_info: The new AgentInfo; its agentId selects the agent to update.
+
+        Returns:
+            The previous AgentInfo record.
+
+        Raises:
+            KeyError: If the agent is not registered.
+            ValueError: If the new agentName is already used by another agent.
+        """
+        with self._write_lock:
+            previous = self.backend.update(agent_info)
+            self.changes.append(OP_UPDATE, agent_info.agentId, self._record_of(agent_info))
+            if self.journal is not None:
+                self.journal.record_update(agent_info)
+                self._maybe_compact()
+        logger.debug(f"Agent updated: {agent_info.agentName} (ID: {agent_info.agentId})")
+        return previous
+
+    def remove_agent(self, agent_id: str) -> Optional[AgentInfo]:
+        """
+        Removes an agent and all of its index entries from the registry.
+
+        Args:
+            agent_id: The unique ID of the agent.
+
+        Returns:
+            The removed AgentInfo object if it was registered, otherwise None.
+        """
+        self.leases.release(agent_id)
+        with self._write_lock:
+            agent_info = self.backend.remove(agent_id)
+            if agent_info is not None:
+                self.changes.append(OP_REMOVE, agent_id)
+                if self.journal is not None:
+                    self.journal.record_remove(agent_id)
+                    self._maybe_compact()
+        if agent_info is not None:
+            logger.debug(f"Agent removed: {agent_info.agentName} (ID: {agent_id})")
+            self._notify_removed(agent_info)
+        return agent_info
 
     def get_agent(self, agent_id: str) -> Optional[AgentInfo]:
         """
@@ -37,7 +322,7 @@ class AgentStorage:
         Returns:
             The AgentInfo object if found, otherwise None.
         """
-        return _agent_registry.get(agent_id)
+        return self.backend.get(agent_id)
 
     def get_agent_by_name(self, agent_name: str) -> Optional[AgentInfo]:
         """
@@ -49,18 +334,97 @@ class AgentStorage:
         Returns:
             The AgentInfo object if found, otherwise None.
         """
-        for agent in _agent_registry.values():
-            if agent.agentName == agent_name:
-                return agent
-        return None
+        return self.backend.get_by_name(agent_name)
+
+    def find_agents_by_capability(self, capability: str) -> List[AgentInfo]:
+        """
+        Returns all agents advertising the given capability.
+
+        Args:
+            capability: The capability string to look up.
+
+        Returns:
+            A list of matching AgentInfo objects (empty if none match).
+        """
+        return self.backend.query(capability=capability)
+
+    def query_agents(
+        self,
+        capability: Optional[str] = None,
+        version: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+    ) -> Tuple[List[AgentInfo], Optional[str]]:
+        """
+        Returns one page of agents matching the given filters, ordered by agentId.
+
+        Args:
+            capability: Only return agents advertising this capability.
+            version: Only return agents registered with this exact version.
+            cursor: Opaque cursor from a previous page (None for the first page).
+            limit: Maximum number of agents to return.
+
+        Returns:
+            A tuple of (agents, next_cursor). next_cursor is None on the last page.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        # Fetch one extra record to learn whether another page exists
+        page = self.backend.query(capability=capability, version=version, after=after, limit=limit + 1)
+        if len(page) > limit:
+            page = page[:limit]
+            return page, encode_cursor(page[-1].agentId)
+        return page, None
+
+    def changes_since(self, since: int, limit: int, epoch: Optional[str] = None) -> Tuple[List[dict], int]:
+        """
+        Returns registry changes newer than sequence number `since`.
+
+        Args:
+            since: Cursor returned by a previous call (or a snapshot).
+            limit: Maximum number of changes to return.
+            epoch: Epoch the cursor was issued under, if known.
+
+        Returns:
+            (changes, cursor): changes oldest first, and the cursor to resume from.
+
+        Raises:
+            ChangeLogExpired: If the cursor is too old (or stale); resync with snapshot().
+        """
+        return self.changes.since(since, limit, epoch=epoch)
+
+    async def wait_for_changes(self, since: int, timeout: float) -> bool:
+        """Waits up to `timeout` seconds for a change after `since`; returns True if there is one."""
+        return await self.changes.wait(since, timeout)
+
+    def snapshot(self) -> Tuple[List[AgentInfo], int]:
+        """
+        Returns every registered agent together with the change sequence
+        number it reflects, so a mirror can continue with changes_since().
+        """
+        with self._write_lock:
+            return self.backend.list_all(), self.changes.seq
 
     def list_agents(self) -> list[AgentInfo]:
         """Returns a list of all registered agents."""
-        return list(_agent_registry.values())
+        return self.backend.list_all()
 
     def clear_all(self) -> None:
         """Clears the registry (useful for testing)."""
-        _agent_registry.clear()
+        with self._write_lock:
+            self.backend.clear()
+            self.leases.clear()
+            self.changes.reset()
+            if self.journal is not None:
+                self.journal.compact([]) # An empty snapshot supersedes all earlier history
 
 # Singleton instance
-agent_storage = AgentStorage()
\ No newline at end of file
+agent_storage = AgentStorage(
+    create_backend_from_env(),
+    journal=create_journal_from_env(),
+    default_lease_ttl=lease_ttl_from_env(),
+    leases=LeaseTable(tick=lease_tick_from_env()),
+    changes=ChangeLog(max_size=change_log_size_from_env()),
+)
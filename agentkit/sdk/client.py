@@ -1,8 +1,9 @@
 import httpx
+import json
 import os
 import logging
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, Iterable, List, Dict, Any, Optional
 from urllib.parse import urljoin
 from pydantic import HttpUrl # For type hinting contactEndpoint
 
@@ -34,6 +35,7 @@ class AgentKitClient:
         self.base_url = base_url
         # Use httpx.AsyncClient for async requests
         self._client = httpx.AsyncClient(base_url=self.base_url, timeout=30.0)
+        self.push_tokens: Dict[str, str] = {}   # agentId -> push token of the agents registered through this client (see MessageReceiver)
 
     async def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
         """Helper method to make async requests and handle common errors."""
@@ -70,7 +72,8 @@ class AgentKitClient:
         capabilities: List[str],
         version: str,
         contact_endpoint: HttpUrl, # Use HttpUrl for validation hint
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        lease_ttl: Optional[float] = None
     ) -> str:
         """
         Registers a new agent with the AgentKit service (asynchronously).
@@ -81,9 +84,12 @@ class AgentKitClient:
             version: Version string for the agent.
             contact_endpoint: URL endpoint where the agent can be reached.
             metadata: Optional structured metadata (e.g., {"description": "...", "config": {...}}).
+            lease_ttl: Optional lease in seconds. The agent must call heartbeat() within
+                       this interval or it is removed from the registry.
 
         Returns:
-            The unique agent ID assigned by the service.
+            The unique agent ID assigned by the service. The agent's push token
+            is kept in `push_tokens` under that ID.
 
         Raises:
             AgentKitError: If registration fails due to API errors or network issues.
@@ -99,24 +105,107 @@ class AgentKitClient:
         # Filter out None metadata before sending
         if payload["metadata"] is None:
             del payload["metadata"]
+        if lease_ttl is not None:
+            payload["leaseTtl"] = lease_ttl
 
         response_data = await self._make_request("POST", endpoint, json=payload)
 
         # Check application-level success status from ApiResponse model
         if response_data.get("status") == "success" and "data" in response_data and "agentId" in response_data["data"]:
-            return response_data["data"]["agentId"]
+            data = response_data["data"]
+            if "pushToken" in data:
+                self.push_tokens[data["agentId"]] = data["pushToken"]
+            return data["agentId"]
         else:
             # If API returned 2xx but status is not success or data format is wrong
             message = response_data.get("message", "Registration failed with unexpected response format.")
             raise AgentKitError(message, response_data=response_data)
 
+    async def register_agents(self, agents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Registers several agents with one request (asynchronously).
+
+        Args:
+            agents: Registration payloads using the API field names
+                    (agentName, capabilities, version, contactEndpoint, metadata).
+
+        Returns:
+            One result per agent, in order. Each result has "index", "agentName" and
+            "status": "registered" (with "agentId" and "pushToken", also kept in
+            `push_tokens`) or "conflict" (with "error").
+            Conflicts are reported here rather than raised, so the rest of the batch
+            can be used.
+
+        Raises:
+            AgentKitError: If the request itself fails (e.g. validation errors, batch too large)
+                           or the response has an unexpected format.
+        """
+        endpoint = "/v1/agents/register:batch"
+        payload = {"agents": []}
+        for agent in agents:
+            item = {key: value for key, value in agent.items() if value is not None}
+            if "contactEndpoint" in item:
+                item["contactEndpoint"] = str(item["contactEndpoint"]) # Convert HttpUrl to string for JSON
+            payload["agents"].append(item)
+
+        response_data = await self._make_request("POST", endpoint, json=payload)
+
+        data = response_data.get("data")
+        if isinstance(data, dict) and isinstance(data.get("results"), list):
+            for result in data["results"]:
+                if "pushToken" in result:
+                    self.push_tokens[result["agentId"]] = result["pushToken"]
+            return data["results"]
+        message = response_data.get("message", "Batch registration failed with unexpected response format.")
+        raise AgentKitError(message, response_data=response_data)
+
+    async def heartbeat(self, agent_ids: List[str], lease_ttl: Optional[float] = None) -> Dict[str, List[str]]:
+        """
+        Renews the leases of one or more agents with a single request (asynchronously).
+
+        Args:
+            agent_ids: IDs of the agents to keep alive.
+            lease_ttl: Optional new lease in seconds (defaults to each agent's current lease length).
+
+        Returns:
+            {"renewed": [...], "unleased": [...], "unknown": [...]}. Unknown
+            agents are no longer registered (e.g. their lease expired) and must
+            register again. Unleased agents are registered but their lease was
+            not renewed by the process that answered.
+
+        Raises:
+            AgentKitError: If the request fails.
+        """
+        payload: Dict[str, Any] = {"agentIds": agent_ids}
+        if lease_ttl is not None:
+            payload["leaseTtl"] = lease_ttl
+        response_data = await self._make_request("POST", "/v1/agents/heartbeat", json=payload)
+        data = response_data.get("data")
+        if response_data.get("status") == "success" and isinstance(data, dict):
+            return {"renewed": data.get("renewed", []), "unleased": data.get("unleased", []), "unknown": data.get("unknown", [])}
+        message = response_data.get("message", "Heartbeat failed with unexpected response format.")
+        raise AgentKitError(message, response_data=response_data)
+
+    async def deregister_agent(self, agent_id: str) -> None:
+        """
+        Removes an agent from the registry (asynchronously).
+
+        Raises:
+            AgentKitError: If the agent is not registered (404) or the request fails.
+        """
+        await self._make_request("DELETE", f"/v1/agents/{agent_id}")
+
     async def send_message(
         self,
         target_agent_id: str,
         sender_id: str,
         message_type: str,
         payload: Dict[str, Any],
-        session_context: Optional[Dict[str, Any]] = None
+        session_context: Optional[Dict[str, Any]] = None,
+        wait: bool = False,
+        timeout: Optional[float] = None,
+        priority: Optional[str] = None,
+        idempotency_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Sends a message to a specific agent via the AgentKit service (asynchronously).
@@ -128,10 +217,19 @@ class AgentKitClient:
             payload: The actual content/data of the message. For 'tool_invocation',
                      this should include 'tool_name' and 'parameters'.
             session_context: Optional session context (e.g., {"sessionId": "..."}).
+            wait: Wait for the agent's reply (posted with `reply`) instead of
+                  returning as soon as the message is queued.
+            timeout: Seconds to wait for the reply (server default if None).
+            priority: Dispatch priority class: "high", "normal" or "low" (server default "normal" if None).
+            idempotency_key: Sent as the Idempotency-Key header. Retrying with the
+                             same key returns the first response instead of sending
+                             the message again, so retries after network errors are safe.
 
         Returns:
             The data part of the successful API response (structure depends on
             how the receiving agent/API handles the message, includes tool results).
+            With `wait`, "replyStatus" is "replied" (the reply is under "reply")
+            or "timeout" (the reply can later be read with `get_task`).
 
         Raises:
             AgentKitError: If sending the message fails due to API errors or network issues.
@@ -146,8 +244,19 @@ class AgentKitClient:
         # Filter out None context before sending
         if message_data["sessionContext"] is None:
             del message_data["sessionContext"]
+        if priority is not None:
+            message_data["priority"] = priority
 
-        response_data = await self._make_request("POST", endpoint, json=message_data)
+        request_options: Dict[str, Any] = {}
+        if idempotency_key is not None:
+            request_options["headers"] = {"Idempotency-Key": idempotency_key}
+        if wait:
+            request_options["params"] = {"wait": "true"}
+            if timeout is not None:
+                request_options["params"]["timeout"] = timeout
+            # Leave the server time to answer before the HTTP client gives up
+            request_options["timeout"] = (timeout if timeout is not None else 30.0) + 10.0
+        response_data = await self._make_request("POST", endpoint, json=message_data, **request_options)
 
         # Check application-level success status
         if response_data.get("status") == "success":
@@ -162,6 +271,169 @@ class AgentKitClient:
             full_message = f"{message} (Code: {error_code})" if error_code else message
             raise AgentKitError(full_message, response_data=response_data)
 
+    async def send_messages(self, records: Iterable[Dict[str, Any]], chunk_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Queues many messages through the bulk ingestion endpoint (asynchronously).
+
+        Records are sent as NDJSON in requests of at most `chunk_size`
+        records, and each request's results are read as the service streams
+        them back. Keeping requests bounded keeps each response small, since
+        this client only reads it once the request body has been sent.
+
+        Args:
+            records: {"agentId": ..., "message": {...MessagePayload fields}} dictionaries.
+            chunk_size: Records sent per request.
+
+        Yields:
+            One result per record, in order, with "index" (position in `records`),
+            "agentId" and "status": "queued" (with "taskId") or "error" (with
+            "statusCode", "error" and, when the queue was full, "retryAfter").
+            Rejected records are reported here rather than raised.
+
+        Raises:
+            AgentKitError: If a request itself fails.
+        """
+        chunk: List[str] = []
+        offset = 0
+        for record in records:
+            chunk.append(json.dumps(record, default=str))
+            if len(chunk) >= chunk_size:
+                async for result in self._send_message_chunk(chunk, offset):
+                    yield result
+                offset += len(chunk)
+                chunk = []
+        if chunk:
+            async for result in self._send_message_chunk(chunk, offset):
+                yield result
+
+    async def _send_message_chunk(self, lines: List[str], offset: int) -> AsyncIterator[Dict[str, Any]]:
+        body = ("\n".join(lines) + "\n").encode()
+        try:
+            async with self._client.stream(
+                "POST", "/v1/agents/run:batch", content=body, headers={"Content-Type": "application/x-ndjson"}
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                    raise AgentKitError(f"AgentKit API error (HTTP {response.status_code}): {response.text}", status_code=response.status_code)
+                async for line in response.aiter_lines():
+                    if line:
+                        result = json.loads(line)
+                        result["index"] += offset
+                        yield result
+        except httpx.RequestError as e:
+            raise AgentKitError(f"Network error communicating with AgentKit API: {e}") from e
+        except ValueError as e:
+            raise AgentKitError(f"Failed to decode bulk ingestion result from AgentKit API: {e}") from e
+
+    async def broadcast_message(
+        self,
+        capability: str,
+        sender_id: str,
+        message_type: str,
+        payload: Dict[str, Any],
+        session_context: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Sends one message to every agent advertising a capability (asynchronously).
+
+        The service resolves the recipients and delivers to all of them before
+        answering; each agent gets a single delivery attempt.
+
+        Args:
+            capability: The capability the recipients advertise.
+            sender_id: The ID of the agent sending the message.
+            message_type: Type of message (tool invocations cannot be broadcast).
+            payload: The actual content/data of the message.
+            session_context: Optional session context (e.g., {"sessionId": "..."}).
+
+        Returns:
+            The delivery report: "recipients", "delivered", "failed", "skipped"
+            (agents whose circuit breaker is open) and "failures", a list of
+            {"agentId", "error", "statusCode"} entries.
+
+        Raises:
+            AgentKitError: If the broadcast request fails.
+        """
+        message_data = {"senderId": sender_id, "messageType": message_type, "payload": payload}
+        if session_context is not None:
+            message_data["sessionContext"] = session_context
+        response_data = await self._make_request("POST", f"/v1/capabilities/{capability}/broadcast", json=message_data)
+        if response_data.get("status") == "success" and isinstance(response_data.get("data"), dict):
+            return response_data["data"]
+        message = response_data.get("message", "Broadcast failed with unexpected response format.")
+        raise AgentKitError(message, response_data=response_data)
+
+    async def reply(
+        self,
+        task_id: str,
+        sender_id: str,
+        message_type: str,
+        payload: Dict[str, Any]
+    ) -> bool:
+        """
+        Answers a received message whose `replyTo` is set (asynchronously).
+
+        Args:
+            task_id: The `replyTo` value of the received message.
+            sender_id: The ID of the replying agent.
+            message_type: Type of the reply message.
+            payload: The reply content.
+
+        Returns:
+            True if the sender was still waiting and got the reply directly,
+            False if it was stored on the task instead.
+
+        Raises:
+            AgentKitError: If the task is unknown or the request fails.
+        """
+        message_data = {"senderId": sender_id, "messageType": message_type, "payload": payload}
+        response_data = await self._make_request("POST", f"/v1/tasks/{task_id}/reply", json=message_data)
+        if response_data.get("status") == "success" and isinstance(response_data.get("data"), dict):
+            return bool(response_data["data"].get("callerWaiting"))
+        message = response_data.get("message", "Replying failed with unexpected response format.")
+        raise AgentKitError(message, response_data=response_data)
+
+    async def get_task(self, task_id: str) -> Dict[str, Any]:
+        """
+        Retrieves the delivery status of a message accepted by `send_message` (asynchronously).
+
+        Args:
+            task_id: The `taskId` returned when the message was accepted.
+
+        Returns:
+            The task's status ('queued', 'dispatched', 'retrying', 'delivered'
+            or 'failed'), attempt count and lifecycle timestamps.
+
+        Raises:
+            AgentKitError: If the task is unknown (or no longer retained) or the request fails.
+        """
+        response_data = await self._make_request("GET", f"/v1/tasks/{task_id}")
+        if response_data.get("status") == "success" and isinstance(response_data.get("data"), dict):
+            return response_data["data"]
+        message = response_data.get("message", "Fetching task failed with unexpected response format.")
+        raise AgentKitError(message, response_data=response_data)
+
+    async def resolve_payload(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Returns the payload of a received message, downloading it if it was offloaded (asynchronously).
+
+        AgentKit can replace large payloads with a claim check
+        ({"claimCheck": {"blobId": ..., "href": "/v1/blobs/..."}}); this
+        fetches the original payload from the claim check's href. Other
+        payloads are returned as they are.
+
+        Args:
+            message: The message as received at the contact endpoint.
+
+        Raises:
+            AgentKitError: If the payload cannot be downloaded (e.g. it expired).
+        """
+        payload = message.get("payload") or {}
+        claim_check = payload.get("claimCheck") if len(payload) == 1 else None
+        if not isinstance(claim_check, dict) or "href" not in claim_check:
+            return payload
+        return await self._make_request("GET", claim_check["href"])
+
     async def report_state_to_opscore(
         self,
         agent_id: str,
@@ -239,6 +511,190 @@ class AgentKitClient:
             raise AgentKitError(f"Unexpected error: {e}") from e
 
 
-    # --- Other SDK methods to be added later ---
-    # async def list_agents(...)
-    # async def get_agent_info(...)
\ No newline at end of file
+    async def list_agents(
+        self,
+        capability: Optional[str] = None,
+        version: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Fetches one page of registered agents (asynchronously).
+
+        Args:
+            capability: Only return agents advertising this capability.
+            version: Only return agents with this exact version.
+            cursor: The `nextCursor` value from a previous page, if any.
+            limit: Maximum number of agents to return (server default if None).
+            fields: Optional list of agent fields to return (e.g. ["agentId", "contactEndpoint"]).
+
+        Returns:
+            A dictionary with "agents" (list of agent dicts) and "nextCursor"
+            (None when there are no more pages).
+
+        Raises:
+            AgentKitError: If the request fails due to API errors or network issues.
+        """
+        params: Dict[str, Any] = {}
+        if capability is not None:
+            params["capability"] = capability
+        if version is not None:
+            params["version"] = version
+        if cursor is not None:
+            params["cursor"] = cursor
+        if limit is not None:
+            params["limit"] = limit
+        if fields:
+            params["fields"] = ",".join(fields)
+
+        response_data = await self._make_request("GET", "/v1/agents", params=params)
+        if response_data.get("status") == "success" and isinstance(response_data.get("data"), dict):
+            return response_data["data"]
+        message = response_data.get("message", "Listing agents failed with unexpected response format.")
+        raise AgentKitError(message, response_data=response_data)
+
+    async def iter_agents(
+        self,
+        capability: Optional[str] = None,
+        version: Optional[str] = None,
+        page_size: Optional[int] = None,
+        fields: Optional[List[str]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Iterates over all matching agents, following pagination cursors.
+
+        Args:
+            capability: Only yield agents advertising this capability.
+            version: Only yield agents with this exact version.
+            page_size: Number of agents fetched per request.
+            fields: Optional list of agent fields to return.
+
+        Yields:
+            Agent dictionaries, one at a time.
+        """
+        cursor = None
+        while True:
+            page = await self.list_agents(
+                capability=capability, version=version, cursor=cursor, limit=page_size, fields=fields
+            )
+            for agent in page.get("agents", []):
+                yield agent
+            cursor = page.get("nextCursor")
+            if not cursor:
+                break
+
+    async def get_agent_info(self, agent_id: str, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Retrieves the registration record of a single agent (asynchronously).
+
+        Args:
+            agent_id: The ID of the agent to look up.
+            fields: Optional list of agent fields to return.
+
+        Returns:
+            The agent's registration data as a dictionary.
+
+        Raises:
+            AgentKitError: If the agent is not found or the request fails.
+        """
+        params = {"fields": ",".join(fields)} if fields else None
+        response_data = await self._make_request("GET", f"/v1/agents/{agent_id}", params=params)
+        if response_data.get("status") == "success" and isinstance(response_data.get("data"), dict):
+            return response_data["data"]
+        message = response_data.get("message", "Fetching agent failed with unexpected response format.")
+        raise AgentKitError(message, response_data=response_data)
+    async def get_agent_changes(
+        self,
+        since: Optional[int] = None,
+        epoch: Optional[str] = None,
+        limit: Optional[int] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Fetches registry changes after a cursor, long-polling until one arrives (asynchronously).
+
+        Args:
+            since: The "seq" returned by the previous call; None requests a snapshot.
+            epoch: The "epoch" returned together with `since`.
+            limit: Maximum number of changes to return (server default if None).
+            timeout: Seconds the server may wait for a change (server default if None).
+                     Keep this below the client's 30s request timeout.
+
+        Returns:
+            The feed response: "epoch", "seq", "hasMore", "reset" and either
+            "changes" (reset False) or a full "agents" snapshot (reset True).
+
+        Raises:
+            AgentKitError: If the request fails due to API errors or network issues.
+        """
+        params: Dict[str, Any] = {}
+        if since is not None:
+            params["since"] = since
+        if epoch is not None:
+            params["epoch"] = epoch
+        if limit is not None:
+            params["limit"] = limit
+        if timeout is not None:
+            params["timeout"] = timeout
+
+        response_data = await self._make_request("GET", "/v1/agents/changes", params=params)
+        if response_data.get("status") == "success" and isinstance(response_data.get("data"), dict):
+            return response_data["data"]
+        message = response_data.get("message", "Fetching agent changes failed with unexpected response format.")
+        raise AgentKitError(message, response_data=response_data)
+
+
+class AgentRegistryMirror:
+    """
+    Local copy of the AgentKit agent registry, kept current through the change feed.
+
+    The first sync loads a snapshot; later syncs only transfer changes. If
+    the service can no longer resume from the mirror's cursor (e.g. after a
+    restart) it sends a fresh snapshot, which replaces the local copy.
+
+    Usage:
+        mirror = AgentRegistryMirror(client)
+        await mirror.sync()                # Initial snapshot
+        while True:
+            await mirror.sync(timeout=25)  # Blocks until something changes
+    """
+    def __init__(self, client: AgentKitClient):
+        self.client = client
+        self.agents: Dict[str, Dict[str, Any]] = {}   # agentId -> agent dict
+        self.seq: Optional[int] = None
+        self.epoch: Optional[str] = None
+
+    def _apply(self, data: Dict[str, Any]) -> int:
+        if data.get("reset"):
+            self.agents = {agent["agentId"]: agent for agent in data.get("agents", [])}
+            applied = len(self.agents)
+        else:
+            changes = data.get("changes", [])
+            for change in changes:
+                if change["op"] == "remove":
+                    self.agents.pop(change["agentId"], None)
+                else:
+                    self.agents[change["agentId"]] = change["agent"]
+            applied = len(changes)
+        self.seq = data["seq"]
+        self.epoch = data["epoch"]
+        return applied
+
+    async def sync(self, timeout: float = 0) -> int:
+        """
+        Brings the mirror up to date.
+
+        Args:
+            timeout: Seconds to wait for a change if the mirror is already current.
+
+        Returns:
+            The number of changes applied (or agents loaded, after a snapshot).
+        """
+        applied = 0
+        while True:
+            data = await self.client.get_agent_changes(since=self.seq, epoch=self.epoch, timeout=timeout)
+            applied += self._apply(data)
+            if not data.get("hasMore"):
+                return applied
+            timeout = 0 # Drain the backlog without waiting
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from agentkit.sdk.client import AgentKitError
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Close codes AgentKit uses when the channel cannot be (or stay) open; reconnecting would not help
+CLOSE_UNAUTHORIZED = 4401   # Missing or invalid push token
+CLOSE_UNKNOWN_AGENT = 4404  # The agent is not registered
+CLOSE_DEREGISTERED = 4410   # The agent left the registry while connected
+FINAL_CLOSE_CODES = {CLOSE_UNAUTHORIZED: 401, CLOSE_UNKNOWN_AGENT: 404, CLOSE_DEREGISTERED: 410}   # Close code -> AgentKitError status
+
+
+class MessageReceiver:
+    """
+    Receives an agent's messages over AgentKit's WebSocket push channel.
+
+    The agent keeps an outbound connection to AgentKit open, so it gets its
+    messages even when its contact endpoint is not reachable from AgentKit.
+    Each message is passed to `handler` (messages of a batch delivery one
+    after the other, in order). The delivery is acknowledged once the
+    handler returns; if it raises, the delivery is rejected and AgentKit
+    retries it as it would a failed POST. An exception with an integer
+    `status_code` attribute (such as AgentKitError) sets the reported
+    status, so a 4xx marks the message as not worth retrying.
+
+    The connection is authenticated with the agent's push token, returned
+    by registration (AgentKitClient keeps it in `push_tokens`). Up to
+    `max_concurrency` deliveries are handled at once. The connection is
+    re-established with exponential backoff until `stop()` is called.
+    Requires the `websockets` package.
+
+    Usage:
+        receiver = MessageReceiver(agent_id, handle_message, client.push_tokens[agent_id], base_url="http://agentkit:8000")
+        await receiver.run()
+    """
+
+    def __init__(
+        self,
+        agent_id: str,
+        handler: MessageHandler,
+        push_token: str,
+        base_url: str = "http://localhost:8000",
+        max_concurrency: int = 16,
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 30.0,
+    ):
+        self.agent_id = agent_id
+        self.handler = handler
+        self.push_token = push_token
+        scheme, rest = base_url.rstrip("/").split("://", 1)
+        self.url = f"{'wss' if scheme == 'https' else 'ws'}://{rest}/v1/agents/{agent_id}/connect"
+        self.max_concurrency = max_concurrency
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._socket: Any = None
+        self._stopped = False
+
+    async def run(self) -> None:
+        """
+        Receives messages until `stop()` is called.
+
+        Raises:
+            AgentKitError: If the `websockets` package is missing, or AgentKit
+                           does not know the agent, rejects the push token or
+                           closes the channel because the agent was deregistered.
+        """
+        try:
+            import websockets
+        except ImportError as e:
+            raise AgentKitError("MessageReceiver requires the 'websockets' package (pip install websockets).") from e
+
+        delay = self.reconnect_delay
+        while not self._stopped:
+            try:
+                async with websockets.connect(self.url, additional_headers={"Authorization": f"Bearer {self.push_token}"}) as socket:
+                    self._socket = socket
+                    delay = self.reconnect_delay
+                    logger.info(f"Push channel for agent {self.agent_id} connected to {self.url}.")
+                    await self._receive(socket)
+            except websockets.ConnectionClosed as e:
+                if e.rcvd is not None and e.rcvd.code in FINAL_CLOSE_CODES:
+                    raise AgentKitError(f"AgentKit rejected the push channel: {e.rcvd.reason}", status_code=FINAL_CLOSE_CODES[e.rcvd.code]) from e
+                logger.warning(f"Push channel for agent {self.agent_id} closed: {e}")
+            except (OSError, websockets.WebSocketException) as e:
+                logger.warning(f"Push channel for agent {self.agent_id} failed: {e!r}")
+            finally:
+                self._socket = None
+            if not self._stopped:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def stop(self) -> None:
+        """Closes the connection and makes `run()` return."""
+        self._stopped = True
+        if self._socket is not None:
+            await self._socket.close()
+
+    async def _receive(self, socket: Any) -> None:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        handling: Set[asyncio.Task] = set()
+
+        async def handle(text: str) -> None:
+            try:
+                reply = await self.handle_frame(text)
+                if reply is not None:
+                    await socket.send(reply)
+            finally:
+                semaphore.release()
+
+        try:
+            async for text in socket:
+                await semaphore.acquire()
+                task = asyncio.create_task(handle(text))
+                handling.add(task)
+                task.add_done_callback(handling.discard)
+        finally:
+            await asyncio.gather(*handling, return_exceptions=True)
+
+    async def handle_frame(self, text: str) -> Optional[str]:
+        """Runs the handler for one `deliver` frame and returns the ack/nack frame to send back."""
+        try:
+            frame = json.loads(text)
+        except ValueError:
+            logger.warning(f"Ignoring malformed push channel frame for agent {self.agent_id}.")
+            return None
+        if not isinstance(frame, dict) or frame.get("type") != "deliver":
+            return None
+        body = frame.get("body")
+        try:
+            for message in body if isinstance(body, list) else [body]:
+                await self.handler(message)
+        except Exception as e:
+            logger.exception(f"Handler failed for a message delivered to agent {self.agent_id}.")
+            status_code = getattr(e, "status_code", None)
+            return json.dumps({
+                "type": "nack",
+                "deliveryId": frame.get("deliveryId"),
+                "statusCode": status_code if isinstance(status_code, int) else 500,
+                "error": str(e),
+            })
+        return json.dumps({"type": "ack", "deliveryId": frame.get("deliveryId")})
@@ -0,0 +1,85 @@
+"""
+Compression benchmark: CPU spent vs. bytes saved on message bodies.
+
+Builds MessagePayload JSON bodies of several sizes (verbose records with
+repeated keys and word-like text, as agents exchange) and, for each
+available coding and level, reports:
+
+  ratio       compressed size / original size
+  comp us     time to compress one body
+  decomp us   time to decompress one body
+  MB/s        compression throughput
+  break-even  link speed below which compressing the body is faster than
+              sending the saved bytes (bytes saved * 8 / compression time);
+              on faster links compression costs more time than it saves
+
+zstd rows need the optional `zstandard` package.
+
+Usage:
+    python benchmarks/bench_compression.py [--sizes 256,1024,4096,65536,1048576] [--seconds 0.2]
+"""
+import argparse
+import random
+import time
+
+from agentkit.core.compression import GZIP, ZSTD, Compression
+from agentkit.core.models import MessagePayload
+
+WORDS = ("agent task status result pending running failed retry session context "
+         "document summary search plan execute tool invocation response metadata").split()
+LEVELS = {GZIP: (1, 6, 9), ZSTD: (1, 3, 9)}
+
+
+def make_body(size: int, rng: random.Random) -> bytes:
+    """A MessagePayload body of roughly `size` bytes."""
+    records = []
+    payload = MessagePayload(senderId="bench", messageType="document", payload={"records": records})
+    while len(payload.model_dump_json()) < size:
+        records.append({
+            "id": f"rec-{len(records):06d}",
+            "status": rng.choice(("pending", "running", "done")),
+            "score": round(rng.random(), 4),
+            "text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))),
+        })
+    return payload.model_dump_json().encode()
+
+
+def timed(fn, seconds: float) -> float:
+    """Mean seconds per call of `fn`, repeated for about `seconds`."""
+    calls, start = 0, time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return elapsed / calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="256,1024,4096,65536,1048576")
+    parser.add_argument("--seconds", type=float, default=0.2, help="Time spent measuring each row")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    supported = Compression().supported
+    print(f"{'size':>9} {'coding':>8} {'ratio':>6} {'comp us':>10} {'decomp us':>10} {'MB/s':>8} {'break-even':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        body = make_body(size, rng)
+        for encoding in (GZIP, ZSTD):
+            if encoding not in supported:
+                print(f"{len(body):>9,} {encoding:>8}  (not installed)")
+                continue
+            for level in LEVELS[encoding]:
+                codecs = Compression(gzip_level=level, zstd_level=level, max_decompressed_size=len(body))
+                compressed = codecs.compress(body, encoding)
+                compress_s = timed(lambda: codecs.compress(body, encoding), args.seconds)
+                decompress_s = timed(lambda: codecs.decompress(compressed, encoding), args.seconds)
+                saved_bits = (len(body) - len(compressed)) * 8
+                print(f"{len(body):>9,} {f'{encoding}-{level}':>8} {len(compressed) / len(body):>6.2f} "
+                      f"{compress_s * 1e6:>10,.1f} {decompress_s * 1e6:>10,.1f} {len(body) / compress_s / 1e6:>8,.0f} "
+                      f"{saved_bits / compress_s / 1e6:>8,.0f} Mb/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Dispatch throughput benchmark: per-message httpx clients vs. the shared pool.
+
+Starts a minimal keep-alive HTTP stub agent in a separate process, then
+dispatches N messages with `dispatch_to_agent_endpoint`, C at a time:
+
+  per-call  a new httpx.AsyncClient for every message (the old behaviour:
+            a fresh TCP connection per dispatch)
+  pooled    the shared HttpClientPool (connections are kept alive and reused)
+
+Usage:
+    python benchmarks/bench_dispatch.py [--messages 2000] [--concurrency 20]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import time
+
+import httpx
+
+from agentkit.api.endpoints import messaging
+from agentkit.core.http_pool import HttpClientPool
+from agentkit.core.models import MessagePayload
+
+RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}"
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Answers every request on a connection with 200 {} until the client closes it."""
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            if length:
+                await reader.readexactly(length)
+            writer.write(RESPONSE)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def _serve(port: int) -> None:
+    async def main() -> None:
+        server = await asyncio.start_server(_handle, "127.0.0.1", port, backlog=1024)
+        async with server:
+            await server.serve_forever()
+    asyncio.run(main())
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class _PerCallPool:
+    """Mimics the previous dispatch code: one AsyncClient per message."""
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        async with httpx.AsyncClient() as client:
+            return await client.post(url, **kwargs)
+
+
+async def _run(pool, url: str, messages: int, concurrency: int) -> float:
+    payload = MessagePayload(senderId="bench", messageType="custom_instruction", payload={"n": 1})
+    messaging.http_pool = pool
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            await messaging.dispatch_to_agent_endpoint(agent_id="bench-agent", contact_endpoint=url, payload=payload)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(messages)))
+    return messages / (time.perf_counter() - start)
+
+
+async def _bench(url: str, messages: int, concurrency: int) -> None:
+    per_call = await _run(_PerCallPool(), url, messages, concurrency)
+    pool = HttpClientPool()
+    pooled = await _run(pool, url, messages, concurrency)
+    await pool.aclose()
+    print(f"{'mode':>10} {'dispatches/s':>14}")
+    print(f"{'per-call':>10} {per_call:>14,.0f}")
+    print(f"{'pooled':>10} {pooled:>14,.0f}   ({pooled / per_call:.1f}x)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2_000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger("agentkit").setLevel(logging.WARNING)   # Keep per-dispatch INFO logs out of the timing
+    messaging.logger.setLevel(logging.WARNING)
+
+    port = _free_port()
+    server = multiprocessing.Process(target=_serve, args=(port,), daemon=True)
+    server.start()
+    try:
+        for _ in range(50):   # Wait for the stub to accept connections
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        asyncio.run(_bench(f"http://127.0.0.1:{port}/run", args.messages, args.concurrency))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
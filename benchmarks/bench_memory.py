@@ -0,0 +1,69 @@
+"""
+Registry memory benchmark using tracemalloc.
+
+Registers N agents into an InMemoryBackend (1M by default) and reports the
+memory the registry holds per agent. AgentInfo objects are created one at a
+time and dropped after registration, so only what the store retains is
+counted. For comparison, the same measurement is taken for a plain dict of
+AgentInfo objects (what the store held before compact records); that run is
+capped at --baseline-agents to keep it within RAM.
+
+Usage:
+    python benchmarks/bench_memory.py [--agents 1000000] [--baseline-agents 100000]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from agentkit.core.models import AgentInfo, AgentMetadata
+from agentkit.registration.backends import InMemoryBackend
+
+CAPABILITIES = ["search", "summarize", "translate", "plan", "code"]
+VERSIONS = ["1.0", "1.1", "2.0"]
+
+
+def make_agent(i: int) -> AgentInfo:
+    return AgentInfo(
+        agentName=f"bench-agent-{i}",
+        capabilities=[CAPABILITIES[i % len(CAPABILITIES)], "bench"],
+        version=VERSIONS[i % len(VERSIONS)],
+        contactEndpoint=f"http://agent-{i}.bench.local:8000/run",
+        metadata=AgentMetadata(description="benchmark agent"),
+    )
+
+
+def measure(count: int, store) -> float:
+    """Returns bytes retained per agent after storing `count` agents via `store`."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        store(make_agent(i))
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return retained / count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=1_000_000)
+    parser.add_argument("--baseline-agents", type=int, default=100_000)
+    args = parser.parse_args()
+
+    agent_infos = {}
+    start = time.perf_counter()
+    per_agent = measure(args.baseline_agents, lambda agent: agent_infos.__setitem__(agent.agentId, agent))
+    print(f"AgentInfo dict:      {args.baseline_agents:>9,} agents  {per_agent:>7,.0f} B/agent  ({time.perf_counter() - start:.1f}s)")
+    agent_infos.clear()
+
+    backend = InMemoryBackend()
+    start = time.perf_counter()
+    per_agent = measure(args.agents, backend.add)
+    print(f"InMemoryBackend:     {args.agents:>9,} agents  {per_agent:>7,.0f} B/agent  ({time.perf_counter() - start:.1f}s)")
+    print(f"registry total:      {per_agent * args.agents / 2**20:,.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Delivery latency benchmark: HTTP POST to the contact endpoint vs. the WebSocket push channel.
+
+Serves the AgentKit app with uvicorn in this process, a keep-alive HTTP
+stub agent in a second process and a MessageReceiver agent in a third,
+then delivers N messages one after another with
+`dispatch_to_agent_endpoint` and reports the per-message latency:
+
+  http   pooled POST to the stub agent's contact endpoint (round trip
+         until the agent's response)
+  push   `deliver` frame over the agent's open WebSocket (round trip
+         until the agent's ack)
+
+Usage:
+    python benchmarks/bench_push.py [--messages 2000]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import time
+
+import uvicorn
+
+from agentkit.api.endpoints import messaging
+from agentkit.core.http_pool import http_pool
+from agentkit.core.models import AgentInfo, MessagePayload
+from agentkit.messaging.push import push_channels
+from agentkit.registration.storage import agent_storage
+from benchmarks.bench_dispatch import _free_port, _serve
+
+AGENT_ID = "bench-push-agent"
+
+
+def _receive(port: int, push_token: str) -> None:
+    from agentkit.sdk.receiver import MessageReceiver
+
+    async def ignore(message) -> None:
+        pass
+
+    asyncio.run(MessageReceiver(AGENT_ID, ignore, push_token, base_url=f"http://127.0.0.1:{port}").run())
+
+
+def _wait_for_port(port: int) -> None:
+    for _ in range(50):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+
+
+async def _latencies(url: str, messages: int) -> list:
+    payload = MessagePayload(senderId="bench", messageType="custom_instruction", payload={"n": 1})
+    samples = []
+    for _ in range(messages):
+        start = time.perf_counter()
+        await messaging.dispatch_to_agent_endpoint(agent_id=AGENT_ID, contact_endpoint=url, payload=payload)
+        samples.append(time.perf_counter() - start)
+    return sorted(samples)
+
+
+def _row(mode: str, samples: list) -> str:
+    def ms(fraction: float) -> float:
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000
+    return f"{mode:>6} {ms(0.5):>9.3f} {ms(0.99):>9.3f} {len(samples) / sum(samples):>12,.0f}"
+
+
+async def _bench(api_port: int, agent_port: int, messages: int) -> None:
+    from main import app
+    url = f"http://127.0.0.1:{agent_port}/run"
+    agent_storage.add_agent(AgentInfo(agentId=AGENT_ID, agentName=AGENT_ID, capabilities=[], version="1.0", contactEndpoint=url))
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=api_port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    await _latencies(url, 50) # Warm up the pooled connection
+    http = await _latencies(url, messages)
+
+    # Spawned rather than forked: a fork would inherit uvicorn's signal handlers and ignore terminate()
+    receiver = multiprocessing.get_context("spawn").Process(target=_receive, args=(api_port, push_channels.token_for(AGENT_ID)), daemon=True)
+    receiver.start()
+    try:
+        while push_channels.get(AGENT_ID) is None:
+            await asyncio.sleep(0.05)
+        await _latencies(url, 50)
+        push = await _latencies(url, messages)
+    finally:
+        receiver.terminate()
+
+    print(f"{'mode':>6} {'p50 ms':>9} {'p99 ms':>9} {'messages/s':>12}")
+    print(_row("http", http))
+    print(_row("push", push))
+    server.should_exit = True
+    await serving
+    await http_pool.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2_000)
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger("agentkit").setLevel(logging.WARNING)   # Keep per-dispatch INFO logs out of the timing
+    messaging.logger.setLevel(logging.WARNING)
+
+    agent_port = _free_port()
+    agent = multiprocessing.Process(target=_serve, args=(agent_port,), daemon=True)
+    agent.start()
+    try:
+        _wait_for_port(agent_port)
+        asyncio.run(_bench(_free_port(), agent_port, args.messages))
+    finally:
+        agent.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Registration throughput benchmark for AgentStorage.
+
+Measures how many agents per second can be added to the registry at
+different registry sizes. With the name/capability indexes each add is
+O(1), so throughput should stay roughly flat as the registry grows.
+
+Usage:
+    python benchmarks/bench_registration.py [--sizes 1000 10000 100000]
+"""
+import argparse
+import time
+
+from agentkit.core.models import AgentInfo
+from agentkit.registration.storage import agent_storage
+
+CAPABILITIES = ["search", "summarize", "translate", "plan", "code"]
+
+
+def build_agents(count: int) -> list[AgentInfo]:
+    """Builds AgentInfo objects up front so only storage work is timed."""
+    return [
+        AgentInfo(
+            agentName=f"bench-agent-{i}",
+            capabilities=[CAPABILITIES[i % len(CAPABILITIES)], "bench"],
+            version="1.0",
+            contactEndpoint=f"http://agent-{i}.bench.local:8000/run",
+        )
+        for i in range(count)
+    ]
+
+
+def bench_add(count: int) -> float:
+    """Returns registrations per second for a registry grown from empty to `count`."""
+    agents = build_agents(count)
+    agent_storage.clear_all()
+    start = time.perf_counter()
+    for agent in agents:
+        agent_storage.add_agent(agent)
+    elapsed = time.perf_counter() - start
+    agent_storage.clear_all()
+    return count / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'agents':>10} {'registrations/s':>18}")
+    for size in args.sizes:
+        print(f"{size:>10} {bench_add(size):>18,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Registry restore benchmark for snapshot + journal persistence.
+
+Builds a journaled registry of N agents (most of them covered by a
+compacted snapshot, the rest left in the journal tail), then measures how
+long a fresh AgentStorage takes to restore it.
+
+Usage:
+    python benchmarks/bench_restore.py [--agents 100000] [--tail 5000]
+"""
+import argparse
+import tempfile
+import time
+
+from agentkit.registration.backends import InMemoryBackend
+from agentkit.registration.persistence import RegistryJournal
+from agentkit.registration.storage import AgentStorage
+from benchmarks.bench_registration import build_agents
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=100_000)
+    parser.add_argument("--tail", type=int, default=5_000, help="Registrations left in the journal after the snapshot")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        journal = RegistryJournal(directory, snapshot_every=args.agents * 10)
+        storage = AgentStorage(InMemoryBackend(), journal=journal)
+        agents = build_agents(args.agents)
+
+        start = time.perf_counter()
+        for agent in agents[: args.agents - args.tail]:
+            storage.add_agent(agent)
+        journal.compact(storage.backend.export_records())
+        for agent in agents[args.agents - args.tail:]:
+            storage.add_agent(agent)
+        journal.close()
+        print(f"journaled {args.agents} registrations (snapshot + {args.tail} tail) in {time.perf_counter() - start:.3f}s")
+
+        start = time.perf_counter()
+        restored = AgentStorage(InMemoryBackend(), journal=RegistryJournal(directory))
+        elapsed = time.perf_counter() - start
+        assert len(restored.list_agents()) == args.agents
+        print(f"restored {args.agents} agents in {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
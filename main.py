@@ -1,21 +1,43 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from agentkit.api.endpoints import registration, messaging
-from agentkit.api.middleware import LoggingMiddleware
+from agentkit.api.middleware import CompressionMiddleware, LoggingMiddleware
+from agentkit.core.http_pool import http_pool # Shared outbound HTTP client
+from agentkit.messaging.dispatcher import drain_timeout_from_env
+from agentkit.registration.storage import agent_storage
 from agentkit.tools.registry import tool_registry # Import the registry
 
 # --- Environment Variables (Optional: For configurable mock tool URL) ---
 MOCK_TOOL_URL = os.environ.get("MOCK_TOOL_ENDPOINT_URL", "http://mock_tool:9001/invoke")
 
+# --- Application Lifespan ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Opens the shared outbound HTTP client and starts the dispatch workers and
+    the lease reaper on startup. On shutdown, gives queued messages a chance
+    to be delivered before the pooled connections are closed.
+    """
+    http_pool.client # Create the client on the serving event loop
+    messaging.dispatcher.start()
+    agent_storage.start_reaper() # Evicts expired leases on this loop, alongside the requests that read the registry
+    yield
+    await agent_storage.stop_reaper()
+    await messaging.dispatcher.stop(timeout=drain_timeout_from_env())
+    await http_pool.aclose()
+
 # --- FastAPI App Setup ---
 app = FastAPI(
     title="AgentKit API",
     description="API for managing autonomous AI agents within the Opspawn ecosystem.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Add Middleware
 app.add_middleware(LoggingMiddleware)
+app.add_middleware(CompressionMiddleware) # Outermost: decodes request bodies, compresses responses
 
 @app.get("/")
 async def read_root():
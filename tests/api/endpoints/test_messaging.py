@@ -5,11 +5,20 @@ from agentkit.registration.storage import agent_storage
 from agentkit.core.models import AgentInfo, MessagePayload
 from agentkit.tools.registry import tool_registry # Import tool registry
 from agentkit.tools.interface import ToolInterface # Import base interface
+import asyncio
+import gzip
+import json
+import time
 from typing import Dict, Any, Optional
 import httpx # Import httpx for mocking
 from unittest.mock import AsyncMock, patch # Add patch
 from pydantic import HttpUrl
-from fastapi import HTTPException, BackgroundTasks # Import HTTPException and BackgroundTasks
+from fastapi import HTTPException # Import HTTPException
+from agentkit.api.endpoints import messaging
+from agentkit.messaging.dispatcher import AgentUnavailable, DispatchQueueFull
+from agentkit.messaging.blobs import BlobStore, ClaimCheck
+from agentkit.messaging.idempotency import IdempotencyCache
+from agentkit.messaging.rate_limit import RateLimiter
 
 # Fixture to provide a TestClient instance
 @pytest.fixture(scope="module")
@@ -79,7 +88,7 @@ def setup_test_environment_with_tools():
 def test_run_agent_dispatch_accepted(client: TestClient, setup_test_environment_with_tools, mocker):
     """Test successful acceptance of a non-tool message (202 Accepted)."""
     target_agent_id = setup_test_environment_with_tools
-    mock_add_task = mocker.patch("fastapi.BackgroundTasks.add_task")
+    mock_submit = mocker.patch.object(messaging.dispatcher, "submit")
 
     payload = {
         "senderId": "dispatch-tester",
@@ -95,11 +104,10 @@ def test_run_agent_dispatch_accepted(client: TestClient, setup_test_environment_
     assert response_data["data"]["dispatch_status"] == "scheduled"
     assert response_data["data"]["agentId"] == target_agent_id
 
-    # Verify background task was scheduled
-    mock_add_task.assert_called_once()
-    assert mock_add_task.call_args[0][0].__name__ == "dispatch_to_agent_endpoint"
-    # Check args passed to background task
-    call_kwargs = mock_add_task.call_args[1] # Keyword args passed to add_task
+    # Verify the message was queued for dispatch
+    mock_submit.assert_called_once()
+    # Check args passed to the dispatcher
+    call_kwargs = mock_submit.call_args[1] # Keyword args passed to submit
     assert call_kwargs["agent_id"] == target_agent_id
     # Compare string representation of HttpUrl, expecting trailing slash
     assert str(call_kwargs["contact_endpoint"]) == "http://test-receiver.local/" # From fixture
@@ -111,7 +119,7 @@ def test_run_agent_dispatch_accepted(client: TestClient, setup_test_environment_
 def test_run_agent_dispatch_with_opscore_fields(client: TestClient, setup_test_environment_with_tools, mocker):
     """Test dispatch acceptance with Ops-Core fields in the payload."""
     target_agent_id = setup_test_environment_with_tools
-    mock_add_task = mocker.patch("fastapi.BackgroundTasks.add_task")
+    mock_submit = mocker.patch.object(messaging.dispatcher, "submit")
 
     payload = {
         "senderId": "opscore-sim",
@@ -127,9 +135,9 @@ def test_run_agent_dispatch_with_opscore_fields(client: TestClient, setup_test_e
     response_data = response.json()
     assert response_data["status"] == "success"
 
-    # Verify background task was scheduled with correct payload including opscore fields
-    mock_add_task.assert_called_once()
-    call_kwargs = mock_add_task.call_args[1]
+    # Verify the message was queued with correct payload including opscore fields
+    mock_submit.assert_called_once()
+    call_kwargs = mock_submit.call_args[1]
     assert call_kwargs["payload"].senderId == payload["senderId"]
     assert call_kwargs["payload"].messageType == payload["messageType"]
     assert call_kwargs["payload"].payload == payload["payload"]
@@ -141,13 +149,13 @@ def test_run_agent_dispatch_with_opscore_fields(client: TestClient, setup_test_e
 def test_run_agent_dispatch_agent_no_endpoint(client: TestClient, setup_test_environment_with_tools, mocker):
     """Test dispatch attempt when the target agent has no contact endpoint."""
     target_agent_id = setup_test_environment_with_tools
-    # Modify the agent directly in storage to remove the endpoint
+    # Storage hands out materialized copies, so serve an endpoint-less copy from get_agent
     agent = agent_storage.get_agent(target_agent_id)
     assert agent is not None # Ensure agent was found
     agent.contactEndpoint = None
-    # No need to call add_agent again, modification is in-place for dict storage
+    mocker.patch.object(agent_storage, "get_agent", return_value=agent)
 
-    mock_add_task = mocker.patch("fastapi.BackgroundTasks.add_task")
+    mock_submit = mocker.patch.object(messaging.dispatcher, "submit")
 
     payload = {
         "senderId": "dispatch-tester",
@@ -161,7 +169,107 @@ def test_run_agent_dispatch_agent_no_endpoint(client: TestClient, setup_test_env
     response_data = response.json()
     assert "detail" in response_data
     assert "has no registered contact endpoint" in response_data["detail"]
-    mock_add_task.assert_not_called() # Background task should not be scheduled
+    mock_submit.assert_not_called() # Nothing should be queued
+
+
+def test_run_agent_dispatch_queue_full(client: TestClient, setup_test_environment_with_tools, mocker):
+    """A saturated dispatch queue is reported as 429 with a Retry-After header."""
+    target_agent_id = setup_test_environment_with_tools
+    mocker.patch.object(messaging.dispatcher, "submit", side_effect=DispatchQueueFull("Dispatch queue is full (10 messages waiting).", retry_after=7))
+
+    payload = {"senderId": "dispatch-tester", "messageType": "custom_instruction", "payload": {}}
+    response = client.post(f"/v1/agents/{target_agent_id}/run", json=payload)
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
+    assert "Dispatch queue is full" in response.json()["detail"]
+
+
+def test_run_agent_circuit_open_fails_fast(client: TestClient, setup_test_environment_with_tools, mocker):
+    """An agent whose circuit breaker is open (fail-fast mode) is reported as 503 with Retry-After."""
+    target_agent_id = setup_test_environment_with_tools
+    mocker.patch.object(messaging.dispatcher, "submit", side_effect=AgentUnavailable(f"Agent '{target_agent_id}' is failing; its circuit breaker is open.", retry_after=25))
+
+    payload = {"senderId": "dispatch-tester", "messageType": "custom_instruction", "payload": {}}
+    response = client.post(f"/v1/agents/{target_agent_id}/run", json=payload)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "25"
+    assert "circuit breaker is open" in response.json()["detail"]
+
+
+def test_run_agent_rate_limited(client: TestClient, setup_test_environment_with_tools, mocker):
+    """A sender over its rate limit is reported as 429 with Retry-After, and counted in the stats."""
+    target_agent_id = setup_test_environment_with_tools
+    mocker.patch.object(messaging, "rate_limiter", RateLimiter(sender_rate=0.5, sender_burst=1))
+    mock_submit = mocker.patch.object(messaging.dispatcher, "submit")
+
+    payload = {"senderId": "noisy-sender", "messageType": "custom_instruction", "payload": {}}
+    assert client.post(f"/v1/agents/{target_agent_id}/run", json=payload).status_code == 202
+    response = client.post(f"/v1/agents/{target_agent_id}/run", json=payload)
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    assert "Sender 'noisy-sender' is over its rate limit" in response.json()["detail"]
+    assert mock_submit.call_count == 1
+    limits = client.get("/v1/dispatch/stats").json()["data"]["rateLimits"]
+    assert limits["sender"]["throttled"] == 1
+    assert limits["sender"]["topThrottled"] == [{"key": "noisy-sender", "throttled": 1}]
+
+
+def test_run_agent_idempotency_key_replays_without_redispatch(client: TestClient, setup_test_environment_with_tools, mocker):
+    """A retried /run with the same Idempotency-Key gets the stored response and is not queued again."""
+    target_agent_id = setup_test_environment_with_tools
+    mocker.patch.object(messaging, "idempotency_cache", IdempotencyCache())
+    submit = mocker.patch.object(messaging.dispatcher, "submit", return_value=mocker.Mock(task_id="task-42"))
+
+    payload = {"senderId": "retrying-producer", "messageType": "custom_instruction", "payload": {"n": 1}}
+    first = client.post(f"/v1/agents/{target_agent_id}/run", json=payload, headers={"Idempotency-Key": "order-42"})
+    retry = client.post(f"/v1/agents/{target_agent_id}/run", json=payload, headers={"Idempotency-Key": "order-42"})
+    same_key_in_body = client.post(f"/v1/agents/{target_agent_id}/run", json={**payload, "idempotencyKey": "order-42"})
+
+    assert first.status_code == retry.status_code == same_key_in_body.status_code == 202
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json() == same_key_in_body.json()
+    assert submit.call_count == 1
+
+    conflict = client.post(f"/v1/agents/{target_agent_id}/run", json={**payload, "messageType": "other"}, headers={"Idempotency-Key": "order-42"})
+    assert conflict.status_code == 422
+    different_body = client.post(f"/v1/agents/{target_agent_id}/run", json={**payload, "payload": {"n": 2}}, headers={"Idempotency-Key": "order-42"})
+    assert different_body.status_code == 422
+    assert submit.call_count == 1
+
+
+def test_run_offloads_large_payload_to_blob_store(client: TestClient, setup_test_environment_with_tools, mocker, tmp_path):
+    """A payload over the claim-check threshold is queued as a reference and downloadable from /blobs."""
+    target_agent_id = setup_test_environment_with_tools
+    mocker.patch.object(messaging, "claim_checks", ClaimCheck(BlobStore(str(tmp_path)), threshold=100))
+    submit = mocker.patch.object(messaging.dispatcher, "submit", return_value=mocker.Mock(task_id="task-1"))
+
+    document = {"text": "lorem ipsum " * 50}
+    response = client.post(f"/v1/agents/{target_agent_id}/run", json={"senderId": "s", "messageType": "document", "payload": document})
+    assert response.status_code == 202
+
+    queued = submit.call_args.kwargs["payload"]
+    reference = queued.payload["claimCheck"]
+    download = client.get(reference["href"])
+    assert download.status_code == 200
+    assert download.headers["content-type"] == "application/json"
+    assert download.json() == document
+    assert client.get("/v1/blobs/" + "0" * 64).status_code == 404
+
+
+def test_get_dispatch_stats(client: TestClient):
+    """The stats endpoint reports the dispatcher configuration and counters."""
+    response = client.get("/v1/dispatch/stats")
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["workers"] == messaging.dispatcher.workers
+    assert data["queueCapacity"] == messaging.dispatcher.max_queue
+    assert {"queueDepth", "inFlight", "accepted", "rejected", "waitTimeMs"} <= set(data)
+    assert {"open", "halfOpen", "tracked"} <= set(data["circuitBreakers"])
 
 
 def test_run_agent_not_found(client: TestClient):
@@ -323,10 +431,11 @@ from agentkit.api.endpoints.messaging import run_agent
 
 @pytest.mark.asyncio
 async def test_unit_dispatch_accepted_and_schedules_task(mocker):
-    """Unit test successful acceptance and background task scheduling."""
+    """Unit test successful acceptance and queueing for dispatch."""
     # Mock dependencies
     mock_agent_storage = mocker.patch('agentkit.api.endpoints.messaging.agent_storage')
-    mock_background_tasks = mocker.MagicMock(spec=BackgroundTasks) # Use MagicMock for BackgroundTasks
+    mock_submit = mocker.patch.object(messaging.dispatcher, "submit")
+    mock_submit.return_value.task_id = "task-unit-01"
 
     # Setup mock return values
     target_agent_id = "unit-target-01"
@@ -344,22 +453,17 @@ async def test_unit_dispatch_accepted_and_schedules_task(mocker):
         payload={"instruction": "unit test dispatch"}
     )
 
-    # Call the function directly, passing the mocked BackgroundTasks
+    # Call the function directly
     api_response = await run_agent(
         agent_id=target_agent_id,
-        payload=message,
-        background_tasks=mock_background_tasks # Pass mock
+        payload=message
     )
 
     # Assertions
     mock_agent_storage.get_agent.assert_called_once_with(target_agent_id)
-    # Verify background task was scheduled
-    mock_background_tasks.add_task.assert_called_once()
-    # Check function and args passed to add_task
-    assert mock_background_tasks.add_task.call_args.args[0].__name__ == "dispatch_to_agent_endpoint"
-    assert len(mock_background_tasks.add_task.call_args.args) == 1 # Only the function itself as positional arg
-    assert mock_background_tasks.add_task.call_args.kwargs is not None # Ensure kwargs exist
-    call_kwargs = mock_background_tasks.add_task.call_args.kwargs # Check keyword args
+    # Verify the message was queued for dispatch
+    mock_submit.assert_called_once()
+    call_kwargs = mock_submit.call_args.kwargs # Check keyword args
     assert call_kwargs["agent_id"] == target_agent_id
     assert str(call_kwargs["contact_endpoint"]) == contact_url # Compare string representation
     # Compare dictionary representations for robustness
@@ -368,7 +472,7 @@ async def test_unit_dispatch_accepted_and_schedules_task(mocker):
     # Assert the immediate response (202 Accepted structure)
     assert api_response.status == "success"
     assert api_response.message == f"Task accepted for agent {target_agent_id}. Dispatch scheduled."
-    assert api_response.data == {"agentId": target_agent_id, "dispatch_status": "scheduled"}
+    assert api_response.data == {"agentId": target_agent_id, "dispatch_status": "scheduled", "taskId": "task-unit-01"}
 
 
 # --- Removed Unit Tests for Synchronous Dispatch Error Handling ---
@@ -379,4 +483,597 @@ async def test_unit_dispatch_accepted_and_schedules_task(mocker):
 # The main run_agent function now returns 202 Accepted immediately if dispatch is possible.
 # Error handling for the actual dispatch happens within the background task (`dispatch_to_agent_endpoint`),
 # which should ideally be tested via integration tests or separate unit tests focusing on that specific function
-# (though testing background tasks in isolation can be complex).
\ No newline at end of file
+# (though testing background tasks in isolation can be complex).
+
+# --- Delivery Failure Classification ---
+
+from pytest_httpx import HTTPXMock
+from agentkit.messaging.dead_letters import DeadLetter, dead_letter_store
+from agentkit.messaging.retry import DeliveryError, KIND_CONNECT, KIND_DISCONNECT, KIND_STATUS, KIND_TIMEOUT
+
+DISPATCH_MESSAGE = MessagePayload(senderId="unit-sender", messageType="custom_instruction", payload={"n": 1})
+
+
+@pytest.mark.asyncio
+async def test_dispatch_to_agent_endpoint_classifies_failures(httpx_mock: HTTPXMock):
+    """Delivery failures are raised as DeliveryError with the kind the retry policy needs."""
+    httpx_mock.add_exception(httpx.ConnectError("refused"), url="http://down.test/run")
+    httpx_mock.add_exception(httpx.ReadTimeout("slow"), url="http://slow.test/run")
+    httpx_mock.add_exception(httpx.RemoteProtocolError("peer closed connection"), url="http://dropped.test/run")
+    httpx_mock.add_response(url="http://busy.test/run", status_code=503, headers={"Retry-After": "4"})
+    httpx_mock.add_response(url="http://ok.test/run", json={})
+
+    with pytest.raises(DeliveryError) as connect:
+        await messaging.dispatch_to_agent_endpoint(agent_id="a", contact_endpoint="http://down.test/run", payload=DISPATCH_MESSAGE)
+    with pytest.raises(DeliveryError) as timeout:
+        await messaging.dispatch_to_agent_endpoint(agent_id="a", contact_endpoint="http://slow.test/run", payload=DISPATCH_MESSAGE)
+    with pytest.raises(DeliveryError) as dropped:
+        await messaging.dispatch_to_agent_endpoint(agent_id="a", contact_endpoint="http://dropped.test/run", payload=DISPATCH_MESSAGE)
+    with pytest.raises(DeliveryError) as busy:
+        await messaging.dispatch_to_agent_endpoint(agent_id="a", contact_endpoint="http://busy.test/run", payload=DISPATCH_MESSAGE)
+    await messaging.dispatch_to_agent_endpoint(agent_id="a", contact_endpoint="http://ok.test/run", payload=DISPATCH_MESSAGE)
+
+    assert connect.value.kind == KIND_CONNECT
+    assert timeout.value.kind == KIND_TIMEOUT
+    assert dropped.value.kind == KIND_DISCONNECT
+    assert (busy.value.kind, busy.value.status_code, busy.value.retry_after) == (KIND_STATUS, 503, 4.0)
+
+
+@pytest.mark.asyncio
+async def test_dispatch_compresses_for_agents_that_accept_it(httpx_mock: HTTPXMock):
+    """Large messages to an agent that declared acceptEncoding are POSTed gzip-compressed; small ones are not."""
+    messaging.dispatch_routes.update("gz-agent", "http://gz.test/run", ["gzip"])
+    httpx_mock.add_response(url="http://gz.test/run", json={})
+    httpx_mock.add_response(url="http://gz.test/run", json={})
+    large = MessagePayload(senderId="unit-sender", messageType="document", payload={"text": "lorem ipsum " * 500})
+
+    await messaging.dispatch_to_agent_endpoint(agent_id="gz-agent", contact_endpoint="http://gz.test/run", payload=large)
+    await messaging.dispatch_to_agent_endpoint(agent_id="gz-agent", contact_endpoint="http://gz.test/run", payload=DISPATCH_MESSAGE)
+    compressed, plain = httpx_mock.get_requests(url="http://gz.test/run")
+    messaging.dispatch_routes.forget("gz-agent")
+
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert MessagePayload.model_validate_json(gzip.decompress(compressed.content)) == large
+    assert "Content-Encoding" not in plain.headers
+    assert MessagePayload.model_validate_json(plain.content) == DISPATCH_MESSAGE
+
+
+def test_run_accepts_compressed_body_and_compresses_responses(client: TestClient, setup_test_environment_with_tools, mocker):
+    """A gzip request body is decoded; unsupported codings get 415; large responses are compressed when accepted."""
+    target_agent_id = setup_test_environment_with_tools
+    submit = mocker.patch.object(messaging.dispatcher, "submit", return_value=mocker.Mock(task_id="task-1"))
+    message = {"senderId": "s", "messageType": "document", "payload": {"text": "lorem ipsum " * 200}}
+    body = gzip.compress(json.dumps(message).encode())
+
+    response = client.post(f"/v1/agents/{target_agent_id}/run", content=body, headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+    assert response.status_code == 202
+    assert submit.call_args.kwargs["payload"].payload == message["payload"]
+
+    unsupported = client.post(f"/v1/agents/{target_agent_id}/run", content=body, headers={"Content-Type": "application/json", "Content-Encoding": "br"})
+    assert unsupported.status_code == 415
+    assert "gzip" in unsupported.headers["Accept-Encoding"]
+    corrupt = client.post(f"/v1/agents/{target_agent_id}/run", content=body[:-10], headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+    assert corrupt.status_code == 400
+
+    stats = client.get("/v1/dispatch/stats", headers={"Accept-Encoding": "gzip"})
+    assert stats.headers["Content-Encoding"] == "gzip" and "Accept-Encoding" in stats.headers["Vary"]
+    assert stats.json()["data"]["compression"]["decoded"]["bodies"] >= 1 # httpx decoded the response transparently
+    small = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers # Below the threshold
+    assert "Accept-Encoding" in small.headers["Vary"]
+    unmatched = client.get("/v1/dispatch/stats", headers={"Accept-Encoding": "br"})
+    assert "Content-Encoding" not in unmatched.headers and "Accept-Encoding" in unmatched.headers["Vary"]
+
+
+def test_range_responses_are_not_compressed(client: TestClient, mocker, tmp_path):
+    """A 206 partial response keeps its bytes as is, so the range still matches the stored blob."""
+    store = BlobStore(str(tmp_path))
+    mocker.patch.object(messaging, "claim_checks", ClaimCheck(store, threshold=100))
+    document = json.dumps({"text": "lorem ipsum " * 500}).encode()
+    href = f"/v1/blobs/{store.put(document)}"
+
+    full = client.get(href, headers={"Accept-Encoding": "gzip"})
+    assert full.headers["Content-Encoding"] == "gzip"
+    partial = client.get(href, headers={"Accept-Encoding": "gzip", "Range": "bytes=100-2099"})
+    assert partial.status_code == 206
+    assert "Content-Encoding" not in partial.headers
+    assert partial.headers["Content-Range"] == f"bytes 100-2099/{len(document)}"
+    assert partial.content == document[100:2100]
+
+
+# --- Dead Letters ---
+
+@pytest.fixture
+def dead_letters():
+    dead_letter_store.clear()
+    yield dead_letter_store
+    dead_letter_store.clear()
+
+
+def test_list_dead_letters(client: TestClient, dead_letters):
+    first = dead_letters.add(DeadLetter("agent-1", "http://a.test/", DISPATCH_MESSAGE, 5, "refused"))
+    dead_letters.add(DeadLetter("agent-2", "http://b.test/", DISPATCH_MESSAGE, 1, "Agent returned status 400", 400))
+
+    response = client.get("/v1/dead-letters", params={"agentId": "agent-1"})
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["total"] == 1
+    [letter] = data["deadLetters"]
+    assert letter["id"] == first.id
+    assert letter["attempts"] == 5
+    assert letter["payload"]["payload"] == {"n": 1}
+    assert client.get("/v1/dead-letters").json()["data"]["total"] == 2
+
+
+def test_replay_dead_letters(client: TestClient, setup_test_environment_with_tools, dead_letters, mocker):
+    target_agent_id = setup_test_environment_with_tools
+    mock_submit = mocker.patch.object(messaging.dispatcher, "submit")
+    letter = dead_letters.add(DeadLetter(target_agent_id, "http://old-endpoint.test/", DISPATCH_MESSAGE, 5, "refused"))
+    orphan = dead_letters.add(DeadLetter("agent-gone", "http://gone.test/", DISPATCH_MESSAGE, 5, "refused"))
+
+    response = client.post("/v1/dead-letters", json={"ids": [letter.id, orphan.id, "missing"]})
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["replayed"] == [letter.id]
+    assert data["unknownAgent"] == [orphan.id]
+    assert data["notFound"] == ["missing"]
+    # Replays go to the agent's current endpoint and leave the store
+    assert mock_submit.call_args.kwargs["contact_endpoint"] == "http://test-receiver.local/"
+    assert [remaining.id for remaining in dead_letters.list()] == [orphan.id]
+
+
+def test_replay_dead_letters_queue_full(client: TestClient, setup_test_environment_with_tools, dead_letters, mocker):
+    target_agent_id = setup_test_environment_with_tools
+    mocker.patch.object(messaging.dispatcher, "submit", side_effect=DispatchQueueFull("Dispatch queue is full (3 messages waiting).", retry_after=2))
+    dead_letters.add(DeadLetter(target_agent_id, "http://a.test/", DISPATCH_MESSAGE, 5, "refused"))
+
+    response = client.post("/v1/dead-letters", json={"agentId": target_agent_id})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    assert len(dead_letters) == 1
+
+
+# --- End-to-end through the DNS-caching transport ---
+
+@pytest.fixture
+def local_agent_server():
+    """A real HTTP server on localhost that records the bodies POSTed to it and answers with JSON."""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            received.append((self.path, json.loads(body)))
+            answer = json.dumps({"status": "success", "echo": json.loads(body), "padding": "x" * 100_000}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(answer)))
+            self.end_headers()
+            self.wfile.write(answer)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://localhost:{server.server_address[1]}", received
+    server.shutdown()
+    server.server_close()
+
+
+def test_dispatch_and_tool_calls_through_dns_cached_transport(client: TestClient, setup_test_environment_with_tools, local_agent_server):
+    """With the DNS cache on (the production default), dispatches and tool calls reach a real server and read its full response."""
+    from agentkit.core.http_pool import http_pool
+    base_url, received = local_agent_server
+    assert http_pool.dns_cache.enabled
+    lookups = http_pool.dns_cache.stats()["hits"] + http_pool.dns_cache.stats()["misses"]
+    agent = AgentInfo(agentName="LocalAgent", capabilities=["receive"], version="1.0", contactEndpoint=f"{base_url}/run")
+    agent_storage.add_agent(agent)
+
+    response = client.post(f"/v1/agents/{agent.agentId}/run", json={"senderId": "e2e", "messageType": "note", "payload": {"n": 1}})
+    task_id = response.json()["data"]["taskId"]
+    for _ in range(200):
+        task = client.get(f"/v1/tasks/{task_id}").json()["data"]
+        if task["status"] == "delivered":
+            break
+        time.sleep(0.01)
+    assert task["status"] == "delivered"
+    assert received[0][0] == "/run" and received[0][1]["payload"] == {"n": 1}
+
+    tool_registry.register_external_tool("echo", "Echoes its arguments", {}, f"{base_url}/tool")
+    response = client.post(f"/v1/agents/{agent.agentId}/run", json={"senderId": "e2e", "messageType": "tool_invocation", "payload": {"tool_name": "echo", "arguments": {"q": "hi"}}})
+    assert response.json()["status"] == "success"
+    data = response.json()["data"]
+    assert data["echo"] == {"arguments": {"q": "hi"}}
+    assert len(data["padding"]) == 100_000 # The whole streamed response body arrived
+    assert http_pool.dns_cache.stats()["hits"] + http_pool.dns_cache.stats()["misses"] > lookups # Resolved through the cache
+
+
+# --- Task Status ---
+
+def test_run_returns_task_id_for_status_polling(client: TestClient, setup_test_environment_with_tools, mocker):
+    """Every accepted message gets a task ID whose status can be polled."""
+    target_agent_id = setup_test_environment_with_tools
+    mocker.patch.object(messaging, "dispatch_to_agent_endpoint", new=AsyncMock(return_value=None))
+    payload = {
+        "senderId": "opscore-sim",
+        "messageType": "workflow_task",
+        "payload": {},
+        "opscore_task_id": "task-poll-1",
+        "opscore_session_id": "sess-poll-1"
+    }
+
+    response = client.post(f"/v1/agents/{target_agent_id}/run", json=payload)
+    assert response.status_code == 202
+    task_id = response.json()["data"]["taskId"]
+
+    for _ in range(100): # Delivery happens on the dispatcher's workers
+        task = client.get(f"/v1/tasks/{task_id}").json()["data"]
+        if task["status"] == "delivered":
+            break
+        time.sleep(0.01)
+    assert task["status"] == "delivered"
+    assert task["agentId"] == target_agent_id
+    assert task["queuedAt"] <= task["dispatchedAt"] <= task["deliveredAt"]
+
+    found = client.get("/v1/tasks", params={"opscore_task_id": "task-poll-1"}).json()["data"]["tasks"]
+    assert [t["taskId"] for t in found] == [task_id]
+    assert client.get("/v1/tasks", params={"opscore_session_id": "sess-poll-1", "opscore_task_id": "other"}).json()["data"]["tasks"] == []
+
+
+def test_task_lookup_errors(client: TestClient):
+    assert client.get("/v1/tasks/no-such-task").status_code == 404
+    assert client.get("/v1/tasks").status_code == 400
+
+
+# --- Batch Delivery ---
+
+def test_run_coalesces_messages_for_batch_agents(client: TestClient, mocker):
+    """Agents that opt in at registration receive their messages in batches."""
+    response = client.post("/v1/agents/register", json={
+        "agentName": "BatchReceiver",
+        "version": "1.0",
+        "contactEndpoint": "http://batch-receiver.local/run",
+        "metadata": {"batchDelivery": {"maxBatchSize": 3, "lingerMs": 5000}}
+    })
+    assert response.status_code == 201
+    agent_id = response.json()["data"]["agentId"]
+    batch_dispatch = mocker.patch.object(messaging, "dispatch_batch_to_agent_endpoint", new=AsyncMock(return_value=None))
+
+    task_ids = []
+    for n in range(3):
+        response = client.post(f"/v1/agents/{agent_id}/run", json={"senderId": "s", "messageType": "note", "payload": {"n": n}})
+        assert response.status_code == 202
+        task_ids.append(response.json()["data"]["taskId"])
+
+    for _ in range(100):
+        if batch_dispatch.await_count:
+            break
+        time.sleep(0.01)
+    batch_dispatch.assert_awaited_once()
+    kwargs = batch_dispatch.await_args.kwargs
+    assert kwargs["contact_endpoint"] == "http://batch-receiver.local/run"
+    assert [p.payload["n"] for p in kwargs["payloads"]] == [0, 1, 2]
+    assert {client.get(f"/v1/tasks/{task_id}").json()["data"]["status"] for task_id in task_ids} == {"delivered"}
+
+
+@pytest.mark.asyncio
+async def test_dispatch_batch_posts_json_array(httpx_mock: HTTPXMock):
+    httpx_mock.add_response(url="http://batch.test/run", json={})
+    second = DISPATCH_MESSAGE.model_copy(update={"payload": {"n": 2}})
+
+    await messaging.dispatch_batch_to_agent_endpoint(agent_id="a", contact_endpoint="http://batch.test/run", payloads=[DISPATCH_MESSAGE, second])
+
+    body = json.loads(httpx_mock.get_request().content)
+    assert [message["payload"] for message in body] == [{"n": 1}, {"n": 2}]
+
+
+# --- Bulk Ingestion ---
+
+def read_ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_run_batch_queues_ndjson_records(client: TestClient, setup_test_environment_with_tools, mocker):
+    """Each NDJSON record is queued independently and answered with its own result line."""
+    target_agent_id = setup_test_environment_with_tools
+    submit = mocker.patch.object(messaging.dispatcher, "submit", side_effect=[
+        mocker.Mock(task_id="task-0"),
+        DispatchQueueFull("Dispatch queue is full.", retry_after=3),
+    ])
+    message = {"senderId": "bulk", "messageType": "workflow_task", "payload": {}}
+    body = "\n".join(json.dumps(record) for record in [
+        {"agentId": target_agent_id, "message": message},
+        {"agentId": "no-such-agent", "message": message},
+        {"agentId": target_agent_id},
+        {"agentId": target_agent_id, "message": {**message, "messageType": "tool_invocation"}},
+        {"agentId": target_agent_id, "message": message},
+    ]) + "\nnot json\n"
+
+    response = client.post("/v1/agents/run:batch", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = read_ndjson(response)
+    assert [(r["index"], r["status"], r.get("statusCode")) for r in results] == [
+        (0, "queued", None), (1, "error", 404), (2, "error", 422), (3, "error", 400), (4, "error", 429), (5, "error", 400)
+    ]
+    assert results[0]["taskId"] == "task-0"
+    assert results[4]["retryAfter"] == 3
+    assert submit.call_count == 2
+
+
+def test_run_batch_accepts_json_array(client: TestClient, setup_test_environment_with_tools, mocker):
+    target_agent_id = setup_test_environment_with_tools
+    mocker.patch.object(messaging.dispatcher, "submit", side_effect=lambda **kwargs: mocker.Mock(task_id=f"task-{kwargs['payload'].payload['n']}"))
+    records = [{"agentId": target_agent_id, "message": {"senderId": "bulk", "messageType": "note", "payload": {"n": n}}} for n in range(3)]
+
+    response = client.post("/v1/agents/run:batch", json=records)
+    assert [r["taskId"] for r in read_ndjson(response)] == ["task-0", "task-1", "task-2"]
+
+    truncated = client.post("/v1/agents/run:batch", content=json.dumps(records)[:-20])
+    results = read_ndjson(truncated)
+    assert [r["status"] for r in results] == ["queued", "queued", "error"] # The broken element ends the stream
+
+
+def test_run_batch_refunds_rate_limit_tokens_of_records_the_queue_rejects(client: TestClient, setup_test_environment_with_tools, mocker):
+    """A record turned away by a full queue does not spend its sender's allowance."""
+    target_agent_id = setup_test_environment_with_tools
+    mocker.patch.object(messaging, "rate_limiter", RateLimiter(sender_rate=0.01, sender_burst=1))
+    mocker.patch.object(messaging.dispatcher, "submit", side_effect=[DispatchQueueFull("Dispatch queue is full.", retry_after=1), mocker.Mock(task_id="task-1")])
+    record = {"agentId": target_agent_id, "message": {"senderId": "bulk", "messageType": "note", "payload": {}}}
+
+    response = client.post("/v1/agents/run:batch", json=[record, record, record])
+
+    assert [(r["status"], r.get("statusCode")) for r in read_ndjson(response)] == [("error", 429), ("queued", None), ("error", 429)]
+    assert messaging.rate_limiter.stats()["sender"]["allowed"] == 1
+
+
+async def test_duplex_response_cancels_the_ingest_when_the_client_disconnects():
+    """A disconnect mid-upload stops the ingest even while it is busy with a record."""
+    busy = asyncio.Event()
+    stopped = asyncio.Event()
+
+    async def ingest(body):
+        try:
+            async for chunk in body:
+                yield chunk
+                busy.set()
+                await asyncio.sleep(60) # A slow record; the client goes away meanwhile
+        finally:
+            stopped.set()
+
+    messages = [{"type": "http.request", "body": b"one", "more_body": True}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await busy.wait()
+        return {"type": "http.disconnect"}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    response = messaging._DuplexStreamingResponse(ingest, media_type="application/x-ndjson")
+    await asyncio.wait_for(response({"type": "http"}, receive, send), timeout=5)
+
+    assert stopped.is_set()
+    assert [m.get("body") for m in sent if m["type"] == "http.response.body"] == [b"one"]
+
+
+def test_run_batch_reports_a_corrupt_compressed_body_in_the_stream(client: TestClient, setup_test_environment_with_tools, mocker):
+    """A gzip body that breaks after some records ends the stream with a 400 line instead of aborting the response."""
+    target_agent_id = setup_test_environment_with_tools
+    mocker.patch.object(messaging.dispatcher, "submit", return_value=mocker.Mock(task_id="task-1"))
+    record = json.dumps({"agentId": target_agent_id, "message": {"senderId": "bulk", "messageType": "note", "payload": {}}})
+    body = gzip.compress(("\n".join([record] * 200) + "\n").encode())
+
+    response = client.post("/v1/agents/run:batch", content=body[:-10], headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    results = read_ndjson(response)
+    assert results[-1]["status"] == "error" and results[-1]["statusCode"] == 400
+    assert results[-1]["index"] == len(results) - 1
+    assert all(r["status"] == "queued" for r in results[:-1])
+
+
+# --- Capability Broadcast ---
+
+def test_broadcast_delivers_one_serialized_body_to_each_capable_agent(client: TestClient, setup_test_environment_with_tools, mocker):
+    """Every agent with the capability gets the same bytes; batch receivers get them wrapped in an array."""
+    target_agent_id = setup_test_environment_with_tools
+    batch_agent = AgentInfo(agentName="BatchListener", capabilities=["receive"], version="1.0", contactEndpoint="http://batch-listener.local/run",
+                            metadata={"batchDelivery": {"maxBatchSize": 5}})
+    agent_storage.add_agent(batch_agent)
+    agent_storage.add_agent(AgentInfo(agentName="Bystander", capabilities=["other"], version="1.0", contactEndpoint="http://bystander.local"))
+
+    async def post(agent_id, contact_endpoint, body):
+        if agent_id == batch_agent.agentId:
+            raise DeliveryError("Agent returned status 503", kind=KIND_STATUS, status_code=503)
+
+    post_to_agent = mocker.patch.object(messaging, "_post_to_agent", new=AsyncMock(side_effect=post))
+    message = {"senderId": "announcer", "messageType": "announcement", "payload": {"text": "hello"}}
+
+    response = client.post("/v1/capabilities/receive/broadcast", json=message)
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert (data["recipients"], data["delivered"], data["failed"]) == (2, 1, 1)
+    assert data["failures"] == [{"agentId": batch_agent.agentId, "error": "Agent returned status 503", "statusCode": 503}]
+    bodies = {call.args[0]: call.args[2] for call in post_to_agent.await_args_list}
+    assert json.loads(bodies[target_agent_id])["payload"] == {"text": "hello"}
+    assert json.loads(bodies[batch_agent.agentId]) == [json.loads(bodies[target_agent_id])]
+
+
+def test_broadcast_rejects_tool_invocations(client: TestClient):
+    response = client.post("/v1/capabilities/receive/broadcast", json={"senderId": "s", "messageType": "tool_invocation", "payload": {"tool_name": "mock_success"}})
+    assert response.status_code == 400
+
+
+# --- Push Channel ---
+
+def push_auth(agent_id):
+    return {"Authorization": f"Bearer {messaging.push_channels.token_for(agent_id)}"}
+
+
+def test_run_prefers_open_push_channel(client: TestClient, setup_test_environment_with_tools, mocker):
+    """A connected agent receives its messages as WebSocket frames instead of POSTs."""
+    target_agent_id = setup_test_environment_with_tools
+    post_to_agent = mocker.patch.object(messaging, "_post_to_agent", new=AsyncMock(return_value=None))
+
+    with client.websocket_connect(f"/v1/agents/{target_agent_id}/connect", headers=push_auth(target_agent_id)) as websocket:
+        response = client.post(f"/v1/agents/{target_agent_id}/run", json={"senderId": "s", "messageType": "note", "payload": {"n": 7}})
+        assert response.status_code == 202
+        frame = websocket.receive_json()
+        assert frame["type"] == "deliver"
+        assert frame["body"]["payload"] == {"n": 7}
+        websocket.send_json({"type": "ack", "deliveryId": frame["deliveryId"]})
+
+        task_id = response.json()["data"]["taskId"]
+        for _ in range(100):
+            if client.get(f"/v1/tasks/{task_id}").json()["data"]["status"] == "delivered":
+                break
+            time.sleep(0.01)
+        assert client.get(f"/v1/tasks/{task_id}").json()["data"]["status"] == "delivered"
+        assert client.get(f"/v1/agents/{target_agent_id}").json()["data"]["pushChannel"]["connected"] is True
+
+    post_to_agent.assert_not_awaited()
+
+
+def test_push_channel_rejects_unknown_agent(client: TestClient):
+    from starlette.websockets import WebSocketDisconnect
+    with pytest.raises(WebSocketDisconnect) as excinfo:
+        with client.websocket_connect("/v1/agents/no-such-agent/connect") as websocket:
+            websocket.receive_text()
+    assert excinfo.value.code == 4404
+
+
+def test_push_channel_refuses_to_replace_open_channel(client: TestClient, setup_test_environment_with_tools):
+    """A second connection for an agent is closed with 4409 while its channel is open; reconnecting later works."""
+    from starlette.websockets import WebSocketDisconnect
+    target_agent_id = setup_test_environment_with_tools
+    with client.websocket_connect(f"/v1/agents/{target_agent_id}/connect", headers=push_auth(target_agent_id)):
+        first = messaging.push_channels.get(target_agent_id)
+        with pytest.raises(WebSocketDisconnect) as excinfo:
+            with client.websocket_connect(f"/v1/agents/{target_agent_id}/connect", headers=push_auth(target_agent_id)) as intruder:
+                intruder.receive_text()
+        assert excinfo.value.code == 4409
+        assert messaging.push_channels.get(target_agent_id) is first
+
+    for _ in range(100): # The server notices the close asynchronously
+        if messaging.push_channels.get(target_agent_id) is None:
+            break
+        time.sleep(0.01)
+    with client.websocket_connect(f"/v1/agents/{target_agent_id}/connect", headers=push_auth(target_agent_id)):
+        assert messaging.push_channels.get(target_agent_id) not in (None, first)
+
+
+
+def test_push_channel_requires_the_agents_push_token(client: TestClient, setup_test_environment_with_tools):
+    """Knowing an agent's ID is not enough to take its deliveries; the token from registration is."""
+    from starlette.websockets import WebSocketDisconnect
+    target_agent_id = setup_test_environment_with_tools
+    other_agent_token = messaging.push_channels.token_for("another-agent")
+    for headers in ({}, {"Authorization": f"Bearer {other_agent_token}"}, {"Authorization": other_agent_token}):
+        with pytest.raises(WebSocketDisconnect) as excinfo:
+            with client.websocket_connect(f"/v1/agents/{target_agent_id}/connect", headers=headers) as websocket:
+                websocket.receive_text()
+        assert excinfo.value.code == 4401
+    assert messaging.push_channels.get(target_agent_id) is None
+
+    registered = client.post("/v1/agents/register", json={"agentName": "PushAgent", "capabilities": [], "version": "1.0", "contactEndpoint": "http://push-agent.local"}).json()["data"]
+    with client.websocket_connect(f"/v1/agents/{registered['agentId']}/connect", headers={"Authorization": f"Bearer {registered['pushToken']}"}):
+        assert messaging.push_channels.get(registered["agentId"]) is not None
+
+
+def test_deregistering_closes_the_push_channel(client: TestClient, setup_test_environment_with_tools):
+    from starlette.websockets import WebSocketDisconnect
+    target_agent_id = setup_test_environment_with_tools
+    with client.websocket_connect(f"/v1/agents/{target_agent_id}/connect", headers=push_auth(target_agent_id)) as websocket:
+        connection = messaging.push_channels.get(target_agent_id)
+        assert client.delete(f"/v1/agents/{target_agent_id}").status_code == 200
+        with pytest.raises(WebSocketDisconnect) as excinfo:
+            websocket.receive_text()
+        assert excinfo.value.code == 4410
+        assert connection.closed and messaging.push_channels.get(target_agent_id) is None
+
+
+# --- Request/Reply ---
+
+def test_run_wait_returns_agent_reply(client: TestClient, setup_test_environment_with_tools, mocker):
+    """With wait=true the caller gets the reply the agent posts to /tasks/{replyTo}/reply."""
+    target_agent_id = setup_test_environment_with_tools
+
+    async def agent_replies(agent_id, contact_endpoint, payload):
+        reply = MessagePayload(senderId=agent_id, messageType="answer", payload={"echo": payload.payload["q"]})
+        await messaging.reply_to_task(task_id=payload.replyTo, reply=reply) # As POST /v1/tasks/{replyTo}/reply would
+
+    mocker.patch.object(messaging, "dispatch_to_agent_endpoint", new=AsyncMock(side_effect=agent_replies))
+
+    response = client.post(f"/v1/agents/{target_agent_id}/run?wait=true&timeout=5", json={"senderId": "s", "messageType": "question", "payload": {"q": "ping"}})
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["replyStatus"] == "replied"
+    assert data["reply"]["payload"] == {"echo": "ping"}
+    assert client.get(f"/v1/tasks/{data['taskId']}").json()["data"]["reply"]["messageType"] == "answer"
+
+
+def test_run_wait_times_out_and_keeps_late_reply(client: TestClient, setup_test_environment_with_tools, mocker):
+    target_agent_id = setup_test_environment_with_tools
+    mocker.patch.object(messaging, "dispatch_to_agent_endpoint", new=AsyncMock(return_value=None))
+
+    response = client.post(f"/v1/agents/{target_agent_id}/run?wait=true&timeout=0.05", json={"senderId": "s", "messageType": "question", "payload": {}})
+
+    assert response.status_code == 202
+    task_id = response.json()["data"]["taskId"]
+    assert response.json()["data"]["replyStatus"] == "timeout"
+    late = client.post(f"/v1/tasks/{task_id}/reply", json={"senderId": target_agent_id, "messageType": "answer", "payload": {"late": True}})
+    assert late.json()["data"]["callerWaiting"] is False
+    assert client.get(f"/v1/tasks/{task_id}").json()["data"]["reply"]["payload"] == {"late": True}
+    assert client.post("/v1/tasks/no-such-task/reply", json={"senderId": "s", "messageType": "answer", "payload": {}}).status_code == 404
+
+
+def test_run_wait_reports_undeliverable_message(client: TestClient, setup_test_environment_with_tools, mocker):
+    target_agent_id = setup_test_environment_with_tools
+    mocker.patch.object(messaging, "dispatch_to_agent_endpoint", new=AsyncMock(side_effect=DeliveryError("Agent returned status 400", kind=KIND_STATUS, status_code=400)))
+
+    response = client.post(f"/v1/agents/{target_agent_id}/run?wait=true&timeout=5", json={"senderId": "s", "messageType": "question", "payload": {}})
+
+    assert response.status_code == 502
+    assert "status 400" in response.json()["detail"]
+
+
+def test_messages_cannot_set_reply_to(client: TestClient, setup_test_environment_with_tools, mocker):
+    """replyTo is assigned by AgentKit; a sender setting it could answer into another caller's wait."""
+    target_agent_id = setup_test_environment_with_tools
+    submit = mocker.patch.object(messaging.dispatcher, "submit", return_value=mocker.Mock(task_id="task-1"))
+    message = {"senderId": "s", "messageType": "question", "payload": {}, "replyTo": "someone-elses-task"}
+
+    assert client.post(f"/v1/agents/{target_agent_id}/run", json=message).status_code == 422
+    results = read_ndjson(client.post("/v1/agents/run:batch", json=[{"agentId": target_agent_id, "message": message}]))
+    assert (results[0]["status"], results[0]["statusCode"]) == ("error", 422)
+    assert client.post("/v1/capabilities/receive/broadcast", json=message).status_code == 422
+    submit.assert_not_called()
+
+
+async def test_run_wait_called_directly_without_a_response(setup_test_environment_with_tools, mocker):
+    """Direct calls pass no Response to set the 200 on; the reply is still returned."""
+    target_agent_id = setup_test_environment_with_tools
+
+    async def agent_replies(agent_id, contact_endpoint, payload):
+        await messaging.reply_to_task(task_id=payload.replyTo, reply=MessagePayload(senderId=agent_id, messageType="answer", payload={}))
+
+    mocker.patch.object(messaging, "dispatch_to_agent_endpoint", new=AsyncMock(side_effect=agent_replies))
+
+    result = await messaging.run_agent(agent_id=target_agent_id, payload=MessagePayload(senderId="s", messageType="question", payload={}), wait=True, timeout=5)
+
+    assert result.data["replyStatus"] == "replied"
@@ -1,5 +1,6 @@
 import pytest
 import os
+import gzip
 import json
 import time
 import hmac
@@ -9,6 +10,7 @@ from fastapi import BackgroundTasks # Import BackgroundTasks
 from fastapi.testclient import TestClient
 from pytest_httpx import HTTPXMock # Import HTTPXMock
 from main import app # Import the FastAPI app instance from main.py
+from agentkit.messaging.push import push_channels
 from agentkit.registration.storage import agent_storage
 from agentkit.core.models import AgentRegistrationPayload, AgentInfo
 
@@ -54,6 +56,7 @@ def test_register_agent_success(client: TestClient):
     assert response_data["message"] == "Agent 'APITestAgent' registered successfully."
     assert "agentId" in response_data["data"]
     agent_id = response_data["data"]["agentId"]
+    assert response_data["data"]["pushToken"] == push_channels.token_for(agent_id)
 
     # Verify agent is actually in storage
     stored_agent = agent_storage.get_agent(agent_id)
@@ -63,6 +66,24 @@ def test_register_agent_success(client: TestClient):
     assert str(stored_agent.contactEndpoint) == payload["contactEndpoint"] # Compare as string
     assert stored_agent.metadata.description == payload["metadata"]["description"]
 
+def test_register_agent_accepts_gzip_body(client: TestClient):
+    """Test a gzip-compressed registration body is decoded, and declared content codings set up the dispatch route."""
+    from agentkit.messaging.routes import dispatch_routes
+    payload = {
+        "agentName": "CompressedAgent",
+        "capabilities": ["bulk"],
+        "version": "1.0",
+        "contactEndpoint": "http://compressed-agent.local:8080/invoke",
+        "metadata": {"acceptEncoding": ["gzip"]}
+    }
+    body = gzip.compress(json.dumps(payload).encode())
+    response = client.post("/v1/agents/register", content=body, headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+
+    assert response.status_code == 201
+    agent_id = response.json()["data"]["agentId"]
+    assert agent_storage.get_agent(agent_id).metadata.acceptEncoding == ["gzip"]
+    assert dispatch_routes.get(agent_id).encoding == "gzip"
+
 def test_register_agent_missing_required_field(client: TestClient):
     """Test registration failure when a required field (e.g., agentName) is missing."""
     payload = {
@@ -284,4 +305,219 @@ async def test_register_agent_webhook_handles_http_error(
 # Note: Testing the 500 Internal Server Error case for registration itself
 # typically requires mocking the storage layer to raise an unexpected Exception,
 # which adds complexity. We'll skip that specific test for now but acknowledge
-# its importance in robust testing.
\ No newline at end of file
+# its importance in robust testing.
+
+# --- Discovery Endpoint Tests ---
+
+def _register(client: TestClient, name: str, capabilities: list[str], version: str = "1.0") -> str:
+    payload = {
+        "agentName": name,
+        "capabilities": capabilities,
+        "version": version,
+        "contactEndpoint": f"http://{name.lower()}.test:8000",
+    }
+    response = client.post("/v1/agents/register", json=payload)
+    assert response.status_code == 201
+    return response.json()["data"]["agentId"]
+
+def test_list_agents_filters_and_paginates(client: TestClient):
+    """Test GET /v1/agents filters by capability and follows cursors."""
+    search_ids = {_register(client, f"SearchAgent{i}", ["search"]) for i in range(5)}
+    _register(client, "PlannerAgent", ["plan"])
+
+    collected = []
+    cursor = None
+    while True:
+        params = {"capability": "search", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/v1/agents", params=params)
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert len(data["agents"]) <= 2
+        collected.extend(agent["agentId"] for agent in data["agents"])
+        cursor = data["nextCursor"]
+        if cursor is None:
+            break
+
+    assert collected == sorted(search_ids)
+
+def test_list_agents_field_projection(client: TestClient):
+    """Test the fields parameter limits the attributes returned."""
+    agent_id = _register(client, "ProjectedAgent", ["search"], version="3.1")
+    response = client.get("/v1/agents", params={"version": "3.1", "fields": "agentId,contactEndpoint"})
+    assert response.status_code == 200
+    agents = response.json()["data"]["agents"]
+    assert agents == [{"agentId": agent_id, "contactEndpoint": "http://projectedagent.test:8000/"}]
+
+def test_list_agents_unknown_field(client: TestClient):
+    """Test requesting an unknown field is rejected with 400."""
+    response = client.get("/v1/agents", params={"fields": "agentId,password"})
+    assert response.status_code == 400
+    assert "password" in response.json()["detail"]
+
+def test_list_agents_invalid_cursor(client: TestClient):
+    """Test a malformed cursor is rejected with 400."""
+    response = client.get("/v1/agents", params={"cursor": "%%%"})
+    assert response.status_code == 400
+
+def test_get_agent_by_id(client: TestClient):
+    """Test GET /v1/agents/{agent_id} returns the agent or 404."""
+    agent_id = _register(client, "LookupAgent", ["lookup"])
+    response = client.get(f"/v1/agents/{agent_id}")
+    assert response.status_code == 200
+    assert response.json()["data"]["agentName"] == "LookupAgent"
+
+    response = client.get("/v1/agents/does-not-exist")
+    assert response.status_code == 404
+
+def test_get_agent_includes_circuit_breaker_state(client: TestClient, mocker):
+    """Test the agent info reports its dispatch circuit breaker, except under a field projection."""
+    agent_id = _register(client, "BreakerAgent", ["lookup"])
+    breaker_state = {"state": "open", "failureRate": 1.0, "recentCalls": 0, "trips": 1, "retryInSeconds": 12.0}
+    mocker.patch("agentkit.api.endpoints.registration.circuit_breakers.state_of", return_value=breaker_state)
+
+    assert client.get(f"/v1/agents/{agent_id}").json()["data"]["circuitBreaker"] == breaker_state
+    assert "circuitBreaker" not in client.get(f"/v1/agents/{agent_id}", params={"fields": "agentId"}).json()["data"]
+
+# --- Batch Registration ---
+
+def batch_item(name):
+    return {"agentName": name, "capabilities": ["batch"], "version": "1.0", "contactEndpoint": f"http://{name.lower()}.test"}
+
+def test_register_batch_reports_conflicts(client: TestClient, mocker):
+    """Test a batch registers valid agents and reports duplicates per item."""
+    client.post("/v1/agents/register", json=batch_item("Existing"))
+    mock_add_task = mocker.patch("fastapi.BackgroundTasks.add_task")
+
+    items = [batch_item("New1"), batch_item("Existing"), batch_item("New2"), batch_item("New1")]
+    response = client.post("/v1/agents/register:batch", json={"agents": items})
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["registered"] == 2 and data["conflicts"] == 2
+    assert [result["status"] for result in data["results"]] == ["registered", "conflict", "registered", "conflict"]
+    assert "already registered" in data["results"][1]["error"]
+    assert agent_storage.get_agent(data["results"][0]["agentId"]).agentName == "New1"
+
+    # A single webhook task covers every registered agent
+    mock_add_task.assert_called_once()
+    assert mock_add_task.call_args[0][0].__name__ == "notify_opscore_webhook_batch"
+    assert [agent.agentName for agent in mock_add_task.call_args[0][1]] == ["New1", "New2"]
+
+def test_register_batch_all_conflicts(client: TestClient, mocker):
+    """Test a batch with nothing registered reports an error and sends no webhook."""
+    client.post("/v1/agents/register", json=batch_item("Taken"))
+    mock_add_task = mocker.patch("fastapi.BackgroundTasks.add_task")
+
+    response = client.post("/v1/agents/register:batch", json={"agents": [batch_item("Taken")]})
+    assert response.status_code == 200
+    assert response.json()["status"] == "error"
+    assert response.json()["error_code"] == "BATCH_ALL_CONFLICTS"
+    mock_add_task.assert_not_called()
+
+def test_register_batch_validation_and_size(client: TestClient, monkeypatch):
+    """Test invalid items reject the whole batch and oversized batches get 413."""
+    invalid = batch_item("Invalid")
+    invalid["contactEndpoint"] = "not-a-url"
+    response = client.post("/v1/agents/register:batch", json={"agents": [batch_item("Valid"), invalid]})
+    assert response.status_code == 422
+    assert agent_storage.list_agents() == []
+
+    monkeypatch.setattr("agentkit.api.endpoints.registration.MAX_REGISTRATION_BATCH", 2)
+    response = client.post("/v1/agents/register:batch", json={"agents": [batch_item(f"Big{i}") for i in range(3)]})
+    assert response.status_code == 413
+
+@pytest.mark.asyncio
+async def test_batch_webhook_payload(httpx_mock: HTTPXMock, monkeypatch):
+    """Test the batch webhook is one signed REGISTER_BATCH request."""
+    from agentkit.api.endpoints.registration import notify_opscore_webhook_batch
+    monkeypatch.setenv("OPSCORE_WEBHOOK_URL", WEBHOOK_URL)
+    monkeypatch.setenv("OPSCORE_WEBHOOK_SECRET", WEBHOOK_SECRET)
+    httpx_mock.add_response(url=WEBHOOK_URL, method="POST", status_code=200)
+
+    agents = [AgentInfo(**batch_item(f"Hook{i}")) for i in range(3)]
+    await notify_opscore_webhook_batch(agents)
+
+    request = httpx_mock.get_request()
+    body = json.loads(request.content)
+    assert body["event_type"] == "REGISTER_BATCH"
+    assert [agent["agentId"] for agent in body["agents"]] == [agent.agentId for agent in agents]
+    sig_string = request.headers["x-agentkit-timestamp"].encode('utf-8') + b'.' + request.content
+    assert request.headers["x-agentkit-signature"] == hmac.new(WEBHOOK_SECRET.encode('utf-8'), sig_string, hashlib.sha256).hexdigest()
+
+# --- Leases, Heartbeat and Deregistration ---
+
+def test_register_with_lease_and_heartbeat(client: TestClient, mocker):
+    """Test leased registration reports the TTL and heartbeats renew it."""
+    mocker.patch.object(agent_storage, "_start_reaper")
+    response = client.post("/v1/agents/register", json={**batch_item("Leased"), "leaseTtl": 30})
+    assert response.status_code == 201
+    agent_id = response.json()["data"]["agentId"]
+    assert response.json()["data"]["leaseTtl"] == 30
+
+    response = client.post("/v1/agents/heartbeat", json={"agentIds": [agent_id, "missing-agent"]})
+    assert response.status_code == 200
+    assert response.json()["data"] == {"renewed": [agent_id], "unleased": [], "unknown": ["missing-agent"]}
+
+def test_register_rejects_invalid_lease(client: TestClient):
+    """Test non-positive lease TTLs are rejected."""
+    response = client.post("/v1/agents/register", json={**batch_item("BadLease"), "leaseTtl": 0})
+    assert response.status_code == 422
+
+def test_deregister_agent(client: TestClient, mocker):
+    """Test DELETE removes the agent and schedules a DEREGISTER webhook."""
+    agent_id = client.post("/v1/agents/register", json=batch_item("Leaving")).json()["data"]["agentId"]
+    mock_add_task = mocker.patch("fastapi.BackgroundTasks.add_task")
+
+    response = client.delete(f"/v1/agents/{agent_id}")
+    assert response.status_code == 200
+    assert agent_storage.get_agent(agent_id) is None
+    assert mock_add_task.call_args[0][0].__name__ == "notify_opscore_webhook_deregister"
+
+    assert client.delete(f"/v1/agents/{agent_id}").status_code == 404
+
+def test_expired_lease_releases_breaker_and_route(client: TestClient, mocker, monkeypatch):
+    """Test lease expiry drops the agent's breaker and dispatch route, like DELETE."""
+    from agentkit.messaging.circuit_breaker import circuit_breakers
+    from agentkit.messaging.routes import dispatch_routes
+    mocker.patch.object(agent_storage, "_start_reaper")
+    agent_id = client.post("/v1/agents/register", json={**batch_item("Lapsing"), "leaseTtl": 30}).json()["data"]["agentId"]
+    dispatch_routes.route(agent_id, "http://lapsing.test")
+    circuit_breakers.get(agent_id)
+
+    monkeypatch.setattr(agent_storage.leases, "_clock", lambda: time.monotonic() + 3600)
+    assert agent_storage.expire_leases() == [agent_id]
+    assert dispatch_routes.get(agent_id) is None
+    assert agent_id not in circuit_breakers._breakers
+
+# --- Change Feed ---
+
+def test_change_feed_snapshot_then_deltas(client: TestClient):
+    """Test a follower bootstraps from a snapshot and then receives deltas."""
+    first_id = client.post("/v1/agents/register", json=batch_item("FeedOne")).json()["data"]["agentId"]
+
+    snapshot = client.get("/v1/agents/changes").json()["data"]
+    assert snapshot["reset"] is True
+    assert [agent["agentId"] for agent in snapshot["agents"]] == [first_id]
+
+    second_id = client.post("/v1/agents/register", json=batch_item("FeedTwo")).json()["data"]["agentId"]
+    client.delete(f"/v1/agents/{first_id}")
+
+    params = {"since": snapshot["seq"], "epoch": snapshot["epoch"], "timeout": 0}
+    delta = client.get("/v1/agents/changes", params=params).json()["data"]
+    assert delta["reset"] is False
+    assert [(c["op"], c["agentId"]) for c in delta["changes"]] == [("register", second_id), ("remove", first_id)]
+    assert delta["hasMore"] is False
+
+    # Nothing new: the long-poll times out with an empty delta
+    params["since"] = delta["seq"]
+    empty = client.get("/v1/agents/changes", params={**params, "timeout": 0.05}).json()["data"]
+    assert empty["changes"] == [] and empty["seq"] == delta["seq"]
+
+def test_change_feed_stale_cursor_falls_back_to_snapshot(client: TestClient):
+    """Test a cursor from another epoch yields a snapshot instead of wrong deltas."""
+    client.post("/v1/agents/register", json=batch_item("Resynced"))
+    data = client.get("/v1/agents/changes", params={"since": 0, "epoch": "old-epoch", "timeout": 0}).json()["data"]
+    assert data["reset"] is True
+    assert [agent["agentName"] for agent in data["agents"]] == ["Resynced"]
@@ -0,0 +1,19 @@
+import weakref
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _httpx_mock_bypasses_dns_cache(request, monkeypatch):
+    """
+    pytest_httpx intercepts httpx.AsyncHTTPTransport, while the shared http_pool
+    sends through its DNS-caching ConnectionPoolTransport. Tests that mock httpx
+    get a pool with the cache off (and fresh clients); every other test, such as
+    the end-to-end dispatch tests, uses the transport production runs.
+    """
+    if "httpx_mock" not in request.fixturenames:
+        yield
+        return
+    from agentkit.core.http_pool import http_pool
+    monkeypatch.setattr(http_pool.dns_cache, "ttl", 0)
+    monkeypatch.setattr(http_pool, "_clients", weakref.WeakKeyDictionary())
+    yield
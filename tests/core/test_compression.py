@@ -0,0 +1,60 @@
+import gzip
+import pytest
+from agentkit.core.compression import GZIP, ZSTD, Compression, DecompressedTooLarge, DecompressionError, UnsupportedEncoding
+
+def test_negotiate_picks_highest_quality_supported_coding():
+    """Test Accept-Encoding negotiation honours q-values, wildcards and refusals."""
+    codecs = Compression()
+    preferred = ZSTD if ZSTD in codecs.supported else GZIP
+    assert codecs.negotiate("br, gzip;q=0.5") == GZIP
+    assert codecs.negotiate("zstd, gzip") == preferred
+    assert codecs.negotiate("*;q=0.1") == preferred
+    assert codecs.negotiate("gzip;q=0, identity") is None
+    assert codecs.negotiate(None) is None
+    assert codecs.choose(["br", "GZIP"]) == GZIP
+    assert codecs.choose(None) is None
+
+def test_check_rejects_unsupported_request_codings():
+    """Test identity bodies pass through and unknown or stacked codings are refused."""
+    codecs = Compression()
+    assert codecs.check("") is None
+    assert codecs.check("identity") is None
+    assert codecs.check(" GZIP ") == GZIP
+    for coding in ("br", "gzip, gzip"):
+        with pytest.raises(UnsupportedEncoding):
+            codecs.check(coding)
+
+def test_round_trip_one_shot_and_streamed():
+    """Test compressed bodies decode to the original, whole or chunk by chunk, and are counted."""
+    codecs = Compression()
+    data = b'{"text": "' + b"agent task status " * 500 + b'"}'
+    compressed = codecs.compress(data, GZIP)
+    assert len(compressed) < len(data) // 10
+    assert gzip.decompress(compressed) == data # Interoperates with standard gzip
+
+    encoder = codecs.encoder(GZIP)
+    chunks = [encoder.compress(data[i:i + 1000], flush=True) for i in range(0, len(data), 1000)]
+    chunks.append(encoder.finish())
+    decoder = codecs.decoder(GZIP)
+    assert b"".join(decoder.feed(chunk) for chunk in chunks) == data
+    decoder.finish()
+
+    stats = codecs.stats()
+    assert stats["encoded"] == {"bodies": 2, "bytesIn": 2 * len(data), "bytesOut": len(compressed) + sum(map(len, chunks))}
+    assert stats["decoded"]["bodies"] == 1 and stats["decoded"]["bytesOut"] == len(data)
+
+def test_decoder_rejects_bombs_truncation_and_garbage():
+    """Test decoding stops at the size limit and reports corrupt or truncated input."""
+    codecs = Compression(max_decompressed_size=10_000)
+    bomb = gzip.compress(b"\0" * 10_000_000)
+    assert len(bomb) < 20_000
+    with pytest.raises(DecompressedTooLarge):
+        codecs.decompress(bomb, GZIP)
+    data = gzip.compress(b"x" * 5000)
+    with pytest.raises(DecompressionError):
+        codecs.decompress(data[:-8], GZIP)
+    with pytest.raises(DecompressionError):
+        codecs.decompress(b"not gzip at all", GZIP)
+    for trailing in (data + b"\0" * 16, data + gzip.compress(b"y" * 10)): # Padded, or two concatenated streams
+        with pytest.raises(DecompressionError, match="after the end"):
+            codecs.decompress(trailing, GZIP)
@@ -0,0 +1,119 @@
+import asyncio
+import socket
+import httpcore
+import pytest
+from agentkit.core.dns_cache import CachingNetworkBackend, DnsCache
+
+class FakeResolver:
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = 0
+
+    async def __call__(self, host, port):
+        self.calls += 1
+        await asyncio.sleep(0)
+        answer = self.answers[host]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+@pytest.mark.asyncio
+async def test_lookups_are_cached_until_ttl():
+    """Test a host is looked up once per TTL."""
+    now = [0.0]
+    resolver = FakeResolver({"agent.test": ["10.0.0.1", "10.0.0.2"]})
+    cache = DnsCache(ttl=10, resolver=resolver, clock=lambda: now[0])
+    assert await cache.resolve("agent.test", 80) == ["10.0.0.1", "10.0.0.2"]
+    assert await cache.resolve("agent.test", 80) == ["10.0.0.1", "10.0.0.2"]
+    assert resolver.calls == 1
+    now[0] = 11
+    await cache.resolve("agent.test", 80)
+    assert resolver.calls == 2
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 2}
+
+@pytest.mark.asyncio
+async def test_failed_lookups_are_negatively_cached():
+    """Test a host that does not resolve is not asked for again within the negative TTL."""
+    now = [0.0]
+    resolver = FakeResolver({"gone.test": socket.gaierror(socket.EAI_NONAME, "Name or service not known")})
+    cache = DnsCache(ttl=60, negative_ttl=5, resolver=resolver, clock=lambda: now[0])
+    for _ in range(3):
+        with pytest.raises(socket.gaierror):
+            await cache.resolve("gone.test", 80)
+    assert resolver.calls == 1
+    now[0] = 6
+    with pytest.raises(socket.gaierror):
+        await cache.resolve("gone.test", 80)
+    assert resolver.calls == 2
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_share_one_resolver_call():
+    """Test simultaneous connections to a new host wait for the same lookup."""
+    resolver = FakeResolver({"agent.test": ["10.0.0.1"]})
+    cache = DnsCache(resolver=resolver)
+    results = await asyncio.gather(*(cache.resolve("agent.test", 80) for _ in range(10)))
+    assert results == [["10.0.0.1"]] * 10
+    assert resolver.calls == 1
+
+@pytest.mark.asyncio
+async def test_ip_literals_and_lru_bound():
+    """Test IP literals skip the resolver and the cache keeps at most max_entries hosts."""
+    resolver = FakeResolver({"a.test": ["10.0.0.1"], "b.test": ["10.0.0.2"]})
+    cache = DnsCache(max_entries=1, resolver=resolver)
+    assert await cache.resolve("127.0.0.1", 80) == ["127.0.0.1"]
+    assert await cache.resolve("::1", 80) == ["::1"]
+    assert resolver.calls == 0
+    await cache.resolve("a.test", 80)
+    await cache.resolve("b.test", 80)
+    assert cache.stats()["entries"] == 1
+    await cache.resolve("a.test", 80)
+    assert resolver.calls == 3
+
+class FakeBackend(httpcore.AsyncNetworkBackend):
+    def __init__(self, reachable):
+        self.reachable = reachable
+        self.attempts = []
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        self.attempts.append(host)
+        if host not in self.reachable:
+            raise httpcore.ConnectError(f"{host} refused")
+        return object()
+
+@pytest.mark.asyncio
+async def test_backend_tries_each_address_and_invalidates_when_all_fail():
+    """Test connections fall through the cached addresses and a dead host is looked up again."""
+    resolver = FakeResolver({"agent.test": ["10.0.0.1", "10.0.0.2"]})
+    cache = DnsCache(resolver=resolver)
+    backend = FakeBackend(reachable={"10.0.0.2"})
+    network = CachingNetworkBackend(cache, backend)
+    await network.connect_tcp("agent.test", 80)
+    assert backend.attempts == ["10.0.0.1", "10.0.0.2"]
+
+    backend.reachable = set()
+    with pytest.raises(httpcore.ConnectError):
+        await network.connect_tcp("agent.test", 80)
+    assert cache.stats()["entries"] == 0
+    resolver.answers["missing.test"] = socket.gaierror(socket.EAI_NONAME, "unknown")
+    with pytest.raises(httpcore.ConnectError, match="Could not resolve"):
+        await network.connect_tcp("missing.test", 80)
+
+class SlowBackend(httpcore.AsyncNetworkBackend):
+    def __init__(self):
+        self.timeouts = []
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        self.timeouts.append(timeout)
+        await asyncio.sleep(min(timeout, 0.05))
+        raise httpcore.ConnectTimeout(f"{host} timed out")
+
+@pytest.mark.asyncio
+async def test_backend_shares_one_deadline_across_addresses():
+    """Test later addresses only get what is left of the connect timeout."""
+    resolver = FakeResolver({"agent.test": ["10.0.0.1", "10.0.0.2", "10.0.0.3"]})
+    backend = SlowBackend()
+    network = CachingNetworkBackend(DnsCache(resolver=resolver), backend)
+    with pytest.raises(httpcore.ConnectTimeout):
+        await network.connect_tcp("agent.test", 80, timeout=0.08)
+    assert len(backend.timeouts) == 2 # The deadline passed before the third address
+    assert backend.timeouts[0] <= 0.08 and backend.timeouts[1] <= 0.08 - 0.05
@@ -0,0 +1,100 @@
+import asyncio
+import httpx
+import pytest
+from pytest_httpx import HTTPXMock
+from agentkit.core.dns_cache import DnsCache
+from agentkit.core.http_pool import HttpClientPool
+
+@pytest.mark.asyncio
+async def test_client_is_shared_within_a_loop(httpx_mock: HTTPXMock):
+    """Test every request on one loop goes through the same client."""
+    httpx_mock.add_response(url="http://agent.test/run", method="POST", json={}, is_reusable=True)
+    pool = HttpClientPool()
+    client = pool.client
+    for _ in range(3):
+        response = await pool.post("http://agent.test/run", json={"n": 1})
+        assert response.status_code == 200
+    assert pool.client is client
+    await pool.aclose()
+    assert client.is_closed
+
+def test_each_loop_gets_its_own_client():
+    """Test clients are not shared across event loops (httpx clients are loop-bound)."""
+    pool = HttpClientPool()
+
+    async def get_client():
+        return pool.client
+
+    first = asyncio.run(get_client())
+    second = asyncio.run(get_client())
+    assert first is not second
+
+@pytest.mark.asyncio
+async def test_per_host_limit_caps_concurrency(monkeypatch):
+    """Test no more than max_per_host requests to one host run at once."""
+    active, peak = 0, 0
+
+    async def fake_request(self, method, url, **kwargs):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200)
+
+    monkeypatch.setattr(httpx.AsyncClient, "request", fake_request)
+    pool = HttpClientPool(max_per_host=2)
+    await asyncio.gather(*(pool.post("http://slow.test/run") for _ in range(6)), pool.post("http://other.test/run"))
+    assert peak == 3 # Two to slow.test plus one to other.test
+    assert pool._host_limits[asyncio.get_running_loop()] == {} # Idle hosts are not kept
+    await pool.aclose()
+
+def test_http2_falls_back_without_h2(monkeypatch):
+    """Test requesting HTTP/2 without the h2 package degrades to HTTP/1.1."""
+    monkeypatch.setattr("importlib.util.find_spec", lambda name: None)
+    assert HttpClientPool(http2=True).http2 is False
+
+@pytest.mark.asyncio
+async def test_connections_resolve_through_dns_cache():
+    """Test new connections look host names up in the pool's DNS cache."""
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    lookups = []
+
+    async def resolver(host, port):
+        lookups.append(host)
+        return ["127.0.0.1"]
+
+    pool = HttpClientPool(dns_cache=DnsCache(resolver=resolver))
+    for _ in range(2):
+        response = await pool.post(f"http://agent.internal:{port}/run", content=b"{}")
+        assert response.text == "ok"
+    assert lookups == ["agent.internal"] # The second connection used the cached address
+    await pool.aclose()
+    server.close()
+
+@pytest.mark.asyncio
+async def test_dns_cached_transport_raises_httpx_errors():
+    """Test connection failures through the DNS-caching pool surface as httpx exceptions."""
+    server = await asyncio.start_server(lambda reader, writer: None, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    server.close()
+    await server.wait_closed() # Nothing listens on the port any more
+
+    async def resolver(host, port):
+        return ["127.0.0.1"]
+
+    pool = HttpClientPool(dns_cache=DnsCache(resolver=resolver))
+    with pytest.raises(httpx.ConnectError):
+        await pool.post(f"http://agent.internal:{port}/run", content=b"{}")
+    await pool.aclose()
+
+def test_dns_cache_disabled_by_default():
+    """Test a pool built without a DNS cache leaves name resolution to httpx."""
+    assert not HttpClientPool().dns_cache.enabled
@@ -0,0 +1,62 @@
+import json
+import os
+import threading
+from agentkit.core.models import MessagePayload
+from agentkit.messaging.blobs import BlobStore, ClaimCheck
+
+
+def make_payload(size: int) -> MessagePayload:
+    return MessagePayload(senderId="tester", messageType="document", payload={"text": "x" * size})
+
+
+async def test_small_payloads_are_kept_inline(tmp_path):
+    claim_checks = ClaimCheck(BlobStore(str(tmp_path)), threshold=1024)
+    payload = make_payload(10)
+    assert await claim_checks.offload(payload) is payload
+    assert os.listdir(tmp_path) == []
+
+
+async def test_large_payloads_are_replaced_by_a_reference(tmp_path):
+    claim_checks = ClaimCheck(BlobStore(str(tmp_path)), threshold=1024)
+    payload = make_payload(5000)
+    offloaded = await claim_checks.offload(payload)
+
+    reference = offloaded.payload["claimCheck"]
+    assert list(offloaded.payload) == ["claimCheck"]
+    assert reference["href"] == f"/v1/blobs/{reference['blobId']}"
+    assert offloaded.senderId == "tester" and offloaded.messageType == "document"
+    with open(claim_checks.store.path(reference["blobId"]), "rb") as f:
+        content = f.read()
+    assert len(content) == reference["size"]
+    assert json.loads(content) == payload.payload
+
+    await claim_checks.offload(make_payload(5000)) # Same content, same blob
+    assert os.listdir(tmp_path) == [reference["blobId"]]
+    assert claim_checks.stats() == {"enabled": True, "threshold": 1024, "offloaded": 2, "stored": 1, "deduplicated": 1, "swept": 0}
+
+
+async def test_blobs_are_written_off_the_event_loop(tmp_path):
+    store = BlobStore(str(tmp_path))
+    writers = []
+    put = store.put
+    store.put = lambda data: writers.append(threading.get_ident()) or put(data)
+    await ClaimCheck(store, threshold=1024).offload(make_payload(5000))
+    assert writers and writers[0] != threading.get_ident()
+
+
+def test_blob_ids_are_validated_and_old_blobs_swept(tmp_path):
+    now = [1_000_000.0]
+    store = BlobStore(str(tmp_path), ttl=100, clock=lambda: now[0])
+    blob_id = store.put(b"{}")
+    assert store.path("../" + blob_id) is None
+    assert store.path("0" * 64) is None
+    os.utime(store.path(blob_id), (now[0] - 200, now[0] - 200))
+    assert store.sweep() == 1
+    assert store.path(blob_id) is None
+
+
+async def test_disabled_claim_check_passes_payloads_through():
+    claim_checks = ClaimCheck(None)
+    payload = make_payload(10_000)
+    assert await claim_checks.offload(payload) is payload
+    assert claim_checks.stats() == {"enabled": False}
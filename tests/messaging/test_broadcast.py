@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from agentkit.core.models import AgentInfo
+from agentkit.messaging.broadcast import broadcast
+from agentkit.messaging.circuit_breaker import CircuitBreakerRegistry
+from agentkit.messaging.retry import DeliveryError, KIND_STATUS
+
+
+def make_agents(count: int):
+    return [
+        AgentInfo(agentId=f"agent-{n}", agentName=f"agent-{n}", capabilities=["notify"], version="1.0", contactEndpoint=f"http://agent-{n}.test/run")
+        for n in range(count)
+    ]
+
+
+async def test_reports_delivered_and_failed_recipients():
+    async def send(agent: AgentInfo) -> None:
+        if agent.agentId == "agent-2":
+            raise DeliveryError("Agent returned status 500", kind=KIND_STATUS, status_code=500)
+
+    report = await broadcast(make_agents(5), send, concurrency=2)
+
+    result = report.to_dict()
+    assert (result["recipients"], result["delivered"], result["failed"], result["skipped"]) == (5, 4, 1, 0)
+    assert result["failures"] == [{"agentId": "agent-2", "error": "Agent returned status 500", "statusCode": 500}]
+    assert result["failuresTruncated"] is False
+
+
+async def test_bounds_concurrency_and_pulls_targets_lazily():
+    active = 0
+    max_active = 0
+    pulled = 0
+    done = 0
+    max_ahead = 0
+
+    def targets():
+        nonlocal pulled
+        for agent in make_agents(20):
+            pulled += 1
+            yield agent
+
+    async def send(agent: AgentInfo) -> None:
+        nonlocal active, max_active, done, max_ahead
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0)
+        max_ahead = max(max_ahead, pulled - done)
+        active -= 1
+        done += 1
+
+    report = await broadcast(targets(), send, concurrency=3)
+
+    assert report.delivered == 20
+    assert max_active == 3
+    assert max_ahead <= 3 # Recipients are only pulled as workers become free
+
+
+async def test_skips_agents_whose_circuit_breaker_is_open():
+    breakers = CircuitBreakerRegistry(window=2, min_calls=2, failure_rate=0.5)
+    for _ in range(2):
+        breakers.get("agent-0").record(True, 0.01, breakers.clock())
+    sent = []
+
+    async def send(agent: AgentInfo) -> None:
+        sent.append(agent.agentId)
+
+    report = await broadcast(make_agents(3), send, breakers=breakers)
+
+    assert sent == ["agent-1", "agent-2"]
+    assert report.skipped == 1
+    assert report.failures[0]["agentId"] == "agent-0"
+
+
+async def test_rejects_zero_concurrency():
+    with pytest.raises(ValueError):
+        await broadcast([], lambda agent: None, concurrency=0)
@@ -0,0 +1,109 @@
+import pytest
+from agentkit.messaging.circuit_breaker import (
+    CircuitBreaker, CircuitBreakerRegistry, is_breaker_failure,
+    STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN,
+)
+from agentkit.messaging.retry import DeliveryError, KIND_CONNECT, KIND_ERROR, KIND_STATUS, KIND_TIMEOUT
+
+
+def make_breaker() -> CircuitBreaker:
+    return CircuitBreaker(window=10, min_calls=4, failure_rate=0.5, slow_call=2.0, open_seconds=30.0)
+
+
+def test_opens_at_failure_rate_after_min_calls():
+    breaker = make_breaker()
+
+    breaker.record(True, 0.1, now=0)
+    breaker.record(True, 0.1, now=0)
+    breaker.record(True, 0.1, now=0)
+    assert breaker.state == STATE_CLOSED # Too few calls to judge
+
+    breaker.record(False, 0.1, now=0)
+    assert breaker.state == STATE_OPEN   # 3 of 4 failed
+    assert breaker.trips == 1
+    assert not breaker.allow(now=10)
+    assert breaker.is_open(now=10)
+    assert breaker.retry_in(now=10) == 20
+
+
+def test_slow_calls_count_as_failures():
+    breaker = make_breaker()
+
+    for _ in range(4):
+        breaker.record(False, 2.5, now=0)
+
+    assert breaker.state == STATE_OPEN
+
+
+def test_old_outcomes_leave_the_window():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(False, 0.1, now=0)
+    for _ in range(4):
+        breaker.record(True, 0.1, now=0)
+    assert breaker.state == STATE_OPEN # 4 of 8 failed
+
+    breaker = make_breaker()
+    for _ in range(10):
+        breaker.record(False, 0.1, now=0)
+    for _ in range(4):
+        breaker.record(True, 0.1, now=0)
+    assert breaker.state == STATE_CLOSED # 4 of the last 10
+
+
+def test_half_open_probe_closes_or_reopens():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(True, 0.1, now=0)
+
+    assert breaker.allow(now=31)           # The first call after open_seconds is the probe
+    assert breaker.state == STATE_HALF_OPEN
+    assert not breaker.allow(now=31)       # Only one probe at a time
+    breaker.record(True, 0.1, now=32)
+    assert breaker.state == STATE_OPEN
+    assert breaker.trips == 2
+
+    assert breaker.allow(now=62)
+    breaker.record(False, 0.1, now=62)
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow(now=62)
+
+
+def test_lost_probe_is_replaced():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(True, 0.1, now=0)
+
+    assert breaker.allow(now=30)
+    assert not breaker.allow(now=45)
+    assert breaker.allow(now=60) # The first probe never reported back
+
+
+def test_breaker_failure_classification():
+    assert is_breaker_failure(DeliveryError("x", kind=KIND_CONNECT))
+    assert is_breaker_failure(DeliveryError("x", kind=KIND_TIMEOUT))
+    assert is_breaker_failure(DeliveryError("x", kind=KIND_STATUS, status_code=503))
+    assert is_breaker_failure(DeliveryError("x", kind=KIND_STATUS, status_code=429))
+    assert not is_breaker_failure(DeliveryError("x", kind=KIND_STATUS, status_code=400)) # The agent is healthy
+    assert not is_breaker_failure(DeliveryError("x", kind=KIND_ERROR))
+    assert not is_breaker_failure(None)
+
+
+def test_registry_state_and_stats():
+    clock = [0.0]
+    registry = CircuitBreakerRegistry(window=4, min_calls=2, clock=lambda: clock[0])
+    breaker = registry.get("agent-a")
+    breaker.record(True, 0.1, now=0)
+    breaker.record(True, 0.1, now=0)
+
+    assert registry.state_of("agent-a")["state"] == STATE_OPEN
+    assert registry.state_of("agent-b")["state"] == STATE_CLOSED
+    stats = registry.stats()
+    assert stats["open"] == 1
+    assert stats["agents"][0]["agentId"] == "agent-a"
+
+    registry.forget("agent-a")
+    assert registry.stats()["tracked"] == 0
+    assert CircuitBreakerRegistry(window=0).get("agent-a") is None
+    with pytest.raises(ValueError):
+        CircuitBreakerRegistry(open_action="explode")
@@ -0,0 +1,450 @@
+import asyncio
+import pytest
+from agentkit.core.models import BatchDeliveryConfig, MessagePayload
+from agentkit.messaging.circuit_breaker import CircuitBreakerRegistry
+from agentkit.messaging.dead_letters import DeadLetterStore
+from agentkit.messaging.dispatcher import AgentUnavailable, Dispatcher, DispatchBatch, DispatchJob, DispatchQueueFull
+from agentkit.messaging.replies import ReplyFailed, ReplyWaiters
+from agentkit.messaging.retry import DeliveryError, RetryPolicy, KIND_CONNECT, KIND_STATUS
+from agentkit.messaging.tasks import TaskStore
+
+
+def make_payload(n: int = 0) -> MessagePayload:
+    return MessagePayload(senderId="tester", messageType="custom_instruction", payload={"n": n})
+
+
+class RecordingDeliver:
+    """Delivery callback that records jobs and blocks until released."""
+
+    def __init__(self):
+        self.delivered = []
+        self.active = {}
+        self.max_active = {}
+        self.release = asyncio.Event()
+
+    async def __call__(self, job: DispatchJob) -> None:
+        self.active[job.agent_id] = self.active.get(job.agent_id, 0) + 1
+        self.max_active[job.agent_id] = max(self.max_active.get(job.agent_id, 0), self.active[job.agent_id])
+        await self.release.wait()
+        self.active[job.agent_id] -= 1
+        self.delivered.append((job.agent_id, job.payload.payload["n"]))
+
+
+async def test_delivers_submitted_messages():
+    deliver = RecordingDeliver()
+    deliver.release.set()
+    dispatcher = Dispatcher(deliver, workers=2)
+
+    for n in range(5):
+        dispatcher.submit("agent-a", "http://a.test/run", make_payload(n))
+    await dispatcher.stop(timeout=1)
+
+    assert sorted(deliver.delivered) == [("agent-a", n) for n in range(5)]
+
+
+async def test_rejects_when_queue_is_full():
+    deliver = RecordingDeliver()
+    dispatcher = Dispatcher(deliver, max_queue=3, workers=1)
+
+    for n in range(3):
+        dispatcher.submit(f"agent-{n}", "http://a.test/run", make_payload(n))
+    with pytest.raises(DispatchQueueFull) as excinfo:
+        dispatcher.submit("agent-x", "http://a.test/run", make_payload(9))
+
+    assert excinfo.value.retry_after >= 1
+    stats = dispatcher.stats()
+    assert stats["accepted"] == 3
+    assert stats["rejected"] == 1
+
+    deliver.release.set()
+    await dispatcher.stop(timeout=1)
+    assert len(deliver.delivered) == 3
+
+
+async def test_rejects_when_agent_backlog_is_full():
+    deliver = RecordingDeliver()
+    dispatcher = Dispatcher(deliver, max_queue=100, workers=4, per_agent_queue=2)
+
+    dispatcher.submit("busy", "http://a.test/run", make_payload(0))
+    dispatcher.submit("busy", "http://a.test/run", make_payload(1))
+    with pytest.raises(DispatchQueueFull):
+        dispatcher.submit("busy", "http://a.test/run", make_payload(2))
+    dispatcher.submit("other", "http://b.test/run", make_payload(3)) # Other agents are unaffected
+
+    deliver.release.set()
+    await dispatcher.stop(timeout=1)
+    assert len(deliver.delivered) == 3
+
+
+async def test_per_agent_limit_parks_without_blocking_workers():
+    deliver = RecordingDeliver()
+    dispatcher = Dispatcher(deliver, workers=4, per_agent_limit=1)
+
+    for n in range(4):
+        dispatcher.submit("slow", "http://slow.test/run", make_payload(n))
+    dispatcher.submit("fast", "http://fast.test/run", make_payload(99))
+    await asyncio.sleep(0.01)
+
+    stats = dispatcher.stats()
+    assert deliver.active == {"slow": 1, "fast": 1} # The free workers still served the other agent
+    assert stats["parked"] == 3
+    assert stats["inFlight"] == 2
+
+    deliver.release.set()
+    await dispatcher.stop(timeout=1)
+    assert deliver.max_active["slow"] == 1
+    assert [n for agent, n in deliver.delivered if agent == "slow"] == [0, 1, 2, 3]
+
+
+async def test_stats_report_wait_times():
+    clock = [100.0]
+    deliver = RecordingDeliver()
+    deliver.release.set()
+    dispatcher = Dispatcher(deliver, workers=1, clock=lambda: clock[0])
+
+    dispatcher.submit("agent-a", "http://a.test/run", make_payload(0))
+    clock[0] += 0.25 # The message waits 250ms before a worker picks it up
+    await asyncio.sleep(0.01)
+
+    stats = dispatcher.stats()
+    assert stats["completed"] == 1
+    assert stats["queueDepth"] == 0
+    assert stats["waitTimeMs"]["max"] == 250.0
+    assert stats["waitTimeMs"]["p95"] == 250.0
+    await dispatcher.stop(timeout=1)
+
+
+async def test_delivery_errors_do_not_kill_workers():
+    calls = []
+
+    async def flaky(job: DispatchJob) -> None:
+        calls.append(job.payload.payload["n"])
+        if job.payload.payload["n"] == 0:
+            raise RuntimeError("boom")
+
+    dispatcher = Dispatcher(flaky, workers=1)
+    dispatcher.submit("agent-a", "http://a.test/run", make_payload(0))
+    dispatcher.submit("agent-a", "http://a.test/run", make_payload(1))
+    await dispatcher.stop(timeout=1)
+
+    assert calls == [0, 1]
+
+
+async def test_retries_then_dead_letters():
+    attempts = []
+
+    async def unreachable(job: DispatchJob) -> None:
+        attempts.append(job.attempts)
+        raise DeliveryError("refused", kind=KIND_CONNECT)
+
+    dead_letters = DeadLetterStore()
+    dispatcher = Dispatcher(unreachable, workers=1, retry_policy=RetryPolicy(max_attempts=3, base_delay=0.001), dead_letters=dead_letters)
+    dispatcher.submit("agent-a", "http://a.test/run", make_payload(7))
+    await dispatcher.stop(timeout=1)
+
+    assert attempts == [1, 2, 3]
+    [letter] = dead_letters.list()
+    assert letter.agent_id == "agent-a"
+    assert letter.attempts == 3
+    assert letter.payload.payload == {"n": 7}
+
+
+async def test_permanent_failures_are_not_retried():
+    attempts = []
+
+    async def rejected(job: DispatchJob) -> None:
+        attempts.append(job.attempts)
+        raise DeliveryError("bad request", kind=KIND_STATUS, status_code=400)
+
+    dead_letters = DeadLetterStore()
+    dispatcher = Dispatcher(rejected, workers=1, retry_policy=RetryPolicy(max_attempts=5, base_delay=0.001), dead_letters=dead_letters)
+    dispatcher.submit("agent-a", "http://a.test/run", make_payload(0))
+    await dispatcher.stop(timeout=1)
+
+    assert attempts == [1]
+    assert dead_letters.list()[0].status_code == 400
+
+
+async def test_waiting_retries_do_not_hold_workers():
+    delivered = []
+
+    async def deliver(job: DispatchJob) -> None:
+        if job.agent_id == "down":
+            raise DeliveryError("refused", kind=KIND_CONNECT)
+        delivered.append(job.payload.payload["n"])
+
+    dead_letters = DeadLetterStore()
+    dispatcher = Dispatcher(deliver, workers=1, retry_policy=RetryPolicy(max_attempts=2, base_delay=60), dead_letters=dead_letters)
+    dispatcher.submit("down", "http://down.test/run", make_payload(0))
+    dispatcher.submit("up", "http://up.test/run", make_payload(1))
+    await asyncio.sleep(0.01)
+
+    # The single worker moved on while the failed message waits for its retry
+    assert delivered == [1]
+    stats = dispatcher.stats()
+    assert stats["retryWaiting"] == 1
+    assert stats["queueDepth"] == 0
+
+    await dispatcher.stop(timeout=0.01)
+    [letter] = dead_letters.list()
+    assert letter.agent_id == "down"
+    assert "stopped" in letter.error
+
+
+async def test_task_lifecycle_is_tracked():
+    async def flaky(job: DispatchJob) -> None:
+        if job.attempts == 1:
+            raise DeliveryError("unavailable", kind=KIND_STATUS, status_code=503)
+
+    tasks = TaskStore()
+    dispatcher = Dispatcher(flaky, workers=1, retry_policy=RetryPolicy(max_attempts=3, base_delay=0.001), tasks=tasks)
+    job = dispatcher.submit("agent-a", "http://a.test/run", make_payload(0))
+    assert tasks.get(job.task_id).status == "queued"
+    await dispatcher.stop(timeout=1)
+
+    task = tasks.get(job.task_id).to_dict()
+    assert task["status"] == "delivered"
+    assert task["attempts"] == 2
+    assert task["deliveredAt"] is not None
+    assert task["error"] is None
+
+
+async def test_failed_task_points_to_dead_letter():
+    async def rejected(job: DispatchJob) -> None:
+        raise DeliveryError("bad request", kind=KIND_STATUS, status_code=400)
+
+    tasks, dead_letters = TaskStore(), DeadLetterStore()
+    dispatcher = Dispatcher(rejected, workers=1, tasks=tasks, dead_letters=dead_letters)
+    job = dispatcher.submit("agent-a", "http://a.test/run", make_payload(0))
+    await dispatcher.stop(timeout=1)
+
+    assert tasks.get(job.task_id).status == "failed"
+    assert dead_letters.list()[0].task_id == job.task_id
+
+
+
+async def test_dead_letter_ends_wait_for_reply():
+    async def rejected(job: DispatchJob) -> None:
+        raise DeliveryError("bad request", kind=KIND_STATUS, status_code=400)
+
+    replies = ReplyWaiters()
+    dispatcher = Dispatcher(rejected, workers=1, replies=replies)
+    reply = replies.expect("task-1")
+    dispatcher.submit("agent-a", "http://a.test/run", make_payload(0), task_id="task-1")
+
+    with pytest.raises(ReplyFailed, match="bad request"):
+        await replies.wait("task-1", reply, timeout=1)
+    await dispatcher.stop(timeout=1)
+
+async def test_open_breaker_holds_messages_until_probe_succeeds():
+    clock = [0.0]
+    healthy = [False]
+    calls = []
+
+    async def deliver(job: DispatchJob) -> None:
+        calls.append(job.payload.payload["n"])
+        if not healthy[0]:
+            raise DeliveryError("refused", kind=KIND_CONNECT)
+
+    breakers = CircuitBreakerRegistry(window=2, min_calls=2, open_seconds=0.05, clock=lambda: clock[0])
+    dispatcher = Dispatcher(deliver, workers=1, breakers=breakers)
+    dispatcher.submit("agent-a", "http://a.test/run", make_payload(0))
+    dispatcher.submit("agent-a", "http://a.test/run", make_payload(1))
+    await asyncio.sleep(0.01)
+    assert breakers.state_of("agent-a")["state"] == "open"
+
+    for n in range(2, 5):
+        dispatcher.submit("agent-a", "http://a.test/run", make_payload(n))
+    await asyncio.sleep(0.01)
+    assert calls == [0, 1] # Held without a delivery attempt
+    assert dispatcher.stats()["heldByCircuitBreaker"] == 3
+
+    healthy[0] = True
+    clock[0] = 1.0 # Past open_seconds: the next release sends a probe, which closes the breaker
+    await dispatcher.stop(timeout=1)
+    assert sorted(calls[2:]) == [2, 3, 4]
+    assert breakers.state_of("agent-a")["state"] == "closed"
+
+
+async def test_fail_fast_breaker_rejects_new_messages():
+    clock = [0.0]
+
+    async def unreachable(job: DispatchJob) -> None:
+        raise DeliveryError("refused", kind=KIND_CONNECT)
+
+    breakers = CircuitBreakerRegistry(window=1, min_calls=1, open_seconds=30, open_action="fail", clock=lambda: clock[0])
+    dead_letters = DeadLetterStore()
+    dispatcher = Dispatcher(unreachable, workers=1, breakers=breakers, dead_letters=dead_letters)
+    dispatcher.submit("agent-a", "http://a.test/run", make_payload(0))
+    dispatcher.submit("agent-a", "http://a.test/run", make_payload(1)) # Queued before the breaker opened
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(AgentUnavailable) as excinfo:
+        dispatcher.submit("agent-a", "http://a.test/run", make_payload(2))
+    assert excinfo.value.retry_after == 30
+    await dispatcher.stop(timeout=1)
+    assert [letter.error for letter in dead_letters.list()] == ["refused", "Circuit breaker for agent 'agent-a' is open."]
+
+
+class BatchRecorder:
+    """Delivery callback that records the message numbers of each request."""
+
+    def __init__(self, fail_first: int = 0):
+        self.requests = []
+        self.fail_first = fail_first
+
+    async def __call__(self, delivery) -> None:
+        numbers = [job.payload.payload["n"] for job in delivery.jobs]
+        if self.fail_first:
+            self.fail_first -= 1
+            raise DeliveryError("unavailable", kind=KIND_STATUS, status_code=503)
+        self.requests.append((isinstance(delivery, DispatchBatch), numbers))
+
+
+async def test_batch_agents_receive_coalesced_messages():
+    deliver = BatchRecorder()
+    dispatcher = Dispatcher(deliver, workers=2)
+    config = BatchDeliveryConfig(maxBatchSize=3, lingerMs=5000)
+
+    jobs = [dispatcher.submit("batcher", "http://a.test/run", make_payload(n), batch=config) for n in range(7)]
+    dispatcher.submit("single", "http://b.test/run", make_payload(99))
+    await asyncio.sleep(0.05)
+
+    # Full batches go out at once; the remainder waits for the linger time
+    assert sorted(deliver.requests) == [(False, [99]), (True, [0, 1, 2]), (True, [3, 4, 5])]
+    stats = dispatcher.stats()
+    assert stats["batching"] == 1
+    assert stats["batchesDelivered"] == 2
+    assert stats["delivered"] == 7
+
+    await dispatcher.stop(timeout=1) # Flushes the open batch
+    assert (True, [6]) in deliver.requests
+    assert all(job.task.status == "delivered" for job in jobs)
+
+
+async def test_batch_is_sent_after_linger_time():
+    deliver = BatchRecorder()
+    dispatcher = Dispatcher(deliver, workers=1)
+    config = BatchDeliveryConfig(maxBatchSize=100, lingerMs=20)
+
+    for n in range(4):
+        dispatcher.submit("batcher", "http://a.test/run", make_payload(n), batch=config)
+    await asyncio.sleep(0.01)
+    assert deliver.requests == []
+    await asyncio.sleep(0.05)
+
+    assert deliver.requests == [(True, [0, 1, 2, 3])]
+    await dispatcher.stop(timeout=1)
+
+
+async def test_failed_batch_is_retried_and_dead_lettered_as_a_unit():
+    deliver = BatchRecorder(fail_first=10)
+    dead_letters = DeadLetterStore()
+    policy = RetryPolicy(max_attempts=2, base_delay=0.001, max_delay=0.001)
+    dispatcher = Dispatcher(deliver, workers=1, retry_policy=policy, dead_letters=dead_letters)
+    config = BatchDeliveryConfig(maxBatchSize=2, lingerMs=1000)
+
+    jobs = [dispatcher.submit("batcher", "http://a.test/run", make_payload(n), batch=config) for n in range(2)]
+    await asyncio.sleep(0.05)
+
+    assert deliver.fail_first == 8 # Two attempts, one request each
+    letters = dead_letters.list()
+    assert [letter.task_id for letter in letters] == [job.task_id for job in jobs]
+    assert all(letter.attempts == 2 and letter.status_code == 503 for letter in letters)
+    stats = dispatcher.stats()
+    assert stats["retried"] == 1
+    assert stats["deadLettered"] == 2
+    await dispatcher.stop(timeout=1)
+
+
+async def test_agent_batches_are_delivered_one_at_a_time_in_order():
+    """A retried batch holds back the agent's later batches, even with several per-agent slots."""
+    attempts = []
+    active = []
+    overlap = []
+
+    async def deliver(batch):
+        active.append(batch)
+        if len(active) > 1:
+            overlap.append(len(active))
+        numbers = [payload.payload["n"] for payload in batch.payloads]
+        attempts.append(numbers)
+        await asyncio.sleep(0.001)
+        active.remove(batch)
+        if numbers == [0, 1] and attempts.count(numbers) == 1:
+            raise DeliveryError("agent busy", kind=KIND_CONNECT)
+
+    dispatcher = Dispatcher(deliver, workers=4, per_agent_limit=4, retry_policy=RetryPolicy(max_attempts=2, base_delay=0.01, max_delay=0.01))
+    config = BatchDeliveryConfig(maxBatchSize=2, lingerMs=1000)
+    for n in range(6):
+        dispatcher.submit("batcher", "http://a.test/run", make_payload(n), batch=config)
+    stats = dispatcher.stats()
+    assert stats["waitingForBatch"] == 4
+    assert stats["queueDepth"] == 2
+    await dispatcher.stop(timeout=1)
+
+    assert overlap == []
+    assert attempts == [[0, 1], [0, 1], [2, 3], [4, 5]]
+
+
+async def test_urgent_messages_overtake_bulk_traffic():
+    deliver = RecordingDeliver()
+    deliver.release.set()
+    dispatcher = Dispatcher(deliver, workers=1)
+
+    for n in range(5):
+        dispatcher.submit("agent-a", "http://a.test/run", MessagePayload(senderId="bulk", messageType="custom_instruction", payload={"n": n}, priority="low"))
+    dispatcher.submit("agent-a", "http://a.test/run", MessagePayload(senderId="opscore", messageType="custom_instruction", payload={"n": 99}, priority="high"))
+    lanes = dispatcher.stats()["priorityLanes"]["lanes"]
+    assert (lanes["low"]["depth"], lanes["high"]["depth"]) == (5, 1)
+    await dispatcher.stop(timeout=1)
+
+    assert deliver.delivered[0] == ("agent-a", 99)
+
+
+async def test_session_messages_are_delivered_one_at_a_time_in_order():
+    active = {}
+    overlap = []
+    delivered = []
+
+    async def deliver(job):
+        session = job.session_id
+        active[session] = active.get(session, 0) + 1
+        if active[session] > 1:
+            overlap.append(session)
+        await asyncio.sleep(0.001 * (5 - job.payload.payload["n"] % 5)) # Earlier messages take longer
+        active[session] -= 1
+        delivered.append((session, job.payload.payload["n"]))
+
+    dispatcher = Dispatcher(deliver, workers=8, per_agent_limit=8)
+    for n in range(10):
+        session = "s1" if n % 2 else "s2"
+        payload = MessagePayload(senderId="tester", messageType="custom_instruction", payload={"n": n}, sessionContext={"sessionId": session})
+        dispatcher.submit("agent-a", "http://a.test/run", payload)
+    stats = dispatcher.stats()
+    assert (stats["sessionLanes"], stats["waitingForSession"]) == (2, 8)
+    await dispatcher.stop(timeout=1)
+
+    assert overlap == []
+    assert [n for session, n in delivered if session == "s1"] == [1, 3, 5, 7, 9]
+    assert [n for session, n in delivered if session == "s2"] == [0, 2, 4, 6, 8]
+    assert dispatcher.stats()["sessionLanes"] == 0 # Idle lanes are dropped
+
+
+async def test_session_order_survives_retries():
+    attempts = {}
+    delivered = []
+
+    async def deliver(job):
+        n = job.payload.payload["n"]
+        attempts[n] = attempts.get(n, 0) + 1
+        if n == 0 and attempts[n] == 1:
+            raise DeliveryError("agent busy", kind=KIND_CONNECT)
+        delivered.append(n)
+
+    dispatcher = Dispatcher(deliver, workers=4, retry_policy=RetryPolicy(max_attempts=2, base_delay=0.01, max_delay=0.01))
+    for n in range(3):
+        dispatcher.submit("agent-a", "http://a.test/run", MessagePayload(senderId="t", messageType="m", payload={"n": n}, sessionContext={"sessionId": "s"}))
+    await dispatcher.stop(timeout=1)
+
+    assert delivered == [0, 1, 2]
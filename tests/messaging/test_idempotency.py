@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from agentkit.messaging.idempotency import IdempotencyCache, IdempotencyConflict
+
+
+class Counter:
+    def __init__(self, result=(202, "ok"), error=None, gate=None):
+        self.calls = 0
+        self.result = result
+        self.error = error
+        self.gate = gate
+
+    async def __call__(self):
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+async def test_replays_stored_response_until_ttl():
+    now = [0.0]
+    cache = IdempotencyCache(ttl=10, clock=lambda: now[0])
+    execute = Counter()
+    assert await cache.run("k", "req", execute) == (202, "ok", False)
+    assert await cache.run("k", "req", execute) == (202, "ok", True)
+    assert execute.calls == 1
+    now[0] = 11
+    assert await cache.run("k", "req", execute) == (202, "ok", False)
+    assert execute.calls == 2
+
+
+async def test_concurrent_duplicates_wait_for_first_execution():
+    cache = IdempotencyCache()
+    execute = Counter(gate=asyncio.Event())
+    first = asyncio.ensure_future(cache.run("k", "req", execute))
+    duplicates = [asyncio.ensure_future(cache.run("k", "req", execute)) for _ in range(3)]
+    await asyncio.sleep(0)
+    execute.gate.set()
+    assert await first == (202, "ok", False)
+    assert [await d for d in duplicates] == [(202, "ok", True)] * 3
+    assert execute.calls == 1
+    assert cache.stats() == {"keys": 1, "executed": 1, "replayed": 3, "joined": 3}
+
+
+async def test_failures_are_shared_but_not_stored():
+    cache = IdempotencyCache()
+    failing = Counter(error=RuntimeError("boom"), gate=asyncio.Event())
+    first = asyncio.ensure_future(cache.run("k", "req", failing))
+    duplicate = asyncio.ensure_future(cache.run("k", "req", failing))
+    await asyncio.sleep(0)
+    failing.gate.set()
+    for task in (first, duplicate):
+        with pytest.raises(RuntimeError):
+            await task
+    assert len(cache) == 0
+    assert await cache.run("k", "req", Counter()) == (202, "ok", False) # A retry executes again
+
+
+async def test_cancelled_first_request_hands_over_to_duplicate():
+    cache = IdempotencyCache()
+    execute = Counter(gate=asyncio.Event())
+    first = asyncio.ensure_future(cache.run("k", "req", execute))
+    duplicate = asyncio.ensure_future(cache.run("k", "req", execute))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    execute.gate.set()
+    assert await duplicate == (202, "ok", False)
+    assert execute.calls == 2
+
+
+async def test_key_reuse_for_another_request_conflicts_and_cache_is_bounded():
+    cache = IdempotencyCache(max_keys=1)
+    await cache.run("k1", "req-a", Counter())
+    with pytest.raises(IdempotencyConflict):
+        await cache.run("k1", "req-b", Counter())
+    await cache.run("k2", "req-a", Counter())
+    assert len(cache) == 1
+
+
+async def test_eviction_keeps_keys_that_are_still_executing():
+    cache = IdempotencyCache(max_keys=2)
+    slow = Counter(gate=asyncio.Event())
+    first = asyncio.ensure_future(cache.run("slow", "req", slow))
+    await asyncio.sleep(0)
+    for i in range(5): # Fill the cache past max_keys while "slow" is in flight
+        await cache.run(f"k{i}", "req", Counter())
+    duplicate = asyncio.ensure_future(cache.run("slow", "req", slow))
+    await asyncio.sleep(0)
+    slow.gate.set()
+    assert await first == (202, "ok", False)
+    assert await duplicate == (202, "ok", True)
+    assert slow.calls == 1
+    assert len(cache) == 2
@@ -0,0 +1,49 @@
+import json
+from agentkit.messaging.ingest import RecordError, iter_json_records
+
+
+async def parse(*chunks: bytes, max_record_bytes: int = 1024):
+    async def body():
+        for chunk in chunks:
+            yield chunk
+    return [record async for record in iter_json_records(body(), max_record_bytes)]
+
+
+def describe(records):
+    return [("error", record.fatal) if isinstance(record, RecordError) else record for record in records]
+
+
+async def test_ndjson_records_split_across_chunks():
+    body = b'{"n": 1}\n\n{"n"', b': 2}\r\n{"n": 3}'
+    assert await parse(*body) == [{"n": 1}, {"n": 2}, {"n": 3}]
+
+
+async def test_ndjson_bad_lines_do_not_stop_parsing():
+    records = await parse(b'{"n": 1}\nnot json\n{"n": 3}\n')
+    assert describe(records) == [{"n": 1}, ("error", False), {"n": 3}]
+
+
+async def test_ndjson_oversized_line_is_skipped():
+    big = json.dumps({"pad": "x" * 100}).encode()
+    records = await parse(b'{"n": 1}\n' + big[:50], big[50:] + b'\n{"n": 2}\n', max_record_bytes=40)
+    assert describe(records) == [{"n": 1}, ("error", False), {"n": 2}]
+
+
+async def test_ndjson_oversized_line_in_one_chunk_is_rejected():
+    big = json.dumps({"pad": "x" * 100}).encode()
+    records = await parse(b'{"n": 1}\n', big + b'\n{"n": 2}\n', big, max_record_bytes=40)
+    assert describe(records) == [{"n": 1}, ("error", False), {"n": 2}, ("error", False)]
+
+
+async def test_json_array_parsed_incrementally():
+    body = b'  [{"n": 1}, {"n": "\xc3', b'\xa9"} ,', b'{"n": 3}]  '
+    assert await parse(*body) == [{"n": 1}, {"n": "é"}, {"n": 3}]
+    assert await parse(b"[]") == []
+    assert await parse(b"   ") == []
+
+
+async def test_malformed_array_ends_with_fatal_error():
+    assert describe(await parse(b'[{"n": 1} {"n": 2}]')) == [{"n": 1}, ("error", True)]
+    assert describe(await parse(b'[{"n": 1}, 5]')) == [{"n": 1}, ("error", True)]
+    assert describe(await parse(b'[{"n": 1}, {"n": ')) == [{"n": 1}, ("error", True)]
+    assert describe(await parse(b'[{"pad": "' + b"x" * 2000 + b'"}]')) == [("error", True)]
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import pytest
+from agentkit.messaging.push import PushChannelRegistry, PushConnection
+from agentkit.messaging.retry import DeliveryError, KIND_CONNECT, KIND_STATUS, KIND_TIMEOUT
+
+
+class FakeSocket:
+    """Collects sent frames; optionally fails to send."""
+
+    def __init__(self, fail: bool = False):
+        self.frames = []
+        self.fail = fail
+        self.sent = asyncio.Event()
+
+    async def send_text(self, text: str) -> None:
+        if self.fail:
+            raise RuntimeError("socket is gone")
+        self.frames.append(json.loads(text))
+        self.sent.set()
+
+
+async def answer(connection: PushConnection, socket: FakeSocket, **reply) -> None:
+    await socket.sent.wait()
+    connection.receive(json.dumps({"deliveryId": socket.frames[-1]["deliveryId"], **reply}))
+
+
+async def test_delivery_completes_on_ack():
+    socket = FakeSocket()
+    connection = PushConnection("agent-a", socket.send_text)
+
+    await asyncio.gather(connection.deliver(b'{"n": 1}'), answer(connection, socket, type="ack"))
+
+    assert socket.frames[0]["type"] == "deliver"
+    assert socket.frames[0]["body"] == {"n": 1}
+    assert connection.to_dict() == {"connected": True, "awaitingAck": 0, "delivered": 1}
+
+
+async def test_nack_raises_status_error():
+    socket = FakeSocket()
+    connection = PushConnection("agent-a", socket.send_text)
+
+    with pytest.raises(DeliveryError) as excinfo:
+        await asyncio.gather(connection.deliver(b"{}"), answer(connection, socket, type="nack", statusCode=422, error="bad"))
+
+    assert (excinfo.value.kind, excinfo.value.status_code) == (KIND_STATUS, 422)
+
+
+async def test_failures_are_classified():
+    unsent = PushConnection("agent-a", FakeSocket(fail=True).send_text)
+    with pytest.raises(DeliveryError) as send_failed:
+        await unsent.deliver(b"{}")
+
+    silent = PushConnection("agent-b", FakeSocket().send_text, ack_timeout=0.01)
+    with pytest.raises(DeliveryError) as timed_out:
+        await silent.deliver(b"{}")
+
+    assert send_failed.value.kind == KIND_CONNECT
+    assert timed_out.value.kind == KIND_TIMEOUT
+
+
+async def test_registry_refuses_second_connection_and_fails_pending_on_disconnect():
+    registry = PushChannelRegistry(ack_timeout=5)
+    first_socket = FakeSocket()
+    first = registry.connect("agent-a", first_socket.send_text)
+    assert registry.connect("agent-a", FakeSocket().send_text) is None # The open channel is not replaced
+    assert registry.get("agent-a") is first
+
+    pending = asyncio.create_task(first.deliver(b"{}"))
+    await first_socket.sent.wait()
+    registry.disconnect(first)
+    with pytest.raises(DeliveryError) as excinfo:
+        await pending
+
+    assert excinfo.value.kind == KIND_TIMEOUT
+    second = registry.connect("agent-a", FakeSocket().send_text) # Reconnecting after the channel closed works
+    assert registry.get("agent-a") is second
+    registry.disconnect(second)
+    assert registry.state_of("agent-a") == {"connected": False}
+
+
+def test_push_tokens_are_per_agent_and_per_secret():
+    registry = PushChannelRegistry(token_secret=b"secret")
+    token = registry.token_for("agent-a")
+    assert registry.verify("agent-a", token)
+    assert not registry.verify("agent-b", token)
+    assert not registry.verify("agent-a", None)
+    assert PushChannelRegistry(token_secret=b"secret").verify("agent-a", token) # Holds in every process sharing the secret
+    assert not PushChannelRegistry(token_secret=b"other").verify("agent-a", token)
+
+
+async def test_revoke_fails_pending_deliveries_and_closes_the_socket():
+    registry = PushChannelRegistry(ack_timeout=5)
+    socket = FakeSocket()
+    closed = []
+    connection = registry.connect("agent-a", socket.send_text, lambda: closed.append(True))
+
+    pending = asyncio.create_task(connection.deliver(b"{}"))
+    await socket.sent.wait()
+    registry.revoke("agent-a")
+    with pytest.raises(DeliveryError):
+        await pending
+
+    assert closed == [True]
+    assert registry.get("agent-a") is None
+    registry.revoke("agent-a") # Nothing left to revoke
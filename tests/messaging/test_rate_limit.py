@@ -0,0 +1,58 @@
+import pytest
+from agentkit.messaging.rate_limit import RateLimited, RateLimiter, TokenBuckets
+
+
+def test_bucket_allows_burst_then_refills_at_rate():
+    now = [0.0]
+    buckets = TokenBuckets(rate=2, burst=3, clock=lambda: now[0])
+    for _ in range(3):
+        assert buckets.wait_time("a", now[0]) == 0
+        buckets.take("a")
+    assert buckets.wait_time("a", now[0]) == pytest.approx(0.5)
+    now[0] = 0.5
+    assert buckets.wait_time("a", now[0]) == 0
+    now[0] = 100
+    buckets.wait_time("a", now[0])
+    assert buckets._buckets["a"][0] == 3 # Refills never exceed the burst
+
+
+def test_bucket_table_is_bounded():
+    buckets = TokenBuckets(rate=1, burst=1, max_keys=2)
+    for key in ("a", "b", "c"):
+        buckets.wait_time(key, 0.0)
+    assert len(buckets) == 2
+    assert buckets.evicted == 1
+    assert "a" not in buckets._buckets # The least recently used key went first
+
+
+def test_limiter_checks_sender_and_agent():
+    now = [0.0]
+    limiter = RateLimiter(sender_rate=10, sender_burst=2, agent_rate=1, agent_burst=1, clock=lambda: now[0])
+    limiter.acquire("s1", "agent-a")
+    with pytest.raises(RateLimited) as excinfo:
+        limiter.acquire("s1", "agent-a")
+    assert (excinfo.value.scope, excinfo.value.retry_after) == ("agent", 1)
+    limiter.acquire("s1", "agent-b") # The rejection did not use up the sender's allowance
+    with pytest.raises(RateLimited) as excinfo:
+        limiter.acquire("s1", "agent-c")
+    assert excinfo.value.scope == "sender"
+
+    stats = limiter.stats()
+    assert (stats["sender"]["allowed"], stats["sender"]["throttled"]) == (2, 1)
+    assert (stats["agent"]["allowed"], stats["agent"]["throttled"]) == (2, 1)
+
+
+def test_disabled_limiter_admits_everything():
+    limiter = RateLimiter()
+    assert not limiter.enabled
+    for _ in range(100):
+        limiter.acquire("s1", "agent-a")
+    assert limiter.stats()["sender"]["keys"] == 0
+
+
+def test_refund_returns_the_tokens_of_a_message_that_was_not_sent():
+    limiter = RateLimiter(sender_rate=1, sender_burst=1, agent_rate=1, agent_burst=1, clock=lambda: 0.0)
+    limiter.acquire("s1", "agent-a")
+    limiter.refund("s1", "agent-a")
+    limiter.acquire("s1", "agent-a") # The refunded tokens admit the retry
+    assert limiter.stats()["sender"]["allowed"] == 1
@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+from agentkit.messaging.replies import ReplyFailed, ReplyWaiters, ReplyWaitersFull
+
+
+async def test_resolve_hands_reply_to_waiter():
+    waiters = ReplyWaiters()
+    future = waiters.expect("task-1")
+
+    assert waiters.resolve("task-1", {"answer": 42})
+    assert await waiters.wait("task-1", future, timeout=1) == {"answer": 42}
+    assert len(waiters) == 0
+    assert not waiters.resolve("task-1", {"answer": 43}) # Nobody is waiting any more
+
+
+async def test_wait_times_out_and_forgets_waiter():
+    waiters = ReplyWaiters()
+    future = waiters.expect("task-1")
+
+    assert await waiters.wait("task-1", future, timeout=0.01) is None
+    assert waiters.stats()["timedOut"] == 1
+    assert len(waiters) == 0
+
+
+async def test_fail_wakes_waiter_with_error():
+    waiters = ReplyWaiters()
+    future = waiters.expect("task-1")
+    asyncio.get_running_loop().call_soon(waiters.fail, "task-1", "Agent returned status 400")
+
+    with pytest.raises(ReplyFailed, match="status 400"):
+        await waiters.wait("task-1", future, timeout=1)
+
+
+async def test_many_concurrent_waiters_are_bounded():
+    waiters = ReplyWaiters(max_waiters=1000)
+    futures = {f"task-{n}": waiters.expect(f"task-{n}") for n in range(1000)}
+    with pytest.raises(ReplyWaitersFull):
+        waiters.expect("one-too-many")
+
+    waiting = asyncio.gather(*(waiters.wait(task_id, future, timeout=1) for task_id, future in futures.items()))
+    for n in range(1000):
+        waiters.resolve(f"task-{n}", n)
+
+    assert await waiting == list(range(1000))
@@ -0,0 +1,57 @@
+import random
+from agentkit.messaging.retry import DeliveryError, RetryPolicy, KIND_CONNECT, KIND_DISCONNECT, KIND_ERROR, KIND_STATUS, KIND_TIMEOUT
+
+
+def test_retryable_failures():
+    policy = RetryPolicy()
+
+    assert policy.is_retryable(DeliveryError("refused", kind=KIND_CONNECT))
+    assert policy.is_retryable(DeliveryError("unavailable", kind=KIND_STATUS, status_code=503))
+    assert policy.is_retryable(DeliveryError("throttled", kind=KIND_STATUS, status_code=429))
+    # A 500 or 4xx may mean the agent acted on the message, so it is not resent
+    assert not policy.is_retryable(DeliveryError("server error", kind=KIND_STATUS, status_code=500))
+    assert not policy.is_retryable(DeliveryError("bad request", kind=KIND_STATUS, status_code=400))
+    assert not policy.is_retryable(DeliveryError("bug", kind=KIND_ERROR))
+    # A timeout or dropped connection may mean the agent processed the message, so resending is opt-in
+    assert not policy.is_retryable(DeliveryError("slow", kind=KIND_TIMEOUT))
+    assert not policy.is_retryable(DeliveryError("dropped", kind=KIND_DISCONNECT))
+    assert RetryPolicy(retry_timeouts=True).is_retryable(DeliveryError("slow", kind=KIND_TIMEOUT))
+    assert RetryPolicy(retry_timeouts=True).is_retryable(DeliveryError("dropped", kind=KIND_DISCONNECT))
+
+
+def test_backoff_grows_with_jitter_and_is_capped():
+    policy = RetryPolicy(max_attempts=10, base_delay=1.0, max_delay=8.0, rng=random.Random(42))
+    error = DeliveryError("refused", kind=KIND_CONNECT)
+
+    for attempts in range(1, 10):
+        ceiling = min(8.0, 2 ** (attempts - 1))
+        delays = [policy.next_delay(attempts, error) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert max(delays) > ceiling * 0.8 # Jitter spreads over the whole window
+
+
+def test_no_retry_after_max_attempts_or_permanent_failure():
+    policy = RetryPolicy(max_attempts=3)
+
+    assert policy.next_delay(2, DeliveryError("refused", kind=KIND_CONNECT)) is not None
+    assert policy.next_delay(3, DeliveryError("refused", kind=KIND_CONNECT)) is None
+    assert policy.next_delay(1, DeliveryError("bad request", kind=KIND_STATUS, status_code=400)) is None
+
+
+def test_honours_retry_after_up_to_max_delay():
+    policy = RetryPolicy(base_delay=0.01, max_delay=5.0)
+
+    assert policy.next_delay(1, DeliveryError("throttled", kind=KIND_STATUS, status_code=429, retry_after=3)) == 3
+    assert policy.next_delay(1, DeliveryError("throttled", kind=KIND_STATUS, status_code=429, retry_after=60)) == 5.0
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("AGENTKIT_DISPATCH_MAX_ATTEMPTS", "2")
+    monkeypatch.setenv("AGENTKIT_DISPATCH_RETRY_STATUSES", "500, 503")
+    monkeypatch.setenv("AGENTKIT_DISPATCH_RETRY_TIMEOUTS", "1")
+
+    policy = RetryPolicy.from_env()
+
+    assert policy.max_attempts == 2
+    assert policy.retry_statuses == {500, 503}
+    assert policy.retry_timeouts is True
@@ -0,0 +1,47 @@
+import gzip
+import pytest
+from agentkit.messaging.routes import RouteCache
+
+def test_route_is_parsed_once_and_reused():
+    """Test lookups with the registered endpoint return the precomputed route."""
+    routes = RouteCache()
+    route = routes.update("agent-1", "https://agent.test/run")
+    assert (route.host, route.port, route.pool_key) == ("agent.test", 443, "https://agent.test:443")
+    assert route.headers == {"Content-Type": "application/json"}
+    assert routes.route("agent-1", "https://agent.test/run") is route
+
+def test_changed_endpoint_rebuilds_route():
+    """Test an agent whose endpoint changed gets a new route rather than the stale one."""
+    routes = RouteCache()
+    old = routes.update("agent-1", "http://agent.test/run")
+    new = routes.route("agent-1", "http://agent.test:8080/run")
+    assert new is not old
+    assert new.pool_key == "http://agent.test:8080"
+    assert routes.get("agent-1") is new
+
+def test_invalid_endpoint_and_forget():
+    """Test invalid endpoints raise ValueError and forgotten agents lose their route."""
+    routes = RouteCache(max_routes=1)
+    with pytest.raises(ValueError):
+        routes.route("agent-1", "not a url")
+    routes.update("agent-1", "http://a.test/")
+    routes.update("agent-2", "http://b.test/")
+    assert routes.get("agent-1") is None # Evicted by the bound
+    routes.forget("agent-2")
+    assert len(routes) == 0
+
+def test_route_compresses_large_bodies_for_agents_that_accept_it():
+    """Test the negotiated coding is applied only above the size threshold."""
+    routes = RouteCache()
+    route = routes.update("agent-1", "http://agent.test/run", ["br", "gzip"])
+    assert route.encoding == "gzip"
+    small = b'{"n": 1}'
+    assert route.encode(small) == (small, route.headers)
+    large = b'{"text": "' + b"lorem ipsum " * 500 + b'"}'
+    body, headers = route.encode(large)
+    assert gzip.decompress(body) == large
+    assert headers == {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+
+    assert routes.route("agent-1", "http://agent.test/run") is route # Codings unknown to the caller: keep the route
+    plain = routes.route("agent-1", "http://agent.test/run", ())
+    assert plain.encoding is None and plain.encode(large) == (large, plain.headers)
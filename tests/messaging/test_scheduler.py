@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from agentkit.messaging.scheduler import DispatchScheduler, parse_weights
+
+
+def classify(item):
+    priority, sender, _ = item
+    return priority, sender, 1
+
+
+def drain(scheduler):
+    items = []
+    while not scheduler.empty():
+        items.append(scheduler.get_nowait())
+    return [n for _, _, n in items]
+
+
+def test_strict_priority_between_classes():
+    scheduler = DispatchScheduler(classify, aging=0)
+    scheduler.put_nowait(("low", "a", 1))
+    scheduler.put_nowait(("normal", "a", 2))
+    scheduler.put_nowait(("high", "a", 3))
+    scheduler.put_nowait(("bogus", "a", 4)) # Unknown classes count as normal
+    assert drain(scheduler) == [3, 2, 4, 1]
+
+
+def test_senders_take_turns_within_a_class():
+    scheduler = DispatchScheduler(classify, aging=0)
+    for n in range(5):
+        scheduler.put_nowait(("normal", "noisy", n))
+    scheduler.put_nowait(("normal", "quiet", 100))
+    assert drain(scheduler) == [0, 100, 1, 2, 3, 4] # The quiet sender does not wait behind the flood
+
+
+def test_weights_and_batch_costs():
+    assert parse_weights("opscore=3, bulk=1") == {"opscore": 3, "bulk": 1}
+    with pytest.raises(ValueError):
+        parse_weights("opscore=0")
+
+    scheduler = DispatchScheduler(classify, weights={"opscore": 3}, aging=0)
+    for n in range(4):
+        scheduler.put_nowait(("normal", "opscore", n))
+        scheduler.put_nowait(("normal", "bulk", 10 + n))
+    assert drain(scheduler) == [0, 1, 2, 10, 3, 11, 12, 13]
+
+    scheduler = DispatchScheduler(lambda item: ("normal", item[1], item[2]), aging=0)
+    scheduler.put_nowait(("normal", "batcher", 3))  # A batch of three messages
+    scheduler.put_nowait(("normal", "single", 1))
+    scheduler.put_nowait(("normal", "single", 1))
+    scheduler.put_nowait(("normal", "single", 1))
+    order = [scheduler.get_nowait()[1] for _ in range(4)]
+    assert order == ["single", "single", "batcher", "single"] # The batch waits until its sender's deficit covers it
+
+
+def test_aging_serves_a_starved_class():
+    now = [0.0]
+    scheduler = DispatchScheduler(classify, aging=5, clock=lambda: now[0])
+    scheduler.put_nowait(("low", "a", "old"))
+    for n in range(3):
+        scheduler.put_nowait(("high", "b", n))
+    assert scheduler.get_nowait()[2] == 0
+    now[0] = 6
+    assert scheduler.get_nowait()[2] == "old"
+    assert scheduler.get_nowait()[2] == 1
+    lanes = scheduler.stats()["lanes"]
+    assert lanes["low"]["promoted"] == 1
+    assert lanes["high"] == {"depth": 1, "senders": 1, "enqueued": 3, "served": 2, "promoted": 0, "oldestWaitMs": 6000.0}
+
+
+async def test_get_waits_for_an_item():
+    scheduler = DispatchScheduler(classify)
+    getter = asyncio.ensure_future(scheduler.get())
+    await asyncio.sleep(0)
+    assert not getter.done()
+    scheduler.put_nowait(("normal", "a", 1))
+    assert await getter == ("normal", "a", 1)
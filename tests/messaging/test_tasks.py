@@ -0,0 +1,76 @@
+import pytest
+from agentkit.core.models import MessagePayload
+from agentkit.messaging.tasks import TaskStore, STATUS_DELIVERED, STATUS_DISPATCHED, STATUS_QUEUED
+
+
+def make_payload(opscore_task_id=None, opscore_session_id=None) -> MessagePayload:
+    return MessagePayload(
+        senderId="opscore", messageType="workflow_task", payload={},
+        opscore_task_id=opscore_task_id, opscore_session_id=opscore_session_id
+    )
+
+
+def test_lifecycle_timestamps():
+    clock = [1000.0]
+    store = TaskStore(capacity=10, clock=lambda: clock[0])
+
+    task = store.add("agent-1", make_payload("t-1", "s-1"))
+    assert task.status == STATUS_QUEUED
+    clock[0] += 0.5
+    task.dispatched(store.now())
+    assert task.status == STATUS_DISPATCHED
+    clock[0] += 0.25
+    task.delivered(store.now())
+
+    data = store.get(task.task_id).to_dict()
+    assert data["status"] == STATUS_DELIVERED
+    assert data["attempts"] == 1
+    assert data["opscore_task_id"] == "t-1"
+    assert data["queueSeconds"] == 0.5
+    assert data["totalSeconds"] == 0.75
+    assert data["queuedAt"].startswith("1970-01-01T00:16:40")
+
+
+def test_ring_buffer_evicts_oldest_and_its_index_entries():
+    store = TaskStore(capacity=3)
+
+    tasks = [store.add("agent-1", make_payload(f"t-{n}", "s-1")) for n in range(5)]
+
+    assert len(store) == 3
+    assert store.evicted == 2
+    assert store.get(tasks[0].task_id) is None
+    assert store.get(tasks[1].task_id) is None
+    assert store.find(opscore_task_id="t-0") == []
+    assert [task.task_id for task in store.find(opscore_session_id="s-1")] == [task.task_id for task in tasks[2:]]
+
+
+def test_find_by_both_ids():
+    store = TaskStore(capacity=10)
+    first = store.add("agent-1", make_payload("t-1", "s-1"))
+    store.add("agent-1", make_payload("t-2", "s-1"))
+    retry = store.add("agent-2", make_payload("t-1", "s-2"))
+
+    assert [task.task_id for task in store.find(opscore_task_id="t-1")] == [first.task_id, retry.task_id]
+    assert [task.task_id for task in store.find(opscore_task_id="t-1", opscore_session_id="s-1")] == [first.task_id]
+    assert store.find(opscore_session_id="s-1", limit=1) == [first]
+    with pytest.raises(ValueError):
+        store.find()
+
+
+def test_add_with_existing_id_restarts_task():
+    store = TaskStore(capacity=10)
+    task = store.add("agent-1", make_payload())
+    task.dispatched(store.now())
+    task.failed(store.now(), "refused")
+
+    replayed = store.add("agent-1", make_payload(), task_id=task.task_id)
+
+    assert replayed is task
+    assert len(store) == 1
+    assert task.status == STATUS_QUEUED
+    assert task.failed_at is None
+    assert task.attempts == 1 # Attempts accumulate across replays
+
+    # A replayed task that was already evicted is recorded again under its old ID
+    assert store.add("agent-1", make_payload(), task_id="evicted-task").task_id == "evicted-task"
+    assert len(store) == 2
@@ -0,0 +1,193 @@
+import pytest
+from agentkit.core.models import AgentInfo
+from agentkit.registration.backends import (
+    InMemoryBackend, SQLiteBackend, create_backend_from_env
+)
+from agentkit.registration.storage import AgentStorage
+
+def make_agent(name="BackendAgent", capabilities=("test",), version="1.0"):
+    return AgentInfo(
+        agentName=name,
+        capabilities=list(capabilities),
+        version=version,
+        contactEndpoint=f"http://{name.lower()}.test"
+    )
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    """Runs each contract test against every backend implementation."""
+    if request.param == "memory":
+        instance = InMemoryBackend()
+    else:
+        instance = SQLiteBackend(str(tmp_path / "registry.db"))
+    yield instance
+    instance.close()
+
+# --- Backend contract ---
+
+def test_add_get_and_remove(backend):
+    """Test the basic add/get/remove round trip."""
+    agent = make_agent()
+    backend.add(agent)
+    assert backend.get(agent.agentId).agentName == agent.agentName
+    assert backend.get_by_name(agent.agentName).agentId == agent.agentId
+
+    removed = backend.remove(agent.agentId)
+    assert removed.agentId == agent.agentId
+    assert backend.get(agent.agentId) is None
+    assert backend.get_by_name(agent.agentName) is None
+    assert backend.remove(agent.agentId) is None
+
+def test_duplicates_rejected(backend):
+    """Test duplicate IDs and names raise ValueError with the storage messages."""
+    agent = make_agent()
+    backend.add(agent)
+
+    same_name = make_agent()
+    with pytest.raises(ValueError, match="already registered"):
+        backend.add(same_name)
+
+    same_id = make_agent(name="OtherName")
+    same_id.agentId = agent.agentId
+    with pytest.raises(ValueError, match=f"Agent with ID {agent.agentId} already registered."):
+        backend.add(same_id)
+    assert len(backend.list_all()) == 1
+
+def test_query_filters_and_order(backend):
+    """Test query filters by capability/version and returns agentId order."""
+    agents = [
+        make_agent("A", ["search"], "1.0"),
+        make_agent("B", ["search", "plan"], "2.0"),
+        make_agent("C", ["plan"], "2.0"),
+    ]
+    for agent in agents:
+        backend.add(agent)
+
+    assert [a.agentName for a in backend.query(capability="search", version="2.0")] == ["B"]
+    assert {a.agentName for a in backend.query(capability="plan")} == {"B", "C"}
+
+    ordered = sorted(agent.agentId for agent in agents)
+    assert [a.agentId for a in backend.query()] == ordered
+    assert [a.agentId for a in backend.query(after=ordered[0], limit=1)] == [ordered[1]]
+
+def test_clear(backend):
+    """Test clear removes agents and their capability entries."""
+    backend.add(make_agent())
+    backend.clear()
+    assert backend.list_all() == []
+    assert backend.query(capability="test") == []
+
+# --- SQLite specifics ---
+
+def test_sqlite_shared_between_instances(tmp_path):
+    """Test two backends on one file (as two workers would) see each other's writes."""
+    path = str(tmp_path / "shared.db")
+    worker_a = SQLiteBackend(path)
+    worker_b = SQLiteBackend(path)
+    try:
+        agent = make_agent()
+        worker_a.add(agent)
+        assert worker_b.get(agent.agentId) is not None
+
+        with pytest.raises(ValueError, match="already registered"):
+            worker_b.add(make_agent())
+    finally:
+        worker_a.close()
+        worker_b.close()
+
+def test_sqlite_read_cache_invalidated_by_other_writer(tmp_path):
+    """Test a cached read is dropped once another connection changes the registry."""
+    path = str(tmp_path / "cache.db")
+    worker_a = SQLiteBackend(path)
+    worker_b = SQLiteBackend(path)
+    try:
+        agent = make_agent()
+        worker_a.add(agent)
+        assert worker_b.get(agent.agentId) is worker_b.get(agent.agentId) # Second read is a cache hit
+
+        worker_a.remove(agent.agentId)
+        assert worker_b.get(agent.agentId) is None
+        assert worker_b.get_by_name(agent.agentName) is None
+    finally:
+        worker_a.close()
+        worker_b.close()
+
+def test_sqlite_uses_wal(tmp_path):
+    """Test the database is opened in WAL journal mode."""
+    backend = SQLiteBackend(str(tmp_path / "wal.db"))
+    try:
+        assert backend._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    finally:
+        backend.close()
+
+def test_storage_pagination_on_sqlite(tmp_path):
+    """Test AgentStorage cursors work unchanged on the SQLite backend."""
+    storage = AgentStorage(SQLiteBackend(str(tmp_path / "pages.db")))
+    agents = [make_agent(f"Paged{i}") for i in range(5)]
+    for agent in agents:
+        storage.add_agent(agent)
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = storage.query_agents(cursor=cursor, limit=2)
+        seen.extend(agent.agentId for agent in page)
+        if cursor is None:
+            break
+    assert seen == sorted(agent.agentId for agent in agents)
+    storage.backend.close()
+
+# --- Backend selection ---
+
+def test_create_backend_from_env(monkeypatch, tmp_path):
+    """Test AGENTKIT_STORAGE_BACKEND selects the backend."""
+    monkeypatch.delenv("AGENTKIT_STORAGE_BACKEND", raising=False)
+    assert isinstance(create_backend_from_env(), InMemoryBackend)
+
+    monkeypatch.setenv("AGENTKIT_STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("AGENTKIT_SQLITE_PATH", str(tmp_path / "env.db"))
+    backend = create_backend_from_env()
+    assert isinstance(backend, SQLiteBackend)
+    backend.close()
+
+    monkeypatch.setenv("AGENTKIT_STORAGE_BACKEND", "redis")
+    with pytest.raises(ValueError, match="Unknown AGENTKIT_STORAGE_BACKEND"):
+        create_backend_from_env()
+
+def test_update_replaces_record_and_indexes(backend):
+    """Test update swaps the stored record and re-indexes capabilities and name."""
+    agent = make_agent("Before", ["old"], "1.0")
+    backend.add(agent)
+
+    updated = agent.model_copy(update={"agentName": "After", "capabilities": ["new"], "version": "2.0"})
+    previous = backend.update(updated)
+
+    assert previous.agentName == "Before"
+    assert backend.get(agent.agentId).agentName == "After"
+    assert backend.get_by_name("Before") is None
+    assert backend.query(capability="old") == []
+    assert [a.agentId for a in backend.query(capability="new", version="2.0")] == [agent.agentId]
+
+def test_update_errors(backend):
+    """Test update rejects unknown agents and name collisions."""
+    first = make_agent("First")
+    second = make_agent("Second")
+    backend.add(first)
+    backend.add(second)
+
+    with pytest.raises(KeyError):
+        backend.update(make_agent("Ghost"))
+    with pytest.raises(ValueError, match="already registered"):
+        backend.update(second.model_copy(update={"agentName": "First"}))
+    assert backend.get(second.agentId).agentName == "Second"
+
+def test_add_many_reports_conflicts(backend):
+    """Test add_many stores valid agents and reports conflicts, including within the batch."""
+    existing = make_agent("Existing")
+    backend.add(existing)
+    batch = [make_agent("One"), make_agent("Existing"), make_agent("One"), make_agent("Two")]
+
+    errors = backend.add_many(batch)
+
+    assert errors[0] is None and errors[3] is None
+    assert "already registered" in errors[1] and "already registered" in errors[2]
+    assert {agent.agentName for agent in backend.list_all()} == {"Existing", "One", "Two"}
@@ -0,0 +1,77 @@
+import threading
+import pytest
+from agentkit.core.models import AgentInfo
+from agentkit.registration.backends import InMemoryBackend
+from agentkit.registration.changes import ChangeLog, ChangeLogExpired
+from agentkit.registration.storage import AgentStorage
+
+def make_agent(name):
+    return AgentInfo(agentName=name, capabilities=["feed"], version="1.0", contactEndpoint=f"http://{name.lower()}.test")
+
+def test_storage_changes_are_sequenced():
+    """Test register/update/remove each produce one change in order."""
+    storage = AgentStorage(InMemoryBackend())
+    agent = make_agent("Changing")
+    storage.add_agent(agent)
+    storage.update_agent(agent.model_copy(update={"version": "2.0"}))
+    storage.remove_agent(agent.agentId)
+
+    changes, cursor = storage.changes_since(0, limit=10)
+    assert [(c["seq"], c["op"]) for c in changes] == [(1, "register"), (2, "update"), (3, "remove")]
+    assert changes[1]["agent"]["version"] == "2.0"
+    assert changes[2]["agent"] is None
+    assert cursor == 3
+    assert storage.changes_since(3, limit=10) == ([], 3)
+
+def test_changes_paginate_with_limit():
+    """Test a limited read returns a cursor that resumes where it stopped."""
+    storage = AgentStorage(InMemoryBackend())
+    storage.add_agents([make_agent(f"Paged{i}") for i in range(5)])
+    first, cursor = storage.changes_since(0, limit=2)
+    rest, cursor = storage.changes_since(cursor, limit=10)
+    assert [c["seq"] for c in first + rest] == [1, 2, 3, 4, 5]
+
+def test_old_or_foreign_cursor_expires():
+    """Test cursors outside the retained window or epoch require a snapshot."""
+    log = ChangeLog(max_size=3)
+    for i in range(5):
+        log.append("remove", f"agent-{i}")
+    assert [c["seq"] for c in log.since(2, limit=10)[0]] == [3, 4, 5]
+    with pytest.raises(ChangeLogExpired):
+        log.since(1, limit=10)
+    with pytest.raises(ChangeLogExpired):
+        log.since(9, limit=10)
+    with pytest.raises(ChangeLogExpired):
+        log.since(4, limit=10, epoch="another-epoch")
+
+def test_clear_invalidates_cursors():
+    """Test clearing the registry forces followers to resync."""
+    storage = AgentStorage(InMemoryBackend())
+    storage.add_agent(make_agent("Cleared"))
+    storage.clear_all()
+    with pytest.raises(ChangeLogExpired):
+        storage.changes_since(1, limit=10)
+    agents, cursor = storage.snapshot()
+    assert agents == [] and storage.changes_since(cursor, limit=10) == ([], cursor)
+
+@pytest.mark.asyncio
+async def test_wait_wakes_on_change_from_another_thread():
+    """Test a long-poll waiter is released by a write on another thread."""
+    log = ChangeLog()
+    timer = threading.Timer(0.05, log.append, args=("remove", "agent-x"))
+    timer.start()
+    assert await log.wait(0, timeout=5) is True
+    assert await log.wait(1, timeout=0.01) is False
+
+@pytest.mark.asyncio
+async def test_cancelled_wait_removes_its_waiter():
+    """Test a long-poll cancelled by a client disconnect does not leave its waiter behind."""
+    import asyncio
+    log = ChangeLog()
+    waiting = asyncio.create_task(log.wait(0, timeout=30))
+    await asyncio.sleep(0.01)
+    assert len(log._waiters) == 1
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    assert log._waiters == []
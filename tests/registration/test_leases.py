@@ -0,0 +1,177 @@
+import random
+import pytest
+from agentkit.core.models import AgentInfo
+from agentkit.registration.backends import InMemoryBackend
+from agentkit.registration.leases import LeaseTable, TimerWheel
+from agentkit.registration.storage import AgentStorage
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+    def __call__(self):
+        return self.now
+
+def make_agent(name, capabilities=("lease",)):
+    return AgentInfo(agentName=name, capabilities=list(capabilities), version="1.0", contactEndpoint=f"http://{name.lower()}.test")
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def storage(clock, monkeypatch):
+    instance = AgentStorage(InMemoryBackend(), leases=LeaseTable(tick=1.0, clock=clock))
+    monkeypatch.setattr(instance, "_start_reaper", lambda: None) # Tests drive expiry explicitly
+    return instance
+
+# --- TimerWheel ---
+
+def test_timer_wheel_fires_each_timer_on_its_tick():
+    """Test timers on every level fire exactly once, at their deadline."""
+    wheel = TimerWheel(tick=1.0, slots=8, levels=3, start=0.0)
+    deadlines = {f"t{i}": d for i, d in enumerate([1, 5, 8, 9, 63, 64, 65, 200, 511, 700])}
+    for key, deadline in deadlines.items():
+        wheel.schedule(key, deadline)
+    assert len(wheel) == len(deadlines)
+
+    fired_at = {}
+    for now in range(1, 801):
+        for key in wheel.advance(now):
+            assert key not in fired_at
+            fired_at[key] = now
+    assert fired_at == deadlines # The 700s timer exceeds the wheel span (512) and wraps correctly
+    assert len(wheel) == 0
+
+def test_timer_wheel_catches_up_after_a_pause():
+    """Test advancing over many ticks at once fires everything due."""
+    wheel = TimerWheel(tick=0.5, slots=16, levels=2, start=0.0)
+    random.seed(7)
+    deadlines = [random.uniform(0.1, 100) for _ in range(500)]
+    for i, deadline in enumerate(deadlines):
+        wheel.schedule(i, deadline)
+    assert sorted(wheel.advance(50.0)) == sorted(i for i, d in enumerate(deadlines) if d <= 50.0)
+    assert len(wheel.advance(100.0)) == sum(1 for d in deadlines if d > 50.0)
+
+# --- Leases in AgentStorage ---
+
+def test_unrenewed_lease_evicts_agent_from_every_index(storage, clock):
+    """Test an expired agent disappears from ID, name and capability lookups."""
+    agent = make_agent("Expiring")
+    assert storage.add_agent(agent, lease_ttl=10) == 10
+    clock.now += 9
+    assert storage.expire_leases() == []
+
+    clock.now += 2
+    assert storage.expire_leases() == [agent.agentId]
+    assert storage.get_agent(agent.agentId) is None
+    assert storage.get_agent_by_name("Expiring") is None
+    assert storage.find_agents_by_capability("lease") == []
+    assert agent.agentId not in storage.leases
+
+def test_expiry_notifies_removal_listeners(storage, clock):
+    """Test expired agents reach the same removal listeners as deregistered ones."""
+    removed = []
+    storage.on_remove(lambda agent_info: removed.append(agent_info.agentId))
+    expiring, leaving = make_agent("Expiring"), make_agent("Leaving")
+    storage.add_agent(expiring, lease_ttl=10)
+    storage.add_agent(leaving)
+
+    storage.remove_agent(leaving.agentId)
+    clock.now += 11
+    storage.expire_leases()
+    assert removed == [leaving.agentId, expiring.agentId]
+
+def test_heartbeat_keeps_agent_alive(storage, clock):
+    """Test renewed leases survive past their original deadline."""
+    kept, dropped = make_agent("Kept"), make_agent("Dropped")
+    storage.add_agents([kept, dropped], lease_ttls=[10, 10])
+
+    for _ in range(5):
+        clock.now += 8
+        assert storage.renew_leases([kept.agentId], lease_ttl=10) == ([kept.agentId], [], [])
+        storage.expire_leases()
+
+    assert storage.get_agent(kept.agentId) is not None
+    assert storage.get_agent(dropped.agentId) is None
+    assert storage.renew_leases([dropped.agentId], lease_ttl=10) == ([], [], [dropped.agentId])
+
+def test_heartbeat_without_ttl_reuses_each_lease_length(storage, clock):
+    """Test a heartbeat that gives no TTL renews each agent for the lease it registered with."""
+    short, long = make_agent("Short"), make_agent("Long")
+    storage.add_agents([short, long], lease_ttls=[10, 100])
+    clock.now += 8
+    assert storage.renew_leases([short.agentId, long.agentId]) == ([short.agentId, long.agentId], [], [])
+    clock.now += 11
+    assert storage.expire_leases() == [short.agentId]
+    assert storage.get_agent(long.agentId) is not None
+
+def test_shortened_lease_expires_early(storage, clock):
+    """Test renewing with a shorter TTL moves the expiry forward."""
+    agent = make_agent("Shortened")
+    storage.add_agent(agent, lease_ttl=100)
+    storage.renew_leases([agent.agentId], lease_ttl=5)
+    clock.now += 6
+    assert storage.expire_leases() == [agent.agentId]
+
+def test_unleased_agents_never_expire(storage, clock):
+    """Test agents registered without a lease are reported as unleased, not renewed, and never evicted."""
+    agent = make_agent("Forever")
+    assert storage.add_agent(agent) is None
+    clock.now += 10_000
+    assert storage.expire_leases() == []
+    assert storage.renew_leases([agent.agentId, "ghost"], lease_ttl=10) == ([], [agent.agentId], ["ghost"])
+
+def test_removed_agent_lease_released(storage, clock):
+    """Test deregistering an agent drops its lease."""
+    agent = make_agent("Removed")
+    storage.add_agent(agent, lease_ttl=10)
+    storage.remove_agent(agent.agentId)
+    assert agent.agentId not in storage.leases
+    clock.now += 20
+    assert storage.expire_leases() == []
+
+def test_default_lease_ttl_applies(clock, monkeypatch):
+    """Test a configured default lease applies to agents that do not ask for one."""
+    storage = AgentStorage(InMemoryBackend(), default_lease_ttl=30, leases=LeaseTable(clock=clock))
+    monkeypatch.setattr(storage, "_start_reaper", lambda: None)
+    agent = make_agent("Defaulted")
+    assert storage.add_agent(agent) == 30
+    clock.now += 31
+    assert storage.expire_leases() == [agent.agentId]
+
+@pytest.mark.asyncio
+async def test_reaper_evicts_on_the_event_loop_while_queries_are_in_flight():
+    """Test the reaper runs as a task on the serving loop, so concurrent queries always see consistent indexes."""
+    import asyncio
+    import threading
+    storage = AgentStorage(InMemoryBackend(), leases=LeaseTable(tick=0.01))
+    loop_thread = threading.get_ident()
+    removed_on = set()
+    remove = storage.backend.remove
+    def recording_remove(agent_id):
+        removed_on.add(threading.get_ident())
+        return remove(agent_id)
+    storage.backend.remove = recording_remove
+
+    for i in range(300):
+        storage.add_agent(make_agent(f"Short{i:03d}"), lease_ttl=0.05)
+        storage.add_agent(make_agent(f"Kept{i:03d}", capabilities=("lease", "kept")))
+    assert storage._reaper is not None and storage._reaper.get_loop() is asyncio.get_running_loop()
+
+    pages = 0
+    deadline = asyncio.get_running_loop().time() + 0.3
+    while asyncio.get_running_loop().time() < deadline:
+        cursor = None
+        while True:
+            page, cursor = storage.query_agents(capability="lease", cursor=cursor, limit=50)
+            pages += 1
+            await asyncio.sleep(0) # Let the reaper run between pages
+            if cursor is None:
+                break
+    await storage.stop_reaper()
+
+    assert pages > 0
+    assert removed_on == {loop_thread}
+    remaining, _ = storage.query_agents(capability="lease", limit=1000)
+    assert sorted(agent.agentName for agent in remaining) == [f"Kept{i:03d}" for i in range(300)]
+    assert len(storage.query_agents(capability="kept", limit=1000)[0]) == 300
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+from agentkit.core.models import AgentInfo, AgentMetadata
+from agentkit.registration.backends import InMemoryBackend
+from agentkit.registration.records import AgentRecord
+from agentkit.registration.persistence import RegistryJournal, create_journal_from_env
+from agentkit.registration.storage import AgentStorage
+
+def make_agent(name, capabilities=("test",)):
+    return AgentInfo(
+        agentName=name,
+        capabilities=list(capabilities),
+        version="1.0",
+        contactEndpoint=f"http://{name.lower()}.test:8000/run",
+        metadata=AgentMetadata(description=f"{name} agent")
+    )
+
+def open_storage(directory, snapshot_every=1000):
+    """Opens a journaled in-memory storage, as the API does at startup."""
+    return AgentStorage(InMemoryBackend(), journal=RegistryJournal(str(directory), snapshot_every=snapshot_every))
+
+def journal_segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("journal-"))
+
+def test_restore_replays_register_update_remove(tmp_path):
+    """Test every kind of event survives a restart."""
+    storage = open_storage(tmp_path)
+    kept = make_agent("Kept")
+    removed = make_agent("Removed")
+    storage.add_agent(kept)
+    storage.add_agent(removed)
+    storage.update_agent(kept.model_copy(update={"version": "2.0", "capabilities": ["upgraded"]}))
+    storage.remove_agent(removed.agentId)
+    storage.journal.close()
+
+    restored = open_storage(tmp_path)
+    agents = restored.list_agents()
+    assert [agent.agentId for agent in agents] == [kept.agentId]
+    assert agents[0].version == "2.0"
+    assert agents[0].metadata.description == "Kept agent"
+    assert str(agents[0].contactEndpoint) == "http://kept.test:8000/run"
+    assert agents[0].registration_time == kept.registration_time
+    assert restored.find_agents_by_capability("upgraded")[0].agentId == kept.agentId
+    assert restored.get_agent_by_name("Removed") is None
+
+def test_compaction_snapshots_and_drops_old_segments(tmp_path):
+    """Test a synchronous compaction writes a snapshot and truncates history."""
+    storage = open_storage(tmp_path)
+    agents = [make_agent(f"Agent{i}") for i in range(5)]
+    for agent in agents:
+        storage.add_agent(agent)
+    assert len(journal_segments(tmp_path)) == 1
+
+    storage.journal.compact(storage.backend.export_records())
+    assert os.path.exists(tmp_path / "snapshot.json")
+    storage.add_agent(make_agent("AfterSnapshot"))
+    storage.journal.close()
+
+    # Only the segment holding the post-snapshot tail remains
+    segments = journal_segments(tmp_path)
+    assert len(segments) == 1
+    with open(tmp_path / segments[0]) as f:
+        assert len(f.readlines()) == 1
+
+    restored = open_storage(tmp_path)
+    assert len(restored.list_agents()) == 6
+    assert restored.get_agent_by_name("AfterSnapshot") is not None
+
+def test_background_compaction_triggered_by_threshold(tmp_path):
+    """Test reaching snapshot_every schedules a snapshot without losing later writes."""
+    storage = open_storage(tmp_path, snapshot_every=3)
+    for i in range(3):
+        storage.add_agent(make_agent(f"Agent{i}"))
+    for thread in threading.enumerate():
+        if thread.name == "agentkit-registry-snapshot":
+            thread.join()
+    storage.add_agent(make_agent("Agent3"))
+    storage.journal.close()
+
+    assert os.path.exists(tmp_path / "snapshot.json")
+    assert len(open_storage(tmp_path).list_agents()) == 4
+
+def test_torn_journal_tail_is_ignored(tmp_path):
+    """Test a partially written last journal line does not block restore."""
+    storage = open_storage(tmp_path)
+    storage.add_agent(make_agent("Intact"))
+    storage.journal.close()
+    with open(tmp_path / journal_segments(tmp_path)[-1], "ab") as f:
+        f.write(b'{"op":"register","agent":["broken"')
+
+    restored = open_storage(tmp_path)
+    assert [agent.agentName for agent in restored.list_agents()] == ["Intact"]
+
+def test_clear_all_persists_empty_registry(tmp_path):
+    """Test clear_all is durable as well."""
+    storage = open_storage(tmp_path)
+    storage.add_agent(make_agent("Temporary"))
+    storage.clear_all()
+    storage.journal.close()
+    assert open_storage(tmp_path).list_agents() == []
+
+def test_create_journal_from_env(monkeypatch, tmp_path):
+    """Test persistence is opt-in through AGENTKIT_PERSISTENCE_DIR."""
+    monkeypatch.delenv("AGENTKIT_PERSISTENCE_DIR", raising=False)
+    assert create_journal_from_env() is None
+
+    monkeypatch.setenv("AGENTKIT_PERSISTENCE_DIR", str(tmp_path / "registry"))
+    monkeypatch.setenv("AGENTKIT_SNAPSHOT_EVERY", "10")
+    journal = create_journal_from_env()
+    assert journal.snapshot_every == 10
+    assert os.path.isdir(tmp_path / "registry")
+
+def test_restore_reads_row_format_snapshot(tmp_path):
+    """Test a format 1 snapshot (one row per agent) still restores."""
+    agent = make_agent("Legacy")
+    with open(tmp_path / "snapshot.json", "w") as f:
+        f.write(json.dumps({"format": 1, "seq": 1, "count": 1}) + "\n")
+        f.write(json.dumps([AgentRecord.from_agent_info(agent).to_row()]))
+
+    restored = open_storage(tmp_path)
+    assert restored.get_agent(agent.agentId).model_dump() == agent.model_dump()
+
+def test_batch_registration_is_journaled(tmp_path):
+    """Test only the agents a batch actually registered are restored."""
+    storage = open_storage(tmp_path)
+    storage.add_agent(make_agent("Taken"))
+    errors = storage.add_agents([make_agent("Fresh"), make_agent("Taken")])
+    assert errors[0] is None and errors[1] is not None
+    storage.journal.close()
+
+    restored = open_storage(tmp_path)
+    assert sorted(agent.agentName for agent in restored.list_agents()) == ["Fresh", "Taken"]
@@ -0,0 +1,59 @@
+from agentkit.core.models import AgentInfo, AgentMetadata
+from agentkit.registration.backends import InMemoryBackend
+from agentkit.registration import records
+from agentkit.registration.records import AgentRecord, intern_capabilities
+
+def make_agent(name, capabilities=("search", "plan")):
+    return AgentInfo(
+        agentName=name,
+        capabilities=list(capabilities),
+        version="1.0",
+        contactEndpoint=f"http://{name.lower()}.test:8000/run",
+        metadata=AgentMetadata(description=f"{name} agent")
+    )
+
+def test_record_round_trip():
+    """Test a record materializes back into an equivalent AgentInfo."""
+    agent = make_agent("RoundTrip")
+    record = AgentRecord.from_agent_info(agent)
+
+    assert isinstance(record.endpoint, str)
+    assert isinstance(record.registered_at, float)
+    assert record.to_agent_info().model_dump() == agent.model_dump()
+    assert AgentRecord.from_row(record.to_row()).to_agent_info().model_dump() == agent.model_dump()
+
+def test_capabilities_and_versions_are_shared():
+    """Test agents with identical capability lists share a single tuple."""
+    first = AgentRecord.from_agent_info(make_agent("First"))
+    second = AgentRecord.from_agent_info(make_agent("Second"))
+
+    assert first.capabilities is second.capabilities
+    assert first.version is second.version
+    assert intern_capabilities(["search", "plan"]) is first.capabilities
+
+def test_capability_table_is_bounded(monkeypatch):
+    """Test per-agent capability lists do not grow the intern table without bound."""
+    monkeypatch.setattr(records, "MAX_CAPABILITY_SETS", 3)
+    shared = intern_capabilities(["search", "plan"])
+    for i in range(10):
+        intern_capabilities([f"unique-{i}"])
+        intern_capabilities(["search", "plan"]) # Recently used: kept
+    assert len(records._capability_sets) <= 3
+    assert intern_capabilities(["search", "plan"]) is shared
+    assert ("unique-0",) not in records._capability_sets
+
+def test_record_has_no_instance_dict():
+    """Test records are slotted."""
+    record = AgentRecord.from_agent_info(make_agent("Slotted"))
+    assert not hasattr(record, "__dict__")
+
+def test_backend_returns_fresh_copies():
+    """Test mutating a returned AgentInfo does not change the stored agent."""
+    backend = InMemoryBackend()
+    agent = make_agent("Copied")
+    backend.add(agent)
+
+    fetched = backend.get(agent.agentId)
+    assert fetched is not backend.get(agent.agentId)
+    fetched.capabilities.append("mutated")
+    assert backend.get(agent.agentId).capabilities == ["search", "plan"]
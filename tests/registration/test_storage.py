@@ -97,4 +97,102 @@ def test_clear_all():
     assert len(agent_storage.list_agents()) == 1
     agent_storage.clear_all()
     assert len(agent_storage.list_agents()) == 0
-    assert agent_storage.get_agent_by_name("TestAgent") is None
\ No newline at end of file
+    assert agent_storage.get_agent_by_name("TestAgent") is None
+
+def test_remove_agent_cleans_indexes():
+    """Test removing an agent drops it from the name and capability indexes."""
+    agent_info = create_sample_agent_info(name="RemovableAgent")
+    agent_storage.add_agent(agent_info)
+
+    removed = agent_storage.remove_agent(agent_info.agentId)
+    assert removed == agent_info
+    assert agent_storage.get_agent(agent_info.agentId) is None
+    assert agent_storage.get_agent_by_name("RemovableAgent") is None
+    assert agent_storage.find_agents_by_capability("test") == []
+
+    # The name is free again after removal
+    agent_storage.add_agent(create_sample_agent_info(name="RemovableAgent"))
+    assert agent_storage.get_agent_by_name("RemovableAgent") is not None
+
+def test_remove_agent_not_found():
+    """Test removing an unknown agent returns None."""
+    assert agent_storage.remove_agent("non-existent-id") is None
+
+def test_find_agents_by_capability():
+    """Test capability lookups return only agents advertising that capability."""
+    agent1 = create_sample_agent_info(name="Agent1")
+    agent2 = AgentInfo(agentName="Agent2", capabilities=["test", "search"], version="1.0", contactEndpoint="http://test.com")
+    agent3 = AgentInfo(agentName="Agent3", capabilities=["search"], version="1.0", contactEndpoint="http://test.com")
+    for agent in (agent1, agent2, agent3):
+        agent_storage.add_agent(agent)
+
+    search_agents = agent_storage.find_agents_by_capability("search")
+    assert len(search_agents) == 2
+    assert agent2 in search_agents and agent3 in search_agents
+    assert len(agent_storage.find_agents_by_capability("test")) == 2
+    assert agent_storage.find_agents_by_capability("unknown") == []
+
+def test_clear_all_resets_indexes():
+    """Test clearing the registry also clears the secondary indexes."""
+    agent_storage.add_agent(create_sample_agent_info())
+    agent_storage.clear_all()
+    assert agent_storage.find_agents_by_capability("test") == []
+    # Re-registering the same name must not collide with a stale index entry
+    agent_storage.add_agent(create_sample_agent_info())
+
+def test_query_agents_paginates_in_id_order():
+    """Test cursor pagination walks every agent exactly once in agentId order."""
+    agents = [create_sample_agent_info(name=f"PagedAgent{i}") for i in range(7)]
+    for agent in agents:
+        agent_storage.add_agent(agent)
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = agent_storage.query_agents(cursor=cursor, limit=3)
+        seen.extend(agent.agentId for agent in page)
+        if cursor is None:
+            break
+    assert seen == sorted(agent.agentId for agent in agents)
+
+def test_query_agents_cursor_stable_under_removal():
+    """Test a cursor stays valid when the agent it points at is removed."""
+    agents = [create_sample_agent_info(name=f"StableAgent{i}") for i in range(4)]
+    for agent in agents:
+        agent_storage.add_agent(agent)
+    ordered_ids = sorted(agent.agentId for agent in agents)
+
+    first_page, cursor = agent_storage.query_agents(limit=2)
+    agent_storage.remove_agent(first_page[-1].agentId)
+    second_page, next_cursor = agent_storage.query_agents(cursor=cursor, limit=2)
+
+    assert [agent.agentId for agent in second_page] == ordered_ids[2:]
+    assert next_cursor is None
+
+def test_query_agents_filters_by_capability_and_version():
+    """Test capability and version filters are combined."""
+    agent_storage.add_agent(AgentInfo(agentName="A", capabilities=["search"], version="1.0", contactEndpoint="http://a.test"))
+    agent_storage.add_agent(AgentInfo(agentName="B", capabilities=["search"], version="2.0", contactEndpoint="http://b.test"))
+    agent_storage.add_agent(AgentInfo(agentName="C", capabilities=["plan"], version="2.0", contactEndpoint="http://c.test"))
+
+    page, cursor = agent_storage.query_agents(capability="search", version="2.0")
+    assert [agent.agentName for agent in page] == ["B"]
+    assert cursor is None
+    assert agent_storage.query_agents(capability="unknown")[0] == []
+
+def test_query_agents_invalid_cursor():
+    """Test a malformed cursor raises ValueError."""
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        agent_storage.query_agents(cursor="%%%not-base64")
+
+
+def test_journal_is_refused_for_self_persisting_backend(tmp_path):
+    """Test a SQLite-backed registry cannot also be journaled (it would replay agents the database already holds)."""
+    from agentkit.registration.backends import SQLiteBackend
+    from agentkit.registration.persistence import RegistryJournal
+    backend = SQLiteBackend(str(tmp_path / "registry.db"))
+    try:
+        with pytest.raises(ValueError, match="already persists"):
+            AgentStorage(backend, journal=RegistryJournal(str(tmp_path / "journal")))
+    finally:
+        backend.close()
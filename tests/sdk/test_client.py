@@ -37,7 +37,7 @@ async def test_register_agent_success(client: AgentKitClient, httpx_mock: HTTPXM
     mock_response = {
         "status": "success",
         "message": "Agent registered.",
-        "data": {"agentId": mock_agent_id}
+        "data": {"agentId": mock_agent_id, "pushToken": "push-token"}
     }
     httpx_mock.add_response(method="POST", url=f"{BASE_URL}{REGISTER_ENDPOINT_REL}", json=mock_response, status_code=201)
 
@@ -50,6 +50,7 @@ async def test_register_agent_success(client: AgentKitClient, httpx_mock: HTTPXM
     )
 
     assert agent_id == mock_agent_id
+    assert client.push_tokens[agent_id] == "push-token" # Kept for MessageReceiver
     request = httpx_mock.get_request()
     assert request is not None
     assert request.method == "POST"
@@ -279,4 +280,163 @@ async def test_report_state_network_error(mock_getenv, client: AgentKitClient, h
     httpx_mock.add_exception(httpx.ConnectError("Failed to connect to Ops-Core"))
 
     with pytest.raises(AgentKitError, match="Network error communicating with Ops-Core API"):
-        await client.report_state_to_opscore(agent_id=agent_id, state=state)
\ No newline at end of file
+        await client.report_state_to_opscore(agent_id=agent_id, state=state)
+# --- Discovery Tests (Async) ---
+
+async def test_list_agents_sends_filters(client: AgentKitClient, httpx_mock: HTTPXMock):
+    """Test list_agents passes filters, cursor and projection as query parameters."""
+    page = {"agents": [{"agentId": "a1"}], "nextCursor": "abc"}
+    httpx_mock.add_response(
+        method="GET",
+        url=f"{BASE_URL}/v1/agents?capability=search&cursor=xyz&limit=10&fields=agentId%2CagentName",
+        json={"status": "success", "data": page},
+    )
+
+    result = await client.list_agents(capability="search", cursor="xyz", limit=10, fields=["agentId", "agentName"])
+    assert result == page
+
+async def test_iter_agents_follows_cursors(client: AgentKitClient, httpx_mock: HTTPXMock):
+    """Test iter_agents keeps fetching pages until nextCursor is empty."""
+    httpx_mock.add_response(
+        method="GET", url=f"{BASE_URL}/v1/agents?limit=1",
+        json={"status": "success", "data": {"agents": [{"agentId": "a1"}], "nextCursor": "c1"}},
+    )
+    httpx_mock.add_response(
+        method="GET", url=f"{BASE_URL}/v1/agents?cursor=c1&limit=1",
+        json={"status": "success", "data": {"agents": [{"agentId": "a2"}], "nextCursor": None}},
+    )
+
+    agent_ids = [agent["agentId"] async for agent in client.iter_agents(page_size=1)]
+    assert agent_ids == ["a1", "a2"]
+
+async def test_get_agent_info_not_found(client: AgentKitClient, httpx_mock: HTTPXMock):
+    """Test get_agent_info surfaces 404 as AgentKitError."""
+    httpx_mock.add_response(method="GET", url=f"{BASE_URL}/v1/agents/ghost", json={"detail": "not found"}, status_code=404)
+    with pytest.raises(AgentKitError) as excinfo:
+        await client.get_agent_info("ghost")
+    assert excinfo.value.status_code == 404
+
+# --- get_task Tests (Async) ---
+
+async def test_get_task_returns_status(client: AgentKitClient, httpx_mock: HTTPXMock):
+    """Test get_task returns the task lifecycle data."""
+    task = {"taskId": "task-1", "status": "delivered", "attempts": 1}
+    httpx_mock.add_response(method="GET", url=f"{BASE_URL}/v1/tasks/task-1", json={"status": "success", "data": task})
+    assert await client.get_task("task-1") == task
+
+async def test_get_task_not_found(client: AgentKitClient, httpx_mock: HTTPXMock):
+    """Test get_task surfaces 404 as AgentKitError."""
+    httpx_mock.add_response(method="GET", url=f"{BASE_URL}/v1/tasks/gone", json={"detail": "not found"}, status_code=404)
+    with pytest.raises(AgentKitError) as excinfo:
+        await client.get_task("gone")
+    assert excinfo.value.status_code == 404
+
+async def test_broadcast_message_returns_report(client: AgentKitClient, httpx_mock: HTTPXMock):
+    """Test broadcast_message posts the message to the capability and returns the delivery report."""
+    report = {"capability": "notify", "recipients": 2, "delivered": 2, "failed": 0, "skipped": 0, "failures": []}
+    httpx_mock.add_response(method="POST", url=f"{BASE_URL}/v1/capabilities/notify/broadcast", json={"status": "success", "data": report})
+    assert await client.broadcast_message("notify", "sender", "announcement", {"text": "hi"}) == report
+    assert json.loads(httpx_mock.get_request().content) == {"senderId": "sender", "messageType": "announcement", "payload": {"text": "hi"}}
+
+async def test_send_message_waits_for_reply(client: AgentKitClient, httpx_mock: HTTPXMock):
+    """Test send_message with wait passes wait/timeout and returns the reply data."""
+    data = {"agentId": "a", "taskId": "task-1", "replyStatus": "replied", "reply": {"payload": {"ok": True}}}
+    httpx_mock.add_response(method="POST", url=f"{BASE_URL}/v1/agents/a/run?wait=true&timeout=5.0", json={"status": "success", "data": data})
+    assert await client.send_message("a", "s", "question", {}, wait=True, timeout=5.0) == data
+
+async def test_send_message_idempotency_key_and_priority(client: AgentKitClient, httpx_mock: HTTPXMock):
+    """Test send_message sends the idempotency key as a header and the priority in the body."""
+    httpx_mock.add_response(method="POST", url=f"{BASE_URL}/v1/agents/a/run", match_headers={"Idempotency-Key": "order-42"}, json={"status": "success", "data": {"taskId": "t"}})
+    assert await client.send_message("a", "s", "task", {}, priority="high", idempotency_key="order-42") == {"taskId": "t"}
+    assert json.loads(httpx_mock.get_request().content)["priority"] == "high"
+
+async def test_resolve_payload_downloads_claim_checks(client: AgentKitClient, httpx_mock: HTTPXMock):
+    """Test resolve_payload fetches offloaded payloads and passes inline ones through."""
+    httpx_mock.add_response(method="GET", url=f"{BASE_URL}/v1/blobs/abc", json={"text": "big"})
+    message = {"senderId": "s", "payload": {"claimCheck": {"blobId": "abc", "size": 15, "href": "/v1/blobs/abc"}}}
+    assert await client.resolve_payload(message) == {"text": "big"}
+    assert await client.resolve_payload({"payload": {"n": 1}}) == {"n": 1}
+
+async def test_reply_reports_whether_caller_was_waiting(client: AgentKitClient, httpx_mock: HTTPXMock):
+    """Test reply posts to the task's reply endpoint."""
+    httpx_mock.add_response(method="POST", url=f"{BASE_URL}/v1/tasks/task-1/reply", json={"status": "success", "data": {"taskId": "task-1", "callerWaiting": True}})
+    assert await client.reply("task-1", "agent-a", "answer", {"ok": True}) is True
+
+# --- send_messages Tests (Async) ---
+
+async def test_send_messages_chunks_records_and_offsets_results(client: AgentKitClient, httpx_mock: HTTPXMock):
+    """Test bulk sending splits records into NDJSON requests and renumbers the streamed results."""
+    def respond(request: httpx.Request) -> httpx.Response:
+        lines = request.read().decode().splitlines()
+        results = [{"index": i, "status": "queued", "taskId": json.loads(line)["message"]["payload"]["n"]} for i, line in enumerate(lines)]
+        return httpx.Response(200, content="".join(json.dumps(r) + "\n" for r in results), headers={"Content-Type": "application/x-ndjson"})
+    httpx_mock.add_callback(respond, method="POST", url=f"{BASE_URL}/v1/agents/run:batch", is_reusable=True)
+    records = [{"agentId": "a", "message": {"senderId": "s", "messageType": "note", "payload": {"n": n}}} for n in range(5)]
+
+    results = [result async for result in client.send_messages(records, chunk_size=2)]
+
+    assert [(r["index"], r["taskId"]) for r in results] == [(n, n) for n in range(5)]
+    assert len(httpx_mock.get_requests()) == 3
+    assert httpx_mock.get_requests()[0].headers["Content-Type"] == "application/x-ndjson"
+
+async def test_send_messages_request_error(client: AgentKitClient, httpx_mock: HTTPXMock):
+    httpx_mock.add_response(method="POST", url=f"{BASE_URL}/v1/agents/run:batch", status_code=413, text="too large")
+    with pytest.raises(AgentKitError) as excinfo:
+        [result async for result in client.send_messages([{"agentId": "a", "message": {}}])]
+    assert excinfo.value.status_code == 413
+
+# --- register_agents Tests (Async) ---
+
+async def test_register_agents_returns_results(client: AgentKitClient, httpx_mock: HTTPXMock):
+    """Test batch registration posts every agent and returns per-item results."""
+    results = [
+        {"index": 0, "status": "registered", "agentName": "A", "agentId": "id-a"},
+        {"index": 1, "status": "conflict", "agentName": "B", "error": "Agent with name 'B' already registered."},
+    ]
+    httpx_mock.add_response(
+        method="POST", url=f"{BASE_URL}/v1/agents/register:batch",
+        json={"status": "success", "data": {"registered": 1, "conflicts": 1, "results": results}}
+    )
+
+    returned = await client.register_agents([
+        {"agentName": "A", "capabilities": ["x"], "version": "1", "contactEndpoint": HttpUrl("http://a.test/")},
+        {"agentName": "B", "capabilities": [], "version": "1", "contactEndpoint": "http://b.test/", "metadata": None},
+    ])
+
+    assert returned == results
+    sent = json.loads(httpx_mock.get_request().read().decode())
+    assert [agent["agentName"] for agent in sent["agents"]] == ["A", "B"]
+    assert sent["agents"][0]["contactEndpoint"] == "http://a.test/"
+    assert "metadata" not in sent["agents"][1]
+
+async def test_heartbeat_batches_agent_ids(client: AgentKitClient, httpx_mock: HTTPXMock):
+    """Test heartbeat sends all IDs in one request and returns renewed/unleased/unknown lists."""
+    httpx_mock.add_response(
+        method="POST", url=f"{BASE_URL}/v1/agents/heartbeat",
+        json={"status": "success", "data": {"renewed": ["a"], "unleased": ["c"], "unknown": ["b"]}}
+    )
+    result = await client.heartbeat(["a", "b", "c"], lease_ttl=30)
+    assert result == {"renewed": ["a"], "unleased": ["c"], "unknown": ["b"]}
+    assert json.loads(httpx_mock.get_request().read().decode()) == {"agentIds": ["a", "b", "c"], "leaseTtl": 30}
+
+async def test_registry_mirror_applies_snapshot_and_changes(client: AgentKitClient, httpx_mock: HTTPXMock):
+    """Test the mirror loads a snapshot, then applies deltas with the returned cursor."""
+    from agentkit.sdk.client import AgentRegistryMirror
+    httpx_mock.add_response(
+        method="GET", url=f"{BASE_URL}/v1/agents/changes?timeout=0",
+        json={"status": "success", "data": {"reset": True, "epoch": "e1", "seq": 4, "hasMore": False,
+                                            "agents": [{"agentId": "a"}, {"agentId": "b"}]}}
+    )
+    httpx_mock.add_response(
+        method="GET", url=f"{BASE_URL}/v1/agents/changes?since=4&epoch=e1&timeout=0",
+        json={"status": "success", "data": {"reset": False, "epoch": "e1", "seq": 6, "hasMore": False, "changes": [
+            {"seq": 5, "op": "remove", "agentId": "a", "agent": None},
+            {"seq": 6, "op": "register", "agentId": "c", "agent": {"agentId": "c"}},
+        ]}}
+    )
+
+    mirror = AgentRegistryMirror(client)
+    assert await mirror.sync() == 2
+    assert await mirror.sync() == 2
+    assert set(mirror.agents) == {"b", "c"}
+    assert (mirror.seq, mirror.epoch) == (6, "e1")
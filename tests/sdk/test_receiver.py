@@ -0,0 +1,28 @@
+import json
+from agentkit.sdk.client import AgentKitError
+from agentkit.sdk.receiver import MessageReceiver
+
+
+async def test_acknowledges_each_message_of_a_delivery():
+    received = []
+
+    async def handler(message):
+        received.append(message["payload"]["n"])
+
+    receiver = MessageReceiver("agent-1", handler, "token", base_url="https://agentkit.example")
+    reply = await receiver.handle_frame(json.dumps({"type": "deliver", "deliveryId": "d1", "body": [{"payload": {"n": 1}}, {"payload": {"n": 2}}]}))
+
+    assert receiver.url == "wss://agentkit.example/v1/agents/agent-1/connect"
+    assert received == [1, 2]
+    assert json.loads(reply) == {"type": "ack", "deliveryId": "d1"}
+
+
+async def test_rejects_delivery_when_handler_fails():
+    async def handler(message):
+        raise AgentKitError("cannot handle this", status_code=422)
+
+    receiver = MessageReceiver("agent-1", handler, "token")
+    reply = json.loads(await receiver.handle_frame(json.dumps({"type": "deliver", "deliveryId": "d2", "body": {"payload": {}}})))
+
+    assert (reply["type"], reply["deliveryId"], reply["statusCode"]) == ("nack", "d2", 422)
+    assert await receiver.handle_frame("not json") is None